@@ -0,0 +1,228 @@
+"""Compare per-update latency of long polling and the webhook server.
+
+Both modes run a real TeleBot against local stand-ins: polling asks a fake Bot API
+for `getUpdates`, the webhook mode has updates POSTed to `webhook.WebhookServer`.
+`--delay` is the one-way network delay to Telegram, applied to every leg that
+crosses it. The webhook server checks each update against a fakeredis-backed
+`UpdateDeduplicator`, the same `SET NX` it pays live. Latency is measured from the
+moment Telegram has an update to the moment the bot's handler runs.
+
+    uv run python scripts/bench_ingest.py --updates 200 --interval 0.02 --delay 0.05
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import logging
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, override
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import fakeredis
+import telebot
+from telebot import apihelper
+
+from dedupe import UpdateDeduplicator
+from webhook import SECRET_HEADER, WebhookServer
+
+TOKEN = "12345:bench"  # noqa: S105
+SECRET = "bench-secret"  # noqa: S105
+
+
+def make_update(update_id: int) -> dict[str, Any]:
+    """Return a minimal private text-message update."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "text": "https://example.com",
+        },
+    }
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """Answers `getUpdates` long polls the way Telegram does, after `delay`."""
+
+    daemon_threads = True
+
+    def __init__(self, delay: float) -> None:
+        """Bind a free local port; no update is pending yet."""
+        super().__init__(("127.0.0.1", 0), _BotApiHandler)
+        self.delay = delay
+        self.updates: list[dict[str, Any]] = []
+        self.arrived = threading.Condition()
+
+    def push(self, update: dict[str, Any]) -> None:
+        """Hand Telegram a new update, waking any long poll waiting for one."""
+        with self.arrived:
+            self.updates.append(update)
+            self.arrived.notify_all()
+
+    def take(self, offset: int, timeout: float) -> list[dict[str, Any]]:
+        """Return the updates from `offset` on, waiting up to `timeout` for one."""
+        with self.arrived:
+            self.arrived.wait_for(
+                lambda: any(u["update_id"] >= offset for u in self.updates),
+                timeout=timeout,
+            )
+            return [u for u in self.updates if u["update_id"] >= offset]
+
+
+class _BotApiHandler(BaseHTTPRequestHandler):
+    server: FakeBotApi  # pyrefly: ignore[bad-override-mutable-attribute]
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        time.sleep(self.server.delay)  # the request's way to Telegram
+        if url.path.endswith("/getUpdates"):
+            result: Any = self.server.take(
+                offset=int(query.get("offset", ["0"])[0]),
+                # Capped so stopping the bot does not wait out a 20 s long poll.
+                timeout=min(float(query.get("timeout", ["1"])[0]), 1.0),
+            )
+        elif url.path.endswith("/setWebhook"):
+            result = True
+        else:  # getMe, which polling asks once for the bot's username
+            result = {"id": 12345, "is_bot": True, "first_name": "Bench"}
+        time.sleep(self.server.delay)  # the response's way back
+        body = json.dumps({"ok": True, "result": result}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @override
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def _serve_bot_api(delay: float) -> FakeBotApi:
+    api = FakeBotApi(delay)
+    threading.Thread(target=api.serve_forever, daemon=True).start()
+    # telebot declares API_URL as None, so assigning a str trips the type checkers.
+    setattr(  # noqa: B010
+        apihelper,
+        "API_URL",
+        f"http://127.0.0.1:{api.server_address[1]}/bot{{0}}/{{1}}",
+    )
+    return api
+
+
+def _recording_bot(received: dict[int, float]) -> telebot.TeleBot:
+    bot = telebot.TeleBot(TOKEN, threaded=False)
+
+    def record(message: telebot.types.Message) -> None:
+        received[message.message_id] = time.perf_counter()
+
+    bot.message_handler(content_types=["text"])(record)
+    return bot
+
+
+def _latencies(sent: dict[int, float], received: dict[int, float]) -> list[float]:
+    deadline = time.perf_counter() + 10
+    while len(received) < len(sent) and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return [received[i] - sent[i] for i in sent if i in received]
+
+
+def run_polling(updates: int, interval: float, delay: float) -> list[float]:
+    """Deliver `updates` through getUpdates long polling; return their latencies."""
+    api = _serve_bot_api(delay)
+    received: dict[int, float] = {}
+    bot = _recording_bot(received)
+    poller = threading.Thread(
+        target=bot.infinity_polling,
+        kwargs={"timeout": 20, "skip_pending": False},
+        daemon=True,
+    )
+    poller.start()
+    sent: dict[int, float] = {}
+    for update_id in range(1, updates + 1):
+        sent[update_id] = time.perf_counter()
+        api.push(make_update(update_id))
+        time.sleep(interval)
+    latencies = _latencies(sent, received)
+    bot.stop_polling()
+    poller.join()
+    api.shutdown()
+    apihelper.API_URL = None
+    return latencies
+
+
+def run_webhook(updates: int, interval: float, delay: float) -> list[float]:
+    """Deliver `updates` as webhook POSTs; return their latencies."""
+    api = _serve_bot_api(delay)  # answers only the setWebhook call
+    received: dict[int, float] = {}
+    bot = _recording_bot(received)
+    dedupe = UpdateDeduplicator(fakeredis.FakeRedis(), ttl=60)
+    server = WebhookServer(
+        bot,
+        dedupe,
+        "https://bench.invalid/hook",
+        SECRET,
+        "127.0.0.1",
+        0,
+    )
+    port = server.listen()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def deliver(update_id: int) -> None:
+        time.sleep(delay)  # Telegram's POST on its way to the bot
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        connection.request(
+            "POST",
+            "/hook",
+            body=json.dumps(make_update(update_id)).encode(),
+            headers={SECRET_HEADER: SECRET},
+        )
+        connection.getresponse().read()
+        connection.close()
+
+    sent: dict[int, float] = {}
+    for update_id in range(1, updates + 1):
+        sent[update_id] = time.perf_counter()
+        threading.Thread(target=deliver, args=(update_id,), daemon=True).start()
+        time.sleep(interval)
+    latencies = _latencies(sent, received)
+    server.close()
+    api.shutdown()
+    apihelper.API_URL = None
+    return latencies
+
+
+def main() -> None:
+    """Parse the arguments, run both modes, print a latency table in ms."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--updates", type=int, default=100)
+    parser.add_argument("--interval", type=float, default=0.02)
+    parser.add_argument("--delay", type=float, default=0.05)
+    args = parser.parse_args()
+    # stop_polling makes infinity_polling log its exit at ERROR.
+    telebot.logger.setLevel(logging.CRITICAL)
+
+    rows = ["mode      updates   mean ms    p50 ms    p95 ms"]
+    for name, run in (("polling", run_polling), ("webhook", run_webhook)):
+        latencies = [s * 1000 for s in run(args.updates, args.interval, args.delay)]
+        p95 = statistics.quantiles(latencies, n=20)[-1]
+        rows.append(
+            f"{name:<9} {len(latencies):>7} {statistics.mean(latencies):>9.1f}"
+            f" {statistics.median(latencies):>9.1f} {p95:>9.1f}",
+        )
+    sys.stdout.write("\n".join(rows) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""Compare how the threaded and asyncio entry points carry concurrent slow jobs.
+
+Both runtimes run for real on the composition root's graph: each update goes to
+`BotApp.enqueue_message` on a started `Scheduler`, as `main.py` hands it over,
+or to `AsyncBotApp.handle_message` on one event loop whose executor is sized as
+`async_main.py` sizes it. The backends are local stand-ins: Postgres is a SQLite
+file, Valkey is fakeredis, tracing is off, and the summarization pipeline is a
+`MessageHandlers` whose every job waits `--latency` seconds, standing in for a
+model call or a Gemini processing poll. Each job comes from its own approved
+sender, so neither runtime's per-chat ordering serializes them. Reported per job
+count: jobs that reached the pipeline, wall time, jobs finished per second, and
+the peak number of live threads.
+
+    uv run python scripts/bench_runtime.py --jobs 10 100 500 --latency 0.5
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING, Self, cast, override
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import fakeredis
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from telebot.types import Message
+
+from async_main import AsyncBotApp
+from caching import TtlCache
+from cancellation import Cancellations
+from container import Container, build_container
+from database import JobRepository, UserRepository
+from dedupe import UpdateDeduplicator
+from handlers import MessageHandlers
+from inflight import InFlightLimiter
+from main import BotApp
+from models import Base
+from services import Tracer
+from workers import Scheduler, WorkerPool
+
+if TYPE_CHECKING:
+    from models import UsersOrm
+
+
+class _WaitingHandlers(MessageHandlers):
+    """The summarization pipeline reduced to one wait per job, counted."""
+
+    def __init__(self, latency: float) -> None:
+        """Wait `latency` seconds per job; the real collaborators are not needed."""
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.handled = 0
+
+    @override
+    def handle_url(self, message: Message, user: UsersOrm, url: str) -> None:
+        time.sleep(self._latency)
+        with self._lock:
+            self.handled += 1
+
+
+class _PeakThreads:
+    """Samples `threading.active_count` in the background while a run lasts."""
+
+    def __init__(self) -> None:
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self) -> Self:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def _messages(jobs: int) -> list[Message]:
+    """Return one private text message per sender, senders numbered from 1."""
+    messages = []
+    for user_id in range(1, jobs + 1):
+        message = cast(
+            "Message",  # a message object always decodes to one
+            Message.de_json(
+                {
+                    "message_id": 1,
+                    "date": 0,
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+                    "text": "https://example.com",
+                },
+            ),
+        )
+        messages.append(message)
+    return messages
+
+
+def _stand_ins(
+    jobs: int,
+    latency: float,
+    database: Path,
+) -> tuple[Container, _WaitingHandlers]:
+    """Return the composition root with every backend swapped for a local one.
+
+    The `jobs` senders are registered and approved in a fresh SQLite database.
+    """
+    engine = create_engine(f"sqlite:///{database}")
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(engine)
+    valkey = fakeredis.FakeRedis(decode_responses=True)
+    user_repo = UserRepository(session_factory, TtlCache(60, jobs))
+    for user_id in range(1, jobs + 1):
+        user_repo.register_user(user_id, "Bench", "", "", approved=True)
+    handlers = _WaitingHandlers(latency)
+    container = replace(
+        build_container(),
+        tracer=Tracer(None),
+        user_repo=user_repo,
+        jobs=JobRepository(session_factory, "bench", 120),
+        limiter=InFlightLimiter(valkey, jobs, 3600),
+        cancellations=Cancellations(valkey, 3600, 1.0),
+        dedupe=UpdateDeduplicator(valkey, 60),
+        handlers=handlers,
+    )
+    return container, handlers
+
+
+def _bot_app(container: Container, scheduler: Scheduler) -> BotApp:
+    """Build the polling, all-role BotApp on `container`, running on `scheduler`."""
+    return BotApp(
+        container.bot,
+        container.user_repo,
+        container.jobs,
+        container.limiter,
+        container.cancellations,
+        container.dedupe,
+        container.lease,
+        container.quota_manager,
+        container.tracer,
+        container.handlers,
+        container.stats_log,
+        scheduler,
+        None,
+        None,
+    )
+
+
+def run_threaded(jobs: int, latency: float, workers: int) -> tuple[int, float, int]:
+    """Enqueue `jobs` updates on BotApp; return (handled, seconds, peak threads).
+
+    Both lanes get `workers` threads and room to queue every job, so none is
+    answered busy.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        container, handlers = _stand_ins(jobs, latency, Path(tmp) / "bench.sqlite")
+        scheduler = Scheduler(
+            {
+                "quick": WorkerPool(workers, queue_size=jobs),
+                "long": WorkerPool(workers, queue_size=jobs),
+            },
+        )
+        app = _bot_app(container, scheduler)
+        messages = _messages(jobs)
+        with _PeakThreads() as threads:
+            started = time.perf_counter()
+            scheduler.start()
+            for message in messages:
+                app.enqueue_message(message)
+            scheduler.shutdown()
+            elapsed = time.perf_counter() - started
+    return handlers.handled, elapsed, threads.peak
+
+
+def run_async(jobs: int, latency: float) -> tuple[int, float, int]:
+    """Hand `jobs` updates to AsyncBotApp; return (handled, seconds, peak threads).
+
+    The app may hold every job at once, so none is answered busy.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        container, handlers = _stand_ins(jobs, latency, Path(tmp) / "bench.sqlite")
+        scheduler = Scheduler({})  # never started: AsyncBotApp has no pools
+        app = AsyncBotApp(
+            container.async_bot,
+            _bot_app(container, scheduler),
+            container.bot,
+            container.tracer,
+            jobs,
+        )
+        messages = _messages(jobs)
+
+        async def main() -> None:
+            # As AsyncBotApp.run does before polling: a thread per held job.
+            asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(jobs))
+            await asyncio.gather(*(app.handle_message(m) for m in messages))
+
+        with _PeakThreads() as threads:
+            started = time.perf_counter()
+            asyncio.run(main())
+            elapsed = time.perf_counter() - started
+    return handlers.handled, elapsed, threads.peak
+
+
+def main() -> None:
+    """Parse the arguments, run both runtimes per job count, print a table."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    rows = ["runtime   jobs   done   seconds   jobs/s   peak threads"]
+    for jobs in args.jobs:
+        for name, (handled, elapsed, peak) in (
+            ("threaded", run_threaded(jobs, args.latency, args.workers)),
+            ("asyncio", run_async(jobs, args.latency)),
+        ):
+            rows.append(
+                f"{name:<9} {jobs:>4} {handled:>6} {elapsed:>9.2f}"
+                f" {handled / elapsed:>8.1f} {peak:>14}",
+            )
+    sys.stdout.write("\n".join(rows) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Experimental asyncio entry point: the bot on AsyncTeleBot over the sync pipeline."""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from weakref import WeakValueDictionary
+
+from telebot.asyncio_handler_backends import ContinueHandling
+
+from config import ASYNC_MAX_JOBS, BOT_MODE, BOT_ROLE
+from container import build_container
+from main import CONTENT_TYPES, BotApp
+from utils import clean_up
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Coroutine
+    from typing import Any
+
+    import telebot
+    from telebot.async_telebot import AsyncTeleBot
+    from telebot.types import Message
+
+    from container import Container
+    from services import Tracer
+
+logger = logging.getLogger(__name__)
+
+
+def check_settings(role: str, mode: str) -> None:
+    """Refuse a BOT_ROLE or BOT_MODE the asyncio runtime does not honour.
+
+    The runtime is experimental: it records no jobs, so none is resumed after
+    a restart, and it has no per-user in-flight cap, /cancel, job deadline or
+    leader lease. It runs only as the one polling process that does every job,
+    rather than silently weakening what a scale-out or webhook setup promises.
+
+    Raises:
+        ValueError: If `role` is not "all" or `mode` is not "polling".
+
+    """
+    if role != "all":
+        msg = f"async_main.py runs only with BOT_ROLE=all, not {role!r}"
+        raise ValueError(msg)
+    if mode != "polling":
+        msg = f"async_main.py runs only with BOT_MODE=polling, not {mode!r}"
+        raise ValueError(msg)
+
+
+class AsyncBotApp:
+    """Runs the bot on AsyncTeleBot, on top of `BotApp` and the sync services.
+
+    The loop only polls and orders each chat's messages. Every job, command and
+    settings reply runs `BotApp`'s own sync handler via `asyncio.to_thread`, so
+    the pipeline, its retries and its answers are the threaded runtime's; the
+    settings flow's next-step registry lives on the sync bot.
+
+    Experimental: none of `BotApp`'s delivery guarantees — job records and
+    resume, the per-user in-flight cap, /cancel, the job deadline, the leader
+    lease — apply here; `check_settings` keeps it to the one setup where that
+    is visible.
+    """
+
+    def __init__(
+        self,
+        async_bot: AsyncTeleBot,
+        app: BotApp,
+        bot: telebot.TeleBot,
+        tracer: Tracer,
+        max_jobs: int,
+    ) -> None:
+        """Store the injected collaborators and the cap on jobs held at once."""
+        self._async_bot = async_bot
+        self._app = app
+        self._bot = bot
+        self._tracer = tracer
+        self._max_jobs = max_jobs
+        self._held = 0
+        # Weak, so a chat's lock goes away once no job for that chat holds it.
+        self._chat_locks: WeakValueDictionary[int, asyncio.Lock] = WeakValueDictionary()
+
+    @staticmethod
+    def _offload(
+        handler: Callable[[Message], None],
+    ) -> Callable[[Message], Coroutine[Any, Any, None]]:
+        """Wrap a sync handler so AsyncTeleBot can await it in the executor."""
+
+        async def run(message: Message) -> None:
+            await asyncio.to_thread(handler, message)
+
+        return run
+
+    def handle_cancel(self, message: Message) -> None:
+        """Answer /cancel: no job here has a token to cancel it by."""
+        self._bot.reply_to(
+            message,
+            "This bot cannot cancel a message under way. Please wait for its reply.",
+        )
+
+    async def authorized(self, message: Message) -> bool:
+        """Async `BotApp.authorized`, off the loop since it queries Postgres."""
+        return await asyncio.to_thread(self._app.authorized, message)
+
+    async def continue_settings_choice(
+        self,
+        message: Message,
+    ) -> ContinueHandling | None:
+        """Hand a reply to a pending settings keyboard to its `proceed_*` handler.
+
+        `BotApp._prompt_choice` registers the next step on the sync bot, which
+        never polls here, so its registry is drained the way TeleBot itself does
+        before command matching. Anything else continues to the other handlers,
+        as does everything when the sync bot was built without a next-step backend.
+        """
+        backend = self._bot.next_step_backend
+        if backend is None:
+            return ContinueHandling()
+        handlers = backend.get_handlers(message.chat.id)
+        if not handlers:
+            return ContinueHandling()
+        for handler in handlers:
+            await asyncio.to_thread(
+                handler["callback"],
+                message,
+                *handler["args"],
+                **handler["kwargs"],
+            )
+        return None
+
+    async def handle_message(self, message: Message) -> None:
+        """Summarize a message once its chat's earlier messages are done.
+
+        AsyncTeleBot runs a batch of updates concurrently, so the per-chat lock is
+        what keeps one chat's messages in arrival order, as `WorkerPool` does for
+        the threaded runtime. Past `max_jobs` held at once, the sender is told
+        the bot is busy instead. A redelivered message is dropped once it holds
+        the lock: checking before would await a thread outside it, and let a
+        later message overtake an earlier one.
+        """
+        if self._held >= self._max_jobs:
+            await asyncio.to_thread(
+                self._bot.reply_to,
+                message,
+                "The bot is busy. Please try again later.",
+            )
+            return
+        self._held += 1
+        try:
+            lock = self._chat_locks.setdefault(message.chat.id, asyncio.Lock())
+            async with lock:
+                if await asyncio.to_thread(self._app.first_delivery, message):
+                    await asyncio.to_thread(self._app.handle_message, message)
+        finally:
+            self._held -= 1
+
+    def register(self) -> None:
+        """Register every handler on the async bot, settings replies first.
+
+        `/cancel` gets this runtime's own answer, since `BotApp.handle_cancel`
+        would report withdrawing jobs that were never recorded.
+        """
+        self._async_bot.message_handler()(self.continue_settings_choice)
+        for command, sync_handler, gated in self._app.command_handlers():
+            handler = self.handle_cancel if command == "cancel" else sync_handler
+            if gated:
+                self._async_bot.message_handler(
+                    commands=[command],
+                    func=self.authorized,
+                )(self._offload(handler))
+            else:
+                self._async_bot.message_handler(commands=[command])(
+                    self._offload(handler),
+                )
+        self._async_bot.message_handler(content_types=CONTENT_TYPES)(
+            self.handle_message,
+        )
+
+    async def _poll(self) -> None:
+        # A held job runs on an executor thread; one for each keeps any from waiting.
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(self._max_jobs, thread_name_prefix="async-job"),
+        )
+        try:
+            await self._async_bot.infinity_polling(timeout=20)
+        finally:
+            await self._async_bot.close_session()
+
+    def run(self) -> None:
+        """Poll Telegram for updates on a fresh event loop."""
+        logger.warning(
+            "The asyncio runtime is experimental: jobs are not recorded or "
+            "resumed, and have no in-flight cap, /cancel or deadline",
+        )
+        asyncio.run(self._poll())
+
+    def shutdown(self) -> None:
+        """Sweep temp download files, then flush the tracer.
+
+        There is no scheduler to drain: `run` returns only once `asyncio.run`
+        has shut the loop's executor down, so no job is left reading a file the
+        sweep removes. The sweep unlinks files directly, so one `OSError` would
+        otherwise cost every span still buffered in the tracer.
+        """
+        try:
+            clean_up(all_downloads=True)
+        finally:
+            self._tracer.shutdown()
+
+
+def build_async_app(container: Container) -> AsyncBotApp:
+    """Build the AsyncBotApp from the composition root, handlers already registered.
+
+    The inner `BotApp` serves the commands only, so its own handlers are not
+    registered, its scheduler is never started, so no job is recorded or resumed, and it
+    gets no stream or webhook.
+
+    Raises:
+        ValueError: If BOT_ROLE or BOT_MODE asks for what this runtime lacks.
+
+    """
+    check_settings(BOT_ROLE, BOT_MODE)
+    app = AsyncBotApp(
+        container.async_bot,
+        BotApp(
+            container.bot,
+            container.user_repo,
+            container.jobs,
+            container.limiter,
+            container.cancellations,
+            container.dedupe,
+            container.lease,
+            container.quota_manager,
+            container.tracer,
+            container.handlers,
+            container.stats_log,
+            container.scheduler,
+            None,
+            None,
+        ),
+        container.bot,
+        container.tracer,
+        ASYNC_MAX_JOBS,
+    )
+    app.register()
+    return app
+
+
+if __name__ == "__main__":
+    app = build_async_app(build_container())
+    try:
+        app.run()
+    finally:
+        app.shutdown()
@@ -0,0 +1,441 @@
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import threading
+import time
+from collections import Counter, OrderedDict
+from compression import zstd
+from dataclasses import asdict, dataclass
+from functools import partial
+from hashlib import sha256
+from typing import TYPE_CHECKING, cast
+
+from domain import PrefixedText
+from prompts import prompt_version
+from utils import canonical_source
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+    from typing import Any
+
+    import redis
+    from redis.client import Pipeline
+
+    from handlers import SummaryKwargs
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    """A cache's hits and misses since its counters started, and bytes held."""
+
+    hits: int
+    misses: int
+    bytes: int
+
+    def __str__(self) -> str:
+        """Return the counters as a log line reads them."""
+        return f"{self.hits} hits, {self.misses} misses, {self.bytes} bytes held"
+
+
+@dataclass(frozen=True)
+class LookupStats:
+    """Lookups answered from a local cache and those that went to the source.
+
+    `miss_seconds` totals the time the misses took, so each hit is taken to
+    have saved the average miss.
+    """
+
+    hits: int
+    misses: int
+    miss_seconds: float
+
+    @property
+    def saved_seconds(self) -> float:
+        """Return the time the hits are estimated to have saved."""
+        if not self.misses:
+            return 0.0
+        return self.hits * self.miss_seconds / self.misses
+
+    @property
+    def saved_per_lookup(self) -> float:
+        """Return the estimated time saved per lookup, hits and misses alike."""
+        lookups = self.hits + self.misses
+        return self.saved_seconds / lookups if lookups else 0.0
+
+    def __str__(self) -> str:
+        """Return the counters and the time saved as a log line reads them."""
+        return (
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{self.saved_per_lookup * 1000:.1f} ms saved per lookup"
+        )
+
+
+class TtlCache[V]:
+    """A small in-process cache whose entries expire after `ttl` seconds.
+
+    For lookups too cheap to be worth a Valkey round trip but too slow to
+    repeat for every request. At most `max_entries` are kept; past that the
+    least recently used go first. Safe to share between threads.
+    """
+
+    def __init__(self, ttl: float, max_entries: int) -> None:
+        """Store the TTL and the entry limit."""
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, V]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> V | None:
+        """Return the value if it has not expired and mark it as just used."""
+        with self._lock:
+            found = self._entries.get(key)
+            if found is None:
+                return None
+            expires, value = found
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def discard(self, key: str) -> None:
+        """Forget the entry, if any, so the next get is a miss."""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def put(self, key: str, value: V) -> None:
+        """Store a value for `ttl` seconds, dropping the oldest past the limit."""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+
+@dataclass(frozen=True)
+class ProbedVideo:
+    """A video's yt-dlp info dict and the proxy it was extracted through."""
+
+    info: dict[str, Any]
+    proxy: str
+
+
+class VideoInfoCache:
+    """yt-dlp's info dicts for videos probed lately, by canonical source.
+
+    A YouTube URL that falls back to audio is probed for subtitles, then for
+    its audio formats, then downloaded; each extraction costs seconds and
+    proxy traffic. One extraction now serves all three: the dict is kept in a
+    `TtlCache` for less time than its signed format URLs live, and each
+    caller gets its own copy, since yt-dlp annotates the dict it processes.
+    YouTube binds those URLs to the address that extracted them, so the proxy
+    is kept with the dict and every caller fetches through that same one.
+    """
+
+    def __init__(self, cache: TtlCache[ProbedVideo]) -> None:
+        """Store the cache the info dicts live in."""
+        self._cache = cache
+
+    def get(self, url: str) -> ProbedVideo | None:
+        """Return a copy of the video's info and its proxy, or None if not lately."""
+        probed = self._cache.get(canonical_source(url))
+        if probed is None:
+            return None
+        return ProbedVideo(copy.deepcopy(probed.info), probed.proxy)
+
+    def put(self, url: str, info: dict[str, Any], proxy: str) -> None:
+        """Keep a copy of the video's freshly extracted info and its proxy."""
+        self._cache.put(
+            canonical_source(url),
+            ProbedVideo(copy.deepcopy(info), proxy),
+        )
+
+    def discard(self, url: str) -> None:
+        """Forget the video's info, so the next caller extracts it afresh."""
+        self._cache.discard(canonical_source(url))
+
+
+class ValkeyCache:
+    """A size-bounded cache of bytes in Valkey, shared by every process.
+
+    Each entry is a plain key under `namespace` that expires after `ttl`
+    seconds. Beside the entries, a sorted set scores each one by when it was
+    last read or written, a hash holds its size, and a counter totals the
+    sizes; a put that takes the total past `max_bytes` evicts the least
+    recently used entries until it fits. An entry that expired on its TTL still
+    counts until eviction reaches it, so the total can overstate what Valkey
+    holds but never understates it. A value over `max_entry_bytes` is not
+    stored at all. Every lookup counts as a hit or a miss in the
+    `{namespace}:stats` hash, which `stats` reads. The outcome is only known
+    once a lookup's round trip returns, so it is added on the next one — or
+    by `stats` — and the counters trail each process by at most one lookup.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        namespace: str,
+        ttl: int,
+        max_bytes: int,
+        max_entry_bytes: int,
+    ) -> None:
+        """Store the client, the key namespace, the TTL and the size limits."""
+        self._client = client
+        self._namespace = namespace
+        self._ttl = ttl
+        self._max_bytes = max_bytes
+        self._max_entry_bytes = max_entry_bytes
+        self._pending_lock = threading.Lock()
+        self._pending: Counter[str] = Counter()
+
+    def _keys(self) -> tuple[str, str, str]:
+        return (
+            f"{self._namespace}:lru",
+            f"{self._namespace}:sizes",
+            f"{self._namespace}:bytes",
+        )
+
+    def _entry(self, key: str) -> str:
+        return f"{self._namespace}:entry:{key}"
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached value and mark it as just used; None on a miss."""
+        entry = self._entry(key)
+        lru, _, _ = self._keys()
+        pipe = self._client.pipeline(transaction=False)
+        pipe.get(entry)
+        pipe.zadd(lru, {entry: time.time()}, xx=True)
+        self._count_pending(pipe)
+        value, *_ = pipe.execute()
+        with self._pending_lock:
+            self._pending["misses" if value is None else "hits"] += 1
+        return value
+
+    def _count_pending(self, pipe: Pipeline) -> None:
+        """Add the lookups not yet counted to the stats hash, in `pipe`."""
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+        for outcome, count in pending.items():
+            pipe.hincrby(f"{self._namespace}:stats", outcome, count)
+
+    def stats(self) -> CacheStats:
+        """Return the hits and misses counted so far and the bytes held."""
+        _, _, total = self._keys()
+        pipe = self._client.pipeline(transaction=False)
+        self._count_pending(pipe)
+        pipe.hmget(f"{self._namespace}:stats", "hits", "misses")
+        pipe.get(total)
+        *_, (hits, misses), held = pipe.execute()
+        return CacheStats(
+            hits=int(hits or 0),
+            misses=int(misses or 0),
+            bytes=int(held or 0),
+        )
+
+    def put(self, key: str, value: bytes, ttl: int | None = None) -> None:
+        """Store a value, then evict the least recently used past `max_bytes`.
+
+        `ttl` overrides the cache's own, for entries that should go stale sooner.
+        """
+        size = len(value)
+        if size > self._max_entry_bytes:
+            return
+        entry = self._entry(key)
+        lru, sizes, total = self._keys()
+
+        def put(pipe: Pipeline) -> None:
+            previous = int(pipe.hget(sizes, entry) or 0)
+            pipe.multi()
+            pipe.set(entry, value, ex=ttl or self._ttl)
+            pipe.zadd(lru, {entry: time.time()})
+            pipe.hset(sizes, entry, size)
+            pipe.incrby(total, size - previous)
+
+        self._client.transaction(put, sizes)
+        self._evict()
+
+    def discard(self, key: str) -> None:
+        """Drop the entry, if any, so the next get is a miss."""
+        entry = self._entry(key)
+        lru, sizes, _ = self._keys()
+        if self._client.zrem(lru, entry):
+            self._client.transaction(partial(self._forget, entry=entry), sizes)
+
+    def _forget(self, pipe: Pipeline, entry: bytes | str) -> None:
+        _, sizes, total = self._keys()
+        size = int(pipe.hget(sizes, entry) or 0)
+        pipe.multi()
+        pipe.delete(entry)
+        pipe.hdel(sizes, entry)
+        pipe.decrby(total, size)
+
+    def _evict(self) -> None:
+        lru, sizes, total = self._keys()
+        while int(self._client.get(total) or 0) > self._max_bytes:
+            popped = self._client.zpopmin(lru)
+            if not popped:
+                return
+            [(entry, _)] = cast("list[tuple[bytes | str, float]]", popped)
+            self._client.transaction(partial(self._forget, entry=entry), sizes)
+
+
+class AudioUrlCache:
+    """Where each podcast episode's audio lives, by canonical source.
+
+    Scraping an episode page for its audio URL costs a page fetch and an HTML
+    parse, and the URL it yields rarely changes, so it is kept for the
+    cache's long TTL. A page found unusable is recorded too, as an empty value
+    kept only `failure_ttl` seconds, so a broken page is not fetched again on
+    every retry yet is tried afresh soon after.
+    """
+
+    def __init__(self, cache: ValkeyCache, failure_ttl: int) -> None:
+        """Store the cache the URLs live in and the failure TTL."""
+        self._cache = cache
+        self._failure_ttl = failure_ttl
+
+    def get(self, url: str) -> str | None:
+        """Return the episode's audio URL, "" if its page just failed, else None."""
+        value = self._cache.get(canonical_source(url))
+        return None if value is None else value.decode()
+
+    def put(self, url: str, audio_url: str) -> None:
+        """Cache the episode's audio URL."""
+        self._cache.put(canonical_source(url), audio_url.encode())
+
+    def put_failure(self, url: str) -> None:
+        """Record, for `failure_ttl` seconds, that the episode page is unusable."""
+        self._cache.put(canonical_source(url), b"", ttl=self._failure_ttl)
+
+    def discard(self, url: str) -> None:
+        """Forget the episode's audio URL, so the next request scrapes again."""
+        self._cache.discard(canonical_source(url))
+
+    def stats(self) -> CacheStats:
+        """Return the underlying cache's counters."""
+        return self._cache.stats()
+
+
+class SummaryCache:
+    """Finished summaries, keyed by what was summarized and how.
+
+    `source` names the content — a video id, a URL or a Telegram file's unique
+    id. The key adds every setting that changes the wording, with
+    `prompts.prompt_version` standing in for the prompt's text, so rewording a
+    prompt retires the summaries it wrote. The user id and daily limit are left
+    out: the same request from another user is answered from the same entry.
+    """
+
+    def __init__(self, cache: ValkeyCache) -> None:
+        """Store the cache the summaries live in."""
+        self._cache = cache
+
+    @staticmethod
+    def key(source: str, settings: SummaryKwargs) -> str:
+        """Return the key a summary of `source` with these settings lives under."""
+        parts = (
+            source,
+            settings["model"],
+            settings["prompt_key"],
+            prompt_version(settings["prompt_key"]),
+            settings["target_language"],
+            settings["thinking_level"],
+        )
+        return sha256("\0".join(parts).encode()).hexdigest()
+
+    def get(self, source: str, settings: SummaryKwargs) -> str | None:
+        """Return the cached summary of `source` with these settings, if any."""
+        value = self._cache.get(self.key(source, settings))
+        return None if value is None else value.decode()
+
+    def put(self, source: str, settings: SummaryKwargs, summary: str) -> None:
+        """Cache the summary of `source` made with these settings."""
+        self._cache.put(self.key(source, settings), summary.encode())
+
+    def stats(self) -> CacheStats:
+        """Return the underlying cache's counters."""
+        return self._cache.stats()
+
+
+class PrefixedTextCache:
+    """Extracted texts with their source prefix, zstd-compressed.
+
+    A text is stored as its `PrefixedText` in JSON, compressed: transcripts and
+    web pages are long plain text and shrink several-fold. A source found to
+    have no text can be recorded too, as an empty value kept only
+    `missing_ttl` seconds, since a video can get captions later.
+    """
+
+    def __init__(self, cache: ValkeyCache, missing_ttl: int | None = None) -> None:
+        """Store the cache the texts live in and the no-text TTL, if shorter."""
+        self._cache = cache
+        self._missing_ttl = missing_ttl
+
+    def get(self, key: str) -> PrefixedText | None:
+        """Return the cached text, or None on a miss.
+
+        A source recorded as having no text comes back with empty text.
+        """
+        value = self._cache.get(key)
+        if value is None:
+            return None
+        if not value:
+            return PrefixedText(text="", prefix="")
+        return PrefixedText(**json.loads(zstd.decompress(value)))
+
+    def put(self, key: str, text: PrefixedText) -> None:
+        """Cache the source's text."""
+        payload = json.dumps(asdict(text)).encode()
+        self._cache.put(key, zstd.compress(payload))
+
+    def put_missing(self, key: str) -> None:
+        """Record, for `missing_ttl` seconds, that the source has no text."""
+        self._cache.put(key, b"", ttl=self._missing_ttl)
+
+    def stats(self) -> CacheStats:
+        """Return the underlying cache's counters."""
+        return self._cache.stats()
+
+
+class StatsLog:
+    """Logs each cache's counters every `interval` seconds while a process runs.
+
+    `sources` maps a cache's name to what reads its counters: a `ValkeyCache`
+    wrapper's `stats`, whose counters every process shares, or a per-process
+    `LookupStats` such as `UserRepository.cache_stats`. Nothing else reads
+    them, so this line is where an operator sees whether a cache pays off.
+    """
+
+    def __init__(
+        self,
+        sources: Mapping[str, Callable[[], CacheStats | LookupStats]],
+        interval: float,
+    ) -> None:
+        """Store the counter readers by name and the interval in seconds."""
+        self._sources = sources
+        self._interval = interval
+
+    def log(self) -> None:
+        """Log one line per cache; a cache whose counters fail to read is skipped."""
+        for name, read in self._sources.items():
+            try:
+                logger.info("%s cache: %s", name, read())
+            except Exception:
+                logger.warning(
+                    "Could not read the %s cache's counters",
+                    name,
+                    exc_info=True,
+                )
+
+    def start(self, stopped: threading.Event) -> None:
+        """Log from a daemon thread every `interval` seconds until `stopped` is set."""
+
+        def report() -> None:
+            while not stopped.wait(self._interval):
+                self.log()
+
+        threading.Thread(target=report, name="cache-stats", daemon=True).start()
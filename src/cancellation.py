@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Any
+
+from exceptions import JobCancelledError, JobDeadlineExceededError
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+    import redis
+
+# The longest a cancellable `sleep` goes without checking its token.
+_SLEEP_SLICE_SECONDS = 1.0
+
+
+class CancelToken:
+    """Whether one job has been cancelled, as `Cancellations.cancel` recorded it.
+
+    The flag is read from Valkey at most every `check_interval` seconds, so a
+    wait loop or a yt-dlp progress hook may ask as often as it likes. Once seen
+    set, it stays set.
+    """
+
+    def __init__(self, client: redis.Redis, key: str, check_interval: float) -> None:
+        """Store the client, the job's flag key and how often to read it."""
+        self._client = client
+        self._key = key
+        self._check_interval = check_interval
+        self._checked_at: float | None = None
+        self._cancelled = False
+
+    def cancelled(self) -> bool:
+        """Return whether the job has been cancelled, reading Valkey if due."""
+        now = time.monotonic()
+        if not self._cancelled and (
+            self._checked_at is None or now - self._checked_at >= self._check_interval
+        ):
+            self._checked_at = now
+            self._cancelled = bool(self._client.exists(self._key))
+        return self._cancelled
+
+
+class Cancellations:
+    """Per-job cancel flags in Valkey, so /cancel reaches a job on any process."""
+
+    def __init__(self, client: redis.Redis, ttl: int, check_interval: float) -> None:
+        """Store the client, how long a flag is kept and how often tokens read it."""
+        self._client = client
+        self._ttl = ttl
+        self._check_interval = check_interval
+
+    @staticmethod
+    def _key(job_id: int) -> str:
+        return f"cancel:{job_id}"
+
+    def cancel(self, job_id: int) -> None:
+        """Flag a job as cancelled, for its token to see at the next check."""
+        self._client.set(self._key(job_id), 1, ex=self._ttl)
+
+    def token(self, job_id: int) -> CancelToken:
+        """Return a fresh token for a job about to run."""
+        return CancelToken(self._client, self._key(job_id), self._check_interval)
+
+
+# The token of the job running in this context. A ContextVar rather than a
+# parameter, so the wait loops deep in the pipeline see it without every call
+# in between passing it along; nothing is bound outside `BotApp.run_job`.
+_current: ContextVar[CancelToken | None] = ContextVar("cancel_token", default=None)
+# The monotonic time the job running in this context must finish by, bound the
+# same way.
+_deadline: ContextVar[float | None] = ContextVar("job_deadline", default=None)
+
+
+@contextmanager
+def bind(token: CancelToken) -> Generator[None]:
+    """Make `token` the one checked by everything run inside the block."""
+    reset = _current.set(token)
+    try:
+        yield
+    finally:
+        _current.reset(reset)
+
+
+@contextmanager
+def deadline(seconds: float) -> Generator[None]:
+    """Give everything run inside the block `seconds` from now to finish."""
+    reset = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(reset)
+
+
+def time_left() -> float | None:
+    """Return the seconds the bound job has left, or None without a deadline."""
+    until = _deadline.get()
+    return None if until is None else until - time.monotonic()
+
+
+def raise_if_stopped() -> None:
+    """Raise if the job running in this context is cancelled or out of time.
+
+    Raises:
+        JobCancelledError: If the bound token is cancelled; never without one.
+        JobDeadlineExceededError: If the bound deadline has passed.
+
+    """
+    token = _current.get()
+    if token is not None and token.cancelled():
+        raise JobCancelledError
+    left = time_left()
+    if left is not None and left <= 0:
+        raise JobDeadlineExceededError
+
+
+def _raise_if_outlasting(seconds: float) -> None:
+    """Raise now if a wait of `seconds` would end past the bound deadline."""
+    left = time_left()
+    if left is not None and seconds >= left:
+        raise JobDeadlineExceededError
+
+
+def sleep(seconds: float) -> None:
+    """`time.sleep` that stops the bound job once it is cancelled or out of time.
+
+    Also tenacity's `sleep=` for retries, so a backoff does not outlive a
+    cancel. A sleep that would end past the deadline raises at once rather
+    than waiting for a retry there is no time left for. Without a bound job it
+    is a single `time.sleep`.
+
+    Raises:
+        JobCancelledError: If the bound job is cancelled before or while sleeping.
+        JobDeadlineExceededError: If the sleep would outlast the bound deadline.
+
+    """
+    if _current.get() is None and _deadline.get() is None:
+        time.sleep(seconds)
+        return
+    raise_if_stopped()
+    _raise_if_outlasting(seconds)
+    until = time.monotonic() + seconds
+    while True:
+        raise_if_stopped()
+        remaining = until - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(remaining, _SLEEP_SLICE_SECONDS))
+
+
+def progress_hook(_status: dict[str, Any]) -> None:
+    """yt-dlp progress hook: abort a stopped job's download mid-way."""
+    raise_if_stopped()
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, cast
+from uuid import uuid4
+
+import cancellation
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import redis
+    from redis.client import Pipeline
+
+
+@dataclass
+class _Lead:
+    """A key's running leader: set once it is done, with its answer if any."""
+
+    done: threading.Event
+    answer: str | None = None
+
+
+class Coalescer:
+    """Lets one of several identical requests do the work while the rest wait.
+
+    Requests are identical when they share a key — the summary cache's, so the
+    same source with the same settings. Within a process the first request
+    leads and the rest wait on an event, then take its answer directly; across
+    processes the leader also claims `coalesce:{key}` in Valkey with `SET NX`
+    for `claim_ttl` seconds, and a process that finds it claimed polls it every
+    `poll_interval` seconds. Before releasing the claim the leader publishes
+    its answer under `coalesce-result:{key}` for `result_ttl` seconds, which is
+    where those followers read it — whatever the summary cache kept. When the
+    leader fails, its followers start over, so one of them leads in its place
+    and the rest follow that one; a follower that waited past `wait_timeout`
+    does the work itself. `on_follow` runs once for each follower served, so it
+    can be charged as if it had done the work.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        claim_ttl: int,
+        poll_interval: float,
+        wait_timeout: float,
+        result_ttl: int,
+    ) -> None:
+        """Store the client, the claim and answer TTLs and the follower timings."""
+        self._client = client
+        self._claim_ttl = claim_ttl
+        self._poll_interval = poll_interval
+        self._wait_timeout = wait_timeout
+        self._result_ttl = result_ttl
+        self._lock = threading.Lock()
+        self._leaders: dict[str, _Lead] = {}
+
+    def run(
+        self,
+        key: str,
+        work: Callable[[], str],
+        on_follow: Callable[[], None],
+    ) -> str:
+        """Return `work()`, or the answer of an identical request already running."""
+        with self._lock:
+            lead = self._leaders.get(key)
+            leading = lead is None
+            if lead is None:
+                lead = self._leaders[key] = _Lead(threading.Event())
+        if not leading:
+            deadline = time.monotonic() + self._wait_timeout
+            while (
+                not lead.done.wait(self._poll_interval) and time.monotonic() < deadline
+            ):
+                cancellation.raise_if_stopped()
+            answer = self._followed(lead.answer, on_follow)
+            if answer is not None:
+                return answer
+            if lead.done.is_set():  # the leader failed
+                return self.run(key, work, on_follow)
+            return work()
+        try:
+            lead.answer = self._lead(key, work, on_follow)
+            return lead.answer
+        finally:
+            with self._lock:
+                del self._leaders[key]
+            lead.done.set()
+
+    def _lead(
+        self,
+        key: str,
+        work: Callable[[], str],
+        on_follow: Callable[[], None],
+    ) -> str:
+        token = self._claim(key)
+        if token is None:
+            deadline = time.monotonic() + self._wait_timeout
+            while (claimed := self._claimed(key)) and time.monotonic() < deadline:
+                cancellation.sleep(self._poll_interval)
+            answer = self._followed(self._published(key), on_follow)
+            if answer is not None:
+                return answer
+            if not claimed:  # released with no answer: the leader failed
+                return self._lead(key, work, on_follow)
+            return work()
+        answer = None
+        try:
+            answer = work()
+            return answer
+        finally:
+            self._release(key, token, answer)
+
+    @staticmethod
+    def _followed(
+        answer: str | None,
+        on_follow: Callable[[], None],
+    ) -> str | None:
+        if answer is not None:
+            on_follow()
+        return answer
+
+    def _claim(self, key: str) -> str | None:
+        token = uuid4().hex
+        if self._client.set(f"coalesce:{key}", token, nx=True, ex=self._claim_ttl):
+            return token
+        return None
+
+    def _claimed(self, key: str) -> bool:
+        return bool(self._client.exists(f"coalesce:{key}"))
+
+    def _published(self, key: str) -> str | None:
+        return cast("str | None", self._client.get(f"coalesce-result:{key}"))
+
+    def _release(self, key: str, token: str, answer: str | None) -> None:
+        """Publish the leader's answer, if any, then drop the claim if still ours."""
+        claim = f"coalesce:{key}"
+
+        def release(pipe: Pipeline) -> None:
+            ours = pipe.get(claim) == token
+            if answer is None and not ours:
+                return
+            pipe.multi()
+            if answer is not None:
+                pipe.set(f"coalesce-result:{key}", answer, ex=self._result_ttl)
+            if ours:
+                pipe.delete(claim)
+
+        self._client.transaction(release, claim)
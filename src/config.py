@@ -1,10 +1,12 @@
 import logging
 import os
+import socket
 import sys
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal
 
+import redis
 import replicate
 import sentry_sdk
 import telebot
@@ -18,6 +20,7 @@ from pydantic_ai import Agent
 from pydantic_ai.providers.openrouter import OpenRouterProvider
 from sentry_sdk.integrations.logging import LoggingIntegration
 from tavily import TavilyClient
+from telebot.async_telebot import AsyncTeleBot
 
 if os.environ.get("ENV") != "PROD":
     from dotenv import load_dotenv
@@ -53,6 +56,8 @@ telebot.logger.setLevel(NUMERIC_LOG_LEVEL)
 DSN = os.environ["DSN"]
 REDIS_URL = os.environ["REDIS_URL"]
 RATE_LIMITER_URL = f"{REDIS_URL}/0"
+# The bot's own keys live in database 1, away from the limiter's counters.
+VALKEY_URL = f"{REDIS_URL}/1"
 
 
 # Proxy
@@ -64,11 +69,35 @@ PROXIES: list[str] = [
 # Telegram bot config
 TG_API_TOKEN = os.environ["TG_API_TOKEN"]
 bot = telebot.TeleBot(token=TG_API_TOKEN, disable_web_page_preview=True)
+# Receives updates for `async_main` only; every answer still goes out through `bot`.
+async_bot = AsyncTeleBot(token=TG_API_TOKEN)
+# How `main.py` receives updates: "polling" (getUpdates, the default) or "webhook",
+# where Telegram POSTs each one to WEBHOOK_URL. The built-in server speaks plain
+# HTTP on WEBHOOK_HOST:WEBHOOK_PORT, so TLS terminates at a proxy in front of it.
+BOT_MODE = os.environ.get("BOT_MODE", "polling")
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0")  # noqa: S104
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8080"))
 
 
 # Gemini config
 GEMINI_API_KEY = os.environ["GEMINI_API_KEY"]
 gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+# With GEMINI_CONTEXT_CACHE on, Gemini runs send the system instruction and the
+# strategy prompt as an explicit cached context (`context_cache.ContextCache`),
+# one per model, prompt version and target language, billed at the cached rate.
+# A cache lives GEMINI_CONTEXT_CACHE_TTL seconds and is replaced
+# GEMINI_CONTEXT_CACHE_REFRESH_MARGIN seconds before it lapses. Gemini refuses
+# content under the model's minimum cacheable size with a 400; such a key is
+# remembered for GEMINI_CONTEXT_REFUSED_TTL seconds and runs uncached, while a
+# rate limit or other failure is retried on the next run. Off by default, as
+# storage is billed by the hour whether or not the cache is read.
+GEMINI_CONTEXT_CACHE = os.environ.get("GEMINI_CONTEXT_CACHE", "false").lower() == "true"
+GEMINI_CONTEXT_CACHE_TTL = 3600
+GEMINI_CONTEXT_CACHE_REFRESH_MARGIN = 300
+GEMINI_CONTEXT_REFUSED_TTL = 86400
+GEMINI_CONTEXT_REFUSED_MAX_ENTRIES = 256
 
 
 # OpenRouter config
@@ -165,6 +194,12 @@ THINKING_LEVEL_LABELS_REVERSE: dict[str, str] = {
     v: k for k, v in THINKING_LEVEL_LABELS.items()
 }
 ALLOWED_THINKING_LEVELS = list(THINKING_LEVEL_LABELS.keys())
+# The /set_summary_cache keyboard: whether the user's answers may come from the
+# summary cache below, or are always summarized afresh.
+SUMMARY_CACHE_LABELS: dict[bool, str] = {True: "On", False: "Off"}
+SUMMARY_CACHE_LABELS_REVERSE: dict[str, bool] = {
+    v: k for k, v in SUMMARY_CACHE_LABELS.items()
+}
 
 
 # Langfuse config
@@ -202,6 +237,11 @@ ALLOWED_PROMPT_KEYS = list(PROMPT_STRATEGY_LABELS.keys())
 # Replicate.com config
 REPLICATE_API_TOKEN = os.environ["REPLICATE_API_TOKEN"]
 replicate_client = replicate.Client(api_token=REPLICATE_API_TOKEN)
+# AudioTranscriber runs the latest WhisperX version, looked up again every
+# REPLICATE_VERSION_REFRESH_SECONDS; set REPLICATE_WHISPERX_VERSION to a
+# version id to pin one instead and skip the lookup.
+REPLICATE_WHISPERX_VERSION = os.environ.get("REPLICATE_WHISPERX_VERSION") or None
+REPLICATE_VERSION_REFRESH_SECONDS = 6 * 3600
 
 
 # Tavily config
@@ -222,6 +262,194 @@ rate_limiter = FixedWindowRateLimiter(RedisStorage(RATE_LIMITER_URL))
 per_minute_rate = parse_rate_limit(f"{MINUTE_LIMIT} per minute")
 
 
+# Valkey, for the bot's own keys
+redis_client = redis.Redis.from_url(VALKEY_URL, decode_responses=True)
+# The same database without decoding, for `caching.ValkeyCache`, whose values
+# may be compressed bytes.
+cache_client = redis.Redis.from_url(VALKEY_URL)
+
+
+# Worker pools: BotApp hands every summarization update to these threads, so a
+# long media job holds one worker instead of the polling thread. A queue counts
+# running jobs too; an update arriving while its lane is full is refused.
+# Jobs run in two lanes, each with its own pool. A web page needs one parse and
+# one model call, while a long video needs a download, ffmpeg, an upload and
+# polling, so quick jobs get their own QUICK_* workers and never wait behind long
+# ones; WORKER_* sizes the long lane. Media is quick when it is at most
+# QUICK_MEDIA_MAX_SECONDS long and QUICK_MEDIA_MAX_BYTES big.
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "4"))
+WORKER_QUEUE_SIZE = int(os.environ.get("WORKER_QUEUE_SIZE", "100"))
+QUICK_POOL_SIZE = int(os.environ.get("QUICK_POOL_SIZE", "2"))
+QUICK_QUEUE_SIZE = int(os.environ.get("QUICK_QUEUE_SIZE", "100"))
+QUICK_MEDIA_MAX_SECONDS = 60
+QUICK_MEDIA_MAX_BYTES = 2 * 1024 * 1024
+# On shutdown the pools get SHUTDOWN_DRAIN_SECONDS to finish their jobs. A job
+# still unfinished then stays in Postgres (or pending in the stream) for the
+# next start, or another worker, to resume, and the temp-file sweep is skipped
+# so it does not pull files from under the jobs still running.
+SHUTDOWN_DRAIN_SECONDS = int(os.environ.get("SHUTDOWN_DRAIN_SECONDS", "60"))
+# ffmpeg encodes (video to Opus, audio ahead of Replicate) share these slots
+# across every job, so parallel encodes cannot take the whole CPU. Each runs
+# under `nice` with TRANSCODE_THREADS decoder threads and is killed after
+# TRANSCODE_TIMEOUT seconds.
+TRANSCODE_MAX_CONCURRENT = int(
+    os.environ.get("TRANSCODE_MAX_CONCURRENT") or max(1, (os.cpu_count() or 2) // 2),
+)
+TRANSCODE_TIMEOUT = 600
+TRANSCODE_NICE = 10
+TRANSCODE_THREADS = int(os.environ.get("TRANSCODE_THREADS", "2"))
+# Each job is recorded in Postgres and picked up again after a restart. A job
+# that has been started this many times without finishing (it keeps killing the
+# process, say) is given up on instead.
+JOB_MAX_ATTEMPTS = 3
+# A process stamps each job it claims with JOB_OWNER and refreshes the job's
+# heartbeat every JOB_HEARTBEAT_SECONDS until the job finishes, draining
+# included. A starting process resumes a `running` job only once its heartbeat
+# is JOB_STALE_SECONDS old, so a job another live process is still running — a
+# webhook replica, the replica rolled out next to it, a leader that lost its
+# lease — is never run twice. Keep it a few heartbeats long: it also absorbs
+# clock skew between hosts.
+JOB_OWNER = f"{socket.gethostname()}-{os.getpid()}"
+JOB_HEARTBEAT_SECONDS = 30.0
+JOB_STALE_SECONDS = 120
+# Per-user cap on jobs running at once, kept in Valkey so it holds across
+# processes: a user pasting ten video links takes at most this many workers and
+# this much of the per-minute limit, and the rest wait their turn while the
+# sender sees their place in line. A slot whose job died without giving it back
+# (and was never resumed) stops counting after USER_JOB_SLOT_TTL seconds, so that
+# must outlast the longest job.
+USER_MAX_INFLIGHT_JOBS = int(os.environ.get("USER_MAX_INFLIGHT_JOBS", "2"))
+USER_JOB_SLOT_TTL = 3600
+# /cancel flags each of the sender's jobs in Valkey for JOB_CANCEL_TTL seconds;
+# a running job reads its flag at most every JOB_CANCEL_CHECK_SECONDS, from its
+# polling loops, download progress and retry backoffs.
+JOB_CANCEL_TTL = 86400
+JOB_CANCEL_CHECK_SECONDS = 1.0
+# Each job must finish within JOB_DEADLINE_SECONDS of starting. Retries, their
+# backoffs and polling loops stop once a wait would outlast it, and the sender
+# is told the message timed out. Keep it under USER_JOB_SLOT_TTL.
+JOB_DEADLINE_SECONDS = int(os.environ.get("JOB_DEADLINE_SECONDS", "1200"))
+# Telegram redelivers updates it did not see acknowledged, for up to a day, so a
+# crash or a second replica can see one twice. Each update and message is
+# remembered in Valkey for UPDATE_DEDUPE_TTL seconds and a repeat is dropped.
+UPDATE_DEDUPE_TTL = 86400
+# Finished summaries are cached in Valkey, keyed by what was summarized (a video
+# id, a URL, a Telegram file's unique id) and every setting that changes the
+# wording (`caching.SummaryCache`), so asking again is answered without a
+# download, a model call or quota. Entries last SUMMARY_CACHE_TTL seconds; past
+# SUMMARY_CACHE_MAX_BYTES in total the least recently used are evicted, and an
+# answer over SUMMARY_CACHE_MAX_ENTRY_BYTES is not cached at all.
+SUMMARY_CACHE_TTL = int(os.environ.get("SUMMARY_CACHE_TTL", str(7 * 86400)))
+SUMMARY_CACHE_MAX_BYTES = int(
+    os.environ.get("SUMMARY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)),
+)
+SUMMARY_CACHE_MAX_ENTRY_BYTES = 64 * 1024
+# Every process logs each cache's hits and misses every CACHE_STATS_LOG_SECONDS
+# (`caching.StatsLog`), its own user cache's included.
+CACHE_STATS_LOG_SECONDS = int(os.environ.get("CACHE_STATS_LOG_SECONDS", "600"))
+# On a summary cache miss, identical requests (same key) running at once are
+# coalesced (`coalescing.Coalescer`): one does the work, holding a Valkey claim
+# for at most COALESCE_CLAIM_TTL seconds, and the others wait for its answer,
+# checking every COALESCE_POLL_SECONDS. No job outlives its deadline, so neither
+# the claim nor a follower's wait needs to outlast it. The leader publishes its
+# answer for COALESCE_RESULT_TTL seconds, long enough for every poller to read
+# it, so followers are served even when the summary cache did not keep it. A
+# follower is still charged one request of quota.
+COALESCE_CLAIM_TTL = JOB_DEADLINE_SECONDS
+COALESCE_POLL_SECONDS = 1.0
+COALESCE_WAIT_SECONDS = JOB_DEADLINE_SECONDS
+COALESCE_RESULT_TTL = 60
+# YouTube transcripts are cached the same way by video id, zstd-compressed
+# (`caching.PrefixedTextCache`), for TRANSCRIPT_CACHE_TTL seconds. A video with no
+# transcript is remembered for TRANSCRIPT_CACHE_MISSING_TTL only, since captions
+# can be added later.
+TRANSCRIPT_CACHE_TTL = int(os.environ.get("TRANSCRIPT_CACHE_TTL", str(30 * 86400)))
+TRANSCRIPT_CACHE_MISSING_TTL = 3600
+TRANSCRIPT_CACHE_MAX_BYTES = int(
+    os.environ.get("TRANSCRIPT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)),
+)
+TRANSCRIPT_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# yt-dlp's info for a video is kept in process for YT_INFO_CACHE_TTL seconds, so
+# the subtitle probe, the audio format choice and the audio download share one
+# extraction (`caching.VideoInfoCache`). Its signed format URLs last hours, so
+# this stays well inside them. An info dict runs to hundreds of KB, hence the
+# small YT_INFO_CACHE_MAX_ENTRIES.
+YT_INFO_CACHE_TTL = int(os.environ.get("YT_INFO_CACHE_TTL", "600"))
+YT_INFO_CACHE_MAX_ENTRIES = 64
+# Castro episode pages are scraped for their audio URL once, then the URL is
+# cached in Valkey by episode (`caching.AudioUrlCache`) for
+# CASTRO_AUDIO_CACHE_TTL seconds; an audio URL that stops serving is dropped. A
+# page with no usable audio URL is remembered for CASTRO_FAILURE_TTL only, so a
+# broken page is not refetched on every request but is tried again soon.
+CASTRO_AUDIO_CACHE_TTL = int(
+    os.environ.get("CASTRO_AUDIO_CACHE_TTL", str(30 * 86400)),
+)
+CASTRO_FAILURE_TTL = 300
+CASTRO_AUDIO_CACHE_MAX_BYTES = 4 * 1024 * 1024
+CASTRO_AUDIO_CACHE_MAX_ENTRY_BYTES = 4096
+# Web pages Exa or Tavily extracted are cached the same way by their resolved
+# URL, for WEB_PARSE_CACHE_TTL seconds: long enough for a link making the rounds
+# of several chats, short enough for a developing story to be read again.
+WEB_PARSE_CACHE_TTL = int(os.environ.get("WEB_PARSE_CACHE_TTL", "3600"))
+WEB_PARSE_CACHE_MAX_BYTES = int(
+    os.environ.get("WEB_PARSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)),
+)
+WEB_PARSE_CACHE_MAX_ENTRY_BYTES = 4 * 1024 * 1024
+# UrlResolver remembers, per process, where a URL redirected to for
+# URL_RESOLVE_CACHE_TTL seconds, and whether a hostname resolved to public
+# addresses only for HOST_VERDICT_TTL seconds. getaddrinfo does not report the
+# records' TTL, so the verdict is kept no longer than a short DNS TTL: a host
+# re-pointed at a private address is refused again within that time.
+URL_RESOLVE_CACHE_TTL = int(os.environ.get("URL_RESOLVE_CACHE_TTL", "600"))
+HOST_VERDICT_TTL = int(os.environ.get("HOST_VERDICT_TTL", "30"))
+URL_RESOLVE_CACHE_MAX_ENTRIES = 4096
+# UserRepository.select_user keeps each user's row in process for
+# USER_CACHE_TTL seconds. This process's own settings writes take effect at
+# once; an approval edited in the database, or a setting changed through
+# another process, is seen within the TTL.
+USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", "30"))
+USER_CACHE_MAX_ENTRIES = 4096
+# Gemini uploads are kept and reused by the SHA-256 of the file, up to
+# GEMINI_UPLOAD_MAX_FILES at once; past that the least recently used are
+# deleted, keeping well inside the Files API's per-project storage. Gemini
+# deletes a file GEMINI_FILE_LIFETIME (48 hours) after upload, so one with less
+# than GEMINI_UPLOAD_MIN_LIFETIME left is uploaded afresh instead. An upload
+# used within GEMINI_UPLOAD_IN_USE_SECONDS is never evicted, as a job may still
+# be calling the model with it; no job outlives its deadline.
+GEMINI_UPLOAD_MAX_FILES = int(os.environ.get("GEMINI_UPLOAD_MAX_FILES", "200"))
+GEMINI_UPLOAD_MIN_LIFETIME = 3600
+GEMINI_FILE_LIFETIME = 48 * 3600
+GEMINI_UPLOAD_IN_USE_SECONDS = JOB_DEADLINE_SECONDS
+# Process roles. With BOT_ROLE "all", `main.py` takes updates and summarizes them
+# itself. To scale out, run `main.py` with BOT_ROLE "ingest", which only records
+# each job and adds it to the JOB_STREAM Valkey stream, plus any number of
+# `stream_worker.py` processes, which read the stream as one consumer group. A
+# job a worker took and never acknowledged (the worker died) is taken over by
+# another after JOB_STREAM_CLAIM_IDLE_MS, so that must outlast the longest job.
+BOT_ROLE = os.environ.get("BOT_ROLE", "all")
+JOB_STREAM = "jobs"
+JOB_STREAM_GROUP = "workers"
+JOB_STREAM_CONSUMER = (
+    os.environ.get("JOB_STREAM_CONSUMER") or f"{socket.gethostname()}-{os.getpid()}"
+)
+JOB_STREAM_CLAIM_IDLE_MS = int(os.environ.get("JOB_STREAM_CLAIM_IDLE_MS", "3600000"))
+JOB_STREAM_MAXLEN = 100_000
+# A worker reads up to this many entries at a time, waiting this long for one.
+JOB_STREAM_READ_COUNT = 10
+JOB_STREAM_BLOCK_MS = 5000
+# Telegram allows one getUpdates caller per token, so with several polling
+# replicas only the one holding the LEADER_LEASE_KEY lease in Valkey polls; the
+# others stand by. The leader renews it every LEADER_LEASE_RENEW_SECONDS and a
+# standby takes over at most LEADER_LEASE_TTL seconds after the leader dies.
+LEADER_LEASE_KEY = "leader:polling"
+LEADER_LEASE_HOLDER = f"{socket.gethostname()}-{os.getpid()}"
+LEADER_LEASE_TTL = 10
+LEADER_LEASE_RENEW_SECONDS = 3.0
+# The asyncio runtime (`async_main.py`) caps the jobs it holds, waiting or
+# running, and sizes its executor to match instead of using the worker pools.
+ASYNC_MAX_JOBS = int(os.environ.get("ASYNC_MAX_JOBS", "500"))
+
+
 # Telegram bot API caps incoming-file downloads at 20MB.
 # https://core.telegram.org/bots/api#getfile
 TG_MAX_FILE_SIZE = 20 * 1024 * 1024
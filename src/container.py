@@ -7,32 +7,66 @@ from typing import TYPE_CHECKING
 
 import config
 import database
-from database import UserRepository
+from caching import (
+    AudioUrlCache,
+    PrefixedTextCache,
+    StatsLog,
+    SummaryCache,
+    TtlCache,
+    ValkeyCache,
+    VideoInfoCache,
+)
+from cancellation import Cancellations
+from coalescing import Coalescer
+from context_cache import ContextCache
+from database import JobRepository, UserRepository
+from dedupe import UpdateDeduplicator
 from download import Downloader
 from handlers import MessageHandlers
+from inflight import InFlightLimiter
+from lease import LeaderLease
 from llm import LLMClient
 from parsing import ExaBackend, TavilyBackend, UrlResolver, WebParser
 from services import GeminiHelper, Messenger, QuotaManager, Tracer
+from streams import JobStream
 from summary import Summarizer
+from transcoding import Transcoder
 from transcription import ApiBackend, AudioTranscriber, YouTubeTranscriber, YtDlpBackend
+from uploads import UploadRegistry
+from webhook import WebhookServer
+from workers import Scheduler, WorkerPool
 
 if TYPE_CHECKING:
     import telebot
+    from telebot.async_telebot import AsyncTeleBot
 
 
 @dataclass(frozen=True)
 class Container:
     """The wired-up collaborators `main.build_app` runs on.
 
-    Only the roots BotApp holds directly; everything else in the graph is reached
-    through `handlers`, which owns the collaborators it needs.
+    Only the roots BotApp holds directly, plus the `async_bot` that
+    `async_main.build_async_app` polls with; everything else in the graph is
+    reached through `handlers`, which owns the collaborators it needs. `stream`
+    is built in every role but only the ingest `BotApp` and
+    `stream_worker.StreamWorker` use it.
     """
 
     bot: telebot.TeleBot
+    async_bot: AsyncTeleBot
     quota_manager: QuotaManager
     tracer: Tracer
     user_repo: UserRepository
+    jobs: JobRepository
+    limiter: InFlightLimiter
+    cancellations: Cancellations
+    dedupe: UpdateDeduplicator
+    lease: LeaderLease
     handlers: MessageHandlers
+    stats_log: StatsLog
+    scheduler: Scheduler
+    stream: JobStream
+    webhook: WebhookServer | None
 
 
 def build_container() -> Container:
@@ -40,16 +74,88 @@ def build_container() -> Container:
     bot = config.bot
     messenger = Messenger(bot)
     quota_manager = QuotaManager(config.rate_limiter, config.per_minute_rate)
+    dedupe = UpdateDeduplicator(config.redis_client, config.UPDATE_DEDUPE_TTL)
     gemini_helper = GeminiHelper(config.gemini_client)
-    llm_client = LLMClient(config.gemini_client, config.openrouter_provider)
-    downloader = Downloader(config.TG_API_TOKEN)
+    context_cache = (
+        ContextCache(
+            config.gemini_client,
+            config.redis_client,
+            config.GEMINI_CONTEXT_CACHE_TTL,
+            config.GEMINI_CONTEXT_CACHE_REFRESH_MARGIN,
+            TtlCache(
+                config.GEMINI_CONTEXT_REFUSED_TTL,
+                config.GEMINI_CONTEXT_REFUSED_MAX_ENTRIES,
+            ),
+        )
+        if config.GEMINI_CONTEXT_CACHE
+        else None
+    )
+    llm_client = LLMClient(
+        config.gemini_client,
+        config.openrouter_provider,
+        context_cache,
+    )
+    video_info = VideoInfoCache(
+        TtlCache(config.YT_INFO_CACHE_TTL, config.YT_INFO_CACHE_MAX_ENTRIES),
+    )
+    audio_urls = AudioUrlCache(
+        ValkeyCache(
+            config.cache_client,
+            "castro",
+            config.CASTRO_AUDIO_CACHE_TTL,
+            config.CASTRO_AUDIO_CACHE_MAX_BYTES,
+            config.CASTRO_AUDIO_CACHE_MAX_ENTRY_BYTES,
+        ),
+        config.CASTRO_FAILURE_TTL,
+    )
+    downloader = Downloader(config.TG_API_TOKEN, video_info, audio_urls)
+    transcoder = Transcoder(
+        config.TRANSCODE_MAX_CONCURRENT,
+        config.TRANSCODE_TIMEOUT,
+        config.TRANSCODE_NICE,
+        config.TRANSCODE_THREADS,
+    )
+    web_pages = PrefixedTextCache(
+        ValkeyCache(
+            config.cache_client,
+            "web",
+            config.WEB_PARSE_CACHE_TTL,
+            config.WEB_PARSE_CACHE_MAX_BYTES,
+            config.WEB_PARSE_CACHE_MAX_ENTRY_BYTES,
+        ),
+    )
     web_parser = WebParser(
         ExaBackend(config.exa_client),
         TavilyBackend(config.tavily_client),
-        UrlResolver(),
+        UrlResolver(
+            TtlCache(
+                config.URL_RESOLVE_CACHE_TTL,
+                config.URL_RESOLVE_CACHE_MAX_ENTRIES,
+            ),
+            TtlCache(config.HOST_VERDICT_TTL, config.URL_RESOLVE_CACHE_MAX_ENTRIES),
+        ),
+        web_pages,
+    )
+    audio_transcriber = AudioTranscriber(
+        config.replicate_client,
+        config.REPLICATE_WHISPERX_VERSION,
+        config.REPLICATE_VERSION_REFRESH_SECONDS,
+    )
+    transcripts = PrefixedTextCache(
+        ValkeyCache(
+            config.cache_client,
+            "transcript",
+            config.TRANSCRIPT_CACHE_TTL,
+            config.TRANSCRIPT_CACHE_MAX_BYTES,
+            config.TRANSCRIPT_CACHE_MAX_ENTRY_BYTES,
+        ),
+        config.TRANSCRIPT_CACHE_MISSING_TTL,
+    )
+    yt_transcriber = YouTubeTranscriber(
+        ApiBackend(),
+        YtDlpBackend(video_info),
+        transcripts,
     )
-    audio_transcriber = AudioTranscriber(config.replicate_client)
-    yt_transcriber = YouTubeTranscriber(ApiBackend(), YtDlpBackend())
     summarizer = Summarizer(
         quota_manager,
         gemini_helper,
@@ -57,12 +163,57 @@ def build_container() -> Container:
         downloader,
         audio_transcriber,
         yt_transcriber,
+        transcoder,
+        UploadRegistry(
+            config.redis_client,
+            config.GEMINI_UPLOAD_MAX_FILES,
+            config.GEMINI_UPLOAD_MIN_LIFETIME,
+            config.GEMINI_FILE_LIFETIME,
+            config.GEMINI_UPLOAD_IN_USE_SECONDS,
+        ),
+    )
+    user_repo = UserRepository(
+        database.Session,
+        TtlCache(config.USER_CACHE_TTL, config.USER_CACHE_MAX_ENTRIES),
+    )
+    summaries = SummaryCache(
+        ValkeyCache(
+            config.cache_client,
+            "summary",
+            config.SUMMARY_CACHE_TTL,
+            config.SUMMARY_CACHE_MAX_BYTES,
+            config.SUMMARY_CACHE_MAX_ENTRY_BYTES,
+        ),
     )
     return Container(
         bot=bot,
+        async_bot=config.async_bot,
         quota_manager=quota_manager,
         tracer=Tracer(config.langfuse_client),
-        user_repo=UserRepository(database.Session),
+        user_repo=user_repo,
+        jobs=JobRepository(
+            database.Session,
+            config.JOB_OWNER,
+            config.JOB_STALE_SECONDS,
+        ),
+        limiter=InFlightLimiter(
+            config.redis_client,
+            config.USER_MAX_INFLIGHT_JOBS,
+            config.USER_JOB_SLOT_TTL,
+        ),
+        cancellations=Cancellations(
+            config.redis_client,
+            config.JOB_CANCEL_TTL,
+            config.JOB_CANCEL_CHECK_SECONDS,
+        ),
+        dedupe=dedupe,
+        lease=LeaderLease(
+            config.redis_client,
+            config.LEADER_LEASE_KEY,
+            config.LEADER_LEASE_HOLDER,
+            config.LEADER_LEASE_TTL,
+            config.LEADER_LEASE_RENEW_SECONDS,
+        ),
         handlers=MessageHandlers(
             bot,
             messenger,
@@ -70,5 +221,49 @@ def build_container() -> Container:
             web_parser,
             quota_manager,
             downloader,
+            transcoder,
+            summaries,
+            Coalescer(
+                config.redis_client,
+                config.COALESCE_CLAIM_TTL,
+                config.COALESCE_POLL_SECONDS,
+                config.COALESCE_WAIT_SECONDS,
+                config.COALESCE_RESULT_TTL,
+            ),
+        ),
+        stats_log=StatsLog(
+            {
+                "summary": summaries.stats,
+                "transcript": transcripts.stats,
+                "web": web_pages.stats,
+                "castro": audio_urls.stats,
+                "user": user_repo.cache_stats,
+            },
+            config.CACHE_STATS_LOG_SECONDS,
+        ),
+        scheduler=Scheduler(
+            {
+                "quick": WorkerPool(config.QUICK_POOL_SIZE, config.QUICK_QUEUE_SIZE),
+                "long": WorkerPool(config.WORKER_POOL_SIZE, config.WORKER_QUEUE_SIZE),
+            },
+        ),
+        stream=JobStream(
+            config.redis_client,
+            config.JOB_STREAM,
+            config.JOB_STREAM_GROUP,
+            config.JOB_STREAM_CONSUMER,
+            config.JOB_STREAM_MAXLEN,
+        ),
+        webhook=(
+            WebhookServer(
+                bot,
+                dedupe,
+                config.WEBHOOK_URL,
+                config.WEBHOOK_SECRET,
+                config.WEBHOOK_HOST,
+                config.WEBHOOK_PORT,
+            )
+            if config.BOT_MODE == "webhook"
+            else None
         ),
     )
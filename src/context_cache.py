@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING, cast
+
+from google.genai import errors, types
+
+from prompts import prompt_version, strategy_prompt, system_instruction
+
+if TYPE_CHECKING:
+    import redis
+    from google import genai
+
+    from caching import TtlCache
+
+logger = logging.getLogger(__name__)
+
+# Gemini refuses content below the model's minimum, or a model without caching,
+# with a 400. Other client errors — a 429 quota, a 403 — say nothing about the
+# key and may clear on the next run.
+_REFUSED_STATUS = 400
+
+
+class ContextCache:
+    """Gemini cached contents holding the system instruction and a strategy prompt.
+
+    A run through one is billed the cached tokens at Gemini's reduced rate and
+    skips re-reading them. Each cache is keyed by model, `prompt_version` and
+    target language — exactly what decides its text — and its name is shared
+    through Valkey, so every process uses one cache per key. A cache is created
+    for `ttl` seconds and its record expires `refresh_margin` seconds earlier,
+    so the next run after that creates a fresh one before the old one lapses;
+    a key nobody uses simply expires on both sides.
+
+    Gemini refuses to cache fewer tokens than the model's minimum, or for a
+    model without caching. A key refused that way is remembered in `refused`
+    and runs uncached; any other failure is logged and that run goes uncached
+    too, as caching is only ever an optimization, while the next one tries
+    again.
+    """
+
+    def __init__(
+        self,
+        client: genai.Client,
+        store: redis.Redis,
+        ttl: int,
+        refresh_margin: int,
+        refused: TtlCache[bool],
+    ) -> None:
+        """Store the clients, the cache lifetime in seconds and the refusal memo."""
+        self._client = client
+        self._store = store
+        self._ttl = ttl
+        self._refresh_margin = refresh_margin
+        self._refused = refused
+
+    @staticmethod
+    def _key(model_id: str, prompt_key: str, target_language: str) -> str:
+        return (
+            f"gemini-context:{model_id}:{prompt_version(prompt_key)}:{target_language}"
+        )
+
+    def name_for(
+        self,
+        model_id: str,
+        prompt_key: str,
+        target_language: str,
+    ) -> str | None:
+        """Return the live cached content for this key, creating it if needed.
+
+        Returns:
+            str | None: The cached content's name, or None when this key is not
+                cached and the run should send its instruction and prompt.
+
+        """
+        key = self._key(model_id, prompt_key, target_language)
+        if self._refused.get(key):
+            return None
+        name = cast("str | None", self._store.get(key))
+        if name is not None:
+            return name
+        name = self._create(key, model_id, prompt_key, target_language)
+        if name is None or self._store.set(
+            key,
+            name,
+            ex=self._ttl - self._refresh_margin,
+            nx=True,
+        ):
+            return name
+        # Another process recorded its own meanwhile; use that one instead.
+        self._delete(name)
+        return cast("str | None", self._store.get(key))
+
+    def discard(self, model_id: str, prompt_key: str, target_language: str) -> None:
+        """Forget this key's cache, gone from Gemini, so the next run makes one."""
+        self._store.delete(self._key(model_id, prompt_key, target_language))
+
+    def _create(
+        self,
+        key: str,
+        model_id: str,
+        prompt_key: str,
+        target_language: str,
+    ) -> str | None:
+        try:
+            cached = self._client.caches.create(
+                model=model_id,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction(target_language),
+                    contents=[
+                        types.Content(
+                            role="user",
+                            parts=[types.Part(text=strategy_prompt(prompt_key))],
+                        ),
+                    ],
+                    ttl=f"{self._ttl}s",
+                    display_name=key,
+                ),
+            )
+        except errors.ClientError as e:
+            if e.code != _REFUSED_STATUS:
+                logger.warning("Failed to create Gemini cache %s: %s", key, e)
+                return None
+            logger.info("Gemini will not cache %s: %s", key, e)
+            self._refused.put(key, value=True)
+            return None
+        except Exception as e:
+            logger.warning("Failed to create Gemini cache %s: %s", key, e)
+            return None
+        return cached.name
+
+    def _delete(self, name: str) -> None:
+        try:
+            self._client.caches.delete(name=name)
+        except Exception as e:
+            logger.warning("Failed to delete Gemini cache %s: %s", name, e)
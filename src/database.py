@@ -1,11 +1,16 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING
+import threading
+import time
+from datetime import UTC, datetime, timedelta
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, cast
 
-from sqlalchemy import create_engine
+from sqlalchemy import and_, create_engine, inspect, or_, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import sessionmaker
 
+from caching import LookupStats
 from config import (
     ALLOWED_MODELS_FOR_SUMMARY,
     ALLOWED_PROMPT_KEYS,
@@ -17,24 +22,46 @@ from config import (
     DSN,
     SUPPORTED_LANGUAGES,
 )
-from models import UsersOrm
+from models import JobsOrm, UsersOrm
 
 if TYPE_CHECKING:
+    from collections.abc import Mapping
+
     # Aliased to avoid shadowing the module-level `Session` session factory
     # below, which reuses the SQLAlchemy convention of naming a sessionmaker
     # instance after the class it produces.
+    from sqlalchemy.engine import CursorResult
     from sqlalchemy.orm import Session as SQLAlchemySession
 
+    from caching import TtlCache
+    from handlers import JobSettings
+
 engine = create_engine(DSN, echo=False, pool_pre_ping=True)
 Session = sessionmaker(engine)
 
 
 class UserRepository:
-    """Data-access object for the users table."""
+    """Data-access object for the users table.
+
+    `select_user` reads through `cache`, which holds each user's column values
+    as a read-only mapping; every caller gets its own detached `UsersOrm` built
+    from them. A settings write or registration in this process drops the
+    user's entry, so only changes made elsewhere — another process, or an
+    approval edited in the database — wait out the cache's TTL.
+    """
 
-    def __init__(self, session_factory: sessionmaker[SQLAlchemySession]) -> None:
-        """Store the injected SQLAlchemy session factory."""
+    def __init__(
+        self,
+        session_factory: sessionmaker[SQLAlchemySession],
+        cache: TtlCache[Mapping[str, Any]],
+    ) -> None:
+        """Store the injected SQLAlchemy session factory and the user cache."""
         self._session_factory = session_factory
+        self._cache = cache
+        self._stats_lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._miss_seconds = 0.0
 
     def register_user(
         self,
@@ -73,28 +100,46 @@ class UserRepository:
                 session.rollback()
                 return False
             else:
+                self._cache.discard(str(user_id))
                 return True
 
     def select_user(self, user_id: int) -> UsersOrm:
-        """Retrieve a user from the database by their ID.
+        """Retrieve a user by their ID, from the cache if recently read.
 
         Raises:
             ValueError: If the user is not found.
 
         """
+        snapshot = self._cache.get(str(user_id))
+        if snapshot is not None:
+            with self._stats_lock:
+                self._hits += 1
+            return UsersOrm(**snapshot)
+        started = time.perf_counter()
         with self._session_factory() as session:
             user = session.get(UsersOrm, user_id)
             if user is None:
                 msg = "User not found"
                 raise ValueError(msg)
-            return user
+            columns = inspect(UsersOrm).column_attrs.keys()
+            snapshot = MappingProxyType({key: getattr(user, key) for key in columns})
+        with self._stats_lock:
+            self._misses += 1
+            self._miss_seconds += time.perf_counter() - started
+        self._cache.put(str(user_id), snapshot)
+        return UsersOrm(**snapshot)
+
+    def cache_stats(self) -> LookupStats:
+        """Return how many lookups the cache answered and the time it saved."""
+        with self._stats_lock:
+            return LookupStats(self._hits, self._misses, self._miss_seconds)
 
     def check_auth(self, user_id: int) -> bool:
         """Return True if the user exists and is approved."""
         user = self.select_user(user_id)
         return user.approved
 
-    def _update_field(self, user_id: int, field: str, value: str) -> bool:
+    def _update_field(self, user_id: int, field: str, value: str | bool) -> bool:
         """Persist a single validated settings field; False if the user is unknown."""
         with self._session_factory() as session:
             user = session.get(UsersOrm, user_id)
@@ -102,7 +147,8 @@ class UserRepository:
                 return False
             setattr(user, field, value)
             session.commit()
-            return True
+        self._cache.discard(str(user_id))
+        return True
 
     def set_target_language(self, user_id: int, target_language: str) -> bool:
         """Set the user's target language; False if unsupported or user unknown."""
@@ -125,9 +171,163 @@ class UserRepository:
             return False
         return self._update_field(user_id, "thinking_level", normalized)
 
+    def set_use_summary_cache(self, user_id: int, enabled: bool) -> bool:
+        """Switch cached summaries on or off for the user; False if user unknown."""
+        return self._update_field(user_id, "use_summary_cache", enabled)
+
     def set_prompt_strategy(self, user_id: int, prompt_key_for_summary: str) -> bool:
         """Set the user's prompt strategy; False if unsupported or user unknown."""
         normalized = prompt_key_for_summary.lower()
         if normalized not in ALLOWED_PROMPT_KEYS:
             return False
         return self._update_field(user_id, "prompt_key_for_summary", normalized)
+
+
+class JobRepository:
+    """Data-access object for the jobs table, the durable record of queued work.
+
+    A job is `queued` from the moment its update arrives, `running` once a worker
+    claims it, and `done`, `failed` or `cancelled` once the user has been
+    answered. A running job carries the id of the process running it, `owner`,
+    which keeps its heartbeat fresh with `heartbeat`. A restart finds the rest
+    through `unfinished`, which leaves alone the running jobs whose heartbeat is
+    younger than `stale_after` seconds: their process is still at work.
+    """
+
+    def __init__(
+        self,
+        session_factory: sessionmaker[SQLAlchemySession],
+        owner: str,
+        stale_after: float,
+    ) -> None:
+        """Store the session factory, this process's id and the heartbeat limit."""
+        self._session_factory = session_factory
+        self._owner = owner
+        self._stale_after = stale_after
+
+    def add(self, chat_id: int, update: dict[str, Any]) -> int:
+        """Record a newly arrived update as a queued job; return the job's id."""
+        with self._session_factory() as session:
+            job = JobsOrm(chat_id=chat_id, update=update)
+            session.add(job)
+            session.commit()
+            return job.id
+
+    def get(self, job_id: int) -> JobsOrm | None:
+        """Return a job, detached from its session; None if there is no such job."""
+        with self._session_factory() as session:
+            job = session.get(JobsOrm, job_id)
+            if job is not None:
+                session.expunge(job)
+            return job
+
+    def claim(self, job_id: int) -> JobsOrm | None:
+        """Move a queued job to `running` and count the attempt; None if not queued.
+
+        The row is read `FOR UPDATE SKIP LOCKED`, so of two workers reaching for
+        the same job one claims it and the other gets None instead of waiting.
+        The job is stamped with this process as its owner, its heartbeat fresh.
+        """
+        with self._session_factory() as session:
+            job = session.scalars(
+                select(JobsOrm)
+                .where(JobsOrm.id == job_id, JobsOrm.state == "queued")
+                .with_for_update(skip_locked=True),
+            ).first()
+            if job is None:
+                return None
+            job.state = "running"
+            job.attempts += 1
+            job.claimed_by = self._owner
+            job.heartbeat_at = _utcnow()
+            session.flush()
+            session.expunge(job)
+            session.commit()
+            return job
+
+    def heartbeat(self) -> int:
+        """Refresh the heartbeat of each job this process runs; return how many."""
+        with self._session_factory() as session:
+            # An UPDATE yields a CursorResult, the Result that carries rowcount.
+            result = cast(
+                "CursorResult[Any]",
+                session.execute(
+                    update(JobsOrm)
+                    .where(
+                        JobsOrm.state == "running",
+                        JobsOrm.claimed_by == self._owner,
+                    )
+                    .values(heartbeat_at=_utcnow()),
+                ),
+            )
+            session.commit()
+            return result.rowcount
+
+    def save_settings(self, job_id: int, settings: JobSettings) -> None:
+        """Record the summarize() kwargs a job runs with, for a resumed run."""
+        with self._session_factory() as session:
+            session.execute(
+                update(JobsOrm)
+                .where(JobsOrm.id == job_id)
+                .values(settings=dict(settings)),
+            )
+            session.commit()
+
+    def finish(self, job_id: int, state: str = "done") -> None:
+        """Mark a job `done`, `failed` or `cancelled`, so no restart picks it up."""
+        with self._session_factory() as session:
+            session.execute(
+                update(JobsOrm).where(JobsOrm.id == job_id).values(state=state),
+            )
+            session.commit()
+
+    def requeue(self, job_id: int) -> None:
+        """Put a `running` job back to `queued`, for a worker taking it over."""
+        with self._session_factory() as session:
+            session.execute(
+                update(JobsOrm)
+                .where(JobsOrm.id == job_id, JobsOrm.state == "running")
+                .values(state="queued"),
+            )
+            session.commit()
+
+    def unfinished(self) -> list[JobsOrm]:
+        """Return the jobs no live process holds, oldest first, requeued.
+
+        A `running` job whose heartbeat went stale was interrupted mid-way — its
+        process died or was restarted — so it goes back to `queued` for `claim`;
+        its attempt count is kept. One whose heartbeat is fresh is left to the
+        process still running it.
+        """
+        cutoff = _utcnow() - timedelta(seconds=self._stale_after)
+        with self._session_factory() as session:
+            jobs = list(
+                session.scalars(
+                    select(JobsOrm)
+                    .where(
+                        or_(
+                            JobsOrm.state == "queued",
+                            and_(
+                                JobsOrm.state == "running",
+                                or_(
+                                    JobsOrm.heartbeat_at.is_(None),
+                                    JobsOrm.heartbeat_at < cutoff,
+                                ),
+                            ),
+                        ),
+                    )
+                    .order_by(JobsOrm.id)
+                    .with_for_update(skip_locked=True),
+                ),
+            )
+            for job in jobs:
+                job.state = "queued"
+            session.flush()
+            session.expunge_all()
+            session.commit()
+            return jobs
+
+
+def _utcnow() -> datetime:
+    """Return the current UTC time, naive, as the jobs table stores it."""
+    return datetime.now(UTC).replace(tzinfo=None)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import redis
+
+
+class UpdateDeduplicator:
+    """Remembers the updates and messages already taken, across restarts and replicas.
+
+    Telegram delivers again whatever it did not see acknowledged, so after a
+    crash the same update can arrive twice, or reach a second replica. Each key
+    is claimed with one `SET NX EX`: the first delivery sets it and goes ahead,
+    and a repeat within `ttl` seconds finds it set and is dropped, at the cost
+    of that one round trip.
+    """
+
+    def __init__(self, client: redis.Redis, ttl: int) -> None:
+        """Store the client and how long a delivery is remembered."""
+        self._client = client
+        self._ttl = ttl
+
+    def _claim(self, key: str) -> bool:
+        return bool(self._client.set(key, 1, nx=True, ex=self._ttl))
+
+    def first_update(self, update_id: int) -> bool:
+        """Return whether this is the first delivery of the update."""
+        return self._claim(f"dedupe:update:{update_id}")
+
+    def first_message(self, chat_id: int, message_id: int) -> bool:
+        """Return whether this is the first delivery of the chat's message."""
+        return self._claim(f"dedupe:message:{chat_id}:{message_id}")
@@ -21,6 +21,8 @@ from tenacity import (
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
 
+import cancellation
+from exceptions import JobCancelledError
 from utils import generate_temporary_name, get_proxy
 
 if TYPE_CHECKING:
@@ -29,6 +31,8 @@ if TYPE_CHECKING:
     from telebot.types import File
     from tenacity import _utils as tenacity_utils
 
+    from caching import AudioUrlCache, VideoInfoCache
+
 logger = logging.getLogger(__name__)
 tenacity_logger = cast("tenacity_utils.LoggerProtocol", logger)
 
@@ -36,9 +40,16 @@ tenacity_logger = cast("tenacity_utils.LoggerProtocol", logger)
 class Downloader:
     """Downloads media from YouTube, Castro, and Telegram."""
 
-    def __init__(self, tg_api_token: str) -> None:
-        """Store the injected Telegram bot API token."""
+    def __init__(
+        self,
+        tg_api_token: str,
+        info: VideoInfoCache,
+        castro: AudioUrlCache,
+    ) -> None:
+        """Store the Telegram bot API token and the yt-dlp and Castro caches."""
         self._tg_api_token = tg_api_token
+        self._info = info
+        self._castro = castro
 
     @staticmethod
     def _choose_yt_audio_format(info: dict[str, Any]) -> str:
@@ -74,7 +85,10 @@ class Downloader:
         dest: str,
         timeout: int = 120,
     ) -> None:
-        """GET `url` and stream the body to `dest` in 8 KB chunks."""
+        """GET `url` and stream the body to `dest` in 8 KB chunks.
+
+        Stops, removing the partial file, once the job is cancelled.
+        """
         r = requests.get(
             url,
             stream=True,
@@ -91,9 +105,10 @@ class Downloader:
             try:
                 with Path(dest).open("wb") as f:
                     for chunk in r.iter_content(chunk_size=8192):
+                        cancellation.raise_if_stopped()
                         if chunk:
                             f.write(chunk)
-            except Exception:
+            except Exception, JobCancelledError:
                 with contextlib.suppress(OSError):
                     Path(dest).unlink(missing_ok=True)
                 raise
@@ -105,6 +120,7 @@ class Downloader:
         wait=wait_fixed(10),
         retry=retry_if_exception_type(DownloadError),
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
+        sleep=cancellation.sleep,
         reraise=False,
     )
     def download_yt(self, url: str) -> str:
@@ -112,22 +128,35 @@ class Downloader:
 
         Raises:
             RetryError: If the download fails after 2 retry attempts.
+            JobCancelledError: If the job is cancelled, or out of time, mid-download.
 
         """
         temporary_file_name = generate_temporary_name(ext=".mp3")
         output_stem = temporary_file_name.split(".", maxsplit=1)[0]
-        proxy = get_proxy()
-        with YoutubeDL({"proxy": proxy, "nocheckcertificate": False}) as ydl:
-            info = ydl.extract_info(url, download=False)
-        if info is None:
-            msg = "Failed to extract info from YouTube URL."
-            raise DownloadError(msg)
-        audio_format = self._choose_yt_audio_format(cast("dict[str, Any]", info))
-        ydl_opts = {
+        probed = self._info.get(url)
+        if probed is not None:
+            info, proxy = probed.info, probed.proxy
+        else:
+            proxy = get_proxy()
+            probe_opts = {
+                "proxy": proxy,
+                "noplaylist": True,
+                "nocheckcertificate": False,
+            }
+            with YoutubeDL(probe_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+            if info is None:
+                msg = "Failed to extract info from YouTube URL."
+                raise DownloadError(msg)
+            info = cast("dict[str, Any]", info)
+            self._info.put(url, info, proxy)
+        audio_format = self._choose_yt_audio_format(info)
+        ydl_opts: dict[str, Any] = {
             "format": audio_format,
             "outtmpl": output_stem,
             "nocheckcertificate": False,
             "proxy": proxy,
+            "progress_hooks": [cancellation.progress_hook],
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -135,13 +164,17 @@ class Downloader:
                 },
             ],
         }
-        with YoutubeDL(ydl_opts) as ydl:
+        with YoutubeDL(ydl_opts) as ydl:  # pyrefly: ignore[bad-argument-type]
             try:
-                ydl.download(url)
-            except DownloadError:
+                # From the probed info, so yt-dlp does not extract it again.
+                # pyrefly: ignore[bad-argument-type]
+                ydl.process_ie_result(info, download=True)
+            except DownloadError, JobCancelledError:
+                # A failure may be a stale format URL: the retry probes afresh.
+                self._info.discard(url)
                 # yt-dlp leaves partial fragment files (named after output_stem,
                 # with no extension) on disk when a download or post-processing
-                # step fails. Remove them so failed attempts don't accumulate.
+                # step fails or is cancelled. Remove them so they don't accumulate.
                 for leftover in Path.cwd().glob(f"{output_stem}*"):
                     with contextlib.suppress(OSError):
                         leftover.unlink(missing_ok=True)
@@ -153,22 +186,50 @@ class Downloader:
         wait=wait_fixed(10),
         retry=retry_if_exception_type((SSLError, RequestsConnectionError)),
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
+        sleep=cancellation.sleep,
         reraise=False,
     )
     def download_castro(self, url: str) -> str:
-        """Scrape a Castro episode page for its audio URL and stream it to a file.
+        """Find a Castro episode's audio URL and stream the audio to a file.
 
-        The bytes are stored as fetched, with no transcoding; the `.mp3` temp name
-        reflects the common case, not a verified container.
+        The URL is scraped from the episode page, or taken from the cache when
+        the episode was scraped before. A page that failed lately is not fetched
+        again until its failure expires, and an audio URL that no longer serves
+        is forgotten. The bytes are stored as fetched, with no transcoding; the
+        `.mp3` temp name reflects the common case, not a verified container.
 
         Raises:
-            ValueError: If the audio source tag or URL is missing on the page.
+            ValueError: If the audio source tag or URL is missing on the page,
+                now or when it was last fetched.
             TypeError: If the page's source `src` is not a string.
             HTTPError: If the HTTP request fails.
             RetryError: If SSL/connection failures persist after retries.
 
         """
         temporary_file_name = generate_temporary_name(ext=".mp3")
+        audio_url = self._castro.get(url)
+        if audio_url == "":
+            msg = "Castro page had no usable audio URL moments ago."
+            raise ValueError(msg)
+        if audio_url is None:
+            try:
+                audio_url = self._scrape_castro(url)
+            except ValueError, TypeError, HTTPError:
+                self._castro.put_failure(url)
+                raise
+            self._castro.put(url, audio_url)
+        logger.debug("Starting download...")
+        try:
+            self._stream_to_file(requote_uri(audio_url), temporary_file_name)
+        except HTTPError:
+            self._castro.discard(url)
+            raise
+        logger.debug("File downloaded...")
+        return temporary_file_name
+
+    @staticmethod
+    def _scrape_castro(url: str) -> str:
+        """Return the audio URL in the first `<source>` tag of a Castro page."""
         logger.debug("Parsing URL...")
         response = requests.get(
             requote_uri(url),
@@ -192,10 +253,7 @@ class Downloader:
         if not isinstance(audio_url, str):
             msg = "Audio URL is not a string."
             raise TypeError(msg)
-        logger.debug("URL parsed! Starting download...")
-        self._stream_to_file(requote_uri(audio_url), temporary_file_name)
-        logger.debug("File downloaded...")
-        return temporary_file_name
+        return audio_url
 
     def download_tg(self, file_id: File, ext: str = "") -> str:
         """Fetch a Telegram file, returning the local temp path.
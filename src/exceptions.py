@@ -1,3 +1,6 @@
+from pydantic_ai.exceptions import ModelHTTPError
+
+
 class LimitExceededError(Exception):
     """Exception raised when a limit or threshold has been exceeded."""
 
@@ -12,3 +15,29 @@ class TranscriptDownloadError(Exception):
 
 class FetchTranscriptError(Exception):
     """Exception raised when transcript retrieval fails via all backends."""
+
+
+class JobCancelledError(BaseException):
+    """Exception raised inside a job its sender cancelled with /cancel.
+
+    A BaseException, like `asyncio.CancelledError`, so the pipeline's broad
+    `except Exception` fallbacks let it through instead of retrying.
+    """
+
+
+class JobDeadlineExceededError(JobCancelledError):
+    """Exception raised inside a job that ran past its deadline.
+
+    A cancel the clock made rather than the sender, so the cleanup that runs
+    for a cancelled job — deleting an upload, cancelling a prediction — runs
+    for it too.
+    """
+
+
+class CachedContextGoneError(ModelHTTPError):
+    """Exception raised when Gemini no longer has the cached context a run named.
+
+    A `ModelHTTPError`, so the summary retry policies retry it as before; its
+    own type tells the caller the missing resource was the context, not a file
+    the request also referred to.
+    """
@@ -1,20 +1,25 @@
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, TypedDict
+from typing import TYPE_CHECKING, NotRequired, TypedDict
 
 from config import TG_MAX_FILE_SIZE
 from domain import format_prefixed_summary
-from utils import classify_url, clean_up, compress_audio, generate_temporary_name
+from models import UsersOrm
+from utils import canonical_source, classify_url, clean_up, generate_temporary_name
 
 if TYPE_CHECKING:
+    from collections.abc import Callable
+
     import telebot
     from telebot.types import Audio, Document, File, Message, Video, VideoNote, Voice
 
+    from caching import SummaryCache
+    from coalescing import Coalescer
     from download import Downloader
-    from models import UsersOrm
     from parsing import WebParser
     from services import Messenger, QuotaManager
     from summary import Summarizer
+    from transcoding import Transcoder
 
     _SizedMedia = Audio | Voice | Video | VideoNote | Document
 
@@ -30,6 +35,16 @@ class SummaryKwargs(TypedDict):
     thinking_level: str
 
 
+class JobSettings(SummaryKwargs):
+    """A job's settings snapshot: its summarize() kwargs and the cache switch.
+
+    Snapshots recorded before the switch was part of them lack it; those
+    resume with the cache on, the column's default.
+    """
+
+    use_summary_cache: NotRequired[bool]
+
+
 class MessageHandlers:
     """Per-content-type Telegram message handlers."""
 
@@ -41,6 +56,9 @@ class MessageHandlers:
         web_parser: WebParser,
         quota_manager: QuotaManager,
         downloader: Downloader,
+        transcoder: Transcoder,
+        summary_cache: SummaryCache,
+        coalescer: Coalescer,
     ) -> None:
         """Store the injected collaborators used to handle Telegram messages."""
         self._bot = bot
@@ -49,9 +67,12 @@ class MessageHandlers:
         self._web_parser = web_parser
         self._quota_manager = quota_manager
         self._downloader = downloader
+        self._transcoder = transcoder
+        self._summary_cache = summary_cache
+        self._coalescer = coalescer
 
     @staticmethod
-    def _summary_kwargs(user: UsersOrm) -> SummaryKwargs:
+    def summary_kwargs(user: UsersOrm) -> SummaryKwargs:
         """Build the recurring summarize() kwargs sourced from a user record."""
         return {
             "model": user.summarizing_model,
@@ -62,17 +83,83 @@ class MessageHandlers:
             "thinking_level": user.thinking_level,
         }
 
-    def _fetch_media(
+    @classmethod
+    def job_settings(cls, user: UsersOrm) -> JobSettings:
+        """Build the settings snapshot a job records when it first starts."""
+        return {
+            **cls.summary_kwargs(user),
+            "use_summary_cache": user.use_summary_cache,
+        }
+
+    @staticmethod
+    def user_from_job_settings(settings: JobSettings) -> UsersOrm:
+        """Rebuild a detached, approved user record from `job_settings` output.
+
+        A resumed job runs on it, so it is summarized with the settings its first
+        run started with rather than whatever the user has chosen since.
+        """
+        return UsersOrm(
+            user_id=settings["user_id"],
+            approved=True,
+            target_language=settings["target_language"],
+            summarizing_model=settings["model"],
+            prompt_key_for_summary=settings["prompt_key"],
+            daily_limit=settings["daily_limit"],
+            thinking_level=settings["thinking_level"],
+            use_summary_cache=settings.get("use_summary_cache", True),
+        )
+
+    def _cached(
+        self,
+        source: str,
+        user: UsersOrm,
+        summarize: Callable[[], str],
+    ) -> str:
+        """Answer from the summary cache, else summarize and cache the answer.
+
+        A hit skips everything `summarize` does — downloads, the LLM and the
+        quota it consumes. On a miss, a request identical to one already
+        running waits for its answer instead of repeating the work, and is
+        charged the quota it would have used. A user who switched the cache
+        off gets a fresh summary, which still replaces the cached one; so does
+        a resumed job of theirs, whose snapshot records the switch.
+        """
+        settings = self.summary_kwargs(user)
+
+        def summarize_and_cache() -> str:
+            answer = summarize()
+            self._summary_cache.put(source, settings, answer)
+            return answer
+
+        if user.use_summary_cache is False:
+            return summarize_and_cache()
+        cached = self._summary_cache.get(source, settings)
+        if cached is not None:
+            return cached
+        return self._coalescer.run(
+            self._summary_cache.key(source, settings),
+            summarize_and_cache,
+            lambda: self._charge_follower(user),
+        )
+
+    def _charge_follower(self, user: UsersOrm) -> None:
+        """Charge a request answered by an identical one as if it had run."""
+        self._quota_manager.check_quota(
+            user_id=user.user_id,
+            daily_limit=user.daily_limit,
+            quantity=1,
+        )
+
+    def _checked_media(
         self,
         message: Message,
         media: _SizedMedia | None,
         missing_msg: str,
-    ) -> File | None:
-        """Validate a Telegram media object and return its downloaded File handle.
-
-        Replies to the user and returns None when the media is missing or exceeds
-        the Telegram 20MB getFile cap.
+    ) -> _SizedMedia | None:
+        """Return the media if it can be fetched; else reply and return None.
 
+        Media is refused when it is missing or exceeds the Telegram 20MB getFile
+        cap.
         """
         if media is None or media.file_size is None:
             self._bot.reply_to(message, missing_msg)
@@ -80,94 +167,157 @@ class MessageHandlers:
         if media.file_size > TG_MAX_FILE_SIZE:
             self._bot.reply_to(message, "File is too big.")
             return None
-        return self._messenger.get_file_with_retry(media.file_id)
+        return media
+
+    def _fetch_media(
+        self,
+        message: Message,
+        user: UsersOrm,
+        media: _SizedMedia | None,
+        missing_msg: str,
+        summarize: Callable[[File], str],
+    ) -> str | None:
+        """Answer a Telegram media message from the cache, else fetch and summarize.
+
+        The cache is keyed by the media's `file_unique_id`, which stays the same
+        when a file is forwarded, so a repeat is answered before getFile or any
+        download. Returns None, having replied, when the media is refused.
+        """
+        checked = self._checked_media(message, media, missing_msg)
+        if checked is None:
+            return None
+        return self._cached(
+            f"telegram:{checked.file_unique_id}",
+            user,
+            lambda: summarize(self._messenger.get_file_with_retry(checked.file_id)),
+        )
+
+    def _handle_media(
+        self,
+        message: Message,
+        user: UsersOrm,
+        media: _SizedMedia | None,
+        missing_msg: str,
+        summarize: Callable[[File], str],
+    ) -> None:
+        answer = self._fetch_media(message, user, media, missing_msg, summarize)
+        if answer is not None:
+            self._messenger.send_answer(message, answer)
+
+    def _summarize_file(self, user: UsersOrm, data: File) -> str:
+        return self._summarizer.summarize(data=data, **self.summary_kwargs(user))
 
     def handle_audio(self, message: Message, user: UsersOrm) -> None:
         """Handle audio file processing."""
-        data = self._fetch_media(message, message.audio, "No audio file found.")
-        if data is None:
-            return
-        answer = self._summarizer.summarize(
-            data=data,
-            **self._summary_kwargs(user),
+        self._handle_media(
+            message,
+            user,
+            message.audio,
+            "No audio file found.",
+            lambda data: self._summarize_file(user, data),
         )
-        self._messenger.send_answer(message, answer)
 
     def handle_voice(self, message: Message, user: UsersOrm) -> None:
         """Handle voice file processing."""
-        data = self._fetch_media(message, message.voice, "No voice message found.")
-        if data is None:
-            return
-        answer = self._summarizer.summarize(
-            data=data,
-            **self._summary_kwargs(user),
+        self._handle_media(
+            message,
+            user,
+            message.voice,
+            "No voice message found.",
+            lambda data: self._summarize_file(user, data),
         )
-        self._messenger.send_answer(message, answer)
 
-    def _handle_video_like(self, message: Message, user: UsersOrm, data: File) -> None:
+    def _summarize_video_like(self, user: UsersOrm, data: File) -> str:
         """Shared video / video-note pipeline: download, compress, summarize."""
         downloaded_file = self._downloader.download_tg(data, ext=".mp4")
         compressed_file = generate_temporary_name(ext=".ogg")
         try:
-            compress_audio(input_file=downloaded_file, output_file=compressed_file)
-            answer = self._summarizer.summarize(
+            self._transcoder.compress_audio(
+                input_file=downloaded_file,
+                output_file=compressed_file,
+            )
+            return self._summarizer.summarize(
                 data=compressed_file,
-                **self._summary_kwargs(user),
+                **self.summary_kwargs(user),
             )
-            self._messenger.send_answer(message, answer)
         finally:
             clean_up(file=downloaded_file)
             clean_up(file=compressed_file)
 
     def handle_video_note(self, message: Message, user: UsersOrm) -> None:
         """Handle video note file processing."""
-        data = self._fetch_media(message, message.video_note, "No video note found.")
-        if data is None:
-            return
-        self._handle_video_like(message, user, data)
+        self._handle_media(
+            message,
+            user,
+            message.video_note,
+            "No video note found.",
+            lambda data: self._summarize_video_like(user, data),
+        )
 
     def handle_video(self, message: Message, user: UsersOrm) -> None:
         """Handle video file processing."""
-        data = self._fetch_media(message, message.video, "No video file found.")
-        if data is None:
-            return
-        self._handle_video_like(message, user, data)
+        self._handle_media(
+            message,
+            user,
+            message.video,
+            "No video file found.",
+            lambda data: self._summarize_video_like(user, data),
+        )
 
     def handle_document(self, message: Message, user: UsersOrm) -> None:
         """Handle document file processing."""
         document = message.document
-        data = self._fetch_media(message, document, "No document found.")
-        if data is None or document is None:
-            return
-        answer = self._summarizer.summarize_with_document(
-            file=data,
-            mime_type=document.mime_type or "application/octet-stream",
-            **self._summary_kwargs(user),
+        mime_type = (
+            document.mime_type
+            if document and document.mime_type
+            else "application/octet-stream"
+        )
+        self._handle_media(
+            message,
+            user,
+            document,
+            "No document found.",
+            lambda data: self._summarizer.summarize_with_document(
+                file=data,
+                mime_type=mime_type,
+                **self.summary_kwargs(user),
+            ),
+        )
+
+    def _summarize_web(self, user: UsersOrm, url: str) -> str:
+        """Check the quota before paying for a parse, then summarize the page."""
+        self._quota_manager.check_quota(
+            user_id=user.user_id,
+            daily_limit=user.daily_limit,
+            quantity=0,
+        )
+        parsed = self._web_parser.parse(url)
+        return format_prefixed_summary(
+            parsed.prefix,
+            self._summarizer.summarize_text(
+                text=parsed.text,
+                **self.summary_kwargs(user),
+            ),
         )
-        self._messenger.send_answer(message, answer)
 
     def handle_url(self, message: Message, user: UsersOrm, url: str) -> None:
         """Handle URL processing."""
         kind = classify_url(url)
         if kind in ("youtube", "castro"):
-            answer = self._summarizer.summarize(
-                data=url,
-                **self._summary_kwargs(user),
+            answer = self._cached(
+                canonical_source(url),
+                user,
+                lambda: self._summarizer.summarize(
+                    data=url,
+                    **self.summary_kwargs(user),
+                ),
             )
             self._messenger.send_answer(message, answer)
         elif kind == "web":
-            self._quota_manager.check_quota(
-                user_id=user.user_id,
-                daily_limit=user.daily_limit,
-                quantity=0,
-            )
-            parsed = self._web_parser.parse(url)
-            answer = format_prefixed_summary(
-                parsed.prefix,
-                self._summarizer.summarize_text(
-                    text=parsed.text,
-                    **self._summary_kwargs(user),
-                ),
+            answer = self._cached(
+                canonical_source(url),
+                user,
+                lambda: self._summarize_web(user, url),
             )
             self._messenger.send_answer(message, answer)
         else:
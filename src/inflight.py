@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, cast
+
+from utils import run_transaction
+
+if TYPE_CHECKING:
+    import redis
+    from redis.client import Pipeline
+
+
+class InFlightLimiter:
+    """Caps how many of one user's jobs run at once, across every process.
+
+    Per user, Valkey holds the jobs running now, as a sorted set scored by when
+    each started, and the jobs waiting for a slot, as a list in arrival order;
+    both change in WATCH/MULTI transactions, so processes admitting and
+    releasing at once never hand out the same slot twice. A running entry older
+    than `slot_ttl` seconds belongs to a job that died without releasing and
+    no longer counts.
+
+    Each waiting job may also have a notice: the chat and message id of the
+    reply telling its sender their place in line.
+    """
+
+    def __init__(self, client: redis.Redis, limit: int, slot_ttl: float) -> None:
+        """Store the client, the per-user job limit and the slot lifetime."""
+        self._client = client
+        self._limit = limit
+        self._slot_ttl = slot_ttl
+
+    @staticmethod
+    def _keys(user_id: int) -> tuple[str, str]:
+        return f"inflight:{user_id}:running", f"inflight:{user_id}:waiting"
+
+    @staticmethod
+    def _notices_key(user_id: int) -> str:
+        return f"inflight:{user_id}:notices"
+
+    def admit(self, user_id: int, job_id: int) -> int:
+        """Give a job a slot, or put it at the back of its user's line.
+
+        A job that already holds a slot or a place (a resumed one) keeps it.
+
+        Returns:
+            int: 0 when the job may run now, else its place in line from 1.
+
+        """
+        running, waiting = self._keys(user_id)
+
+        def admit(pipe: Pipeline) -> int:
+            now = time.time()
+            cutoff = now - self._slot_ttl
+            queued = [int(job) for job in pipe.lrange(waiting, 0, -1)]
+            held = pipe.zscore(running, job_id) is not None
+            live = pipe.zcount(running, cutoff, "+inf")
+            pipe.multi()
+            pipe.zremrangebyscore(running, "-inf", f"({cutoff}")
+            if job_id in queued:
+                return queued.index(job_id) + 1
+            if held or (live < self._limit and not queued):
+                pipe.zadd(running, {str(job_id): now})
+                return 0
+            pipe.rpush(waiting, job_id)
+            return len(queued) + 1
+
+        return run_transaction(self._client, admit, running, waiting)
+
+    def release(self, user_id: int, job_id: int) -> list[int]:
+        """Free a job's slot and hand the free slots to the first jobs in line.
+
+        Returns:
+            list[int]: The jobs that now hold a slot and should be started.
+
+        """
+        running, waiting = self._keys(user_id)
+
+        def release(pipe: Pipeline) -> list[int]:
+            now = time.time()
+            cutoff = now - self._slot_ttl
+            queued = [int(job) for job in pipe.lrange(waiting, 0, -1)]
+            score = pipe.zscore(running, job_id)
+            live = pipe.zcount(running, cutoff, "+inf")
+            if score is not None and score >= cutoff:
+                live -= 1
+            promoted = queued[: max(0, self._limit - live)]
+            pipe.multi()
+            pipe.zremrangebyscore(running, "-inf", f"({cutoff}")
+            pipe.zrem(running, job_id)
+            if promoted:
+                pipe.zadd(running, {str(job): now for job in promoted})
+                pipe.ltrim(waiting, len(promoted), -1)
+            return promoted
+
+        return run_transaction(self._client, release, running, waiting)
+
+    def running(self, user_id: int) -> list[int]:
+        """Return the user's jobs holding a slot, oldest first."""
+        running, _ = self._keys(user_id)
+        jobs = cast("list[str]", self._client.zrange(running, 0, -1))
+        return [int(job) for job in jobs]
+
+    def withdraw(self, user_id: int, job_id: int) -> bool:
+        """Take a job out of its user's line; False if it was not in it (any more)."""
+        _, waiting = self._keys(user_id)
+        return bool(self._client.lrem(waiting, 0, str(job_id)))
+
+    def waiting(self, user_id: int) -> list[int]:
+        """Return the user's jobs waiting for a slot, first in line first."""
+        _, waiting = self._keys(user_id)
+        return [int(job) for job in self._client.lrange(waiting, 0, -1)]
+
+    def set_notice(
+        self,
+        user_id: int,
+        job_id: int,
+        chat_id: int,
+        message_id: int,
+    ) -> bool:
+        """Record the reply that tells a waiting job's sender their place.
+
+        The job's place is checked in the same transaction: one promoted or
+        withdrawn since `admit` — its notice already looked for, and not
+        found — gets no notice recorded.
+
+        Returns:
+            bool: Whether the notice was recorded; if not, the caller deletes
+                the reply itself.
+
+        """
+        _, waiting = self._keys(user_id)
+        notices = self._notices_key(user_id)
+
+        def record(pipe: Pipeline) -> bool:
+            if str(job_id) not in pipe.lrange(waiting, 0, -1):
+                return False
+            pipe.multi()
+            pipe.hset(notices, str(job_id), f"{chat_id}:{message_id}")
+            return True
+
+        return run_transaction(self._client, record, waiting)
+
+    def notices(self, user_id: int) -> dict[int, tuple[int, int]]:
+        """Return each waiting job's notice, as (chat id, message id), by job id."""
+        stored = cast(
+            "dict[str, str]",
+            self._client.hgetall(self._notices_key(user_id)),
+        )
+        return {
+            int(job): (int(chat_id), int(message_id))
+            for job, value in stored.items()
+            for chat_id, message_id in [value.split(":")]
+        }
+
+    def drop_notice(self, user_id: int, job_id: int) -> tuple[int, int] | None:
+        """Forget a job's notice; return it as (chat id, message id) if it had one.
+
+        The read and the delete run as one MULTI, so of two processes dropping
+        the same notice only one gets it back.
+        """
+        key = self._notices_key(user_id)
+        pipe = self._client.pipeline()
+        pipe.hget(key, str(job_id))
+        pipe.hdel(key, str(job_id))
+        value, _ = pipe.execute()
+        if value is None:
+            return None
+        chat_id, message_id = value.split(":")
+        return int(chat_id), int(message_id)
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import TYPE_CHECKING
+
+import redis
+
+from utils import run_transaction
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from redis.client import Pipeline
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderLease:
+    """A Valkey lease that lets one of several replicas poll Telegram.
+
+    Telegram allows one getUpdates caller per token, so replicas take turns: the
+    holder's id sits in `key` for `ttl` seconds and is renewed every
+    `renew_interval`, while standbys try to take the key as often. A leader
+    that dies stops renewing, so a standby takes over within `ttl` seconds. The
+    key changes in WATCH/MULTI transactions, so only the holder renews or
+    releases it. The lease decides who polls, nothing more: a leader that
+    lost it still drains its jobs, which their heartbeats keep the next
+    leader from resuming.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        key: str,
+        holder: str,
+        ttl: int,
+        renew_interval: float,
+    ) -> None:
+        """Store the client, the lease key, this process's id and the timings."""
+        self._client = client
+        self._key = key
+        self._holder = holder
+        self._ttl = ttl
+        self._renew_interval = renew_interval
+        self._released = threading.Event()
+
+    def try_acquire(self) -> bool:
+        """Take the lease if free, or renew it if held; False if another holds it."""
+
+        def acquire(pipe: Pipeline) -> bool:
+            owner = pipe.get(self._key)
+            if owner not in (None, self._holder):
+                return False
+            pipe.multi()
+            pipe.set(self._key, self._holder, ex=self._ttl)
+            return True
+
+        return run_transaction(self._client, acquire, self._key)
+
+    def wait(self) -> None:
+        """Block as a standby until this process holds the lease."""
+        while not self.try_acquire():
+            self._released.wait(self._renew_interval)
+
+    def keep(self, on_lost: Callable[[], None]) -> None:
+        """Renew the lease in the background until `release`.
+
+        If another process holds the key at a renewal — this one stalled past
+        `ttl` — `on_lost` is called and renewal stops. A failed Valkey call is
+        only logged: while Valkey is unreachable, no standby can take the key
+        either.
+        """
+
+        def renew() -> None:
+            while not self._released.wait(self._renew_interval):
+                try:
+                    held = self.try_acquire()
+                except redis.RedisError:
+                    logger.warning("Could not renew the leader lease", exc_info=True)
+                    continue
+                if not held:
+                    logger.warning("Lost the leader lease to another replica")
+                    on_lost()
+                    return
+
+        threading.Thread(target=renew, name="leader-lease", daemon=True).start()
+
+    def release(self) -> None:
+        """Stop renewing and free the key, if still held, for a standby to take."""
+        self._released.set()
+
+        def release(pipe: Pipeline) -> None:
+            if pipe.get(self._key) != self._holder:
+                return
+            pipe.multi()
+            pipe.delete(self._key)
+
+        self._client.transaction(release, self._key)
@@ -1,18 +1,20 @@
 from __future__ import annotations
 
-from textwrap import dedent
-from typing import TYPE_CHECKING, cast
+import threading
+from typing import TYPE_CHECKING, Any, cast
 
 from opentelemetry.trace import get_current_span
 from pydantic_ai import Agent, UploadedFile
-from pydantic_ai.models.google import GoogleModel
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.models.google import GoogleModel, GoogleModelSettings
 from pydantic_ai.models.openrouter import OpenRouterModel, OpenRouterModelSettings
 from pydantic_ai.models.wrapper import WrapperModel
 from pydantic_ai.providers.google import GoogleProvider
 from pydantic_ai.settings import ModelSettings
 
 from config import MODEL_SPECS
-from prompts import SYSTEM_INSTRUCTION
+from exceptions import CachedContextGoneError
+from prompts import strategy_prompt, system_instruction
 
 if TYPE_CHECKING:
     from collections.abc import Sequence
@@ -29,6 +31,15 @@ if TYPE_CHECKING:
     from pydantic_ai.providers.openrouter import OpenRouterProvider
     from pydantic_ai.settings import ThinkingLevel
 
+    from context_cache import ContextCache
+
+# Gemini answers a request naming a cached content it no longer has (expired,
+# or deleted) with one of these. A run that also refers to an uploaded file
+# gets the same statuses when that file is gone, so the error body has to name
+# the cached content before the context is the one blamed.
+_GONE_CONTEXT_STATUSES = frozenset({403, 404})
+_CACHED_CONTENT_MARKER = "cachedcontent"
+
 
 class OpenRouterCostReporter(WrapperModel):
     """Publishes the cost OpenRouter charged onto the generation span.
@@ -77,10 +88,15 @@ class LLMClient:
         self,
         client: genai.Client,
         openrouter_provider: OpenRouterProvider,
+        context_cache: ContextCache | None = None,
     ) -> None:
-        """Store the injected providers and this client's model cache."""
+        """Store the injected providers and this client's model cache.
+
+        `context_cache` is None when Gemini explicit context caching is off.
+        """
         self._client = client
         self._openrouter_provider = openrouter_provider
+        self._context_cache = context_cache
         # Neither agent is model-, language- or user-specific: pydantic-ai takes
         # the model, the instructions and the settings per run. They differ only
         # in whether instrumentation is on.
@@ -91,6 +107,9 @@ class LLMClient:
         self._untraced_agent: Agent[None, str] = Agent()
         self._untraced_agent.instrument = False
         self._models: dict[str, Model] = {}
+        # Worker threads share this client, so two first runs of one model id
+        # must not each build and store their own instance.
+        self._models_lock = threading.Lock()
 
     @staticmethod
     def _is_text_only(content: str | Sequence[UserContent]) -> bool:
@@ -101,32 +120,37 @@ class LLMClient:
 
     def build_model(self, model_id: str) -> Model:
         """Return the pydantic-ai model for a registered id, shared across calls."""
-        if model_id not in self._models:
-            spec = MODEL_SPECS[model_id]
-            if spec.provider == "google":
-                model: Model = GoogleModel(
-                    model_id,
-                    provider=GoogleProvider(client=self._client),
-                )
-            elif spec.provider == "openrouter":
-                # Usage accounting is what makes OpenRouter report the cost
-                # `OpenRouterCostReporter` forwards to the trace. It belongs on
-                # the model rather than in `build_settings`, which owns no
-                # provider branch; pydantic-ai merges the two.
-                model = OpenRouterCostReporter(
-                    OpenRouterModel(
+        with self._models_lock:
+            if model_id not in self._models:
+                spec = MODEL_SPECS[model_id]
+                if spec.provider == "google":
+                    model: Model = GoogleModel(
                         model_id,
-                        provider=self._openrouter_provider,
-                        settings=OpenRouterModelSettings(
-                            openrouter_usage={"include": True},
+                        provider=GoogleProvider(client=self._client),
+                    )
+                elif spec.provider == "openrouter":
+                    # Usage accounting is what makes OpenRouter report the cost
+                    # `OpenRouterCostReporter` forwards to the trace. It belongs on
+                    # the model rather than in `build_settings`, which owns no
+                    # provider branch; pydantic-ai merges the two. So does the
+                    # `cache_control` breakpoint on the system instruction, which
+                    # pydantic-ai sends only where the downstream provider
+                    # (Anthropic, Gemini) honours it.
+                    model = OpenRouterCostReporter(
+                        OpenRouterModel(
+                            model_id,
+                            provider=self._openrouter_provider,
+                            settings=OpenRouterModelSettings(
+                                openrouter_usage={"include": True},
+                                openrouter_cache_instructions=True,
+                            ),
                         ),
-                    ),
-                )
-            else:
-                msg = f"No model builder for provider: {spec.provider}"
-                raise ValueError(msg)
-            self._models[model_id] = model
-        return self._models[model_id]
+                    )
+                else:
+                    msg = f"No model builder for provider: {spec.provider}"
+                    raise ValueError(msg)
+                self._models[model_id] = model
+            return self._models[model_id]
 
     def build_settings(self, thinking_level: str) -> ModelSettings:
         """Build the per-run settings from the agnostic thinking effort.
@@ -178,32 +202,148 @@ class LLMClient:
             ),
         )
 
+    def _run_options(
+        self,
+        model_id: str,
+        target_language: str,
+        thinking_level: str,
+    ) -> dict[str, Any]:
+        """Build the per-run model, instructions and settings both run paths send.
+
+        `metadata` lands on the agent run span, so a trace says which prompt
+        cache the run could use; the cached input tokens themselves are on the
+        generation span as `gen_ai.usage.cache_read.input_tokens`.
+        """
+        provider = MODEL_SPECS[model_id].provider
+        return {
+            "model": self.build_model(model_id),
+            "instructions": system_instruction(target_language),
+            "model_settings": self.build_settings(thinking_level=thinking_level),
+            "metadata": {
+                "prompt_cache": "openrouter" if provider == "openrouter" else "none",
+            },
+        }
+
+    def _cached_context(
+        self,
+        content: str | Sequence[UserContent],
+        model_id: str,
+        prompt_key: str | None,
+        target_language: str,
+    ) -> str | None:
+        """Return the Gemini cache this run can use in place of its prompt, if any.
+
+        Only a Gemini run whose content opens with its strategy prompt and goes
+        on to more qualifies: the cache holds that prompt, so the request then
+        carries the rest of the content alone.
+        """
+        if (
+            self._context_cache is None
+            or prompt_key is None
+            or MODEL_SPECS[model_id].provider != "google"
+            or isinstance(content, str)
+            or len(content) < 2  # noqa: PLR2004
+            or content[0] != strategy_prompt(prompt_key)
+        ):
+            return None
+        return self._context_cache.name_for(model_id, prompt_key, target_language)
+
+    def _prepare(
+        self,
+        content: str | Sequence[UserContent],
+        model_id: str,
+        prompt_key: str | None,
+        target_language: str,
+        thinking_level: str,
+    ) -> tuple[str | Sequence[UserContent], dict[str, Any], str | None]:
+        """Return the content and options to run with, and the cache used, if any."""
+        options = self._run_options(model_id, target_language, thinking_level)
+        cached = self._cached_context(content, model_id, prompt_key, target_language)
+        if cached is None:
+            return content, options, None
+        # The cache owns the instruction; Gemini rejects a request that sends it too.
+        options["instructions"] = None
+        options["model_settings"] = GoogleModelSettings(
+            **options["model_settings"],
+            google_cached_content=cached,
+        )
+        options["metadata"] = {"prompt_cache": "gemini-context"}
+        return content[1:], options, cached
+
+    def _context_gone(
+        self,
+        error: ModelHTTPError,
+        content: str | Sequence[UserContent],
+    ) -> bool:
+        """Whether a failed cached run failed because the cached context is gone.
+
+        A text-only run names no other resource, so its status alone decides;
+        a run with file parts needs the error body to name the cached content.
+        """
+        if error.status_code not in _GONE_CONTEXT_STATUSES:
+            return False
+        if self._is_text_only(content):
+            return True
+        return _CACHED_CONTENT_MARKER in str(error.body).lower()
+
+    def _drop_gone_context(
+        self,
+        model_id: str,
+        prompt_key: str | None,
+        target_language: str,
+    ) -> None:
+        """Forget a cache Gemini no longer has, so the retry makes a new one."""
+        if self._context_cache is not None and prompt_key is not None:
+            self._context_cache.discard(model_id, prompt_key, target_language)
+
+    @staticmethod
+    def _gone_error(error: ModelHTTPError) -> CachedContextGoneError:
+        return CachedContextGoneError(
+            error.status_code,
+            error.model_name,
+            error.body,
+            headers=error.headers,
+        )
+
+    def _agent_for(self, content: str | Sequence[UserContent]) -> Agent[None, str]:
+        return self._agent if self._is_text_only(content) else self._untraced_agent
+
     def run(
         self,
         content: str | Sequence[UserContent],
         model_id: str,
         target_language: str,
         thinking_level: str,
+        prompt_key: str | None = None,
     ) -> str:
         """Run one summarization request and return the model's text output.
 
         `content` is the prompt on its own, or the prompt followed by the file
-        parts it refers to.
+        parts it refers to. Given the `prompt_key` it was built from, a Gemini
+        run may send the prompt and instruction as a cached context instead.
 
         Raises:
             AttributeError: If the model returns an empty response.
+            CachedContextGoneError: If Gemini no longer has the cached context
+                the run named; it is forgotten first, so the retry makes a
+                new one.
+            ModelHTTPError: If the request fails otherwise.
 
         """
-        instructions = dedent(
-            SYSTEM_INSTRUCTION.format(language=target_language),
-        ).strip()
-        agent = self._agent if self._is_text_only(content) else self._untraced_agent
-        result = agent.run_sync(
+        sent, options, cached = self._prepare(
             content,
-            model=self.build_model(model_id),
-            instructions=instructions,
-            model_settings=self.build_settings(thinking_level=thinking_level),
+            model_id,
+            prompt_key,
+            target_language,
+            thinking_level,
         )
+        try:
+            result = self._agent_for(content).run_sync(sent, **options)
+        except ModelHTTPError as e:
+            if cached is None or not self._context_gone(e, content):
+                raise
+            self._drop_gone_context(model_id, prompt_key, target_language)
+            raise self._gone_error(e) from e
         if not result.output:
             raise AttributeError
         return result.output
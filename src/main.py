@@ -2,42 +2,128 @@
 
 from __future__ import annotations
 
+import logging
+import signal
+import threading
+from functools import partial
 from textwrap import dedent
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, cast
 
 from sentry_sdk import capture_exception
+from sqlalchemy.exc import SQLAlchemyError
+from telebot.apihelper import ApiTelegramException
 from telebot.types import (
     KeyboardButton,
+    Message,
     ReplyKeyboardMarkup,
     ReplyKeyboardRemove,
 )
 from tenacity import RetryError
 
+import cancellation
 from config import (
+    BOT_ROLE,
+    JOB_DEADLINE_SECONDS,
+    JOB_HEARTBEAT_SECONDS,
+    JOB_MAX_ATTEMPTS,
     MODEL_LABELS,
     MODEL_LABELS_REVERSE,
     PROMPT_STRATEGY_LABELS,
     PROMPT_STRATEGY_LABELS_REVERSE,
+    QUICK_MEDIA_MAX_BYTES,
+    QUICK_MEDIA_MAX_SECONDS,
+    SHUTDOWN_DRAIN_SECONDS,
+    SUMMARY_CACHE_LABELS,
+    SUMMARY_CACHE_LABELS_REVERSE,
     SUPPORTED_DOCUMENT_MIME_TYPES,
     SUPPORTED_LANGUAGES,
     THINKING_LEVEL_LABELS,
     THINKING_LEVEL_LABELS_REVERSE,
+    USER_MAX_INFLIGHT_JOBS,
 )
 from container import build_container
-from exceptions import LimitExceededError, WebParseError
-from utils import clean_up
+from exceptions import (
+    JobCancelledError,
+    JobDeadlineExceededError,
+    LimitExceededError,
+    WebParseError,
+)
+from utils import classify_url, clean_up
 
 if TYPE_CHECKING:
     from collections.abc import Callable
 
     import telebot
-    from telebot.types import Message
 
+    from caching import StatsLog
+    from cancellation import Cancellations
     from container import Container
-    from database import UserRepository
-    from handlers import MessageHandlers
-    from models import UsersOrm
+    from database import JobRepository, UserRepository
+    from dedupe import UpdateDeduplicator
+    from handlers import JobSettings, MessageHandlers
+    from inflight import InFlightLimiter
+    from lease import LeaderLease
+    from models import JobsOrm, UsersOrm
     from services import QuotaManager, Tracer
+    from streams import JobStream
+    from webhook import WebhookServer
+    from workers import Scheduler
+
+logger = logging.getLogger(__name__)
+
+
+def failure_reply(error: Exception) -> str:
+    """Return the answer a user gets when summarizing their message raised `error`."""
+    if isinstance(error, LimitExceededError):
+        return "Daily limit has been exceeded, try again tomorrow."
+    if isinstance(error, WebParseError):
+        return "Check provided URL, looks like the page is not available."
+    if isinstance(error, RetryError):
+        return "An error occurred during execution. Please try again in 10 minutes."
+    return f"Unexpected: {type(error).__name__}"
+
+
+def queue_position_reply(position: int) -> str:
+    """Return the notice a sender gets while their job waits at `position` in line."""
+    return (
+        f"You already have {USER_MAX_INFLIGHT_JOBS} messages in progress. "
+        f"This one is queued, position {position}."
+    )
+
+
+def classify_job(message: Message) -> str:
+    """Classify a message by how long summarizing it takes, to pick its lane.
+
+    Returns:
+        str: "quick" for text that is not a YouTube or Castro link, a document of
+            an unsupported type (both answered without any media work) and media
+            within QUICK_MEDIA_MAX_SECONDS and QUICK_MEDIA_MAX_BYTES; "long" for
+            media links and any media that is longer, bigger, or of unknown size.
+
+    """
+    if message.content_type == "text":
+        url = (message.text or "").strip().split(" ", maxsplit=1)[0]
+        return "long" if classify_url(url) in ("youtube", "castro") else "quick"
+    media = getattr(message, message.content_type, None)
+    if (
+        message.content_type == "document"
+        and media is not None
+        and media.mime_type not in SUPPORTED_DOCUMENT_MIME_TYPES
+    ):
+        return "quick"
+    file_size = getattr(media, "file_size", None)
+    duration = getattr(media, "duration", None)
+    if (
+        file_size is not None
+        and file_size <= QUICK_MEDIA_MAX_BYTES
+        and (duration is None or duration <= QUICK_MEDIA_MAX_SECONDS)
+    ):
+        return "quick"
+    return "long"
+
+
+# The content types the unified summarization handler is registered for.
+CONTENT_TYPES = ["text", "audio", "document", "video_note", "voice", "video"]
 
 
 class BotApp:
@@ -47,16 +133,41 @@ class BotApp:
         self,
         bot: telebot.TeleBot,
         user_repo: UserRepository,
+        jobs: JobRepository,
+        limiter: InFlightLimiter,
+        cancellations: Cancellations,
+        dedupe: UpdateDeduplicator,
+        lease: LeaderLease,
         quota_manager: QuotaManager,
         tracer: Tracer,
         handlers: MessageHandlers,
+        stats_log: StatsLog,
+        scheduler: Scheduler,
+        stream: JobStream | None,
+        webhook: WebhookServer | None,
     ) -> None:
-        """Store the injected collaborators used to register and run handlers."""
+        """Store the injected collaborators.
+
+        `stream` is set in the ingest role and in stream workers, where jobs go
+        to the worker processes instead of `scheduler`; `webhook` is None in
+        polling mode.
+        """
         self._bot = bot
         self._user_repo = user_repo
+        self._jobs = jobs
+        self._limiter = limiter
+        self._cancellations = cancellations
+        self._dedupe = dedupe
+        self._lease = lease
         self._quota_manager = quota_manager
         self._tracer = tracer
         self._handlers = handlers
+        self._stats_log = stats_log
+        self._scheduler = scheduler
+        self._stream = stream
+        self._webhook = webhook
+        self._draining = threading.Event()
+        self._stopped = threading.Event()
 
     # /start
     def handle_start(self, message: Message) -> None:
@@ -102,11 +213,44 @@ class BotApp:
                     Summarizing model: {MODEL_LABELS.get(user.summarizing_model, user.summarizing_model)}
                     Prompt strategy: {PROMPT_STRATEGY_LABELS.get(user.prompt_key_for_summary, user.prompt_key_for_summary)}
                     Thinking level: {THINKING_LEVEL_LABELS.get(user.thinking_level, user.thinking_level)}
+                    Summary cache: {SUMMARY_CACHE_LABELS[user.use_summary_cache]}
                     Daily limit: {user.daily_limit}
                     Remaining quota: {self._quota_manager.get_remaining_quota(user.user_id, user.daily_limit)}
                     """).strip()  # noqa: E501
         self._bot.send_message(message.chat.id, msg)
 
+    # /cancel
+    def handle_cancel(self, message: Message) -> None:
+        """Handle /cancel: stop the sender's running jobs and drop the waiting ones.
+
+        A waiting job is taken out of line and never starts. A running one is
+        flagged, and stops at its next check — cancelling its Replicate
+        prediction or deleting its Gemini upload on the way out — wherever it
+        runs. The line is read before the running jobs, so one promoted in
+        between is flagged rather than missed.
+        """
+        if message.from_user is None:
+            self._bot.reply_to(message, "User information is missing.")
+            return
+        user_id = message.from_user.id
+        waiting = self._limiter.waiting(user_id)
+        running = self._limiter.running(user_id)
+        for job_id in waiting:
+            if self._limiter.withdraw(user_id, job_id):
+                self._jobs.finish(job_id, "cancelled")
+                notice = self._limiter.drop_notice(user_id, job_id)
+                if notice is not None:
+                    self._update_notice(notice, None)
+            else:
+                self._cancellations.cancel(job_id)
+        for job_id in running:
+            self._cancellations.cancel(job_id)
+        count = len({*waiting, *running})
+        self._bot.reply_to(
+            message,
+            f"Cancelling {count} message(s)." if count else "Nothing to cancel.",
+        )
+
     def _prompt_choice(
         self,
         message: Message,
@@ -246,6 +390,41 @@ class BotApp:
             reply_markup=markup,
         )
 
+    # /set_summary_cache
+    def handle_set_summary_cache(self, message: Message) -> None:
+        """Handle the /set_summary_cache command for the bot."""
+        self._prompt_choice(
+            message,
+            "Select whether to reuse earlier summaries 👇",
+            list(SUMMARY_CACHE_LABELS.values()),
+            self.proceed_set_summary_cache,
+        )
+
+    def proceed_set_summary_cache(self, message: Message) -> None:
+        """Apply the picked cache switch, or report it as unknown."""
+        if message.from_user is None or message.text is None:
+            self._bot.reply_to(message, "User information or choice is missing.")
+            return
+        enabled = SUMMARY_CACHE_LABELS_REVERSE.get(message.text)
+        if enabled is None:
+            self._bot.send_message(message.chat.id, "Unknown choice")
+            return
+        if not self._user_repo.set_use_summary_cache(
+            message.from_user.id,
+            enabled=enabled,
+        ):
+            self._bot.send_message(
+                message.chat.id,
+                "Failed to update summary cache.",
+            )
+            return
+        markup = ReplyKeyboardRemove()
+        self._bot.send_message(
+            message.chat.id,
+            f"The summary cache is set to {message.text}.",
+            reply_markup=markup,
+        )
+
     def process_message_content(self, message: Message, user: UsersOrm) -> None:
         """Route a validated message to the handler for its content type."""
         if message.content_type == "audio":
@@ -269,8 +448,29 @@ class BotApp:
             url = message.text.strip().split(" ", maxsplit=1)[0]
             self._handlers.handle_url(message, user, url)
 
+    def _approved_user(self, message: Message, job: JobsOrm | None) -> UsersOrm | None:
+        """Return the user to summarize for, or None once the sender is answered.
+
+        A job that already started once runs on the settings it recorded then;
+        otherwise the sender is looked up and, when approved, their settings are
+        recorded on the job for a run after a restart.
+        """
+        if job is not None and job.settings is not None:
+            settings = cast("JobSettings", job.settings)  # what save_settings stored
+            return self._handlers.user_from_job_settings(settings)
+        if message.from_user is None:
+            self._bot.reply_to(message, "User information is missing.")
+            return None
+        user = self._user_repo.select_user(message.from_user.id)
+        if not user.approved:
+            self._bot.send_message(message.chat.id, "You are not approved.")
+            return None
+        if job is not None:
+            self._jobs.save_settings(job.id, self._handlers.job_settings(user))
+        return user
+
     # Unified handler
-    def handle_message(self, message: Message) -> None:
+    def handle_message(self, message: Message, job: JobsOrm | None = None) -> None:
         """Universal entry point: authorize the sender, then route and trace it.
 
         Every failure the summarization pipeline raises terminates here — reported to
@@ -278,13 +478,8 @@ class BotApp:
         are separate entry points and are not covered by this guard.
         """
         try:
-            if message.from_user is None:
-                self._bot.reply_to(message, "User information is missing.")
-                return
-            user = self._user_repo.select_user(message.from_user.id)
-
-            if not user.approved:
-                self._bot.send_message(message.chat.id, "You are not approved.")
+            user = self._approved_user(message, job)
+            if user is None:
                 return
 
             with self._tracer.observe_message(
@@ -296,29 +491,214 @@ class BotApp:
             ):
                 self.process_message_content(message, user)
 
-        except LimitExceededError as e:
-            capture_exception(e)
-            self._bot.reply_to(
-                message,
-                "Daily limit has been exceeded, try again tomorrow.",
-            )
-        except WebParseError as e:
+        except Exception as e:
             capture_exception(e)
+            self._bot.reply_to(message, failure_reply(e))
+
+    def run_job(self, job_id: int, message: Message) -> None:
+        """Claim a recorded job, handle its message and mark it done.
+
+        A job another worker claimed, or one already finished, is skipped. One
+        that has been started JOB_MAX_ATTEMPTS times without finishing is failed
+        and answered instead of being run again. The job stays `running` if
+        handling is interrupted, so the next start resumes it, and keeps its
+        sender's slot until then; a finished job gives the slot back. The job's
+        cancel token and a JOB_DEADLINE_SECONDS deadline are bound while it
+        runs, so /cancel stops it at the next check, or before it starts, and a
+        job out of time is failed with one timeout reply.
+        """
+        job = self._jobs.claim(job_id)
+        if job is None:
+            return
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            self._jobs.finish(job_id, "failed")
             self._bot.reply_to(
                 message,
-                "Check provided URL, looks like the page is not available.",
+                "This message could not be processed. Please send it again.",
             )
-        except RetryError as e:
-            capture_exception(e)
-            self._bot.reply_to(
-                message,
-                "An error occurred during execution. Please try again in 10 minutes.",
+        else:
+            try:
+                with (
+                    cancellation.bind(self._cancellations.token(job_id)),
+                    cancellation.deadline(JOB_DEADLINE_SECONDS),
+                ):
+                    cancellation.raise_if_stopped()
+                    self.handle_message(message, job)
+            except JobDeadlineExceededError:
+                self._jobs.finish(job_id, "failed")
+                self._bot.reply_to(
+                    message,
+                    "This message took too long to process. Please try again later.",
+                )
+            except JobCancelledError:
+                self._jobs.finish(job_id, "cancelled")
+                self._bot.reply_to(message, "Cancelled.")
+            else:
+                self._jobs.finish(job_id)
+        self._release(job_id, message)
+
+    def _dispatch(self, job_id: int, message: Message) -> None:
+        """Submit a job to its lane; fail and answer it if the lane is full.
+
+        With a stream the job goes to the worker processes instead. While
+        draining the closed pools would refuse it, so the job is left `queued`
+        for the next start to resume.
+        """
+        if self._stream is not None:
+            self._stream.publish(job_id, message.json)
+            return
+        if self._draining.is_set():
+            return
+        if not self._scheduler.submit(
+            classify_job(message),
+            message.chat.id,
+            partial(self.run_job, job_id, message),
+        ):
+            self._jobs.finish(job_id, "failed")
+            self._bot.reply_to(message, "The bot is busy. Please try again later.")
+            self._release(job_id, message)
+
+    def _update_notice(self, notice: tuple[int, int], position: int | None) -> None:
+        """Edit a position notice to `position`, or delete it once the job starts.
+
+        The notice is only a courtesy, so a sender having deleted it, or an edit
+        to the text it already has, is logged rather than failing the job.
+        """
+        chat_id, message_id = notice
+        try:
+            if position is None:
+                self._bot.delete_message(chat_id, message_id)
+            else:
+                self._bot.edit_message_text(
+                    queue_position_reply(position),
+                    chat_id,
+                    message_id,
+                )
+        except ApiTelegramException as e:
+            logger.warning("Could not update queue notice %s: %s", notice, e)
+
+    def _queue_job(self, job_id: int, message: Message) -> None:
+        """Dispatch a recorded job, or line it up behind its sender's running ones.
+
+        A sender with USER_MAX_INFLIGHT_JOBS jobs running gets a reply with this
+        job's place in line, which `_release` edits as the line moves. A job
+        promoted before its reply was recorded has it deleted at once. A resumed
+        job keeps the slot or place, and the reply, it already had.
+        """
+        if message.from_user is None:
+            self._dispatch(job_id, message)
+            return
+        user_id = message.from_user.id
+        position = self._limiter.admit(user_id, job_id)
+        if not position:
+            self._dispatch(job_id, message)
+            return
+        if job_id not in self._limiter.notices(user_id):
+            notice = self._bot.reply_to(message, queue_position_reply(position))
+            if not self._limiter.set_notice(
+                user_id,
+                job_id,
+                notice.chat.id,
+                notice.message_id,
+            ):
+                # Promoted (or withdrawn) while the reply was on its way.
+                self._update_notice((notice.chat.id, notice.message_id), None)
+
+    def _release(self, job_id: int, message: Message) -> None:
+        """Give a job's slot back, then start its sender's next jobs in line.
+
+        Whichever process frees the slot starts them, each rebuilt from its
+        recorded update; their notices are deleted and, as the line moved, the
+        ones still waiting are edited to their new place.
+        """
+        if message.from_user is None:
+            return
+        user_id = message.from_user.id
+        promoted = self._limiter.release(user_id, job_id)
+        if not promoted:
+            return
+        for promoted_id in promoted:
+            notice = self._limiter.drop_notice(user_id, promoted_id)
+            if notice is not None:
+                self._update_notice(notice, None)
+            job = self._jobs.get(promoted_id)
+            promoted_message = (
+                None if job is None else self.stored_message(promoted_id, job.update)
             )
-        except Exception as e:
-            capture_exception(e)
-            self._bot.reply_to(message, f"Unexpected: {type(e).__name__}")
+            if promoted_message is None:
+                self._release(promoted_id, message)
+                continue
+            self._dispatch(promoted_id, promoted_message)
+        notices = self._limiter.notices(user_id)
+        for position, waiting_id in enumerate(self._limiter.waiting(user_id), 1):
+            if waiting_id in notices:
+                self._update_notice(notices[waiting_id], position)
+
+    def enqueue_message(self, message: Message) -> None:
+        """Record a message as a job, then queue it behind its chat's earlier ones.
+
+        Keeps the polling thread free: a long media job occupies one worker, not
+        the thread every other chat's updates arrive on, and `classify_job` keeps
+        quick jobs out of the long lane's queue. A full lane is answered straight
+        away rather than buffered. A message delivered before, as Telegram does
+        after a crash, is dropped before it costs anything but the check.
+        """
+        if not self.first_delivery(message):
+            return
+        self._queue_job(self._jobs.add(message.chat.id, message.json), message)
+
+    def first_delivery(self, message: Message) -> bool:
+        """Return whether this is the first time the message has reached the bot."""
+        return self._dedupe.first_message(message.chat.id, message.message_id)
+
+    def resume_jobs(self) -> None:
+        """Queue the jobs a previous run left unfinished, oldest first.
+
+        Each is rebuilt from the update Telegram sent, so its answer is a reply to
+        the original message; one with no message left in it is failed. A job
+        another process is still running keeps a fresh heartbeat, so it is not
+        among them.
+        """
+        for job in self._jobs.unfinished():
+            message = self.stored_message(job.id, job.update)
+            if message is not None:
+                self._queue_job(job.id, message)
+
+    def stored_message(self, job_id: int, update: dict[str, Any]) -> Message | None:
+        """Rebuild a job's message from its recorded update.
+
+        An update that decodes to no message cannot be answered, so its job is
+        failed rather than left for every restart to trip over; None then.
+        """
+        message = Message.de_json(update)
+        if message is None:
+            logger.warning("Job %s has no message to run; failing it", job_id)
+            self._jobs.finish(job_id, "failed")
+        return message
+
+    def start_heartbeat(self) -> None:
+        """Keep this process's running jobs marked alive until `shutdown` ends.
+
+        Every JOB_HEARTBEAT_SECONDS the jobs this process claimed get a fresh
+        heartbeat, draining included, so no other process resumes them while
+        they run. A failed write is only logged: the next beat comes well
+        before JOB_STALE_SECONDS pass.
+        """
 
-    def _authorized(self, message: Message) -> bool:
+        def beat() -> None:
+            while not self._stopped.wait(JOB_HEARTBEAT_SECONDS):
+                try:
+                    self._jobs.heartbeat()
+                except SQLAlchemyError:
+                    logger.warning("Could not refresh job heartbeats", exc_info=True)
+
+        threading.Thread(target=beat, name="job-heartbeat", daemon=True).start()
+
+    def start_stats_log(self) -> None:
+        """Log the cache counters every CACHE_STATS_LOG_SECONDS until `shutdown`."""
+        self._stats_log.start(self._stopped)
+
+    def authorized(self, message: Message) -> bool:
         """Gate the settings commands on a known, approved sender.
 
         Runs as TeleBot's `func=` filter, which is evaluated outside
@@ -333,47 +713,93 @@ class BotApp:
         except ValueError:
             return False
 
+    def command_handlers(self) -> list[tuple[str, Callable[[Message], None], bool]]:
+        """List each command, its handler, and whether it needs an approved sender."""
+        return [
+            ("start", self.handle_start, False),
+            ("info", self.handle_info, False),
+            ("myinfo", self.handle_myinfo, True),
+            ("cancel", self.handle_cancel, True),
+            ("set_target_language", self.handle_set_target_language, True),
+            ("set_summarizing_model", self.handle_set_summarizing_model, True),
+            ("set_prompt_strategy", self.handle_set_prompt_strategy, True),
+            ("set_thinking_level", self.handle_set_thinking_level, True),
+            ("set_summary_cache", self.handle_set_summary_cache, True),
+        ]
+
     def register(self) -> None:
         """Register every handler on the bot. Replaces the import-time decorators."""
-        self._bot.message_handler(commands=["start"])(self.handle_start)
-        self._bot.message_handler(commands=["info"])(self.handle_info)
-        self._bot.message_handler(
-            commands=["myinfo"],
-            func=self._authorized,
-        )(self.handle_myinfo)
-        self._bot.message_handler(
-            commands=["set_target_language"],
-            func=self._authorized,
-        )(self.handle_set_target_language)
+        for command, handler, gated in self.command_handlers():
+            if gated:
+                self._bot.message_handler(
+                    commands=[command],
+                    func=self.authorized,
+                )(handler)
+            else:
+                self._bot.message_handler(commands=[command])(handler)
         self._bot.message_handler(
-            commands=["set_summarizing_model"],
-            func=self._authorized,
-        )(self.handle_set_summarizing_model)
-        self._bot.message_handler(
-            commands=["set_prompt_strategy"],
-            func=self._authorized,
-        )(self.handle_set_prompt_strategy)
-        self._bot.message_handler(
-            commands=["set_thinking_level"],
-            func=self._authorized,
-        )(self.handle_set_thinking_level)
-        self._bot.message_handler(
-            content_types=["text", "audio", "document", "video_note", "voice", "video"],
-        )(self.handle_message)
+            content_types=CONTENT_TYPES,
+        )(self.enqueue_message)
 
     def run(self) -> None:
-        """Start polling Telegram for updates."""
-        self._bot.infinity_polling(timeout=20)
+        """Start the worker pools, resume unfinished jobs, then take updates.
+
+        In polling mode a replica first waits as a standby until it holds the
+        leader lease, since Telegram allows one poller per token. Losing the
+        lease stops polling, while the jobs already running drain. Whichever
+        process resumes jobs — a new leader, a webhook replica, a rolled-out
+        one — skips those another live process keeps a heartbeat on, so no job
+        runs twice however the lease or the deploy went. The ingest role runs
+        no jobs, so it starts no pools and resumes nothing: a job a worker
+        process dropped is still pending in the stream, where another worker
+        takes it over.
+        """
+        if self._webhook is None:
+            self._lease.wait()
+            self._lease.keep(self._bot.stop_polling)
+        self.start_stats_log()
+        if self._stream is None:
+            self._scheduler.start()
+            self.start_heartbeat()
+            self.resume_jobs()
+        if self._webhook is None:
+            # A webhook left registered by webhook mode makes getUpdates fail.
+            self._bot.remove_webhook()
+            self._bot.infinity_polling(timeout=20)
+        else:
+            self._webhook.listen()
+            self._webhook.serve_forever()
 
     def shutdown(self) -> None:
-        """Remove temp download files and flush the tracer.
-
-        The sweep unlinks files directly, so one `OSError` would otherwise cost
-        every span still buffered in the tracer.
+        """Stop taking updates, drain the running jobs, sweep temp files, flush.
+
+        The leader lease is released as soon as polling stops, so a standby
+        takes updates over without waiting out the drain. The pools then get
+        SHUTDOWN_DRAIN_SECONDS to finish their jobs, their heartbeats kept
+        fresh meanwhile, so the new leader does not resume them. Whatever is
+        left then stays unfinished, for a later start to resume once its
+        heartbeat goes stale, and the sweep is skipped so it cannot delete a
+        file a still-running job is reading. The sweep unlinks files directly,
+        so one `OSError` would otherwise cost every span still buffered in the
+        tracer.
         """
         try:
-            clean_up(all_downloads=True)
+            if self._webhook is not None:
+                self._webhook.close()
+            else:
+                self._bot.stop_polling()
+                self._lease.release()
+            self._draining.set()
+            left = self._scheduler.shutdown(SHUTDOWN_DRAIN_SECONDS)
+            if left:
+                logger.warning(
+                    "Shutdown left %d job(s) unfinished; they resume on restart",
+                    left,
+                )
+            else:
+                clean_up(all_downloads=True)
         finally:
+            self._stopped.set()
             self._tracer.shutdown()
 
 
@@ -382,9 +808,18 @@ def build_app(container: Container) -> BotApp:
     app = BotApp(
         container.bot,
         container.user_repo,
+        container.jobs,
+        container.limiter,
+        container.cancellations,
+        container.dedupe,
+        container.lease,
         container.quota_manager,
         container.tracer,
         container.handlers,
+        container.stats_log,
+        container.scheduler,
+        container.stream if BOT_ROLE == "ingest" else None,
+        container.webhook,
     )
     app.register()
     return app
@@ -392,6 +827,9 @@ def build_app(container: Container) -> BotApp:
 
 if __name__ == "__main__":
     app = build_app(build_container())
+    # A deploy stops the container with SIGTERM; raising KeyboardInterrupt for it
+    # too unwinds through the `finally`, so the jobs drain before the exit.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
     try:
         app.run()
     finally:
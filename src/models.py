@@ -1,4 +1,7 @@
-from sqlalchemy import BigInteger
+from datetime import datetime  # noqa: TC003 — SQLAlchemy resolves Mapped[] at runtime
+from typing import Any
+
+from sqlalchemy import JSON, BigInteger, Integer, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -33,3 +36,31 @@ class UsersOrm(Base):
     )
     daily_limit: Mapped[int] = mapped_column(server_default="0")
     thinking_level: Mapped[str] = mapped_column(server_default="medium")
+    use_summary_cache: Mapped[bool] = mapped_column(server_default="True")
+
+
+class JobsOrm(Base):
+    """The `jobs` table: one row per summarization update, kept across restarts.
+
+    `update` is the message as Telegram sent it, so a resumed job replies to the
+    original message. `settings` is the user's summarize() kwargs, recorded when
+    the job first starts, so a resumed job runs with the settings it began with.
+    `state` is one of `queued`, `running`, `done`, `failed` or `cancelled`. A
+    `running` job names the process running it in `claimed_by`, which refreshes
+    `heartbeat_at` (UTC) for as long as it lives.
+    """
+
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer(), "sqlite"),
+        primary_key=True,
+    )
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    update: Mapped[dict[str, Any]] = mapped_column(JSON)
+    settings: Mapped[dict[str, Any] | None] = mapped_column(JSON)
+    state: Mapped[str] = mapped_column(server_default="queued", index=True)
+    attempts: Mapped[int] = mapped_column(server_default="0")
+    created_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    claimed_by: Mapped[str | None]
+    heartbeat_at: Mapped[datetime | None]
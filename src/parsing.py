@@ -18,15 +18,18 @@ from tenacity import (
     wait_fixed,
 )
 
+import cancellation
 from domain import PrefixedText
 from exceptions import WebParseError
-from utils import get_proxy
+from utils import canonical_source, get_proxy
 
 if TYPE_CHECKING:
     from exa_py import Exa
     from tavily import TavilyClient
     from tenacity import _utils as tenacity_utils
 
+    from caching import PrefixedTextCache, TtlCache
+
 logger = logging.getLogger(__name__)
 tenacity_logger = cast("tenacity_utils.LoggerProtocol", logger)
 
@@ -56,6 +59,7 @@ class ExaBackend(ParserBackend):
         stop=stop_after_attempt(2),
         wait=wait_fixed(5),
         retry=retry_if_exception_type(WebParseError),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=True,
     )
@@ -99,6 +103,7 @@ class TavilyBackend(ParserBackend):
         stop=stop_after_attempt(2),
         wait=wait_fixed(5),
         retry=retry_if_exception_type(TavilyTimeoutError),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=False,
     )
@@ -126,10 +131,24 @@ class TavilyBackend(ParserBackend):
 
 
 class UrlResolver:
-    """Resolves a URL to its final post-redirect destination, guarding against SSRF."""
+    """Resolves a URL to its final post-redirect destination, guarding against SSRF.
+
+    Where a URL redirects to is kept in `redirects`, and each hostname's
+    public-or-not verdict in `verdicts`, so a link shared again skips both the
+    DNS lookups and the request. The verdict cache's TTL stands in for the DNS
+    TTL, which getaddrinfo does not report, and a cached redirect's target is
+    checked against it on every use.
+    """
 
-    def __init__(self, timeout: int = 10) -> None:
-        """Store the per-request timeout in seconds."""
+    def __init__(
+        self,
+        redirects: TtlCache[str],
+        verdicts: TtlCache[bool],
+        timeout: int = 10,
+    ) -> None:
+        """Store the redirect and hostname caches and the request timeout."""
+        self._redirects = redirects
+        self._verdicts = verdicts
         self._timeout = timeout
 
     def resolve(self, url: str) -> str:
@@ -141,28 +160,20 @@ class UrlResolver:
         (timeout, network error) is logged and the original URL is returned
         unchanged. Non-public hosts (private, loopback, link-local) are
         rejected before the request and after redirect to prevent SSRF.
+        Successful resolutions are cached; failures are tried again next time.
         """
-        if not self._is_public(url):
+        if not self._allowed(url):
             logger.warning("Blocked non-public URL: %s", url)
             return url
-        try:
-            response = requests.get(
-                url,
-                stream=True,
-                allow_redirects=True,
-                impersonate="chrome",
-                verify=True,
-                timeout=self._timeout,
-                proxy=get_proxy() or None,
-            )
+        resolved = self._redirects.get(url)
+        if resolved is None:
             try:
-                resolved = response.url or url
-            finally:
-                response.close()
-        except Exception:  # best-effort: never let resolution break parsing
-            logger.warning("Could not resolve redirects for %s", url, exc_info=True)
-            return url
-        if not self._is_public(resolved):
+                resolved = self._follow(url)
+            except Exception:  # best-effort: never let resolution break parsing
+                logger.warning("Could not resolve redirects for %s", url, exc_info=True)
+                return url
+            self._redirects.put(url, resolved)
+        if not self._allowed(resolved):
             logger.warning(
                 "Blocked redirect to non-public host: %s -> %s",
                 url,
@@ -173,6 +184,30 @@ class UrlResolver:
             logger.info("Resolved %s -> %s", url, resolved)
         return resolved
 
+    def _follow(self, url: str) -> str:
+        response = requests.get(
+            url,
+            stream=True,
+            allow_redirects=True,
+            impersonate="chrome",
+            verify=True,
+            timeout=self._timeout,
+            proxy=get_proxy() or None,
+        )
+        try:
+            return response.url or url
+        finally:
+            response.close()
+
+    def _allowed(self, url: str) -> bool:
+        """Return `_is_public` for the URL's hostname, cached by hostname."""
+        hostname = (urlsplit(url).hostname or "").rstrip(".")
+        verdict = self._verdicts.get(hostname)
+        if verdict is None:
+            verdict = self._is_public(url)
+            self._verdicts.put(hostname, verdict)
+        return verdict
+
     @staticmethod
     def _is_public(url: str) -> bool:
         """Return True only if every resolved IP for the hostname is globally routable.
@@ -194,24 +229,32 @@ class UrlResolver:
 
 
 class WebParser:
-    """Orchestrate redirect resolution, then primary→fallback content extraction."""
+    """Orchestrate redirect resolution, then primary→fallback content extraction.
+
+    Extracted pages are cached by their resolved URL, so a link shared in
+    several chats reaches Exa or Tavily once.
+    """
 
     def __init__(
         self,
         primary: ParserBackend,
         fallback: ParserBackend,
         resolver: UrlResolver,
+        cache: PrefixedTextCache,
     ) -> None:
-        """Store the primary/fallback backends and the URL resolver."""
+        """Store the primary/fallback backends, the URL resolver and the cache."""
         self._primary = primary
         self._fallback = fallback
         self._resolver = resolver
+        self._cache = cache
 
     def parse(self, url: str) -> PrefixedText:
         """Resolve redirects, then extract main textual content from the URL.
 
-        Resolves the final destination (best-effort, SSRF-guarded), parses with
-        the primary backend first, and falls back to the secondary on failure.
+        Resolves the final destination (best-effort, SSRF-guarded), answers from
+        the cache when the resolved URL was parsed recently, and otherwise
+        parses with the primary backend first, falling back to the secondary on
+        failure.
 
         Returns:
             PrefixedText: The extracted content and source display prefix.
@@ -223,6 +266,15 @@ class WebParser:
 
         """
         url = self._resolver.resolve(url)
+        key = canonical_source(url)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        parsed = self._extract(url)
+        self._cache.put(key, parsed)
+        return parsed
+
+    def _extract(self, url: str) -> PrefixedText:
         try:
             return PrefixedText(
                 text=self._primary.parse(url),
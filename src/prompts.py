@@ -1,6 +1,7 @@
 # ruff: noqa: E501
 
 from hashlib import sha256
+from textwrap import dedent
 
 PROMPTS = {
     "basic_prompt_for_transcript": """
@@ -41,3 +42,13 @@ def prompt_version(prompt_key: str) -> str:
     """
     payload = f"{SYSTEM_INSTRUCTION}\0{PROMPTS[prompt_key]}"
     return sha256(payload.encode()).hexdigest()[:12]
+
+
+def strategy_prompt(prompt_key: str) -> str:
+    """Return the `prompt_key` strategy's prompt as it is sent: dedented, stripped."""
+    return dedent(PROMPTS[prompt_key]).strip()
+
+
+def system_instruction(target_language: str) -> str:
+    """Return the system instruction for `target_language` as it is sent."""
+    return dedent(SYSTEM_INSTRUCTION.format(language=target_language)).strip()
@@ -19,8 +19,9 @@ from tenacity import (
     wait_fixed,
 )
 
+import cancellation
 from config import DAILY_LIMIT_KEY, MINUTE_LIMIT_KEY
-from exceptions import LimitExceededError
+from exceptions import JobCancelledError, LimitExceededError
 from prompts import prompt_version
 
 if TYPE_CHECKING:
@@ -66,6 +67,7 @@ class Messenger:
         stop=stop_after_attempt(3),
         wait=wait_fixed(30),
         retry=retry_if_exception_type(ReadTimeout),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=True,
     )
@@ -106,6 +108,8 @@ class QuotaManager:
 
         Raises:
             LimitExceededError: If the user's daily budget is already spent.
+            JobCancelledError: If the job is cancelled, or out of time, while
+                waiting on the minute.
 
         """
         if daily_limit <= 0:
@@ -132,7 +136,7 @@ class QuotaManager:
                 self._per_minute_rate,
                 MINUTE_LIMIT_KEY,
             )
-            time.sleep(max(0.0, stats.reset_time - time.time()))
+            cancellation.sleep(max(0.0, stats.reset_time - time.time()))
 
     def get_remaining_quota(self, user_id: int, daily_limit: int) -> int:
         """Return remaining daily requests for a user without consuming quota."""
@@ -166,6 +170,11 @@ class GeminiHelper:
         """Upload a file to Gemini and wait for processing to finish.
 
         `sleep_time` is the interval between polls of the processing state.
+
+        Raises:
+            JobCancelledError: If the job is cancelled, or out of time, while the
+                file processes; the upload is deleted first.
+
         """
         uploaded = self._client.files.upload(
             file=file,
@@ -175,7 +184,14 @@ class GeminiHelper:
             raise AttributeError
         file_name = uploaded.name
         while uploaded.state == "PROCESSING":
-            time.sleep(sleep_time)
+            try:
+                cancellation.sleep(sleep_time)
+            except JobCancelledError:
+                try:
+                    self.delete_file(file_name)
+                except Exception as e:
+                    logger.warning("Failed to delete Gemini file %s: %s", file_name, e)
+                raise
             uploaded = self._client.files.get(name=file_name)
         if uploaded.state == "FAILED":
             raise ValueError(uploaded.state)
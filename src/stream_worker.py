@@ -0,0 +1,148 @@
+"""Worker entry point: runs the jobs an ingest process adds to the job stream."""
+
+from __future__ import annotations
+
+import signal
+import threading
+from functools import partial
+from typing import TYPE_CHECKING
+
+from config import (
+    JOB_STREAM_BLOCK_MS,
+    JOB_STREAM_CLAIM_IDLE_MS,
+    JOB_STREAM_READ_COUNT,
+)
+from container import build_container
+from main import BotApp, classify_job
+
+if TYPE_CHECKING:
+    from telebot.types import Message
+
+    from container import Container
+    from database import JobRepository
+    from streams import JobStream, StreamEntry
+    from workers import Scheduler
+
+
+class StreamWorker:
+    """Consumes the job stream and runs each job on this process's worker pools.
+
+    Many of these share the stream's consumer group, so summarizing scales out
+    across processes while one ingest `BotApp` talks to Telegram. An entry is
+    acknowledged only once `BotApp.run_job` returns, that is once the user has
+    been answered; until then a dead worker's entries stay pending for another
+    worker to take over. Per-chat order holds within one worker only.
+    """
+
+    def __init__(
+        self,
+        app: BotApp,
+        stream: JobStream,
+        scheduler: Scheduler,
+        jobs: JobRepository,
+        claim_idle_ms: int,
+    ) -> None:
+        """Store the injected collaborators and how long an entry may sit idle."""
+        self._app = app
+        self._stream = stream
+        self._scheduler = scheduler
+        self._jobs = jobs
+        self._claim_idle_ms = claim_idle_ms
+        self._stopping = threading.Event()
+
+    def _run(self, entry: StreamEntry, message: Message) -> None:
+        """Run the entry's job, then acknowledge it.
+
+        A raising job is not acknowledged, so another worker retries it later.
+        """
+        self._app.run_job(entry.job_id, message)
+        self._stream.ack(entry.entry_id)
+
+    def _dispatch(self, entry: StreamEntry, *, taken_over: bool) -> None:
+        """Submit an entry to its lane, waiting while the lane is full.
+
+        Waiting keeps a full worker from reading entries other workers could run.
+        A taken-over job is put back to `queued` first: its worker died while it
+        was `running`, and `run_job` only claims queued jobs. An entry whose
+        update holds no message has its job failed and is acknowledged.
+        """
+        message = self._app.stored_message(entry.job_id, entry.update)
+        if message is None:
+            self._stream.ack(entry.entry_id)
+            return
+        if taken_over:
+            self._jobs.requeue(entry.job_id)
+        while not self._scheduler.submit(
+            classify_job(message),
+            message.chat.id,
+            partial(self._run, entry, message),
+        ):
+            if self._stopping.wait(1):
+                return
+
+    def poll_once(self) -> None:
+        """Take over stale entries, then read and dispatch a batch of new ones."""
+        for entry in self._stream.claim_stale(
+            self._claim_idle_ms,
+            JOB_STREAM_READ_COUNT,
+        ):
+            self._dispatch(entry, taken_over=True)
+        for entry in self._stream.read(JOB_STREAM_READ_COUNT, JOB_STREAM_BLOCK_MS):
+            self._dispatch(entry, taken_over=False)
+
+    def run(self) -> None:
+        """Join the consumer group, start the pools, heartbeats and stats, then poll."""
+        self._stream.ensure_group()
+        self._scheduler.start()
+        self._app.start_heartbeat()
+        self._app.start_stats_log()
+        while not self._stopping.is_set():
+            self.poll_once()
+
+    def shutdown(self) -> None:
+        """Stop reading, then let `BotApp.shutdown` finish the jobs already taken."""
+        self._stopping.set()
+        self._app.shutdown()
+
+
+def build_stream_worker(container: Container) -> StreamWorker:
+    """Build the StreamWorker from the composition root.
+
+    Its `BotApp` only runs jobs, so it registers no handlers and gets no
+    webhook. It does get the stream: a job it starts when another job frees
+    its sender's slot goes back through the stream, like any other.
+    """
+    app = BotApp(
+        container.bot,
+        container.user_repo,
+        container.jobs,
+        container.limiter,
+        container.cancellations,
+        container.dedupe,
+        container.lease,
+        container.quota_manager,
+        container.tracer,
+        container.handlers,
+        container.stats_log,
+        container.scheduler,
+        container.stream,
+        None,
+    )
+    return StreamWorker(
+        app,
+        container.stream,
+        container.scheduler,
+        container.jobs,
+        JOB_STREAM_CLAIM_IDLE_MS,
+    )
+
+
+if __name__ == "__main__":
+    worker = build_stream_worker(build_container())
+    # A deploy stops the container with SIGTERM; raising KeyboardInterrupt for it
+    # too unwinds through the `finally`, so the jobs drain before the exit.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        worker.run()
+    finally:
+        worker.shutdown()
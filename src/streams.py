@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, cast
+
+from redis.exceptions import ResponseError
+
+if TYPE_CHECKING:
+    import redis
+
+
+@dataclass(frozen=True)
+class StreamEntry:
+    """One job as read from the stream: its entry id, job id and Telegram update."""
+
+    entry_id: str
+    job_id: int
+    update: dict[str, Any]
+
+
+class JobStream:
+    """Valkey stream that carries recorded jobs from the ingest process to workers.
+
+    An entry names the `jobs` row and carries the update itself, so a worker
+    rebuilds the message without a Postgres read. Workers read as one consumer
+    group, so each entry goes to one of them; it stays pending until `ack`, and
+    a pending entry left idle long enough is taken over by `claim_stale`.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        stream: str,
+        group: str,
+        consumer: str,
+        maxlen: int,
+    ) -> None:
+        """Store the client and the stream, group and consumer names."""
+        self._client = client
+        self._stream = stream
+        self._group = group
+        self._consumer = consumer
+        self._maxlen = maxlen
+
+    def publish(self, job_id: int, update: dict[str, Any]) -> None:
+        """Append a job, trimming the oldest entries past roughly `maxlen`."""
+        self._client.xadd(
+            self._stream,
+            {"job_id": job_id, "update": json.dumps(update)},
+            maxlen=self._maxlen,
+            approximate=True,
+        )
+
+    def ensure_group(self) -> None:
+        """Create the stream and its consumer group, unless they already exist.
+
+        Raises:
+            ResponseError: For any failure other than the group existing.
+
+        """
+        try:
+            self._client.xgroup_create(self._stream, self._group, id="0", mkstream=True)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def read(self, count: int, block_ms: int) -> list[StreamEntry]:
+        """Take up to `count` new entries, waiting up to `block_ms` for the first."""
+        reply = cast(
+            "list[tuple[str, list[tuple[str, dict[str, str]]]]] | None",
+            self._client.xreadgroup(
+                self._group,
+                self._consumer,
+                {self._stream: ">"},
+                count=count,
+                block=block_ms,
+            ),
+        )
+        return [
+            self._entry(entry_id, fields)
+            for _, entries in reply or []
+            for entry_id, fields in entries
+        ]
+
+    def claim_stale(self, min_idle_ms: int, count: int) -> list[StreamEntry]:
+        """Take over up to `count` entries another consumer left pending too long."""
+        _, entries, _ = self._client.xautoclaim(
+            self._stream,
+            self._group,
+            self._consumer,
+            min_idle_ms,
+            start_id="0-0",
+            count=count,
+        )
+        return [self._entry(entry_id, fields) for entry_id, fields in entries]
+
+    def ack(self, entry_id: str) -> None:
+        """Acknowledge an entry, so it is never delivered again."""
+        self._client.xack(self._stream, self._group, entry_id)
+
+    @staticmethod
+    def _entry(entry_id: str, fields: dict[str, str]) -> StreamEntry:
+        return StreamEntry(
+            entry_id,
+            int(fields["job_id"]),
+            json.loads(fields["update"]),
+        )
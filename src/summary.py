@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import logging
-from textwrap import dedent
 from typing import TYPE_CHECKING, cast
 
 from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError
 from curl_cffi.requests.exceptions import SSLError as CurlSSLError
-from pydantic_ai.exceptions import ModelAPIError, UnexpectedModelBehavior
+from pydantic_ai.exceptions import (
+    ModelAPIError,
+    ModelHTTPError,
+    UnexpectedModelBehavior,
+)
 from requests.exceptions import SSLError
 from telebot.types import File
 from tenacity import (
@@ -18,11 +21,12 @@ from tenacity import (
     wait_fixed,
 )
 
+import cancellation
 from config import DEFAULT_MODEL_ID_FOR_SUMMARY, MODEL_SPECS
 from domain import format_prefixed_summary
-from exceptions import FetchTranscriptError
-from prompts import PROMPTS
-from utils import classify_url, clean_up, compress_audio, generate_temporary_name
+from exceptions import CachedContextGoneError, FetchTranscriptError
+from prompts import strategy_prompt
+from utils import classify_url, clean_up, file_sha256, generate_temporary_name
 
 if TYPE_CHECKING:
     from tenacity import _utils as tenacity_utils
@@ -30,11 +34,17 @@ if TYPE_CHECKING:
     from download import Downloader
     from llm import LLMClient
     from services import GeminiHelper, QuotaManager
+    from transcoding import Transcoder
     from transcription import AudioTranscriber, YouTubeTranscriber
+    from uploads import UploadRegistry
 
 logger = logging.getLogger(__name__)
 tenacity_logger = cast("tenacity_utils.LoggerProtocol", logger)
 
+# Statuses with which Gemini refuses a file reference: the upload was deleted
+# or has expired early, so the registry's record of it is stale.
+_GONE_UPLOAD_STATUSES = frozenset({403, 404})
+
 
 class Summarizer:
     """Generates model-backed summaries from audio, video, documents, and URLs."""
@@ -47,6 +57,8 @@ class Summarizer:
         downloader: Downloader,
         audio_transcriber: AudioTranscriber,
         yt_transcriber: YouTubeTranscriber,
+        transcoder: Transcoder,
+        uploads: UploadRegistry,
     ) -> None:
         """Store the injected collaborators used to build a summary."""
         self._quota_manager = quota_manager
@@ -55,6 +67,8 @@ class Summarizer:
         self._downloader = downloader
         self._audio_transcriber = audio_transcriber
         self._yt_transcriber = yt_transcriber
+        self._transcoder = transcoder
+        self._uploads = uploads
 
     def _summarize_uploaded_file(
         self,
@@ -67,24 +81,38 @@ class Summarizer:
         daily_limit: int,
         thinking_level: str,
     ) -> str:
-        """Upload a local file to the provider, summarize it, then delete the upload.
+        """Summarize a local file through the provider's file API.
 
         Shared by the audio and document paths; the caller owns `file` on disk,
         has already run the non-consuming quota pre-check, and carries the
-        `@retry` this runs under — so this method must stay undecorated.
+        `@retry` this runs under — so this method must stay undecorated. The
+        upload is looked up in the registry by the file's SHA-256 and made only
+        if no live one exists, so a retry or a repeat file skips it; uploads
+        are deleted when the registry evicts them, or expire on Gemini's side.
+        A job cancelled by the time the upload is ready stops before the model
+        call.
         """
-        prompt = dedent(PROMPTS[prompt_key]).strip()
-        uploaded = self._gemini_helper.upload_and_wait_for_file(
-            file=file,
-            mime_type=mime_type,
+        prompt = strategy_prompt(prompt_key)
+        digest = file_sha256(file)
+        uploaded = self._uploads.get(digest)
+        if uploaded is None:
+            uploaded = self._gemini_helper.upload_and_wait_for_file(
+                file=file,
+                mime_type=mime_type,
+            )
+            uploaded, stale = self._uploads.put(digest, uploaded)
+            for name in stale:
+                try:
+                    self._gemini_helper.delete_file(name)
+                except Exception as e:
+                    logger.warning("Failed to delete Gemini file %s: %s", name, e)
+        cancellation.raise_if_stopped()
+        self._quota_manager.check_quota(
+            user_id=user_id,
+            daily_limit=daily_limit,
+            quantity=1,
         )
-        uploaded_name = cast("str", uploaded.name)
         try:
-            self._quota_manager.check_quota(
-                user_id=user_id,
-                daily_limit=daily_limit,
-                quantity=1,
-            )
             return self._llm_client.run(
                 content=[
                     prompt,
@@ -96,16 +124,16 @@ class Summarizer:
                 model_id=model,
                 target_language=target_language,
                 thinking_level=thinking_level,
+                prompt_key=prompt_key,
             )
-        finally:
-            try:
-                self._gemini_helper.delete_file(uploaded_name)
-            except Exception as e:
-                logger.warning(
-                    "Failed to delete Gemini file %s: %s",
-                    uploaded_name,
-                    e,
-                )
+        except ModelHTTPError as e:
+            # A gone cached context is not a gone upload; the file is fine.
+            if e.status_code in _GONE_UPLOAD_STATUSES and not isinstance(
+                e,
+                CachedContextGoneError,
+            ):
+                self._uploads.discard(digest)
+            raise
 
     @retry(
         stop=stop_after_attempt(2),
@@ -113,6 +141,7 @@ class Summarizer:
         retry=retry_if_exception_type(
             (ModelAPIError, AttributeError, UnexpectedModelBehavior, SSLError),
         ),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=False,
     )
@@ -158,6 +187,7 @@ class Summarizer:
         retry=retry_if_exception_type(
             (ModelAPIError, AttributeError, UnexpectedModelBehavior),
         ),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=False,
     )
@@ -186,7 +216,7 @@ class Summarizer:
                 for it is retried and then wrapped, never re-raised.
 
         """
-        prompt = dedent(PROMPTS[prompt_key]).strip()
+        prompt = strategy_prompt(prompt_key)
         # Silent or music-only audio gives WhisperX no segments, so the rescue
         # path can hand us "". Sending that as its own part would put an empty
         # text part in the request; the concatenated form used to swallow it.
@@ -201,6 +231,7 @@ class Summarizer:
             model_id=model,
             target_language=target_language,
             thinking_level=thinking_level,
+            prompt_key=prompt_key,
         )
 
     @retry(
@@ -216,6 +247,7 @@ class Summarizer:
                 CurlConnectionError,
             ),
         ),
+        sleep=cancellation.sleep,
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
         reraise=False,
     )
@@ -395,7 +427,7 @@ class Summarizer:
         """
         new_file = generate_temporary_name(ext=".ogg")
         try:
-            compress_audio(input_file=data, output_file=new_file)
+            self._transcoder.compress_audio(input_file=data, output_file=new_file)
             transcription = self._audio_transcriber.transcribe(new_file)
             return format_prefixed_summary(
                 "📝",
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import logging
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class EncodeStats:
+    """How one encode went: time queued for a slot, time encoding, output size."""
+
+    waited: float
+    seconds: float
+    output_bytes: int
+
+
+class Transcoder:
+    """Runs ffmpeg encodes, at most `max_concurrent` at a time.
+
+    Every job that needs an encode shares these slots, so a burst of videos
+    queues here instead of starting one CPU-bound ffmpeg each and slowing every
+    other job down. Each encode runs under `nice`, with `threads` decoder
+    threads, and is killed after `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        timeout: float,
+        nice: int,
+        threads: int,
+    ) -> None:
+        """Store the encode limits; `nice` 0 runs ffmpeg at normal priority."""
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._timeout = timeout
+        self._nice = nice
+        self._threads = threads
+
+    def _command(self, input_file: str, output_file: str) -> list[str]:
+        """Return the ffmpeg command line, prefixed with `nice` when it is set."""
+        command = [
+            "ffmpeg",  # /usr/bin/ffmpeg
+            "-y",
+            "-threads",
+            str(self._threads),
+            "-i",
+            input_file,
+            "-vn",
+            "-ac",
+            "1",
+            "-c:a",
+            "libopus",
+            "-b:a",
+            "16k",
+            output_file,
+        ]
+        if self._nice:
+            return ["nice", "-n", str(self._nice), *command]
+        return command
+
+    def compress_audio(self, input_file: str, output_file: str) -> EncodeStats:
+        """Compress an audio file to mono 16 kbps Opus, stripping any video stream.
+
+        Waits for a free slot first. Requires ffmpeg (and `nice`) on PATH.
+
+        Raises:
+            subprocess.CalledProcessError: If the ffmpeg command fails.
+            subprocess.TimeoutExpired: If it runs past the timeout; ffmpeg is killed.
+
+        Returns:
+            EncodeStats: The wait, the encode time and the size of `output_file`.
+
+        """
+        queued = time.perf_counter()
+        with self._slots:
+            started = time.perf_counter()
+            subprocess.run(
+                self._command(input_file, output_file),
+                check=True,
+                capture_output=False,
+                timeout=self._timeout,
+            )
+            finished = time.perf_counter()
+        stats = EncodeStats(
+            waited=started - queued,
+            seconds=finished - started,
+            output_bytes=Path(output_file).stat().st_size,
+        )
+        logger.info(
+            "Encoded %s in %.2fs after %.2fs queued, %d bytes",
+            input_file,
+            stats.seconds,
+            stats.waited,
+            stats.output_bytes,
+        )
+        return stats
@@ -2,11 +2,11 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
 import time
 from abc import ABC, abstractmethod
 from pathlib import Path
 from typing import TYPE_CHECKING, Any, ClassVar, cast
-from urllib.parse import parse_qs, urlsplit
 
 from defusedxml.ElementTree import ParseError
 from replicate.exceptions import ModelError, ReplicateError
@@ -23,47 +23,111 @@ from youtube_transcript_api._errors import (
     IpBlocked,
     NoTranscriptFound,
     RequestBlocked,
+    TranscriptsDisabled,
 )
 from youtube_transcript_api.formatters import TextFormatter
 from youtube_transcript_api.proxies import GenericProxyConfig
 from yt_dlp import YoutubeDL
 from yt_dlp.utils import DownloadError
 
-from config import YT_HOSTS
+import cancellation
 from domain import PrefixedText
 from exceptions import (
     FetchTranscriptError,
+    JobCancelledError,
     TranscriptDownloadError,
 )
 from utils import (
     clean_up,
     generate_temporary_name,
     get_proxy,
+    youtube_video_id,
 )
 
 if TYPE_CHECKING:
     import replicate as replicate_lib
+    from replicate.prediction import Prediction
     from tenacity import _utils as tenacity_utils
 
+    from caching import PrefixedTextCache, VideoInfoCache
+
 logger = logging.getLogger(__name__)
 tenacity_logger = cast("tenacity_utils.LoggerProtocol", logger)
 
 
 class AudioTranscriber:
-    """Transcribes audio files via the Replicate WhisperX model."""
+    """Transcribes audio files via the Replicate WhisperX model.
+
+    The model's latest version is looked up once and reused for
+    `refresh_interval` seconds, saving two API calls per transcription, or is
+    fixed by `pinned_version`. A version Replicate refuses as unknown — it was
+    deleted, or replaced since the lookup — is looked up again once and the
+    prediction retried; a refused pinned version is not. Replicate also answers
+    422 for input it cannot use, such as unsupported audio, so a 422 counts as
+    a refused version only when its detail names the version; any other is
+    left to the retry policy.
+    """
 
     # How long to wait between polls of the prediction's status.
     _POLL_SECONDS: ClassVar[int] = 10
+    _MODEL: ClassVar[str] = "victor-upmeet/whisperx"
+    # Replicate refuses a prediction for a version it no longer has with a 404,
+    # or with a 422 whose detail is about the version.
+    _STALE_VERSION_STATUS: ClassVar[int] = 404
+    _INVALID_INPUT_STATUS: ClassVar[int] = 422
 
-    def __init__(self, client: replicate_lib.Client) -> None:
-        """Store the injected Replicate client."""
+    def __init__(
+        self,
+        client: replicate_lib.Client,
+        pinned_version: str | None = None,
+        refresh_interval: float = 6 * 3600,
+    ) -> None:
+        """Store the injected Replicate client and how the version is chosen."""
         self._client = client
+        self._pinned_version = pinned_version
+        self._refresh_interval = refresh_interval
+        self._version_lock = threading.Lock()
+        self._version: str | None = None
+        self._version_expires = 0.0
+
+    def _current_version(self, refresh: bool = False) -> str:
+        """Return the version to run, looking it up if stale or `refresh`."""
+        if self._pinned_version:
+            return self._pinned_version
+        with self._version_lock:
+            if (
+                refresh
+                or self._version is None
+                or (time.monotonic() >= self._version_expires)
+            ):
+                model = self._client.models.get(self._MODEL)
+                self._version = model.versions.list()[0].id
+                self._version_expires = time.monotonic() + self._refresh_interval
+            return self._version
+
+    @classmethod
+    def _refused_version(cls, error: ReplicateError, version: str) -> bool:
+        """Whether Replicate refused `version` itself, rather than the input."""
+        if error.status == cls._STALE_VERSION_STATUS:
+            return True
+        detail = (error.detail or "").lower()
+        return error.status == cls._INVALID_INPUT_STATUS and (
+            "version" in detail or version.lower() in detail
+        )
+
+    def _create_prediction(self, file: str, version: str) -> Prediction:
+        with Path(file).open("rb") as audio:
+            return self._client.predictions.create(
+                version=version,
+                input={"audio_file": audio},
+            )
 
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_fixed(10),
         retry=retry_if_exception_type(ReplicateError),
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
+        sleep=cancellation.sleep,
         reraise=False,
     )
     def transcribe(self, file: str) -> str:
@@ -72,20 +136,31 @@ class AudioTranscriber:
         Raises:
             ModelError: If the transcription fails, is canceled, or output is invalid.
             RetryError: If Replicate errors persist after all retry attempts.
+            JobCancelledError: If the job is cancelled, or out of time, while the
+                prediction runs; the prediction is cancelled first, so it
+                stops billing.
 
         """
-        model = self._client.models.get("victor-upmeet/whisperx")
-        version = model.versions.list()[0]
-        with Path(file).open("rb") as audio:
-            prediction = self._client.predictions.create(
-                version=version,
-                input={"audio_file": audio},
+        version = self._current_version()
+        try:
+            prediction = self._create_prediction(file, version)
+        except ReplicateError as e:
+            if self._pinned_version or not self._refused_version(e, version):
+                raise
+            logger.warning("Replicate refused version %s, looking it up again", version)
+            prediction = self._create_prediction(
+                file,
+                self._current_version(refresh=True),
             )
         while prediction.status != "succeeded":
             if prediction.status in ("failed", "canceled"):
                 raise ModelError(prediction)
             prediction.reload()
-            time.sleep(self._POLL_SECONDS)
+            try:
+                cancellation.sleep(self._POLL_SECONDS)
+            except JobCancelledError:
+                prediction.cancel()
+                raise
         if prediction.output is None:
             raise ModelError(prediction)
         segments = prediction.output.get("segments")
@@ -101,10 +176,15 @@ class AudioTranscriber:
 
 
 class TranscriptBackend(ABC):
-    """Abstract base for YouTube transcript-fetching backends."""
+    """Abstract base for YouTube transcript-fetching backends.
+
+    `absent` lists the errors by which a backend reports that the video has no
+    transcript at all, as opposed to failing to fetch one.
+    """
 
     name: str
     prefix: str
+    absent: ClassVar[tuple[type[Exception], ...]] = ()
 
     @abstractmethod
     def fetch(self, url: str, video_id: str) -> str:
@@ -116,6 +196,7 @@ class ApiBackend(TranscriptBackend):
 
     name = "youtube_transcript_api"
     prefix = "📺"
+    absent = (NoTranscriptFound, TranscriptsDisabled)
 
     @retry(
         stop=stop_after_attempt(2),
@@ -131,6 +212,7 @@ class ApiBackend(TranscriptBackend):
             ),
         ),
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
+        sleep=cancellation.sleep,
         reraise=False,
     )
     def fetch_via_api(self, video_id: str) -> str:
@@ -158,7 +240,7 @@ class ApiBackend(TranscriptBackend):
             # Deliberate cooldown between back-to-back requests: rapid calls get
             # rate-limited/blocked by YouTube. Do not shorten or remove.
             # See https://github.com/jdepoix/youtube-transcript-api/issues/572
-            time.sleep(60)
+            cancellation.sleep(60)
             transcript = ytt_api.fetch(video_id, languages=language_codes)
         return TextFormatter().format_transcript(transcript)
 
@@ -173,6 +255,10 @@ class YtDlpBackend(TranscriptBackend):
     name = "yt-dlp"
     prefix = "📹"
 
+    def __init__(self, info: VideoInfoCache) -> None:
+        """Store the info cache shared with the audio download."""
+        self._info = info
+
     @staticmethod
     def _vtt_to_text(vtt_path: Path) -> str:
         """Convert a VTT subtitle file to plain text, collapsing consecutive repeats.
@@ -214,6 +300,7 @@ class YtDlpBackend(TranscriptBackend):
         wait=wait_fixed(10),
         retry=retry_if_exception_type(TranscriptDownloadError),
         before_sleep=before_sleep_log(tenacity_logger, log_level=logging.WARNING),
+        sleep=cancellation.sleep,
         reraise=False,
     )
     def fetch_via_ytdlp(self, url: str) -> str:  # noqa: C901, PLR0912, PLR0915
@@ -230,34 +317,42 @@ class YtDlpBackend(TranscriptBackend):
 
         """
         temp_basename = generate_temporary_name()
-        proxy = get_proxy()
-        probe_opts: dict[str, Any] = {
-            "proxy": proxy,
-            "noplaylist": True,
-            "skip_download": True,
-            "quiet": True,
-            "nocheckcertificate": False,
-        }
 
-        # Phase 1: probe available subtitle tracks (no download, no temp files).
-        try:
-            with YoutubeDL(probe_opts) as ydl:  # pyrefly: ignore[bad-argument-type]
-                info = ydl.extract_info(url, download=False)
-        except DownloadError as e:
-            logger.warning("yt-dlp probe failed: %s: %s", type(e).__name__, e)
-            raise TranscriptDownloadError(str(e)) from e
-        except Exception as e:
-            logger.warning(
-                "yt-dlp probe failed unexpectedly: %s: %s",
-                type(e).__name__,
-                e,
-            )
-            msg = "yt-dlp probe failed"
-            raise TranscriptDownloadError(msg) from e
+        # Phase 1: probe available subtitle tracks (no download, no temp files),
+        # unless the video was probed lately — then through the same proxy, as
+        # its subtitle URLs are bound to the address that extracted them.
+        probed = self._info.get(url)
+        if probed is not None:
+            info, proxy = probed.info, probed.proxy
+        else:
+            proxy = get_proxy()
+            probe_opts: dict[str, Any] = {
+                "proxy": proxy,
+                "noplaylist": True,
+                "skip_download": True,
+                "quiet": True,
+                "nocheckcertificate": False,
+            }
+            try:
+                with YoutubeDL(probe_opts) as ydl:  # pyrefly: ignore[bad-argument-type]
+                    info = ydl.extract_info(url, download=False)
+            except DownloadError as e:
+                logger.warning("yt-dlp probe failed: %s: %s", type(e).__name__, e)
+                raise TranscriptDownloadError(str(e)) from e
+            except Exception as e:
+                logger.warning(
+                    "yt-dlp probe failed unexpectedly: %s: %s",
+                    type(e).__name__,
+                    e,
+                )
+                msg = "yt-dlp probe failed"
+                raise TranscriptDownloadError(msg) from e
 
-        if info is None:
-            msg = "No subtitles available via yt-dlp"
-            raise DownloadError(msg)
+            if info is None:
+                msg = "No subtitles available via yt-dlp"
+                raise DownloadError(msg)
+            info = cast("dict[str, Any]", info)
+            self._info.put(url, info, proxy)
 
         manual = info.get("subtitles") or {}
         auto = info.get("automatic_captions") or {}
@@ -308,14 +403,19 @@ class YtDlpBackend(TranscriptBackend):
             "outtmpl": temp_basename,
             "quiet": True,
             "nocheckcertificate": False,
+            "progress_hooks": [cancellation.progress_hook],
         }
 
-        # Phase 2: download and convert subtitles.
+        # Phase 2: download and convert subtitles, from the probed info rather
+        # than extracting it again. A failure may be a stale format URL, so the
+        # retry probes afresh.
         try:
             try:
                 with YoutubeDL(ydl_opts) as ydl:  # pyrefly: ignore[bad-argument-type]
-                    ydl.download([url])
+                    # pyrefly: ignore[bad-argument-type]
+                    ydl.process_ie_result(info, download=True)
             except DownloadError as e:
+                self._info.discard(url)
                 logger.warning(
                     "yt-dlp subtitle fetch failed: %s: %s",
                     type(e).__name__,
@@ -323,6 +423,7 @@ class YtDlpBackend(TranscriptBackend):
                 )
                 raise TranscriptDownloadError(str(e)) from e
             except Exception as e:
+                self._info.discard(url)
                 logger.warning(
                     "yt-dlp subtitle fetch failed unexpectedly: %s: %s",
                     type(e).__name__,
@@ -352,16 +453,22 @@ class YtDlpBackend(TranscriptBackend):
 
 
 class YouTubeTranscriber:
-    """Orchestrate primary→fallback transcript fetching across backends."""
+    """Orchestrate primary→fallback transcript fetching across backends.
+
+    Results are cached by video id, and so is a video both backends failed on
+    when either reported it has no transcript at all.
+    """
 
     def __init__(
         self,
         primary: TranscriptBackend,
         fallback: TranscriptBackend,
+        cache: PrefixedTextCache,
     ) -> None:
-        """Store the primary and fallback transcript backends."""
+        """Store the primary and fallback transcript backends and the cache."""
         self._primary = primary
         self._fallback = fallback
+        self._cache = cache
 
     @staticmethod
     def _extract_video_id(url: str) -> str | None:
@@ -371,21 +478,7 @@ class YouTubeTranscriber:
         be located in the path/query.
 
         """
-        parts = urlsplit(url)
-        hostname = (parts.hostname or "").lower()
-        hostname = hostname.removeprefix("www.")
-        if hostname not in YT_HOSTS:
-            return None
-        if hostname == "youtu.be":
-            video_id = parts.path.lstrip("/").split("/", 1)[0]
-            return video_id or None
-        path_parts = [p for p in parts.path.split("/") if p]
-        prefixed_paths = ("live", "shorts", "embed")
-        if len(path_parts) >= 2 and path_parts[0] in prefixed_paths:  # noqa: PLR2004
-            return path_parts[1]
-        if path_parts and path_parts[0] == "watch":
-            return parse_qs(parts.query).get("v", [None])[0]
-        return None
+        return youtube_video_id(url)
 
     @staticmethod
     def _fetch_validated(
@@ -412,9 +505,10 @@ class YouTubeTranscriber:
     def get_transcript(self, url: str) -> PrefixedText:
         """Retrieve the transcript from a YouTube video URL.
 
-        Tries the primary backend first, falling back to the secondary on any
-        failure (including an empty result). With the default wiring this means
-        the API first, then yt-dlp.
+        Answers from the transcript cache when it can. Otherwise tries the
+        primary backend first, falling back to the secondary on any failure
+        (including an empty result). With the default wiring this means the API
+        first, then yt-dlp.
 
         Returns:
             PrefixedText: The transcript and its display prefix — 📺 for
@@ -422,7 +516,8 @@ class YouTubeTranscriber:
 
         Raises:
             ValueError: If the URL format is not recognized.
-            FetchTranscriptError: If both backends fail.
+            FetchTranscriptError: If both backends fail, or recently did for a
+                video with no transcript.
 
         """
         video_id = self._extract_video_id(url)
@@ -430,6 +525,17 @@ class YouTubeTranscriber:
             msg = "Unknown URL"
             raise ValueError(msg)
 
+        cached = self._cache.get(video_id)
+        if cached is not None:
+            if not cached.text:
+                msg = "The video has no transcript"
+                raise FetchTranscriptError(msg)
+            return cached
+        transcript = self._fetch(url, video_id)
+        self._cache.put(video_id, transcript)
+        return transcript
+
+    def _fetch(self, url: str, video_id: str) -> PrefixedText:
         try:
             text = self._fetch_validated(self._primary, url, video_id)
         except Exception as primary_error:
@@ -449,6 +555,11 @@ class YouTubeTranscriber:
                     self._fallback.name,
                     fallback_error,
                 )
+                if isinstance(primary_error, self._primary.absent) or isinstance(
+                    fallback_error,
+                    self._fallback.absent,
+                ):
+                    self._cache.put_missing(video_id)
                 msg = "Both transcript backends failed"
                 raise FetchTranscriptError(msg) from fallback_error
             return PrefixedText(text=text, prefix=self._fallback.prefix)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import UTC, datetime
+from functools import partial
+from typing import TYPE_CHECKING, cast
+
+from google.genai import types
+
+from utils import run_transaction
+
+if TYPE_CHECKING:
+    import redis
+    from redis.client import Pipeline
+
+
+class UploadRegistry:
+    """Gemini uploads still live, by the SHA-256 of the uploaded file's bytes.
+
+    A file summarized again — on a retry, or sent by another user — reuses its
+    upload instead of paying for a new one and its `PROCESSING` wait. Each
+    record keeps the file's name, uri, MIME type and expiry in one Valkey hash,
+    with a sorted set scoring them by last use. Gemini deletes a file itself
+    when it expires; a record with less than `min_lifetime` seconds left is
+    dropped rather than handed to a model call it might not outlive. Past
+    `max_files`, `put` evicts the least recently used records and returns their
+    names for the caller to delete, sparing any used within the last `in_use`
+    seconds, as a model call may still be reading it.
+
+    Two processes uploading the same bytes at once both reach `put`; the first
+    record stands, and the other is handed that upload and its own to delete.
+    """
+
+    _files = "gemini-uploads:files"
+    _lru = "gemini-uploads:lru"
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        max_files: int,
+        min_lifetime: int,
+        default_lifetime: int,
+        in_use: int,
+    ) -> None:
+        """Store the client, the record limit and the lifetimes in seconds.
+
+        `default_lifetime` stands in for an upload that reports no expiry, and
+        `in_use` is how long after its last use an upload may still be read.
+        """
+        self._client = client
+        self._max_files = max_files
+        self._min_lifetime = min_lifetime
+        self._default_lifetime = default_lifetime
+        self._in_use = in_use
+
+    def _live(self, raw: str | None) -> dict | None:
+        """Return a raw record decoded if it has at least `min_lifetime` left."""
+        if raw is None:
+            return None
+        record = json.loads(raw)
+        if record["expires"] - time.time() < self._min_lifetime:
+            return None
+        return record
+
+    @staticmethod
+    def _file(record: dict) -> types.File:
+        return types.File(
+            name=record["name"],
+            uri=record["uri"],
+            mime_type=record["mime_type"],
+            expiration_time=datetime.fromtimestamp(record["expires"], UTC),
+            state=types.FileState.ACTIVE,
+        )
+
+    def get(self, digest: str) -> types.File | None:
+        """Return the live upload of these bytes and mark it used; None if none."""
+        raw = cast("str | None", self._client.hget(self._files, digest))
+        if raw is None:
+            return None
+        record = self._live(raw)
+        if record is None:
+            self.discard(digest)
+            return None
+        self._client.zadd(self._lru, {digest: time.time()}, xx=True)
+        return self._file(record)
+
+    def put(
+        self,
+        digest: str,
+        uploaded: types.File,
+    ) -> tuple[types.File, list[str]]:
+        """Record a ready upload of these bytes, unless another process did first.
+
+        Returns:
+            tuple[types.File, list[str]]: The upload to use — `uploaded`, or the
+                one already recorded for these bytes — and the names of the
+                uploads the caller deletes from Gemini: any evicted to make
+                room, and `uploaded` itself if it was not recorded.
+
+        """
+        if uploaded.expiration_time is None:
+            expires = time.time() + self._default_lifetime
+        else:
+            expires = uploaded.expiration_time.timestamp()
+        record = {
+            "name": uploaded.name,
+            "uri": uploaded.uri,
+            "mime_type": uploaded.mime_type,
+            "expires": expires,
+        }
+
+        def record_unless_live(pipe: Pipeline) -> dict | None:
+            existing = self._live(cast("str | None", pipe.hget(self._files, digest)))
+            pipe.multi()
+            if existing is None:
+                pipe.hset(self._files, digest, json.dumps(record))
+            pipe.zadd(self._lru, {digest: time.time()})
+            return existing
+
+        existing = run_transaction(self._client, record_unless_live, self._files)
+        if existing is not None:
+            # Another process recorded these bytes first; use its upload.
+            name = cast("str", uploaded.name)  # set on every file Gemini returns
+            return self._file(existing), [name, *self._evict()]
+        return uploaded, self._evict()
+
+    def discard(self, digest: str) -> None:
+        """Forget the upload of these bytes, leaving Gemini's copy to expire."""
+        pipe = self._client.pipeline()
+        pipe.zrem(self._lru, digest)
+        pipe.hdel(self._files, digest)
+        pipe.execute()
+
+    def _evict(self) -> list[str]:
+        def forget(pipe: Pipeline, digest: str) -> str | None:
+            used = pipe.zscore(self._lru, digest)
+            if used is None or used > cutoff:
+                return None  # used again, or forgotten, since it was listed
+            raw = pipe.hget(self._files, digest)
+            pipe.multi()
+            pipe.zrem(self._lru, digest)
+            pipe.hdel(self._files, digest)
+            return None if raw is None else json.loads(raw)["name"]
+
+        excess = self._client.zcard(self._lru) - self._max_files
+        if excess <= 0:
+            return []
+        # An upload used within `in_use` may still be read by a model call, so
+        # only older ones are evicted; the registry stays over its limit until
+        # they age out.
+        cutoff = time.time() - self._in_use
+        stale = cast(
+            "list[str]",
+            self._client.zrangebyscore(self._lru, "-inf", cutoff, start=0, num=excess),
+        )
+        evicted: list[str] = []
+        for digest in stale:
+            name = run_transaction(
+                self._client,
+                partial(forget, digest=digest),
+                self._files,
+                self._lru,
+            )
+            if name is not None:
+                evicted.append(name)
+        return evicted
@@ -1,11 +1,20 @@
+from __future__ import annotations
+
+import hashlib
 import random
-import subprocess
 from pathlib import Path
-from urllib.parse import urlsplit
+from typing import TYPE_CHECKING, cast
+from urllib.parse import parse_qs, urlsplit
 from uuid import uuid4
 
 from config import CASTRO_HOST, PROTECTED_FILES, PROXIES, YT_HOSTS
 
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    import redis
+    from redis.client import Pipeline
+
 
 def get_proxy() -> str:
     """Return a random proxy URL from PROXIES, or '' if none configured."""
@@ -46,40 +55,77 @@ def classify_url(url: str) -> str | None:
     return "web"
 
 
-def generate_temporary_name(ext: str = "") -> str:
-    """Generate a UUID filename, with `ext` appended when given."""
-    return f"{uuid4()!s}{ext}"
+def youtube_video_id(url: str) -> str | None:
+    """Extract the video id from any supported YouTube URL form.
 
+    Returns None when the host is not a known YouTube host or the id cannot
+    be located in the path/query.
+
+    """
+    parts = urlsplit(url)
+    hostname = (parts.hostname or "").lower()
+    hostname = hostname.removeprefix("www.")
+    if hostname not in YT_HOSTS:
+        return None
+    if hostname == "youtu.be":
+        video_id = parts.path.lstrip("/").split("/", 1)[0]
+        return video_id or None
+    path_parts = [p for p in parts.path.split("/") if p]
+    prefixed_paths = ("live", "shorts", "embed")
+    if len(path_parts) >= 2 and path_parts[0] in prefixed_paths:  # noqa: PLR2004
+        return path_parts[1]
+    if path_parts and path_parts[0] == "watch":
+        return parse_qs(parts.query).get("v", [None])[0]
+    return None
+
+
+def canonical_source(url: str) -> str:
+    """Name what a URL points at, so its spellings share one summary cache entry.
+
+    A YouTube URL in any form becomes its video id. Any other URL keeps its
+    path and query but drops the scheme, fragment, `www.` and host case.
+    """
+    video_id = youtube_video_id(url)
+    if video_id is not None:
+        return f"youtube:{video_id}"
+    parts = urlsplit(url)
+    host = (parts.hostname or "").lower().removeprefix("www.")
+    query = f"?{parts.query}" if parts.query else ""
+    return f"url:{host}{parts.path}{query}"
 
-def compress_audio(input_file: str, output_file: str) -> None:
-    """Compress an audio file to mono 16 kbps Opus, stripping any video stream.
 
-    Requires ffmpeg on PATH.
+def file_sha256(path: str) -> str:
+    """Return the hex SHA-256 of a file's bytes, read in one streaming pass."""
+    with Path(path).open("rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
 
-    Raises:
-        subprocess.CalledProcessError: If the ffmpeg command fails.
 
+def run_transaction[T](
+    client: redis.Redis,
+    func: Callable[[Pipeline], T],
+    *watches: str,
+) -> T:
+    """Run `func` in a WATCH/MULTI transaction on `watches`; return its value.
+
+    redis-py types the callback as returning None and the result as the
+    pipeline's replies, while `value_from_callable=True` returns the callback's
+    own value; the casts say so once, for every caller.
     """
-    subprocess.run(
-        [
-            "ffmpeg",  # /usr/bin/ffmpeg
-            "-y",
-            "-i",
-            input_file,
-            "-vn",
-            "-ac",
-            "1",
-            "-c:a",
-            "libopus",
-            "-b:a",
-            "16k",
-            output_file,
-        ],
-        check=True,
-        capture_output=False,
+    return cast(
+        "T",
+        client.transaction(
+            cast("Callable[[Pipeline], None]", func),
+            *watches,
+            value_from_callable=True,
+        ),
     )
 
 
+def generate_temporary_name(ext: str = "") -> str:
+    """Generate a UUID filename, with `ext` appended when given."""
+    return f"{uuid4()!s}{ext}"
+
+
 def clean_up(file: str | None = None, all_downloads: bool = False) -> None:
     """Remove `file`, or sweep the working directory when `all_downloads` is set.
 
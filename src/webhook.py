@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import hmac
+import logging
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+from telebot.types import Update
+
+if TYPE_CHECKING:
+    import telebot
+
+    from dedupe import UpdateDeduplicator
+
+logger = logging.getLogger(__name__)
+
+# Telegram sends the `secret_token` given to setWebhook back in this header.
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"  # noqa: S105
+
+
+class _UpdateServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        bot: telebot.TeleBot,
+        dedupe: UpdateDeduplicator,
+        secret_token: str,
+    ) -> None:
+        super().__init__(address, _UpdateHandler, bind_and_activate=False)
+        self.bot = bot
+        self.dedupe = dedupe
+        self.secret_token = secret_token
+
+
+class _UpdateHandler(BaseHTTPRequestHandler):
+    server: _UpdateServer  # pyrefly: ignore[bad-override-mutable-attribute]
+
+    def do_POST(self) -> None:
+        """Check the secret token, then dispatch the update to the bot's handlers.
+
+        A body that is no update object is refused with 400. An update delivered
+        before is acknowledged without being dispatched again.
+        """
+        if not hmac.compare_digest(
+            self.headers.get(SECRET_HEADER, "").encode(),
+            self.server.secret_token.encode(),
+        ):
+            self._respond(HTTPStatus.FORBIDDEN)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+            update = Update.de_json(self.rfile.read(length).decode())
+        except ValueError, KeyError, TypeError:  # TypeError: a body that is no object
+            update = None
+        if update is None:
+            self._respond(HTTPStatus.BAD_REQUEST)
+            return
+        if self.server.dedupe.first_update(update.update_id):
+            self.server.bot.process_new_updates([update])
+        self._respond(HTTPStatus.OK)
+
+    def _respond(self, status: HTTPStatus) -> None:
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Send the access log to the module logger rather than stderr."""
+        logger.debug(format, *args)
+
+
+class WebhookServer:
+    """Receives Telegram updates over HTTP POST instead of long polling.
+
+    Each update is handed to `bot.process_new_updates`, the same dispatch polling
+    feeds, so the registered handlers route it exactly as they would a polled one.
+    A redelivered update is dropped by `update_id` first.
+    Plain HTTP only: Telegram requires HTTPS, so TLS terminates at a proxy that
+    forwards `url` to `host:port`.
+    """
+
+    def __init__(
+        self,
+        bot: telebot.TeleBot,
+        dedupe: UpdateDeduplicator,
+        url: str,
+        secret_token: str,
+        host: str,
+        port: int,
+    ) -> None:
+        """Store the bot, the deduplicator and the webhook settings.
+
+        The port is bound on `listen`.
+
+        Raises:
+            ValueError: If `secret_token` is empty, which would let anyone who
+                finds the URL post updates as Telegram.
+
+        """
+        if not secret_token:
+            msg = "Webhook mode needs a secret token"
+            raise ValueError(msg)
+        self._bot = bot
+        self._url = url
+        self._secret_token = secret_token
+        self._server = _UpdateServer((host, port), bot, dedupe, secret_token)
+        self._serving = False
+
+    def listen(self) -> int:
+        """Bind the port and point Telegram's webhook at `url`; return the port."""
+        self._server.server_bind()
+        self._server.server_activate()
+        self._bot.set_webhook(url=self._url, secret_token=self._secret_token)
+        return self._server.server_address[1]
+
+    def serve_forever(self) -> None:
+        """Handle update POSTs until `close` is called from another thread."""
+        self._serving = True
+        try:
+            self._server.serve_forever()
+        finally:
+            self._serving = False
+
+    def close(self) -> None:
+        """Stop serving, if still serving, and release the port.
+
+        The webhook stays registered, so Telegram holds the updates sent while
+        the bot is down and delivers them once it listens again.
+        """
+        if self._serving:
+            self._server.shutdown()
+        self._server.server_close()
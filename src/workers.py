@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from queue import SimpleQueue
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Hashable, Mapping
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    """Bounded thread pool that runs jobs in order per key, in parallel across keys.
+
+    Keyed by chat: a chat's updates run one at a time and in arrival order, while
+    different chats share the `workers` threads. `queue_size` caps the jobs the
+    pool holds at once, running ones included, so a flood of updates is refused
+    instead of buffered without limit.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        """Store the pool's size limits; threads start on `start`."""
+        self._workers = workers
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # A key stays in `_pending` while its head job runs, so a job submitted
+        # meanwhile queues behind it instead of being handed to a second worker.
+        self._pending: dict[Hashable, deque[Callable[[], None]]] = {}
+        self._ready: SimpleQueue[Hashable | None] = SimpleQueue()
+        self._threads: list[threading.Thread] = []
+        self._closed = False
+        # Set when a drain runs out of time: jobs not yet started are dropped.
+        self._abandoned = False
+
+    def start(self) -> None:
+        """Start the worker threads."""
+        for index in range(self._workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=f"worker-{index}",
+                daemon=True,
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: Hashable, job: Callable[[], None]) -> bool:
+        """Queue `job` behind any earlier job for `key`; False if the pool is full."""
+        if self._closed or not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            if key in self._pending:
+                self._pending[key].append(job)
+            else:
+                self._pending[key] = deque([job])
+                self._ready.put(key)
+        return True
+
+    def shutdown(self, timeout: float | None = None) -> int:
+        """Refuse new jobs and let the queued ones finish, then stop the threads.
+
+        With a `timeout`, the drain gives up after that many seconds: jobs not
+        yet started are dropped, and running ones are left to their daemon
+        threads, which die with the process.
+
+        Returns:
+            int: How many jobs did not finish, 0 when the pool drained.
+
+        """
+        self._closed = True
+        # A key re-queued after the stop sentinels would never be picked up, so
+        # wait for every queued job to finish before sending them.
+        with self._idle:
+            drained = self._idle.wait_for(lambda: not self._pending, timeout)
+            left = sum(len(jobs) for jobs in self._pending.values())
+            self._abandoned = not drained
+        for _ in self._threads:
+            self._ready.put(None)
+        if drained:
+            for thread in self._threads:
+                thread.join()
+        self._threads.clear()
+        return left
+
+    def _work(self) -> None:
+        """Run the head job of each ready key until a stop sentinel arrives."""
+        while (key := self._ready.get()) is not None:
+            with self._lock:
+                job = self._pending[key][0]
+            try:
+                if not self._abandoned:
+                    job()
+            except Exception:
+                logger.exception("Job for %s failed", key)
+            finally:
+                self._slots.release()
+                with self._lock:
+                    self._pending[key].popleft()
+                    if self._pending[key] and not self._abandoned:
+                        self._ready.put(key)
+                    else:
+                        del self._pending[key]
+                        self._idle.notify_all()
+
+
+class Scheduler:
+    """Runs each job on its lane's `WorkerPool`, so lanes never queue behind each other.
+
+    Each lane has its own threads and queue limit. Per-key order holds within a
+    lane only: a chat's quick job may finish before its earlier long one.
+    """
+
+    def __init__(self, lanes: Mapping[str, WorkerPool]) -> None:
+        """Store the pool that serves each lane."""
+        self._lanes = lanes
+
+    def start(self) -> None:
+        """Start every lane's worker threads."""
+        for pool in self._lanes.values():
+            pool.start()
+
+    def submit(self, lane: str, key: Hashable, job: Callable[[], None]) -> bool:
+        """Queue `job` on `lane` behind earlier jobs for `key`; False if it is full."""
+        return self._lanes[lane].submit(key, job)
+
+    def shutdown(self, timeout: float | None = None) -> int:
+        """Let every lane finish its queued jobs, then stop its threads.
+
+        The lanes share one `timeout` deadline, so a drain takes at most that
+        long however many lanes there are.
+
+        Returns:
+            int: How many jobs did not finish across the lanes, 0 when drained.
+
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return sum(
+            pool.shutdown(
+                None if deadline is None else max(0.0, deadline - time.monotonic()),
+            )
+            for pool in self._lanes.values()
+        )
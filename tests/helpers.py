@@ -10,15 +10,42 @@ def make_app(mocker):
     fakes = SimpleNamespace(
         bot=mocker.MagicMock(),
         user_repo=mocker.MagicMock(),
+        jobs=mocker.MagicMock(),
+        limiter=mocker.MagicMock(),
+        cancellations=mocker.MagicMock(),
+        dedupe=mocker.MagicMock(),
+        lease=mocker.MagicMock(),
         quota_manager=mocker.MagicMock(),
         tracer=mocker.MagicMock(),
         handlers=mocker.MagicMock(),
+        stats_log=mocker.MagicMock(),
+        scheduler=mocker.MagicMock(),
+        stream=None,
+        webhook=None,
     )
+    # Every sender is under the per-user limit unless a test says otherwise.
+    fakes.limiter.admit.return_value = 0
+    fakes.limiter.release.return_value = []
+    # ...and no job is cancelled.
+    fakes.cancellations.token.return_value.cancelled.return_value = False
+    # ...and every message is a first delivery...
+    fakes.dedupe.first_message.return_value = True
+    # ...and shutdown drains every job in time.
+    fakes.scheduler.shutdown.return_value = 0
     app = BotApp(
         fakes.bot,
         fakes.user_repo,
+        fakes.jobs,
+        fakes.limiter,
+        fakes.cancellations,
+        fakes.dedupe,
+        fakes.lease,
         fakes.quota_manager,
         fakes.tracer,
         fakes.handlers,
+        fakes.stats_log,
+        fakes.scheduler,
+        fakes.stream,
+        fakes.webhook,
     )
     return app, fakes
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from telebot.asyncio_handler_backends import ContinueHandling
+
+from async_main import AsyncBotApp, build_async_app, check_settings
+from config import ASYNC_MAX_JOBS
+from main import BotApp
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def _make_async_app(mocker, max_jobs=10):
+    """Return (app, fakes) with every AsyncBotApp collaborator injected as a mock.
+
+    `app` is the inner BotApp, whose sync handlers every job and command runs.
+    """
+    fakes = SimpleNamespace(
+        async_bot=mocker.MagicMock(),
+        app=mocker.MagicMock(),
+        bot=mocker.MagicMock(),
+        tracer=mocker.MagicMock(),
+    )
+    app = AsyncBotApp(fakes.async_bot, fakes.app, fakes.bot, fakes.tracer, max_jobs)
+    return app, fakes
+
+
+@pytest.mark.parametrize(
+    ("role", "mode", "named"),
+    [
+        ("ingest", "polling", "BOT_ROLE"),
+        ("all", "webhook", "BOT_MODE"),
+    ],
+)
+def test_check_settings_refuses_what_the_runtime_does_not_honour(role, mode, named):
+    """A scale-out role or webhook mode is refused rather than quietly weakened."""
+    with pytest.raises(ValueError, match=named):
+        check_settings(role, mode)
+
+
+def test_build_async_app_refuses_a_role_it_does_not_honour(mocker):
+    """The settings are checked before anything is wired."""
+    mocker.patch("async_main.BOT_ROLE", "ingest")
+    container = mocker.MagicMock()
+
+    with pytest.raises(ValueError, match="BOT_ROLE"):
+        build_async_app(container)
+
+    container.async_bot.message_handler.assert_not_called()
+
+
+def test_build_async_app_wires_container_and_registers_handlers(mocker):
+    """build_async_app polls the async bot and serves commands from a BotApp."""
+    container = SimpleNamespace(
+        bot=mocker.MagicMock(),
+        async_bot=mocker.MagicMock(),
+        user_repo=mocker.MagicMock(),
+        jobs=mocker.MagicMock(),
+        limiter=mocker.MagicMock(),
+        cancellations=mocker.MagicMock(),
+        dedupe=mocker.MagicMock(),
+        lease=mocker.MagicMock(),
+        quota_manager=mocker.MagicMock(),
+        tracer=mocker.MagicMock(),
+        handlers=mocker.MagicMock(),
+        stats_log=mocker.MagicMock(),
+        scheduler=mocker.MagicMock(),
+    )
+
+    app = build_async_app(container)
+
+    assert app._async_bot is container.async_bot
+    assert isinstance(app._app, BotApp)
+    assert app._app._bot is container.bot
+    assert app._app._dedupe is container.dedupe
+    assert app._app._lease is container.lease
+    assert app._tracer is container.tracer
+    assert app._max_jobs == ASYNC_MAX_JOBS
+    # Settings replies, nine commands, the content handler; none on the sync bot.
+    assert container.async_bot.message_handler.call_count == 11
+    container.bot.message_handler.assert_not_called()
+    container.scheduler.start.assert_not_called()
+
+
+def test_register_puts_settings_replies_first_and_content_last(mocker):
+    """register() checks pending settings replies before any command or content."""
+    app, fakes = _make_async_app(mocker)
+    fakes.app.command_handlers.return_value = [
+        ("start", mocker.MagicMock(), False),
+        ("myinfo", mocker.MagicMock(), True),
+    ]
+
+    app.register()
+
+    calls = fakes.async_bot.message_handler.call_args_list
+    registered = fakes.async_bot.message_handler.return_value.call_args_list
+    assert calls[0].kwargs == {}
+    assert registered[0].args == (app.continue_settings_choice,)
+    assert calls[1].kwargs == {"commands": ["start"]}
+    assert calls[2].kwargs == {"commands": ["myinfo"], "func": app.authorized}
+    assert calls[3].kwargs["content_types"] == [
+        "text",
+        "audio",
+        "document",
+        "video_note",
+        "voice",
+        "video",
+    ]
+    assert registered[3].args == (app.handle_message,)
+
+
+def test_registered_commands_run_the_sync_handler_off_the_loop(mocker):
+    """A command handler from BotApp runs on a worker thread, not the loop."""
+    app, fakes = _make_async_app(mocker)
+    seen = {}
+
+    def start(message):
+        seen["message"] = message
+        seen["thread"] = threading.get_ident()
+
+    fakes.app.command_handlers.return_value = [("start", start, False)]
+    app.register()
+    wrapped = fakes.async_bot.message_handler.return_value.call_args_list[1].args[0]
+
+    asyncio.run(wrapped("message"))
+
+    assert seen["message"] == "message"
+    assert seen["thread"] != threading.get_ident()
+
+
+def test_registered_cancel_says_it_is_unsupported(mocker, message_factory):
+    """/cancel is answered by the async runtime, never by BotApp.handle_cancel."""
+    app, fakes = _make_async_app(mocker)
+    sync_cancel = mocker.MagicMock()
+    fakes.app.command_handlers.return_value = [("cancel", sync_cancel, True)]
+    app.register()
+    calls = fakes.async_bot.message_handler.call_args_list
+    wrapped = fakes.async_bot.message_handler.return_value.call_args_list[1].args[0]
+    msg = message_factory(text="/cancel")
+
+    asyncio.run(wrapped(msg))
+
+    assert calls[1].kwargs == {"commands": ["cancel"], "func": app.authorized}
+    sync_cancel.assert_not_called()
+    fakes.bot.reply_to.assert_called_once_with(
+        msg,
+        "This bot cannot cancel a message under way. Please wait for its reply.",
+    )
+
+
+def test_authorized_delegates_to_the_sync_app(mocker):
+    """`authorized` answers with BotApp.authorized, which queries Postgres."""
+    app, fakes = _make_async_app(mocker)
+    fakes.app.authorized.return_value = True
+
+    assert asyncio.run(app.authorized("message")) is True
+    fakes.app.authorized.assert_called_once_with("message")
+
+
+def test_continue_settings_choice_passes_through_without_a_pending_step(
+    mocker,
+    message_factory,
+):
+    """A message with no pending settings keyboard continues to other handlers."""
+    app, fakes = _make_async_app(mocker)
+    fakes.bot.next_step_backend.get_handlers.return_value = None
+
+    result = asyncio.run(app.continue_settings_choice(message_factory()))
+
+    assert isinstance(result, ContinueHandling)
+
+
+def test_continue_settings_choice_passes_through_without_a_backend(
+    mocker,
+    message_factory,
+):
+    """A sync bot with no next-step backend has no pending step to run."""
+    app, fakes = _make_async_app(mocker)
+    fakes.bot.next_step_backend = None
+
+    result = asyncio.run(app.continue_settings_choice(message_factory()))
+
+    assert isinstance(result, ContinueHandling)
+
+
+def test_continue_settings_choice_runs_the_pending_step(mocker, message_factory):
+    """A reply to a settings keyboard runs the registered step and stops there."""
+    app, fakes = _make_async_app(mocker)
+    msg = message_factory(text="English")
+    callback = mocker.MagicMock()
+    fakes.bot.next_step_backend.get_handlers.return_value = [
+        {"callback": callback, "args": ["user"], "kwargs": {"field": "x"}},
+    ]
+
+    result = asyncio.run(app.continue_settings_choice(msg))
+
+    assert result is None
+    fakes.bot.next_step_backend.get_handlers.assert_called_once_with(msg.chat.id)
+    callback.assert_called_once_with(msg, "user", field="x")
+
+
+def test_handle_message_drops_a_redelivered_message(mocker, message_factory):
+    """A message seen before costs the one dedupe check and nothing more."""
+    app, fakes = _make_async_app(mocker)
+    fakes.app.first_delivery.return_value = False
+    msg = message_factory()
+
+    asyncio.run(app.handle_message(msg))
+
+    fakes.app.first_delivery.assert_called_once_with(msg)
+    fakes.app.handle_message.assert_not_called()
+
+
+def test_handle_message_runs_the_sync_pipeline_off_the_loop(mocker, message_factory):
+    """A first delivery runs BotApp.handle_message on a worker thread."""
+    app, fakes = _make_async_app(mocker)
+    msg = message_factory(text="https://example.com")
+    seen = {}
+
+    def handle_message(message):
+        seen["message"] = message
+        seen["thread"] = threading.get_ident()
+
+    fakes.app.handle_message.side_effect = handle_message
+
+    asyncio.run(app.handle_message(msg))
+
+    assert seen["message"] is msg
+    assert seen["thread"] != threading.get_ident()
+    assert app._held == 0
+
+
+def test_handle_message_runs_one_chats_messages_in_order(mocker, message_factory):
+    """A chat's second message waits for its first, however long that takes."""
+    app, fakes = _make_async_app(mocker)
+    seen = []
+
+    def handle_message(message):
+        seen.append(f"start {message.text}")
+        time.sleep(0.01 if message.text == "first" else 0)
+        seen.append(f"end {message.text}")
+
+    fakes.app.handle_message.side_effect = handle_message
+
+    async def main():
+        await asyncio.gather(
+            app.handle_message(message_factory(text="first")),
+            app.handle_message(message_factory(text="second")),
+        )
+
+    asyncio.run(main())
+
+    assert seen == ["start first", "end first", "start second", "end second"]
+
+
+def test_handle_message_answers_busy_past_max_jobs(mocker, message_factory):
+    """Once max_jobs are held, a further message is refused, not queued."""
+    app, fakes = _make_async_app(mocker, max_jobs=1)
+    held = message_factory(text="first")
+    refused = message_factory(text="second", user_id=2)
+
+    async def main():
+        await asyncio.gather(app.handle_message(held), app.handle_message(refused))
+
+    asyncio.run(main())
+
+    fakes.bot.reply_to.assert_called_once_with(
+        refused,
+        "The bot is busy. Please try again later.",
+    )
+    fakes.app.handle_message.assert_called_once_with(held)
+    assert app._held == 0
+
+
+def test_run_polls_and_closes_the_session_on_exit(mocker, caplog):
+    """run() polls the async bot and closes its HTTP session however it ends."""
+    app, fakes = _make_async_app(mocker)
+    fakes.async_bot.infinity_polling = mocker.AsyncMock(side_effect=RuntimeError)
+    fakes.async_bot.close_session = mocker.AsyncMock()
+
+    with (
+        caplog.at_level(logging.WARNING, logger="async_main"),
+        pytest.raises(RuntimeError),
+    ):
+        app.run()
+
+    assert "The asyncio runtime is experimental" in caplog.text
+
+    fakes.async_bot.infinity_polling.assert_awaited_once_with(timeout=20)
+    fakes.async_bot.close_session.assert_awaited_once()
+
+
+def test_run_gives_each_held_job_an_executor_thread(mocker):
+    """The loop's executor has a thread for each of max_jobs held jobs."""
+    app, fakes = _make_async_app(mocker, max_jobs=3)
+    seen = {}
+
+    async def poll(**_kwargs):
+        executor = asyncio.get_running_loop()._default_executor
+        seen["workers"] = executor._max_workers
+        seen["thread"] = await asyncio.to_thread(
+            lambda: threading.current_thread().name,
+        )
+
+    fakes.async_bot.infinity_polling = poll
+    fakes.async_bot.close_session = mocker.AsyncMock()
+
+    app.run()
+
+    assert seen["workers"] == 3
+    assert seen["thread"].startswith("async-job")
+
+
+def test_shutdown_sweeps_downloads_and_flushes_the_tracer(mocker):
+    """shutdown() sweeps temp files and flushes spans, with no scheduler to drain."""
+    app, fakes = _make_async_app(mocker)
+    mock_clean_up = mocker.patch("async_main.clean_up")
+
+    app.shutdown()
+
+    mock_clean_up.assert_called_once_with(all_downloads=True)
+    fakes.tracer.shutdown.assert_called_once_with()
+    fakes.app.shutdown.assert_not_called()
+
+
+def test_shutdown_flushes_the_tracer_when_the_sweep_fails(mocker):
+    """An OSError from the sweep does not cost the buffered spans."""
+    app, fakes = _make_async_app(mocker)
+    mocker.patch("async_main.clean_up", side_effect=OSError("device busy"))
+
+    with pytest.raises(OSError, match="device busy"):
+        app.shutdown()
+
+    fakes.tracer.shutdown.assert_called_once_with()
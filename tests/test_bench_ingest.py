@@ -0,0 +1,13 @@
+import pytest
+from scripts import bench_ingest
+from telebot import apihelper
+
+
+@pytest.mark.parametrize("run", [bench_ingest.run_polling, bench_ingest.run_webhook])
+def test_bench_delivers_every_update(run):
+    """Each mode hands every update to the handler and cleans up after itself."""
+    latencies = run(updates=3, interval=0, delay=0)
+
+    assert len(latencies) == 3
+    assert all(latency >= 0 for latency in latencies)
+    assert apihelper.API_URL is None
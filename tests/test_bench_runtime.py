@@ -0,0 +1,12 @@
+from scripts import bench_runtime
+
+
+def test_bench_runs_every_job_on_both_runtimes():
+    """Each runtime takes every update through to the stubbed pipeline."""
+    threaded = bench_runtime.run_threaded(jobs=3, latency=0, workers=2)
+    asyncio_runtime = bench_runtime.run_async(jobs=3, latency=0)
+
+    for handled, elapsed, peak in (threaded, asyncio_runtime):
+        assert handled == 3
+        assert elapsed >= 0
+        assert peak >= 1
@@ -0,0 +1,323 @@
+import logging
+import threading
+
+import fakeredis
+import pytest
+
+from caching import (
+    AudioUrlCache,
+    CacheStats,
+    LookupStats,
+    PrefixedTextCache,
+    ProbedVideo,
+    StatsLog,
+    SummaryCache,
+    TtlCache,
+    ValkeyCache,
+    VideoInfoCache,
+)
+from domain import PrefixedText
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every process."""
+    return fakeredis.FakeRedis()
+
+
+def _cache(client, max_bytes=100, max_entry_bytes=50, namespace="test"):
+    return ValkeyCache(client, namespace, 60, max_bytes, max_entry_bytes)
+
+
+SETTINGS = {
+    "model": "gemini-3.7-flash",
+    "prompt_key": "basic_prompt_for_transcript",
+    "target_language": "English",
+    "user_id": 1,
+    "daily_limit": 10,
+    "thinking_level": "medium",
+}
+
+
+def test_put_then_get_round_trips_with_the_ttl(client):
+    """A stored value is read back, by every process, and expires after the TTL."""
+    cache = _cache(client)
+
+    cache.put("a", b"summary")
+
+    assert _cache(client).get("a") == b"summary"
+    assert 0 < client.ttl("test:entry:a") <= 60
+    assert cache.get("missing") is None
+
+
+def test_a_value_over_the_entry_limit_is_not_stored(client):
+    """An oversized value is skipped rather than evicting everything else."""
+    cache = _cache(client, max_entry_bytes=5)
+
+    cache.put("a", b"too long")
+
+    assert cache.get("a") is None
+    assert client.get("test:bytes") is None
+
+
+def test_overwriting_an_entry_counts_only_its_new_size(client):
+    """The byte total follows a replaced value instead of adding both."""
+    cache = _cache(client)
+
+    cache.put("a", b"x" * 10)
+    cache.put("a", b"x" * 4)
+
+    assert client.get("test:bytes") == b"4"
+
+
+def test_eviction_drops_the_least_recently_used_first(client, mocker):
+    """Past max_bytes, the entry read or written longest ago goes first."""
+    clock = mocker.patch("caching.time.time", return_value=1.0)
+    cache = _cache(client, max_bytes=30)
+    cache.put("a", b"x" * 10)
+    clock.return_value = 2.0
+    cache.put("b", b"x" * 10)
+    clock.return_value = 3.0
+    cache.get("a")
+    clock.return_value = 4.0
+
+    cache.put("c", b"x" * 15)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"x" * 10
+    assert cache.get("c") == b"x" * 15
+    assert client.get("test:bytes") == b"25"
+
+
+def test_eviction_stops_when_nothing_is_left_to_evict(client):
+    """A total that drifted past the limit with an empty index does not loop."""
+    cache = _cache(client, max_bytes=10)
+    client.set("test:bytes", 1000)
+
+    cache.put("a", b"x" * 5)
+
+    assert cache.get("a") is None
+
+
+def test_stats_count_hits_misses_and_bytes_across_processes(client):
+    """Every process's lookups add to the same counters, on its next round trip."""
+    cache, other = _cache(client), _cache(client)
+    cache.put("a", b"summary")
+
+    cache.get("a")
+    other.get("a")
+    cache.get("b")
+
+    # `cache` counted its hit on the "b" lookup; its miss waits for its next.
+    assert other.stats() == CacheStats(hits=2, misses=0, bytes=7)
+    assert cache.stats() == CacheStats(hits=2, misses=1, bytes=7)
+    assert _cache(client, namespace="other").stats() == CacheStats(0, 0, 0)
+
+
+def test_a_lookup_is_one_round_trip(mocker, client):
+    """The previous lookup's outcome rides in the same pipeline as the read."""
+    cache = _cache(client)
+    cache.get("a")
+    pipeline = mocker.spy(client, "pipeline")
+    hincrby = mocker.spy(client, "hincrby")
+
+    cache.get("a")
+
+    pipeline.assert_called_once_with(transaction=False)
+    hincrby.assert_not_called()
+    assert client.hget("test:stats", "misses") == b"1"
+
+
+def test_put_can_shorten_an_entrys_ttl(client):
+    """An entry given its own TTL expires on that one, not the cache's."""
+    _cache(client).put("a", b"summary", ttl=5)
+
+    assert 0 < client.ttl("test:entry:a") <= 5
+
+
+def test_discard_drops_an_entry_and_its_size(client):
+    """A discarded entry misses and no longer counts towards max_bytes."""
+    cache = _cache(client)
+    cache.put("a", b"x" * 10)
+    cache.put("b", b"y" * 5)
+
+    cache.discard("a")
+    cache.discard("missing")
+
+    assert cache.get("a") is None
+    assert cache.get("b") == b"y" * 5
+    assert cache.stats().bytes == 5
+
+
+def test_audio_url_cache_keeps_failures_only_briefly(client):
+    """An episode's audio URL lasts the cache's TTL; a failed page, failure_ttl."""
+    cache = AudioUrlCache(_cache(client), 30)
+
+    cache.put("https://castro.fm/episode/a", "https://audio.link/a.mp3")
+    cache.put_failure("https://castro.fm/episode/b")
+
+    assert cache.get("https://www.castro.fm/episode/a") == "https://audio.link/a.mp3"
+    assert cache.get("https://castro.fm/episode/b") == ""
+    assert 0 < client.ttl("test:entry:url:castro.fm/episode/b") <= 30
+    assert client.ttl("test:entry:url:castro.fm/episode/a") > 30
+    cache.discard("https://castro.fm/episode/a")
+    assert cache.get("https://castro.fm/episode/a") is None
+    assert cache.stats().misses == 1
+
+
+def test_summary_cache_keys_on_the_wording_settings_only(client):
+    """Another user with the same settings shares the entry; a setting splits it."""
+    cache = SummaryCache(_cache(client, max_entry_bytes=100))
+
+    cache.put("youtube:abc", SETTINGS, "summary")
+
+    assert cache.get("youtube:abc", {**SETTINGS, "user_id": 2}) == "summary"
+    assert cache.get("youtube:abc", {**SETTINGS, "target_language": "German"}) is None
+    assert cache.get("youtube:xyz", SETTINGS) is None
+    assert cache.stats().hits == 1
+
+
+def test_summary_cache_retires_entries_when_the_prompt_changes(client, mocker):
+    """A reworded prompt has a new prompt_version, so old summaries miss."""
+    cache = SummaryCache(_cache(client, max_entry_bytes=100))
+    cache.put("youtube:abc", SETTINGS, "summary")
+
+    mocker.patch("caching.prompt_version", return_value="reworded")
+
+    assert cache.get("youtube:abc", SETTINGS) is None
+
+
+def test_transcript_cache_stores_transcripts_compressed(client):
+    """A transcript round-trips through zstd and takes less room than its text."""
+    cache = PrefixedTextCache(
+        _cache(client, max_bytes=10**6, max_entry_bytes=10**6),
+        30,
+    )
+    transcript = PrefixedText(text="never gonna give you up " * 200, prefix="📺")
+
+    cache.put("abc", transcript)
+
+    assert cache.get("abc") == transcript
+    assert len(client.get("test:entry:abc")) < len(transcript.text) / 10
+    assert cache.get("xyz") is None
+
+
+def test_transcript_cache_remembers_a_missing_transcript_briefly(client):
+    """No transcript reads back as empty text and expires on missing_ttl."""
+    cache = PrefixedTextCache(_cache(client), 30)
+
+    cache.put_missing("abc")
+
+    assert cache.get("abc") == PrefixedText(text="", prefix="")
+    assert 0 < client.ttl("test:entry:abc") <= 30
+    assert cache.stats().hits == 1
+
+
+def test_ttl_cache_entries_expire_after_the_ttl(mocker):
+    """A local entry is returned until its TTL runs out, falsy values included."""
+    clock = mocker.patch("caching.time.monotonic", return_value=100.0)
+    cache = TtlCache(30, 8)
+
+    cache.put("host", value=False)
+
+    assert cache.get("host") is False
+    assert cache.get("other") is None
+    clock.return_value = 130.0
+    assert cache.get("host") is None
+
+
+def test_ttl_cache_drops_the_least_recently_used_past_the_limit():
+    """Reading an entry keeps it; the one unread longest goes first."""
+    cache = TtlCache(30, 2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+
+    cache.put("c", "3")
+
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+
+
+def test_ttl_cache_discard_forgets_an_entry():
+    """A discarded entry misses; discarding an absent one is harmless."""
+    cache = TtlCache(30, 2)
+    cache.put("a", "1")
+
+    cache.discard("a")
+    cache.discard("b")
+
+    assert cache.get("a") is None
+
+
+def test_lookup_stats_credit_each_hit_with_the_average_miss():
+    """Time saved is hits times the mean miss, spread over every lookup."""
+    stats = LookupStats(hits=3, misses=1, miss_seconds=0.02)
+
+    assert stats.saved_seconds == pytest.approx(0.06)
+    assert stats.saved_per_lookup == pytest.approx(0.015)
+    assert LookupStats(0, 0, 0.0).saved_per_lookup == 0.0
+    assert LookupStats(2, 0, 0.0).saved_seconds == 0.0
+
+
+def test_video_info_cache_shares_a_private_copy_per_video():
+    """Any URL of the video finds its info, and a caller's edits stay its own."""
+    cache = VideoInfoCache(TtlCache(60, 16))
+    info = {"formats": [{"format_id": "139"}]}
+    cache.put("https://www.youtube.com/watch?v=abc", info, "http://proxy-a:8080")
+    info["formats"].clear()
+
+    found = cache.get("https://youtu.be/abc")
+    found.info["formats"][0]["format_id"] = "251"
+
+    assert cache.get("https://youtube.com/shorts/abc") == ProbedVideo(
+        {"formats": [{"format_id": "139"}]},
+        "http://proxy-a:8080",
+    )
+    cache.discard("https://youtu.be/abc")
+    assert cache.get("https://youtu.be/abc") is None
+
+
+def test_stats_log_logs_a_line_per_cache(client, caplog):
+    """Each source's counters are logged under its name."""
+    cache = _cache(client)
+    cache.put("a", b"summary")
+    cache.get("a")
+
+    with caplog.at_level(logging.INFO, logger="caching"):
+        StatsLog({"summary": cache.stats}, 600).log()
+
+    assert "summary cache: 1 hits, 0 misses, 7 bytes held" in caplog.text
+
+
+def test_lookup_stats_read_as_time_saved_per_lookup():
+    """A per-process cache's log line gives the latency saved per lookup."""
+    stats = LookupStats(hits=3, misses=1, miss_seconds=0.02)
+
+    assert str(stats) == "3 hits, 1 misses, 15.0 ms saved per lookup"
+
+
+def test_stats_log_skips_a_cache_it_cannot_read(mocker, caplog):
+    """A failed read is logged as a warning and the other caches still report."""
+    broken = mocker.Mock(side_effect=ConnectionError("down"))
+    working = mocker.Mock(return_value=CacheStats(1, 2, 3))
+
+    with caplog.at_level(logging.INFO, logger="caching"):
+        StatsLog({"web": broken, "summary": working}, 600).log()
+
+    assert "Could not read the web cache's counters" in caplog.text
+    assert "summary cache: 1 hits, 2 misses, 3 bytes held" in caplog.text
+
+
+def test_stats_log_reports_until_stopped(mocker):
+    """The reporting thread logs every interval and exits once stopped is set."""
+    stopped = threading.Event()
+    logged = threading.Semaphore(0)
+    stats_log = StatsLog({}, 0.01)
+    mocker.patch.object(stats_log, "log", side_effect=logged.release)
+
+    stats_log.start(stopped)
+
+    assert logged.acquire(timeout=5)
+    assert logged.acquire(timeout=5)
+    stopped.set()
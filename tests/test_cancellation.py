@@ -0,0 +1,165 @@
+import fakeredis
+import pytest
+
+import cancellation
+from cancellation import Cancellations
+from exceptions import JobCancelledError, JobDeadlineExceededError
+
+
+@pytest.fixture
+def cancellations():
+    """Provide Cancellations on an in-memory server, reading flags on every check."""
+    return Cancellations(fakeredis.FakeRedis(decode_responses=True), 60, 0)
+
+
+def test_token_sees_a_cancel_made_after_it_was_handed_out(cancellations):
+    """A job's token reads the flag /cancel sets while the job runs."""
+    token = cancellations.token(5)
+    assert not token.cancelled()
+
+    cancellations.cancel(5)
+
+    assert token.cancelled()
+    assert not cancellations.token(6).cancelled()
+
+
+def test_cancel_flag_expires_after_the_ttl(mocker):
+    """A flag is kept for the TTL only, so Valkey does not collect them forever."""
+    client = mocker.MagicMock()
+
+    Cancellations(client, 60, 1).cancel(5)
+
+    client.set.assert_called_once_with("cancel:5", 1, ex=60)
+
+
+def test_token_reads_valkey_at_most_once_per_interval(mocker):
+    """Checks within the interval reuse the last answer; a seen cancel sticks."""
+    client = mocker.MagicMock()
+    client.exists.side_effect = [0, 1]
+    clock = mocker.patch("cancellation.time.monotonic", return_value=100.0)
+    token = Cancellations(client, 60, 1).token(5)
+
+    assert not token.cancelled()
+    assert not token.cancelled()
+    clock.return_value = 101.0
+    assert token.cancelled()
+    clock.return_value = 200.0
+    assert token.cancelled()
+    assert client.exists.call_count == 2
+
+
+def test_raise_if_stopped_checks_only_the_bound_token(cancellations):
+    """Outside a bound job, and for a job not cancelled, nothing is raised."""
+    cancellation.raise_if_stopped()
+    cancellations.cancel(5)
+
+    with cancellation.bind(cancellations.token(6)):
+        cancellation.raise_if_stopped()
+    with (
+        pytest.raises(JobCancelledError),
+        cancellation.bind(cancellations.token(5)),
+    ):
+        cancellation.raise_if_stopped()
+    cancellation.raise_if_stopped()
+
+
+def test_job_cancelled_error_passes_broad_exception_handlers():
+    """Broad `except Exception` fallbacks in the pipeline do not swallow a cancel."""
+    assert not issubclass(JobCancelledError, Exception)
+
+
+def test_sleep_without_a_bound_job_is_one_plain_sleep(mocker):
+    """Outside a job, sleep is time.sleep, so patched sleeps still see one call."""
+    mock_sleep = mocker.patch("cancellation.time.sleep")
+
+    cancellation.sleep(60)
+
+    mock_sleep.assert_called_once_with(60)
+
+
+def test_sleep_wakes_up_to_raise_once_cancelled(mocker, cancellations):
+    """A bound job's sleep is sliced, so a cancel ends it within a slice."""
+    token = cancellations.token(5)
+    mock_sleep = mocker.patch(
+        "cancellation.time.sleep",
+        side_effect=lambda _seconds: cancellations.cancel(5),
+    )
+
+    with pytest.raises(JobCancelledError), cancellation.bind(token):
+        cancellation.sleep(60)
+
+    mock_sleep.assert_called_once_with(1.0)
+
+
+def test_sleep_returns_after_the_full_time_when_not_cancelled(mocker, cancellations):
+    """An uncancelled bound job sleeps out the whole duration, slice by slice."""
+    clock = mocker.patch("cancellation.time.monotonic", return_value=0.0)
+
+    def advance(seconds):
+        clock.return_value += seconds
+
+    mock_sleep = mocker.patch("cancellation.time.sleep", side_effect=advance)
+
+    with cancellation.bind(cancellations.token(5)):
+        cancellation.sleep(2.5)
+
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 1.0, 0.5]
+
+
+def test_download_hook_raises_for_a_cancelled_job(cancellations):
+    """The yt-dlp progress hook stops a cancelled job's download."""
+    cancellations.cancel(5)
+
+    with (
+        cancellation.bind(cancellations.token(5)),
+        pytest.raises(JobCancelledError),
+    ):
+        cancellation.progress_hook({"status": "downloading"})
+
+
+def test_deadline_is_bound_only_inside_its_block(mocker):
+    """time_left counts down inside the block and is None outside it."""
+    clock = mocker.patch("cancellation.time.monotonic", return_value=100.0)
+
+    assert cancellation.time_left() is None
+    with cancellation.deadline(30):
+        clock.return_value = 110.0
+        assert cancellation.time_left() == 20.0
+    assert cancellation.time_left() is None
+
+
+def test_raise_if_stopped_raises_once_the_deadline_passes(mocker):
+    """A job past its deadline stops, as a cancel whose cleanup still runs."""
+    clock = mocker.patch("cancellation.time.monotonic", return_value=100.0)
+
+    with cancellation.deadline(30):
+        cancellation.raise_if_stopped()
+        clock.return_value = 130.0
+        with pytest.raises(JobDeadlineExceededError):
+            cancellation.raise_if_stopped()
+    assert issubclass(JobDeadlineExceededError, JobCancelledError)
+
+
+def test_sleep_past_the_deadline_raises_without_sleeping(mocker):
+    """A backoff the job has no time left for fails now, not when it ends."""
+    mock_sleep = mocker.patch("cancellation.time.sleep")
+
+    with pytest.raises(JobDeadlineExceededError), cancellation.deadline(10):
+        cancellation.sleep(30)
+
+    mock_sleep.assert_not_called()
+
+
+def test_sleep_within_the_deadline_sleeps_without_a_token(mocker):
+    """A deadline alone makes sleep sliced too, with no cancel token bound."""
+    clock = mocker.patch("cancellation.time.monotonic", return_value=0.0)
+
+    def advance(seconds):
+        clock.return_value += seconds
+
+    mock_sleep = mocker.patch("cancellation.time.sleep", side_effect=advance)
+
+    with cancellation.deadline(60):
+        cancellation.sleep(1.5)
+
+    assert [call.args[0] for call in mock_sleep.call_args_list] == [1.0, 0.5]
@@ -0,0 +1,293 @@
+import threading
+
+import fakeredis
+import pytest
+
+from coalescing import Coalescer
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every process."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _coalescer(client, wait_timeout=5.0):
+    return Coalescer(client, 60, 0.01, wait_timeout, 30)
+
+
+class _Summaries:
+    """Work that counts its runs and the followers it served."""
+
+    def __init__(self):
+        self.answer = None
+        self.runs = 0
+        self.follows = 0
+
+    def work(self):
+        self.runs += 1
+        self.answer = "summary"
+        return self.answer
+
+    def on_follow(self):
+        self.follows += 1
+
+
+def test_a_lone_request_does_the_work_and_releases_its_claim(client):
+    """With nothing else running, the work runs once and the claim is gone after."""
+    summaries = _Summaries()
+
+    answer = _coalescer(client).run(
+        "k",
+        summaries.work,
+        summaries.on_follow,
+    )
+
+    assert answer == "summary"
+    assert (summaries.runs, summaries.follows) == (1, 0)
+    assert not client.exists("coalesce:k")
+
+
+def test_a_leader_publishes_its_answer_for_other_processes(client):
+    """The answer is left under its own short-lived key, whatever the cache kept."""
+    summaries = _Summaries()
+
+    _coalescer(client).run("k", summaries.work, summaries.on_follow)
+
+    assert client.get("coalesce-result:k") == "summary"
+    assert 0 < client.ttl("coalesce-result:k") <= 30
+
+
+def test_a_failed_leader_publishes_nothing(client):
+    """A leader whose work raised releases its claim and leaves no answer."""
+
+    def failing_work():
+        msg = "model down"
+        raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError):
+        _coalescer(client).run("k", failing_work, _Summaries().on_follow)
+
+    assert not client.exists("coalesce:k")
+    assert not client.exists("coalesce-result:k")
+
+
+def test_a_local_twin_waits_for_the_leaders_answer(mocker, client):
+    """A second thread with the same key is served the first one's answer."""
+    coalescer = _coalescer(client)
+    summaries = _Summaries()
+    started, follower_waiting = threading.Event(), threading.Event()
+    mocker.patch(
+        "coalescing.cancellation.raise_if_stopped",
+        side_effect=follower_waiting.set,
+    )
+
+    def slow_work():
+        started.set()
+        follower_waiting.wait(5)
+        return summaries.work()
+
+    leader = threading.Thread(
+        target=coalescer.run,
+        args=("k", slow_work, summaries.on_follow),
+    )
+    leader.start()
+    started.wait(5)
+    answer = coalescer.run("k", summaries.work, summaries.on_follow)
+    leader.join(5)
+
+    assert answer == "summary"
+    assert (summaries.runs, summaries.follows) == (1, 1)
+    assert coalescer._leaders == {}
+
+
+def test_a_twin_whose_leader_failed_leads_in_its_place(mocker, client):
+    """No answer to follow means the follower leads, and is not charged twice."""
+    coalescer = _coalescer(client)
+    summaries = _Summaries()
+    started, follower_waiting = threading.Event(), threading.Event()
+    mocker.patch(
+        "coalescing.cancellation.raise_if_stopped",
+        side_effect=follower_waiting.set,
+    )
+
+    def failing_work():
+        started.set()
+        follower_waiting.wait(5)
+        msg = "model down"
+        raise RuntimeError(msg)
+
+    def lead():
+        with pytest.raises(RuntimeError):
+            coalescer.run("k", failing_work, summaries.on_follow)
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(5)
+    answer = coalescer.run("k", summaries.work, summaries.on_follow)
+    leader.join(5)
+
+    assert answer == "summary"
+    assert (summaries.runs, summaries.follows) == (1, 0)
+    assert client.get("coalesce-result:k") == "summary"
+    assert not client.exists("coalesce:k")
+
+
+def test_the_twins_of_a_failed_leader_follow_one_of_them(mocker, client):
+    """Of two followers left without an answer, one leads and the other follows."""
+    coalescer = _coalescer(client)
+    summaries = _Summaries()
+    started, both_waiting, new_lead_followed = (
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+    )
+    failed_lead = []
+    polling = set()
+
+    def poll():
+        polling.add(threading.get_ident())
+        if len(polling) == 2:
+            both_waiting.set()
+        if coalescer._leaders.get("k") not in (None, *failed_lead):
+            new_lead_followed.set()
+
+    mocker.patch("coalescing.cancellation.raise_if_stopped", side_effect=poll)
+
+    def failing_work():
+        failed_lead.append(coalescer._leaders["k"])
+        started.set()
+        both_waiting.wait(5)
+        msg = "model down"
+        raise RuntimeError(msg)
+
+    def new_leaders_work():
+        new_lead_followed.wait(5)
+        return summaries.work()
+
+    def lead():
+        with pytest.raises(RuntimeError):
+            coalescer.run("k", failing_work, summaries.on_follow)
+
+    answers = []
+
+    def follow():
+        answers.append(coalescer.run("k", new_leaders_work, summaries.on_follow))
+
+    leader = threading.Thread(target=lead)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=follow) for _ in range(2)]
+    for follower in followers:
+        follower.start()
+    for thread in (leader, *followers):
+        thread.join(5)
+
+    assert answers == ["summary", "summary"]
+    assert (summaries.runs, summaries.follows) == (1, 1)
+    assert coalescer._leaders == {}
+
+
+def test_a_claim_held_by_another_process_is_polled_until_released(mocker, client):
+    """A process finding the key claimed waits for the claim to go, then follows."""
+    client.set("coalesce:k", "other")
+    summaries = _Summaries()
+
+    def other_process_finishes(_seconds):
+        client.set("coalesce-result:k", "their summary")
+        client.delete("coalesce:k")
+
+    sleep = mocker.patch(
+        "coalescing.cancellation.sleep",
+        side_effect=other_process_finishes,
+    )
+
+    answer = _coalescer(client).run(
+        "k",
+        summaries.work,
+        summaries.on_follow,
+    )
+
+    assert answer == "their summary"
+    sleep.assert_called_once_with(0.01)
+    assert (summaries.runs, summaries.follows) == (0, 1)
+
+
+def test_an_empty_answer_is_followed_like_any_other(mocker, client):
+    """An empty string from another process is an answer, not a failed leader."""
+    client.set("coalesce:k", "other")
+    summaries = _Summaries()
+
+    def other_process_finishes(_seconds):
+        client.set("coalesce-result:k", "")
+        client.delete("coalesce:k")
+
+    mocker.patch("coalescing.cancellation.sleep", side_effect=other_process_finishes)
+
+    answer = _coalescer(client).run("k", summaries.work, summaries.on_follow)
+
+    assert answer == ""
+    assert (summaries.runs, summaries.follows) == (0, 1)
+
+
+def test_a_claim_released_with_no_answer_is_taken_over(mocker, client):
+    """When another process's leader fails, this one claims the key and leads."""
+    client.set("coalesce:k", "other")
+    summaries = _Summaries()
+
+    def other_process_fails(_seconds):
+        client.delete("coalesce:k")
+
+    mocker.patch("coalescing.cancellation.sleep", side_effect=other_process_fails)
+
+    answer = _coalescer(client).run("k", summaries.work, summaries.on_follow)
+
+    assert answer == "summary"
+    assert (summaries.runs, summaries.follows) == (1, 0)
+    assert client.get("coalesce-result:k") == "summary"
+    assert not client.exists("coalesce:k")
+
+
+def test_a_claim_outlasting_the_wait_is_given_up_on(client):
+    """Past wait_timeout with no answer, the work is done here after all."""
+    client.set("coalesce:k", "other")
+    summaries = _Summaries()
+
+    answer = _coalescer(client, wait_timeout=0).run(
+        "k",
+        summaries.work,
+        summaries.on_follow,
+    )
+
+    assert answer == "summary"
+    assert (summaries.runs, summaries.follows) == (1, 0)
+    assert client.get("coalesce:k") == "other"
+
+
+def test_a_leader_leaves_a_claim_taken_over_after_its_own_expired(client):
+    """Once the claim expired and another process took it, it is not released."""
+    summaries = _Summaries()
+
+    def overrun():
+        client.set("coalesce:k", "other")
+        return summaries.work()
+
+    _coalescer(client).run("k", overrun, summaries.on_follow)
+
+    assert client.get("coalesce:k") == "other"
+    assert client.get("coalesce-result:k") == "summary"
+
+
+def test_a_failed_leader_leaves_a_claim_taken_over_untouched(client):
+    """With no answer and the claim no longer its own, release does nothing."""
+
+    def overrun_and_fail():
+        client.set("coalesce:k", "other")
+        msg = "model down"
+        raise RuntimeError(msg)
+
+    with pytest.raises(RuntimeError):
+        _coalescer(client).run("k", overrun_and_fail, _Summaries().on_follow)
+
+    assert client.get("coalesce:k") == "other"
+    assert not client.exists("coalesce-result:k")
@@ -73,6 +73,7 @@ def test_handle_myinfo(message_factory, mocker):
         prompt_key_for_summary="basic_prompt_for_transcript",
         daily_limit=10,
         thinking_level="minimal",
+        use_summary_cache=False,
     )
     fakes.user_repo.select_user.return_value = mock_user
     fakes.quota_manager.get_remaining_quota.return_value = 7
@@ -86,6 +87,7 @@ def test_handle_myinfo(message_factory, mocker):
     assert "Remaining quota: 7" in content
     assert "Summarizing model: Gemini 3.7 Flash" in content
     assert "Thinking level: Minimal" in content
+    assert "Summary cache: Off" in content
     assert "Prompt strategy: Detailed Summary" in content
     assert "YouTube transcript" not in content
     assert "Audio transcript" not in content
@@ -125,6 +127,11 @@ def test_handle_myinfo_missing_user(message_factory, mocker):
             "Select thinking level",
             "proceed_set_thinking_level",
         ),
+        (
+            "handle_set_summary_cache",
+            "Select whether to reuse earlier summaries",
+            "proceed_set_summary_cache",
+        ),
     ],
 )
 def test_handle_set_setting_shows_keyboard(
@@ -209,6 +216,21 @@ def test_proceed_set_thinking_level_success(message_factory, mocker):
     assert "The thinking level is set to High" in fakes.bot.send_message.call_args[0][1]
 
 
+def test_proceed_set_summary_cache_success(message_factory, mocker):
+    """Test switching the summary cache off."""
+    msg = message_factory(content_type="text", text="Off")
+    app, fakes = make_app(mocker)
+    fakes.user_repo.set_use_summary_cache.return_value = True
+
+    app.proceed_set_summary_cache(msg)
+
+    fakes.user_repo.set_use_summary_cache.assert_called_once_with(
+        msg.from_user.id,
+        enabled=False,
+    )
+    assert "The summary cache is set to Off" in fakes.bot.send_message.call_args[0][1]
+
+
 @pytest.mark.parametrize(
     ("proceed_name", "setter_name", "null_attr", "error_msg"),
     [
@@ -236,6 +258,12 @@ def test_proceed_set_thinking_level_success(message_factory, mocker):
             "text",
             "User information or level is missing.",
         ),
+        (
+            "proceed_set_summary_cache",
+            "set_use_summary_cache",
+            "text",
+            "User information or choice is missing.",
+        ),
     ],
 )
 def test_proceed_set_setting_missing_input(
@@ -278,6 +306,12 @@ def test_proceed_set_setting_missing_input(
             "Ludicrous",
             "Unknown level",
         ),
+        (
+            "proceed_set_summary_cache",
+            "set_use_summary_cache",
+            "Maybe",
+            "Unknown choice",
+        ),
     ],
 )
 def test_proceed_set_setting_invalid_choice(
@@ -330,6 +364,12 @@ def test_proceed_set_target_language_invalid_choice(message_factory, mocker):
             "High",
             "Failed to update thinking level.",
         ),
+        (
+            "proceed_set_summary_cache",
+            "set_use_summary_cache",
+            "Off",
+            "Failed to update summary cache.",
+        ),
     ],
 )
 def test_proceed_set_setting_db_failure(
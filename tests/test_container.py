@@ -1,35 +1,60 @@
 import config
 import database
+from caching import PrefixedTextCache, SummaryCache
+from cancellation import Cancellations
 from container import Container, build_container
-from database import UserRepository
+from database import JobRepository, UserRepository
+from dedupe import UpdateDeduplicator
 from download import Downloader
 from handlers import MessageHandlers
+from inflight import InFlightLimiter
+from lease import LeaderLease
 from llm import LLMClient
 from parsing import WebParser
 from services import GeminiHelper, Messenger, QuotaManager, Tracer
+from streams import JobStream
 from summary import Summarizer
+from transcoding import Transcoder
 from transcription import ApiBackend, AudioTranscriber, YouTubeTranscriber, YtDlpBackend
+from uploads import UploadRegistry
+from webhook import WebhookServer
+from workers import Scheduler, WorkerPool
 
 
 def test_build_container_returns_wired_container():
     """build_container wires each collaborator to config's actual clients.
 
-    The container exposes only what BotApp holds; the rest of the graph is
+    The container exposes only what BotApp and AsyncBotApp hold; the rest of the graph is
     reached through `handlers`, so that is what the traversal below follows.
     """
     container = build_container()
 
     assert isinstance(container, Container)
     assert container.bot is config.bot
+    assert container.async_bot is config.async_bot
     assert isinstance(container.quota_manager, QuotaManager)
     assert isinstance(container.tracer, Tracer)
     assert isinstance(container.user_repo, UserRepository)
+    assert isinstance(container.jobs, JobRepository)
     assert isinstance(container.handlers, MessageHandlers)
+    assert isinstance(container.scheduler, Scheduler)
+    lanes = container.scheduler._lanes
+    assert lanes.keys() == {"quick", "long"}
+    assert all(isinstance(pool, WorkerPool) for pool in lanes.values())
+    assert lanes["quick"]._workers == config.QUICK_POOL_SIZE
+    assert lanes["long"]._workers == config.WORKER_POOL_SIZE
+    assert isinstance(container.stream, JobStream)
+    assert container.stream._client is config.redis_client
+    assert container.stream._consumer == config.JOB_STREAM_CONSUMER
+    # BOT_MODE defaults to polling, which needs no webhook server.
+    assert container.webhook is None
 
     assert container.quota_manager._rate_limiter is config.rate_limiter
     assert container.quota_manager._per_minute_rate is config.per_minute_rate
     assert container.tracer._client is config.langfuse_client
     assert container.user_repo._session_factory is database.Session
+    assert container.user_repo._cache._ttl == config.USER_CACHE_TTL
+    assert container.jobs._session_factory is database.Session
 
     handlers = container.handlers
     assert handlers._bot is config.bot
@@ -49,6 +74,10 @@ def test_build_container_returns_wired_container():
     assert summarizer._llm_client._client is config.gemini_client
     assert isinstance(summarizer._audio_transcriber, AudioTranscriber)
     assert summarizer._audio_transcriber._client is config.replicate_client
+    assert (
+        summarizer._audio_transcriber._pinned_version
+        == config.REPLICATE_WHISPERX_VERSION
+    )
     assert isinstance(summarizer._yt_transcriber, YouTubeTranscriber)
     assert isinstance(summarizer._yt_transcriber._primary, ApiBackend)
     assert isinstance(summarizer._yt_transcriber._fallback, YtDlpBackend)
@@ -58,3 +87,168 @@ def test_build_container_returns_wired_container():
     assert summarizer._quota_manager is container.quota_manager
     assert summarizer._downloader is handlers._downloader
     assert handlers._quota_manager is container.quota_manager
+
+
+def test_build_container_shares_one_transcoder():
+    """Handlers and Summarizer encode through one Transcoder, so they share its slots."""
+    container = build_container()
+
+    transcoder = container.handlers._transcoder
+    assert isinstance(transcoder, Transcoder)
+    assert container.handlers._summarizer._transcoder is transcoder
+    assert transcoder._timeout == config.TRANSCODE_TIMEOUT
+    assert transcoder._threads == config.TRANSCODE_THREADS
+
+
+def test_build_container_registers_gemini_uploads_in_valkey():
+    """The upload registry lives in the bot's database, shared by every process."""
+    uploads = build_container().handlers._summarizer._uploads
+
+    assert isinstance(uploads, UploadRegistry)
+    assert uploads._client is config.redis_client
+    assert uploads._max_files == config.GEMINI_UPLOAD_MAX_FILES
+    assert uploads._in_use == config.GEMINI_UPLOAD_IN_USE_SECONDS
+
+
+def test_build_container_coalesces_through_the_bot_database():
+    """Identical requests are coalesced across processes within the job deadline."""
+    coalescer = build_container().handlers._coalescer
+
+    assert coalescer._client is config.redis_client
+    assert coalescer._claim_ttl == config.JOB_DEADLINE_SECONDS
+    assert coalescer._wait_timeout == config.JOB_DEADLINE_SECONDS
+
+
+def test_build_container_leaves_gemini_context_caching_off_by_default():
+    """Without GEMINI_CONTEXT_CACHE, every run sends its instruction and prompt."""
+    llm_client = build_container().handlers._summarizer._llm_client
+
+    assert llm_client._context_cache is None
+
+
+def test_build_container_records_gemini_context_caches_in_valkey(monkeypatch):
+    """With the flag on, every process shares one cache per prompt and language."""
+    monkeypatch.setattr(config, "GEMINI_CONTEXT_CACHE", True)
+
+    context_cache = build_container().handlers._summarizer._llm_client._context_cache
+
+    assert context_cache._client is config.gemini_client
+    assert context_cache._store is config.redis_client
+    assert context_cache._ttl == config.GEMINI_CONTEXT_CACHE_TTL
+
+
+def test_build_container_shares_video_info_between_probe_and_download():
+    """The subtitle probe and the audio download read one yt-dlp info cache."""
+    summarizer = build_container().handlers._summarizer
+    info = summarizer._downloader._info
+
+    assert summarizer._yt_transcriber._fallback._info is info
+    assert info._cache._ttl == config.YT_INFO_CACHE_TTL
+
+
+def test_build_container_caches_castro_audio_urls_in_valkey():
+    """Castro audio URLs are shared by every process, with failures kept briefly."""
+    castro = build_container().handlers._summarizer._downloader._castro
+
+    assert castro._cache._client is config.cache_client
+    assert castro._cache._namespace == "castro"
+    assert castro._failure_ttl == config.CASTRO_FAILURE_TTL
+
+
+def test_build_container_keeps_the_caches_in_valkey():
+    """Summaries, transcripts and pages are cached undecoded, each in its own place."""
+    container = build_container()
+    summaries = container.handlers._summary_cache
+    transcripts = container.handlers._summarizer._yt_transcriber._cache
+
+    assert isinstance(summaries, SummaryCache)
+    assert summaries._cache._client is config.cache_client
+    assert summaries._cache._max_bytes == config.SUMMARY_CACHE_MAX_BYTES
+    assert isinstance(transcripts, PrefixedTextCache)
+    assert transcripts._cache._client is config.cache_client
+    assert transcripts._cache._namespace == "transcript"
+    assert transcripts._missing_ttl == config.TRANSCRIPT_CACHE_MISSING_TTL
+    pages = container.handlers._web_parser._cache
+    assert pages._cache._namespace == "web"
+    assert pages._cache._ttl == config.WEB_PARSE_CACHE_TTL
+    assert pages._missing_ttl is None
+
+
+def test_build_container_caches_redirects_and_host_verdicts_in_process():
+    """The resolver's two caches use their own TTLs, the DNS one the shorter."""
+    resolver = build_container().handlers._web_parser._resolver
+
+    assert resolver._redirects._ttl == config.URL_RESOLVE_CACHE_TTL
+    assert resolver._verdicts._ttl == config.HOST_VERDICT_TTL
+    assert resolver._verdicts._max_entries == config.URL_RESOLVE_CACHE_MAX_ENTRIES
+
+
+def test_build_container_limits_jobs_per_user_in_valkey():
+    """The per-user job limit lives in the bot's Valkey database, shared by processes."""
+    limiter = build_container().limiter
+
+    assert isinstance(limiter, InFlightLimiter)
+    assert limiter._client is config.redis_client
+    assert limiter._limit == config.USER_MAX_INFLIGHT_JOBS
+    assert limiter._slot_ttl == config.USER_JOB_SLOT_TTL
+
+
+def test_build_container_keeps_cancel_flags_in_valkey():
+    """/cancel flags jobs in the bot's Valkey database, seen by every process."""
+    cancellations = build_container().cancellations
+
+    assert isinstance(cancellations, Cancellations)
+    assert cancellations._client is config.redis_client
+    assert cancellations._ttl == config.JOB_CANCEL_TTL
+    assert cancellations._check_interval == config.JOB_CANCEL_CHECK_SECONDS
+
+
+def test_build_container_keeps_the_polling_lease_in_valkey():
+    """Replicas contend for one lease key, each under its own holder id."""
+    lease = build_container().lease
+
+    assert isinstance(lease, LeaderLease)
+    assert lease._client is config.redis_client
+    assert lease._key == config.LEADER_LEASE_KEY
+    assert lease._holder == config.LEADER_LEASE_HOLDER
+    assert lease._ttl == config.LEADER_LEASE_TTL
+    assert lease._renew_interval == config.LEADER_LEASE_RENEW_SECONDS
+
+
+def test_build_container_shares_one_deduplicator_in_valkey(monkeypatch):
+    """BotApp and the webhook drop redeliveries against the same Valkey keys."""
+    monkeypatch.setattr(config, "BOT_MODE", "webhook")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "secret")
+
+    container = build_container()
+
+    assert isinstance(container.dedupe, UpdateDeduplicator)
+    assert container.dedupe._client is config.redis_client
+    assert container.dedupe._ttl == config.UPDATE_DEDUPE_TTL
+    assert container.webhook._server.dedupe is container.dedupe
+    container.webhook.close()
+
+
+def test_build_container_builds_the_webhook_server_in_webhook_mode(monkeypatch):
+    """BOT_MODE=webhook wires a WebhookServer for config.bot; nothing is bound yet."""
+    monkeypatch.setattr(config, "BOT_MODE", "webhook")
+    monkeypatch.setattr(config, "WEBHOOK_URL", "https://bot.example.com/hook")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "secret")
+    monkeypatch.setattr(config, "WEBHOOK_PORT", 0)
+
+    webhook = build_container().webhook
+
+    assert isinstance(webhook, WebhookServer)
+    assert webhook._bot is config.bot
+    assert webhook._url == "https://bot.example.com/hook"
+    webhook.close()
+
+
+def test_build_container_logs_every_cache_and_the_user_cache():
+    """The stats log reads each Valkey cache and this process's user cache."""
+    container = build_container()
+    stats_log = container.stats_log
+
+    assert set(stats_log._sources) == {"summary", "transcript", "web", "castro", "user"}
+    assert stats_log._sources["user"] == container.user_repo.cache_stats
+    assert stats_log._interval == config.CACHE_STATS_LOG_SECONDS
@@ -0,0 +1,136 @@
+import fakeredis
+import pytest
+from google.genai import errors
+
+from caching import TtlCache
+from context_cache import ContextCache
+from prompts import prompt_version, strategy_prompt, system_instruction
+
+MODEL = "gemini-3.7-flash"
+PROMPT = "basic_prompt_for_transcript"
+KEY = f"gemini-context:{MODEL}:{prompt_version(PROMPT)}:English"
+
+
+@pytest.fixture
+def store():
+    """Provide an in-memory Redis-compatible server shared by every process."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def client(mocker):
+    """A Gemini client that creates cached contents under one name."""
+    client = mocker.MagicMock()
+    client.caches.create.return_value.name = "cachedContents/abc"
+    return client
+
+
+def _context_cache(client, store):
+    return ContextCache(client, store, 3600, 300, TtlCache(86400, 16))
+
+
+def test_name_for_creates_a_cache_holding_the_instruction_and_prompt(client, store):
+    """A first run creates the cache and records its name for the refresh window."""
+    name = _context_cache(client, store).name_for(MODEL, PROMPT, "English")
+
+    assert name == "cachedContents/abc"
+    call = client.caches.create.call_args
+    assert call.kwargs["model"] == MODEL
+    config = call.kwargs["config"]
+    assert config.system_instruction == system_instruction("English")
+    assert config.contents[0].parts[0].text == strategy_prompt(PROMPT)
+    assert config.ttl == "3600s"
+    assert store.get(KEY) == "cachedContents/abc"
+    assert store.ttl(KEY) == 3300
+
+
+def test_name_for_reuses_the_recorded_cache(client, store):
+    """A cache another process created is used without calling Gemini."""
+    store.set(KEY, "cachedContents/theirs")
+
+    name = _context_cache(client, store).name_for(MODEL, PROMPT, "English")
+
+    assert name == "cachedContents/theirs"
+    client.caches.create.assert_not_called()
+
+
+def test_name_for_keys_on_the_target_language(client, store):
+    """Each target language gets a cache of its own."""
+    context_cache = _context_cache(client, store)
+
+    context_cache.name_for(MODEL, PROMPT, "English")
+    context_cache.name_for(MODEL, PROMPT, "Ukrainian")
+
+    assert client.caches.create.call_count == 2
+
+
+def test_name_for_remembers_a_key_gemini_refuses(client, store):
+    """Content under the minimum is refused once, then runs uncached unasked."""
+    client.caches.create.side_effect = errors.ClientError(
+        400,
+        {"error": {"message": "Cached content is too small."}},
+    )
+    context_cache = _context_cache(client, store)
+
+    assert context_cache.name_for(MODEL, PROMPT, "English") is None
+    assert context_cache.name_for(MODEL, PROMPT, "English") is None
+
+    client.caches.create.assert_called_once()
+    assert not store.exists(KEY)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        ConnectionError("down"),
+        errors.ClientError(429, {"error": {"status": "RESOURCE_EXHAUSTED"}}),
+        errors.ClientError(403, {"error": {"status": "PERMISSION_DENIED"}}),
+    ],
+)
+def test_name_for_runs_uncached_on_any_other_failure(client, store, error):
+    """A quota, permission or network failure is not remembered; the next run retries."""
+    client.caches.create.side_effect = error
+    context_cache = _context_cache(client, store)
+
+    assert context_cache.name_for(MODEL, PROMPT, "English") is None
+    assert context_cache.name_for(MODEL, PROMPT, "English") is None
+
+    assert client.caches.create.call_count == 2
+
+
+def test_name_for_records_nothing_for_a_nameless_cache(client, store):
+    """A created cache Gemini gave no name is run without."""
+    client.caches.create.return_value.name = None
+
+    assert _context_cache(client, store).name_for(MODEL, PROMPT, "English") is None
+    assert not store.exists(KEY)
+
+
+@pytest.mark.parametrize("delete_fails", [False, True])
+def test_name_for_yields_to_a_cache_recorded_meanwhile(client, store, delete_fails):
+    """Losing the race to record deletes this process's cache and uses the winner's."""
+
+    def theirs_recorded_first(**_kwargs):
+        store.set(KEY, "cachedContents/theirs")
+        return client.caches.create.return_value
+
+    client.caches.create.side_effect = theirs_recorded_first
+    if delete_fails:
+        client.caches.delete.side_effect = ConnectionError("down")
+
+    name = _context_cache(client, store).name_for(MODEL, PROMPT, "English")
+
+    assert name == "cachedContents/theirs"
+    client.caches.delete.assert_called_once_with(name="cachedContents/abc")
+
+
+def test_discard_forgets_the_recorded_cache(client, store):
+    """A cache Gemini no longer has is forgotten, so the next run makes one."""
+    context_cache = _context_cache(client, store)
+    context_cache.name_for(MODEL, PROMPT, "English")
+
+    context_cache.discard(MODEL, PROMPT, "English")
+
+    assert not store.exists(KEY)
+    assert context_cache.name_for(MODEL, PROMPT, "English") == "cachedContents/abc"
+    assert client.caches.create.call_count == 2
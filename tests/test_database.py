@@ -1,15 +1,18 @@
+from datetime import UTC, datetime, timedelta
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, update
 from sqlalchemy.orm import sessionmaker
 
+from caching import TtlCache
 from config import (
     ALLOWED_THINKING_LEVELS,
     DEFAULT_MODEL_ID_FOR_SUMMARY,
     DEFAULT_PROMPT_KEY,
     DEFAULT_THINKING_LEVEL,
 )
-from database import UserRepository
-from models import Base, UsersOrm
+from database import JobRepository, UserRepository
+from models import Base, JobsOrm, UsersOrm
 
 
 @pytest.fixture
@@ -25,7 +28,13 @@ def sqlite_session_factory(tmp_path):
 @pytest.fixture
 def user_repo(sqlite_session_factory):
     """Provide a UserRepository backed by the isolated SQLite session factory."""
-    return UserRepository(sqlite_session_factory)
+    return UserRepository(sqlite_session_factory, TtlCache(30, 16))
+
+
+@pytest.fixture
+def job_repo(sqlite_session_factory):
+    """Provide a JobRepository backed by the isolated SQLite session factory."""
+    return JobRepository(sqlite_session_factory, "worker-a", 120)
 
 
 def test_register_user_success(user_repo, sqlite_session_factory):
@@ -223,8 +232,231 @@ def test_set_thinking_level_rejects_unknown_value(user_repo, sqlite_session_fact
         ("set_summarizing_model", "gemini-3.7-flash"),
         ("set_prompt_strategy", "key_points_for_transcript"),
         ("set_thinking_level", "high"),
+        ("set_use_summary_cache", False),
     ],
 )
 def test_set_setting_missing_user(user_repo, setter, value):
     """Test each setting setter returns False when the user does not exist."""
     assert getattr(user_repo, setter)(999, value) is False
+
+
+def test_set_use_summary_cache_defaults_on_and_switches(
+    user_repo,
+    sqlite_session_factory,
+):
+    """Test a new user uses the summary cache until they switch it off."""
+    user_repo.register_user(123, "John", "Doe", "jdoe")
+    with sqlite_session_factory() as session:
+        assert session.get(UsersOrm, 123).use_summary_cache is True
+
+    assert user_repo.set_use_summary_cache(123, enabled=False) is True
+
+    with sqlite_session_factory() as session:
+        assert session.get(UsersOrm, 123).use_summary_cache is False
+
+
+def test_select_user_reads_the_database_once_within_the_ttl(
+    user_repo,
+    sqlite_session_factory,
+):
+    """Test a cached user is served without a query, as a fresh object each time."""
+    user_repo.register_user(123, "John", "Doe", "jdoe", approved=True)
+    first = user_repo.select_user(123)
+    with sqlite_session_factory() as session:
+        session.get(UsersOrm, 123).approved = False
+        session.commit()
+
+    second = user_repo.select_user(123)
+
+    assert second.approved is True
+    assert second is not first
+    assert user_repo.check_auth(123) is True
+    stats = user_repo.cache_stats()
+    assert (stats.hits, stats.misses) == (2, 1)
+    assert stats.saved_seconds == pytest.approx(2 * stats.miss_seconds)
+
+
+def test_settings_writes_drop_the_cached_user(user_repo):
+    """Test a setter or a re-registration is seen by the next select_user."""
+    user_repo.register_user(123, "John", "Doe", "jdoe")
+    user_repo.select_user(123)
+
+    assert user_repo.set_target_language(123, "german") is True
+    assert user_repo.select_user(123).target_language == "German"
+    assert user_repo.set_use_summary_cache(123, enabled=False) is True
+    assert user_repo.select_user(123).use_summary_cache is False
+    assert user_repo.cache_stats().hits == 0
+
+
+def test_register_user_drops_a_cached_entry(sqlite_session_factory, mocker):
+    """Test a successful registration forgets whatever was cached for the id."""
+    cache = mocker.Mock()
+    repo = UserRepository(sqlite_session_factory, cache)
+
+    repo.register_user(123, "John", "Doe", "jdoe")
+
+    cache.discard.assert_called_once_with("123")
+
+
+UPDATE = {"message_id": 1, "chat": {"id": 42, "type": "private"}, "text": "hi"}
+
+
+def test_add_job_records_a_queued_job(job_repo, sqlite_session_factory):
+    """Test add stores the update as a queued job with no attempts yet."""
+    job_id = job_repo.add(42, UPDATE)
+
+    with sqlite_session_factory() as session:
+        job = session.get(JobsOrm, job_id)
+        assert job is not None
+        assert (job.chat_id, job.update, job.state) == (42, UPDATE, "queued")
+        assert job.attempts == 0
+        assert job.settings is None
+
+
+def test_get_returns_a_detached_job_or_none(job_repo):
+    """Test get returns a job usable after its session closes, or None."""
+    job_id = job_repo.add(42, UPDATE)
+
+    job = job_repo.get(job_id)
+
+    assert job is not None
+    assert (job.chat_id, job.update, job.state) == (42, UPDATE, "queued")
+    assert job_repo.get(job_id + 1) is None
+
+
+def test_claim_job_moves_it_to_running_once(job_repo):
+    """Test claim returns the job with its attempt counted, and only once."""
+    job_id = job_repo.add(42, UPDATE)
+
+    job = job_repo.claim(job_id)
+
+    assert job is not None
+    assert (job.id, job.state, job.attempts, job.update) == (
+        job_id,
+        "running",
+        1,
+        UPDATE,
+    )
+    assert job_repo.claim(job_id) is None
+    assert job_repo.claim(999) is None
+
+
+def test_claim_job_reads_the_row_with_skip_locked(mocker, job_repo):
+    """Test claim locks the row without waiting on a worker that holds it."""
+    session = mocker.MagicMock()
+    job_repo._session_factory = mocker.MagicMock()
+    job_repo._session_factory.return_value.__enter__.return_value = session
+    session.scalars.return_value.first.return_value = None
+
+    job_repo.claim(1)
+
+    statement = session.scalars.call_args.args[0]
+    assert statement._for_update_arg.skip_locked is True
+
+
+def test_save_settings_and_finish_update_the_job(job_repo, sqlite_session_factory):
+    """Test save_settings records the snapshot and finish sets the final state."""
+    job_id = job_repo.add(42, UPDATE)
+
+    job_repo.save_settings(job_id, {"model": "gemini-3.7-flash"})
+    job_repo.finish(job_id, "failed")
+
+    with sqlite_session_factory() as session:
+        job = session.get(JobsOrm, job_id)
+        assert job is not None
+        assert job.settings == {"model": "gemini-3.7-flash"}
+        assert job.state == "failed"
+
+
+def _age_heartbeat(session_factory, job_id, seconds):
+    """Make a job's heartbeat `seconds` old, as if its process stopped beating."""
+    beat = datetime.now(UTC).replace(tzinfo=None) - timedelta(seconds=seconds)
+    with session_factory() as session:
+        session.execute(
+            update(JobsOrm).where(JobsOrm.id == job_id).values(heartbeat_at=beat),
+        )
+        session.commit()
+
+
+def test_claim_stamps_the_job_with_its_owner_and_a_heartbeat(job_repo):
+    """Test a claimed job names this process and was heard from just now."""
+    job_id = job_repo.add(42, UPDATE)
+    before = datetime.now(UTC).replace(tzinfo=None)
+
+    job = job_repo.claim(job_id)
+
+    assert job is not None
+    assert job.claimed_by == "worker-a"
+    assert job.heartbeat_at >= before
+
+
+def test_heartbeat_refreshes_only_this_processs_running_jobs(
+    job_repo,
+    sqlite_session_factory,
+):
+    """Test a beat touches the jobs this process runs, not another's or finished ones."""
+    other = JobRepository(sqlite_session_factory, "worker-b", 120)
+    mine, theirs, done = (job_repo.add(42, UPDATE) for _ in range(3))
+    job_repo.claim(mine)
+    other.claim(theirs)
+    job_repo.claim(done)
+    job_repo.finish(done)
+    for job_id in (mine, theirs, done):
+        _age_heartbeat(sqlite_session_factory, job_id, 600)
+
+    assert job_repo.heartbeat() == 1
+
+    assert [job.id for job in other.unfinished()] == [theirs]
+    assert job_repo.claim(mine) is None
+
+
+def test_unfinished_leaves_running_jobs_a_live_process_holds(
+    job_repo,
+    sqlite_session_factory,
+):
+    """Test a starting process does not take a job whose owner still beats."""
+    running = job_repo.add(42, UPDATE)
+    job_repo.claim(running)
+    other = JobRepository(sqlite_session_factory, "worker-b", 120)
+
+    assert other.unfinished() == []
+    assert job_repo.get(running).state == "running"
+
+
+def test_unfinished_requeues_interrupted_jobs_oldest_first(
+    job_repo,
+    sqlite_session_factory,
+):
+    """Test unfinished returns queued and stale running jobs, requeued, not done ones."""
+    queued = job_repo.add(42, UPDATE)
+    running = job_repo.add(42, UPDATE)
+    done = job_repo.add(42, UPDATE)
+    job_repo.claim(running)
+    job_repo.claim(done)
+    job_repo.finish(done)
+    _age_heartbeat(sqlite_session_factory, running, 121)
+
+    jobs = job_repo.unfinished()
+
+    assert [(job.id, job.state, job.attempts) for job in jobs] == [
+        (queued, "queued", 0),
+        (running, "queued", 1),
+    ]
+    assert job_repo.claim(running) is not None
+
+
+def test_requeue_puts_only_a_running_job_back(job_repo):
+    """Test requeue makes a running job claimable again and leaves others alone."""
+    running = job_repo.add(42, UPDATE)
+    done = job_repo.add(42, UPDATE)
+    job_repo.claim(running)
+    job_repo.claim(done)
+    job_repo.finish(done)
+
+    job_repo.requeue(running)
+    job_repo.requeue(done)
+
+    job = job_repo.claim(running)
+    assert job is not None
+    assert job.attempts == 2
+    assert job_repo.claim(done) is None
@@ -0,0 +1,38 @@
+import fakeredis
+import pytest
+
+from dedupe import UpdateDeduplicator
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every replica."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_first_update_is_true_once_per_update_id(client):
+    """Only the first delivery of an update goes ahead, on any replica."""
+    first, second = UpdateDeduplicator(client, 60), UpdateDeduplicator(client, 60)
+
+    assert first.first_update(7)
+    assert not second.first_update(7)
+    assert second.first_update(8)
+
+
+def test_first_message_is_keyed_by_chat_and_message(client):
+    """Message ids repeat across chats, so the chat is part of the key."""
+    dedupe = UpdateDeduplicator(client, 60)
+
+    assert dedupe.first_message(42, 1)
+    assert not dedupe.first_message(42, 1)
+    assert dedupe.first_message(43, 1)
+
+
+def test_a_delivery_is_remembered_for_the_ttl_only(mocker):
+    """Each claim is one SET NX with the TTL, so keys do not pile up."""
+    client = mocker.MagicMock()
+    client.set.return_value = None
+
+    assert not UpdateDeduplicator(client, 60).first_message(42, 1)
+
+    client.set.assert_called_once_with("dedupe:message:42:1", 1, nx=True, ex=60)
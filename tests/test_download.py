@@ -1,10 +1,13 @@
 from pathlib import Path
 
+import fakeredis
 import pytest
 from curl_cffi.requests.exceptions import HTTPError
 from tenacity import RetryError
 from yt_dlp.utils import DownloadError
 
+import cancellation
+from caching import AudioUrlCache, TtlCache, ValkeyCache, VideoInfoCache
 from download import Downloader
 
 
@@ -27,17 +30,26 @@ def _audio_only_info():
     }
 
 
+def _castro_cache():
+    client = fakeredis.FakeRedis()
+    # fakeredis reads its command tables on first use; do it before tests
+    # patch Path.open.
+    client.ping()
+    return AudioUrlCache(ValkeyCache(client, "castro", 3600, 10**4, 1024), 60)
+
+
 @pytest.fixture
 def downloader():
-    """Downloader instance wired to a fixed test token."""
-    return Downloader("TEST_TOKEN")
+    """Downloader instance wired to a fixed test token and empty caches."""
+    return Downloader("TEST_TOKEN", VideoInfoCache(TtlCache(600, 16)), _castro_cache())
 
 
 def _arrange_failing_yt_download(mocker, unlink_side_effect=None):
     """Drive download_yt to a DownloadError on both attempts, leaving one partial.
 
     The temp name is pinned so the glob pattern is known ahead of the call, and
-    the YoutubeDL contexts alternate extract_info/download across both attempts.
+    the YoutubeDL contexts alternate extract_info/process_ie_result across both
+    attempts: a failed download drops the cached info, so the retry probes again.
 
     Returns:
         (mock_cwd, partial) — the patched Path.cwd and the leftover file mock.
@@ -50,7 +62,7 @@ def _arrange_failing_yt_download(mocker, unlink_side_effect=None):
     info_ydl = mocker.MagicMock()
     info_ydl.extract_info.return_value = _audio_only_info()
     download_ydl = mocker.MagicMock()
-    download_ydl.download.side_effect = DownloadError("boom")
+    download_ydl.process_ie_result.side_effect = DownloadError("boom")
     mock_ydl.side_effect = [
         mocker.MagicMock(__enter__=mocker.MagicMock(return_value=info_ydl)),
         mocker.MagicMock(__enter__=mocker.MagicMock(return_value=download_ydl)),
@@ -167,13 +179,16 @@ def test_download_yt_happy_path(mocker, downloader):
         "https://youtube.com/watch?v=123",
         download=False,
     )
-    mock_ydl.assert_any_call({"proxy": mocker.ANY, "nocheckcertificate": False})
+    mock_ydl.assert_any_call(
+        {"proxy": mocker.ANY, "noplaylist": True, "nocheckcertificate": False},
+    )
     mock_ydl.assert_any_call(
         {
             "format": "139",
             "outtmpl": output_stem,
             "nocheckcertificate": False,
             "proxy": mocker.ANY,
+            "progress_hooks": [cancellation.progress_hook],
             "postprocessors": [
                 {
                     "key": "FFmpegExtractAudio",
@@ -182,7 +197,38 @@ def test_download_yt_happy_path(mocker, downloader):
             ],
         },
     )
-    download_ydl.download.assert_called_once_with("https://youtube.com/watch?v=123")
+    download_ydl.process_ie_result.assert_called_once_with(
+        info_ydl.extract_info.return_value,
+        download=True,
+    )
+    probe_proxy = mock_ydl.call_args_list[0].args[0]["proxy"]
+    assert mock_ydl.call_args_list[1].args[0]["proxy"] == probe_proxy
+    assert downloader._info.get("https://youtu.be/123").proxy == probe_proxy
+
+
+def test_download_yt_downloads_from_info_the_transcript_probe_cached(mocker):
+    """A video probed lately is downloaded from its cached info, unextracted."""
+    info = VideoInfoCache(TtlCache(600, 16))
+    info.put(
+        "https://www.youtube.com/watch?v=123",
+        _audio_only_info(),
+        "http://proxy-a:8080",
+    )
+    mocker.patch("download.get_proxy", return_value="http://proxy-b:8080")
+    mock_ydl = mocker.patch("download.YoutubeDL")
+    download_ydl = mock_ydl.return_value.__enter__.return_value
+
+    Downloader("TEST_TOKEN", info, _castro_cache()).download_yt("https://youtu.be/123")
+
+    mock_ydl.assert_called_once()
+    assert mock_ydl.call_args.args[0]["format"] == "139"
+    # Its format URLs are bound to the address that extracted them.
+    assert mock_ydl.call_args.args[0]["proxy"] == "http://proxy-a:8080"
+    download_ydl.extract_info.assert_not_called()
+    download_ydl.process_ie_result.assert_called_once_with(
+        _audio_only_info(),
+        download=True,
+    )
 
 
 def test_download_yt_extract_info_returns_none(mocker, downloader):
@@ -316,6 +362,42 @@ def test_download_castro_happy_path(mocker, downloader):
     assert mock_path_open().write.call_count == 2
 
 
+def test_download_castro_repeat_skips_the_episode_page(mocker, downloader):
+    """A second request for the episode streams the cached audio URL directly."""
+    page = mocker.MagicMock(
+        content=b'<html><source src="https://audio.link/file.mp3"></html>',
+    )
+    audio = mocker.MagicMock(status_code=200)
+    audio.iter_content.return_value = [b"chunk"]
+    mock_get = mocker.patch("download.requests.get", side_effect=[page, audio, audio])
+    mocker.patch("download.requote_uri", side_effect=lambda x: x)
+    mocker.patch("pathlib.Path.open", mocker.mock_open())
+
+    downloader.download_castro("https://castro.fm/episode/123")
+    downloader.download_castro("https://www.castro.fm/episode/123#player")
+
+    fetched = [call.args[0] for call in mock_get.call_args_list]
+    assert fetched == [
+        "https://castro.fm/episode/123",
+        "https://audio.link/file.mp3",
+        "https://audio.link/file.mp3",
+    ]
+
+
+def test_download_castro_remembers_a_broken_page_briefly(mocker, downloader):
+    """A page without audio is not fetched again while its failure is cached."""
+    page = mocker.MagicMock(content=b"<html><body>No source here</body></html>")
+    mock_get = mocker.patch("download.requests.get", return_value=page)
+    mocker.patch("download.requote_uri", side_effect=lambda x: x)
+
+    with pytest.raises(ValueError, match=r"Audio source tag not found"):
+        downloader.download_castro("https://castro.fm/episode/123")
+    with pytest.raises(ValueError, match=r"no usable audio URL moments ago"):
+        downloader.download_castro("https://castro.fm/episode/123")
+
+    mock_get.assert_called_once()
+
+
 def test_download_castro_missing_source_tag(mocker, downloader):
     """Test download_castro raises ValueError when <source> tag is missing."""
     mock_page_resp = mocker.MagicMock()
@@ -375,6 +457,8 @@ def test_download_castro_http_error(mocker, downloader):
         downloader.download_castro("https://castro.fm/episode/123")
 
     mock_logger.exception.assert_called_once_with("%s: status code", 500)
+    # An audio URL that no longer serves is not reused.
+    assert downloader._castro.get("https://castro.fm/episode/123") is None
 
 
 def test_download_castro_page_http_error(mocker, downloader):
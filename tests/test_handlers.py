@@ -1,13 +1,16 @@
 from types import SimpleNamespace
 
+import fakeredis
 import pytest
 from telebot import types
 from tenacity import RetryError
 
+from coalescing import Coalescer
 from domain import PrefixedText
 from exceptions import LimitExceededError, WebParseError
 from handlers import MessageHandlers
 from helpers import make_app
+from models import UsersOrm
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -23,7 +26,14 @@ def _make_handlers(mocker):
         web_parser=mocker.MagicMock(),
         quota_manager=mocker.MagicMock(),
         downloader=mocker.MagicMock(),
+        transcoder=mocker.MagicMock(),
+        summary_cache=mocker.MagicMock(),
+        coalescer=Coalescer(fakeredis.FakeRedis(decode_responses=True), 60, 0, 0, 60),
     )
+    fakes.summary_cache.get.return_value = None
+    fakes.summary_cache.key.side_effect = lambda source, _: source
+    # The coalescer publishes each answer to Valkey, which takes only strings.
+    fakes.summarizer.summarize.return_value = "summary"
     handlers = MessageHandlers(
         fakes.bot,
         fakes.messenger,
@@ -31,10 +41,54 @@ def _make_handlers(mocker):
         fakes.web_parser,
         fakes.quota_manager,
         fakes.downloader,
+        fakes.transcoder,
+        fakes.summary_cache,
+        fakes.coalescer,
     )
     return handlers, fakes
 
 
+@pytest.mark.parametrize("use_summary_cache", [True, False])
+def test_job_settings_round_trip_through_a_rebuilt_user(use_summary_cache):
+    """A resumed job's rebuilt user yields the same kwargs and cache switch."""
+    user = UsersOrm(
+        user_id=7,
+        approved=True,
+        target_language="German",
+        summarizing_model="gemini-3.7-flash",
+        prompt_key_for_summary="basic_prompt_for_transcript",
+        daily_limit=10,
+        thinking_level="high",
+        use_summary_cache=use_summary_cache,
+    )
+    settings = MessageHandlers.job_settings(user)
+
+    rebuilt = MessageHandlers.user_from_job_settings(settings)
+
+    assert rebuilt.approved is True
+    assert rebuilt.use_summary_cache is use_summary_cache
+    assert MessageHandlers.job_settings(rebuilt) == settings
+    assert MessageHandlers.summary_kwargs(rebuilt) == MessageHandlers.summary_kwargs(
+        user,
+    )
+
+
+def test_a_snapshot_recorded_without_the_switch_resumes_with_the_cache_on():
+    """Jobs recorded before the switch was snapshotted keep the old behaviour."""
+    settings = MessageHandlers.summary_kwargs(
+        UsersOrm(
+            user_id=7,
+            target_language="German",
+            summarizing_model="gemini-3.7-flash",
+            prompt_key_for_summary="basic_prompt_for_transcript",
+            daily_limit=10,
+            thinking_level="high",
+        ),
+    )
+
+    assert MessageHandlers.user_from_job_settings(settings).use_summary_cache is True
+
+
 def test_unauthorized_user(message_factory, mocker):
     """Test that unauthorized users receive an access denied message."""
     msg = message_factory(content_type="text", text="Hello")
@@ -67,7 +121,7 @@ def test_successful_document_flow(message_factory, mocker):
         prompt_key_for_summary="mock-prompt",
         target_language="English",
     )
-    mock_file = mocker.MagicMock(spec=types.File)
+    mock_file = mocker.MagicMock(spec=types.File, file_unique_id="unique")
     fakes.messenger.get_file_with_retry.return_value = mock_file
     fakes.summarizer.summarize_with_document.return_value = (
         "Here is your awesome summary"
@@ -217,7 +271,7 @@ def test_handle_media_summarizes_the_fetched_file(
         prompt_key_for_summary="prompt",
         target_language="English",
     )
-    mock_file = mocker.MagicMock(spec=types.File)
+    mock_file = mocker.MagicMock(spec=types.File, file_unique_id="unique")
     fakes.messenger.get_file_with_retry.return_value = mock_file
 
     getattr(handlers, handler_name)(msg, user)
@@ -299,6 +353,104 @@ def test_handle_url_other_http_pattern(message_factory, mocker):
     assert "Summary text." in answer
 
 
+def test_handle_url_cache_hit_skips_quota_parse_and_summary(message_factory, mocker):
+    """A cached answer is sent as is, with no quota check, parse or model call."""
+    url = "https://www.example.com/article#intro"
+    msg = message_factory(content_type="text", text=url)
+    handlers, fakes = _make_handlers(mocker)
+    user = mocker.MagicMock()
+    fakes.summary_cache.get.return_value = "cached summary"
+
+    handlers.handle_url(msg, user, url)
+
+    fakes.summary_cache.get.assert_called_once_with(
+        "url:example.com/article",
+        handlers.summary_kwargs(user),
+    )
+    fakes.quota_manager.check_quota.assert_not_called()
+    fakes.web_parser.parse.assert_not_called()
+    fakes.summary_cache.put.assert_not_called()
+    fakes.messenger.send_answer.assert_called_once_with(msg, "cached summary")
+
+
+def test_handle_url_caches_a_fresh_summary_by_video_id(message_factory, mocker):
+    """A miss summarizes and caches the answer under the canonical video id."""
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    msg = message_factory(content_type="text", text=url)
+    handlers, fakes = _make_handlers(mocker)
+    user = mocker.MagicMock()
+    fakes.summarizer.summarize.return_value = "fresh summary"
+
+    handlers.handle_url(msg, user, url)
+
+    fakes.summary_cache.put.assert_called_once_with(
+        "youtube:dQw4w9WgXcQ",
+        handlers.summary_kwargs(user),
+        "fresh summary",
+    )
+
+
+def test_cache_switched_off_summarizes_afresh_and_refreshes(message_factory, mocker):
+    """A user bypassing the cache is not served from it, but refreshes the entry."""
+    msg = message_factory(content_type="audio")
+    handlers, fakes = _make_handlers(mocker)
+    user = mocker.MagicMock(use_summary_cache=False)
+    fakes.messenger.get_file_with_retry.return_value = mocker.MagicMock(
+        spec=types.File,
+        file_unique_id="unique",
+    )
+    fakes.summary_cache.get.return_value = "cached summary"
+    fakes.summarizer.summarize.return_value = "fresh summary"
+
+    handlers.handle_audio(msg, user)
+
+    fakes.summary_cache.get.assert_not_called()
+    assert fakes.summary_cache.put.call_args.args[0] == "telegram:mock_audio_uid"
+    fakes.messenger.send_answer.assert_called_once_with(msg, "fresh summary")
+
+
+def test_a_request_already_running_elsewhere_is_followed_and_charged(
+    message_factory,
+    mocker,
+):
+    """A miss whose twin holds the claim takes its answer and pays one request."""
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    msg = message_factory(content_type="text", text=url)
+    handlers, fakes = _make_handlers(mocker)
+    fakes.coalescer._client.set("coalesce:youtube:dQw4w9WgXcQ", "other")
+    # Too large for the summary cache, so only the published answer has it.
+    fakes.coalescer._client.set(
+        "coalesce-result:youtube:dQw4w9WgXcQ",
+        "leader's summary",
+    )
+    fakes.summary_cache.get.return_value = None
+    user = mocker.MagicMock(user_id=7, daily_limit=10)
+
+    handlers.handle_url(msg, user, url)
+
+    fakes.summarizer.summarize.assert_not_called()
+    fakes.quota_manager.check_quota.assert_called_once_with(
+        user_id=7,
+        daily_limit=10,
+        quantity=1,
+    )
+    fakes.messenger.send_answer.assert_called_once_with(msg, "leader's summary")
+
+
+def test_video_cache_hit_skips_the_fetch_and_download(message_factory, mocker):
+    """A cached video answer, keyed by the forward-stable id, needs no getFile."""
+    msg = message_factory(content_type="video")
+    handlers, fakes = _make_handlers(mocker)
+    fakes.summary_cache.get.return_value = "cached summary"
+
+    handlers.handle_video(msg, mocker.MagicMock())
+
+    assert fakes.summary_cache.get.call_args.args[0] == "telegram:mock_video_uid"
+    fakes.messenger.get_file_with_retry.assert_not_called()
+    fakes.downloader.download_tg.assert_not_called()
+    fakes.messenger.send_answer.assert_called_once_with(msg, "cached summary")
+
+
 def test_handle_url_web_preflight_blocks_before_parse_url(message_factory, mocker):
     """Test that quota preflight blocks Tavily IO for over-quota users."""
     url = "https://example.com/article"
@@ -361,16 +513,19 @@ def test_handle_video_like_cleans_up_both_temp_files(
         prompt_key_for_summary="prompt",
         target_language="English",
     )
-    mock_file = mocker.MagicMock(spec=types.File)
+    mock_file = mocker.MagicMock(spec=types.File, file_unique_id="unique")
     fakes.messenger.get_file_with_retry.return_value = mock_file
     fakes.downloader.download_tg.return_value = "downloaded.mp4"
     mocker.patch("handlers.generate_temporary_name", return_value="compressed.ogg")
-    mocker.patch("handlers.compress_audio")
     fakes.summarizer.summarize.return_value = "summary"
     mock_clean_up = mocker.patch("handlers.clean_up")
 
     getattr(handlers, handler_name)(msg, user)
 
+    fakes.transcoder.compress_audio.assert_called_once_with(
+        input_file="downloaded.mp4",
+        output_file="compressed.ogg",
+    )
     assert mock_clean_up.call_args_list == [
         mocker.call(file="downloaded.mp4"),
         mocker.call(file="compressed.ogg"),
@@ -394,11 +549,10 @@ def test_handle_video_cleans_up_compressed_file_when_summarize_raises(
         prompt_key_for_summary="prompt",
         target_language="English",
     )
-    mock_file = mocker.MagicMock(spec=types.File)
+    mock_file = mocker.MagicMock(spec=types.File, file_unique_id="unique")
     fakes.messenger.get_file_with_retry.return_value = mock_file
     fakes.downloader.download_tg.return_value = "downloaded.mp4"
     mocker.patch("handlers.generate_temporary_name", return_value="compressed.ogg")
-    mocker.patch("handlers.compress_audio")
     fakes.summarizer.summarize.side_effect = LimitExceededError("blocked")
     mock_clean_up = mocker.patch("handlers.clean_up")
 
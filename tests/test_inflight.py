@@ -0,0 +1,138 @@
+import fakeredis
+import pytest
+
+from inflight import InFlightLimiter
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every process."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _limiter(client, limit=2, slot_ttl=3600):
+    return InFlightLimiter(client, limit, slot_ttl)
+
+
+def test_admit_runs_up_to_the_limit_then_lines_jobs_up(client):
+    """Jobs past the limit get their place in line, counted from 1."""
+    limiter = _limiter(client)
+
+    assert [limiter.admit(42, job) for job in (1, 2, 3, 4)] == [0, 0, 1, 2]
+    assert limiter.waiting(42) == [3, 4]
+
+
+def test_admit_keeps_a_resumed_jobs_slot_or_place(client):
+    """Admitting a job again, as a restart does, neither duplicates nor reorders it."""
+    limiter = _limiter(client)
+    for job in (1, 2, 3, 4):
+        limiter.admit(42, job)
+
+    assert limiter.admit(42, 1) == 0
+    assert limiter.admit(42, 4) == 2
+    assert limiter.waiting(42) == [3, 4]
+
+
+def test_limit_is_shared_by_every_limiter_on_the_server(client):
+    """Two processes' limiters count one user's jobs together."""
+    first, second = _limiter(client), _limiter(client)
+
+    assert first.admit(42, 1) == 0
+    assert second.admit(42, 2) == 0
+    assert first.admit(42, 3) == 1
+
+
+def test_users_are_limited_separately(client):
+    """One user's line does not hold another user's jobs back."""
+    limiter = _limiter(client, limit=1)
+
+    assert limiter.admit(42, 1) == 0
+    assert limiter.admit(42, 2) == 1
+    assert limiter.admit(7, 3) == 0
+
+
+def test_release_hands_the_slot_to_the_first_job_in_line(client):
+    """Releasing a slot starts the oldest waiting job, and only that one."""
+    limiter = _limiter(client)
+    for job in (1, 2, 3, 4):
+        limiter.admit(42, job)
+
+    assert limiter.release(42, 1) == [3]
+    assert limiter.waiting(42) == [4]
+    assert limiter.admit(42, 5) == 2
+
+
+def test_release_with_no_line_just_frees_the_slot(client):
+    """With nobody waiting, a release promotes nothing and frees room to run."""
+    limiter = _limiter(client, limit=1)
+    limiter.admit(42, 1)
+
+    assert limiter.release(42, 1) == []
+    assert limiter.admit(42, 2) == 0
+
+
+def test_a_stale_slot_stops_counting(client):
+    """A job that died without releasing frees its slot after slot_ttl."""
+    limiter = _limiter(client, limit=1, slot_ttl=-1)
+    limiter.admit(42, 1)
+
+    assert limiter.admit(42, 2) == 0
+
+
+def test_release_fills_every_slot_a_stale_job_left(client):
+    """Slots freed by stale jobs go to the line too, not only the released one."""
+    limiter = _limiter(client, limit=2)
+    for job in (1, 2, 3, 4):
+        limiter.admit(42, job)
+    client.zadd("inflight:42:running", {"2": 0})
+
+    assert limiter.release(42, 1) == [3, 4]
+    assert limiter.waiting(42) == []
+
+
+def test_running_lists_the_jobs_holding_a_slot(client):
+    """running() shows the jobs /cancel has to flag, not the ones in line."""
+    limiter = _limiter(client)
+    for job in (1, 2, 3):
+        limiter.admit(42, job)
+
+    assert limiter.running(42) == [1, 2]
+
+
+def test_withdraw_takes_a_job_out_of_line_once(client):
+    """A withdrawn job leaves the line; withdrawing it again reports it gone."""
+    limiter = _limiter(client, limit=1)
+    for job in (1, 2, 3):
+        limiter.admit(42, job)
+
+    assert limiter.withdraw(42, 2)
+    assert not limiter.withdraw(42, 2)
+    assert limiter.waiting(42) == [3]
+    assert limiter.release(42, 1) == [3]
+
+
+def test_notices_are_recorded_listed_and_dropped(client):
+    """A waiting job's notice is kept by job id until it is dropped."""
+    limiter = _limiter(client, limit=1)
+    for job in (1, 3, 4):
+        limiter.admit(42, job)
+
+    assert limiter.set_notice(42, 3, 42, 100)
+    assert limiter.set_notice(42, 4, 42, 101)
+
+    assert limiter.notices(42) == {3: (42, 100), 4: (42, 101)}
+    assert limiter.drop_notice(42, 3) == (42, 100)
+    assert limiter.drop_notice(42, 3) is None
+    assert limiter.notices(42) == {4: (42, 101)}
+
+
+def test_a_job_promoted_before_its_notice_gets_none_recorded(client):
+    """A release between admit and set_notice leaves no stale notice behind."""
+    limiter = _limiter(client, limit=1)
+    limiter.admit(42, 1)
+    limiter.admit(42, 2)
+    assert limiter.release(42, 1) == [2]
+    assert limiter.drop_notice(42, 2) is None
+
+    assert not limiter.set_notice(42, 2, 42, 100)
+    assert limiter.notices(42) == {}
@@ -0,0 +1,119 @@
+import threading
+
+import fakeredis
+import pytest
+import redis
+
+from lease import LeaderLease
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every replica."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _lease(client, holder, ttl=10, renew_interval=0.01):
+    return LeaderLease(client, "leader:polling", holder, ttl, renew_interval)
+
+
+def test_only_one_replica_holds_the_lease(client):
+    """The first replica takes the lease and renews it; the second stands by."""
+    leader, standby = _lease(client, "a"), _lease(client, "b")
+
+    assert leader.try_acquire()
+    assert not standby.try_acquire()
+    assert leader.try_acquire()
+    assert client.get("leader:polling") == "a"
+    assert 0 < client.ttl("leader:polling") <= 10
+
+
+def test_a_standby_takes_over_once_the_lease_expires(client):
+    """A leader that stops renewing loses the lease to the standby."""
+    leader, standby = _lease(client, "a"), _lease(client, "b")
+    leader.try_acquire()
+
+    client.delete("leader:polling")
+
+    assert standby.try_acquire()
+    assert not leader.try_acquire()
+
+
+def test_wait_blocks_until_the_leader_releases(client):
+    """A standby's wait returns once the leader hands the lease on."""
+    leader, standby = _lease(client, "a"), _lease(client, "b")
+    leader.try_acquire()
+    waiter = threading.Thread(target=standby.wait)
+    waiter.start()
+    waiter.join(timeout=0.05)
+    assert waiter.is_alive()
+
+    leader.release()
+    waiter.join(timeout=5)
+
+    assert not waiter.is_alive()
+    assert client.get("leader:polling") == "b"
+
+
+def test_release_leaves_another_holders_lease_alone(client):
+    """A replica that lost the lease does not delete its successor's."""
+    leader, standby = _lease(client, "a"), _lease(client, "b")
+    standby.try_acquire()
+
+    leader.release()
+
+    assert client.get("leader:polling") == "b"
+
+
+def test_keep_renews_until_released(client, mocker):
+    """The renewal thread keeps the lease fresh, then stops on release."""
+    leader = _lease(client, "a")
+    leader.try_acquire()
+    renewed = threading.Event()
+    mocker.patch.object(
+        leader,
+        "try_acquire",
+        side_effect=lambda: renewed.set() or True,
+    )
+    on_lost = mocker.MagicMock()
+
+    leader.keep(on_lost)
+    assert renewed.wait(timeout=5)
+    leader.release()
+
+    on_lost.assert_not_called()
+    assert client.get("leader:polling") is None
+
+
+def test_keep_reports_a_lost_lease_and_stops(client):
+    """If another replica took the key, on_lost is called once and renewal ends."""
+    leader = _lease(client, "a")
+    lost = threading.Event()
+    client.set("leader:polling", "b")
+
+    leader.keep(lost.set)
+
+    assert lost.wait(timeout=5)
+    assert client.get("leader:polling") == "b"
+
+
+def test_keep_rides_out_a_valkey_error(client, mocker):
+    """A failed renewal is retried at the next interval, not taken as a loss."""
+    leader = _lease(client, "a")
+    renewed = threading.Event()
+    errors = [redis.ConnectionError("down")]
+
+    def try_acquire():
+        if errors:
+            raise errors.pop()
+        return True
+
+    mocker.patch.object(leader, "try_acquire", side_effect=try_acquire)
+    mocker.patch("lease.logger.warning", side_effect=lambda *_a, **_k: renewed.set())
+    on_lost = mocker.MagicMock()
+
+    leader.keep(on_lost)
+    assert renewed.wait(timeout=5)
+    leader.release()
+
+    on_lost.assert_not_called()
@@ -1,4 +1,5 @@
 import asyncio
+import threading
 from types import SimpleNamespace
 from typing import get_args
 
@@ -7,6 +8,7 @@ from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import SimpleSpanProcessor
 from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
 from pydantic_ai import Agent
+from pydantic_ai.exceptions import ModelHTTPError
 from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
 from pydantic_ai.models import ModelRequestParameters
 from pydantic_ai.models.function import FunctionModel
@@ -19,7 +21,9 @@ from pydantic_ai.settings import ThinkingEffort
 
 import llm as llm_module
 from config import ALLOWED_THINKING_LEVELS, ModelSpec
+from exceptions import CachedContextGoneError
 from llm import LLMClient, OpenRouterCostReporter
+from prompts import strategy_prompt
 
 
 @pytest.fixture
@@ -55,7 +59,10 @@ def test_build_model_asks_openrouter_for_usage_accounting(mocker):
 
     model = client.build_model("minimax/minimax-m3")
 
-    assert model.settings == {"openrouter_usage": {"include": True}}
+    assert model.settings == {
+        "openrouter_usage": {"include": True},
+        "openrouter_cache_instructions": True,
+    }
 
 
 def test_build_model_leaves_gemini_unwrapped(llm_client):
@@ -180,6 +187,25 @@ def test_build_model_caches_across_providers(mocker):
     assert google is not openrouter
 
 
+def test_build_model_builds_once_under_concurrent_first_calls(mocker):
+    """Test worker threads racing on a cold id all get the same instance."""
+    client = LLMClient(mocker.MagicMock(), OpenRouterProvider(api_key="mock_key"))
+    barrier = threading.Barrier(8)
+    built = []
+
+    def build():
+        barrier.wait()
+        built.append(client.build_model("minimax/minimax-m3"))
+
+    threads = [threading.Thread(target=build) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(model) for model in built}) == 1
+
+
 def test_build_model_rejects_unregistered_model(llm_client):
     """Test an id missing from MODEL_SPECS fails loudly rather than guessing."""
     with pytest.raises(KeyError):
@@ -530,3 +556,232 @@ def test_run_uses_untraced_agent_for_uploaded_file_content(llm_client, mocker):
     assert llm_client._untraced_agent.instrument is False
     mock_untraced_run_sync.assert_called_once()
     mock_run_sync.assert_not_called()
+
+
+def test_run_tags_the_prompt_cache_the_run_can_use(mocker):
+    """Test the run span says OpenRouter runs carry a cache breakpoint."""
+    client = LLMClient(mocker.MagicMock(), OpenRouterProvider(api_key="mock_key"))
+    mock_run_sync = mocker.patch.object(
+        client._agent,
+        "run_sync",
+        return_value=SimpleNamespace(output="A summary."),
+    )
+
+    client.run(
+        content="Summarize this.",
+        model_id="openai/gpt-5.6-luna",
+        target_language="English",
+        thinking_level="high",
+    )
+
+    assert mock_run_sync.call_args.kwargs["metadata"] == {"prompt_cache": "openrouter"}
+
+
+@pytest.fixture
+def context_cache(mocker):
+    """A Gemini context cache that always has a live cache to offer."""
+    cache = mocker.MagicMock()
+    cache.name_for.return_value = "cachedContents/abc"
+    return cache
+
+
+def test_run_sends_a_cached_gemini_context_in_place_of_the_prompt(
+    mocker,
+    context_cache,
+):
+    """Test the real Agent gets no instruction or prompt, only the cache's name."""
+    client = LLMClient(mocker.MagicMock(), mocker.MagicMock(), context_cache)
+    seen = {}
+
+    def capture(messages, info):
+        seen["instructions"] = messages[0].instructions
+        seen["prompt"] = messages[0].parts[-1].content
+        seen["cached"] = info.model_settings["google_cached_content"]
+        return ModelResponse(parts=[TextPart(content="A summary.")])
+
+    mocker.patch.object(client, "build_model", return_value=FunctionModel(capture))
+
+    result = client.run(
+        content=[strategy_prompt("basic_prompt_for_transcript"), "A transcript."],
+        model_id="gemini-3.7-flash",
+        target_language="Ukrainian",
+        thinking_level="medium",
+        prompt_key="basic_prompt_for_transcript",
+    )
+
+    assert result == "A summary."
+    assert seen == {
+        "instructions": None,
+        "prompt": ["A transcript."],
+        "cached": "cachedContents/abc",
+    }
+    context_cache.name_for.assert_called_once_with(
+        "gemini-3.7-flash",
+        "basic_prompt_for_transcript",
+        "Ukrainian",
+    )
+
+
+@pytest.mark.parametrize(
+    ("content", "model_id"),
+    [
+        ("Summarize this.", "gemini-3.7-flash"),
+        ([strategy_prompt("basic_prompt_for_transcript")], "gemini-3.7-flash"),
+        (["Another prompt.", "A transcript."], "gemini-3.7-flash"),
+        (
+            [strategy_prompt("basic_prompt_for_transcript"), "A transcript."],
+            "openai/gpt-5.6-luna",
+        ),
+    ],
+)
+def test_run_sends_the_prompt_where_no_cached_context_fits(
+    mocker,
+    context_cache,
+    content,
+    model_id,
+):
+    """Test only a Gemini run opening with its strategy prompt uses the cache."""
+    client = LLMClient(
+        mocker.MagicMock(),
+        OpenRouterProvider(api_key="mock_key"),
+        context_cache,
+    )
+    mock_run_sync = mocker.patch.object(
+        client._agent,
+        "run_sync",
+        return_value=SimpleNamespace(output="A summary."),
+    )
+
+    client.run(
+        content=content,
+        model_id=model_id,
+        target_language="English",
+        thinking_level="high",
+        prompt_key="basic_prompt_for_transcript",
+    )
+
+    assert mock_run_sync.call_args.args[0] == content
+    assert "English" in mock_run_sync.call_args.kwargs["instructions"]
+    context_cache.name_for.assert_not_called()
+
+
+def test_run_sends_the_prompt_when_gemini_has_no_cache_for_it(mocker, context_cache):
+    """Test a key Gemini refused to cache runs with its instruction and prompt."""
+    context_cache.name_for.return_value = None
+    client = LLMClient(mocker.MagicMock(), mocker.MagicMock(), context_cache)
+    mock_run_sync = mocker.patch.object(
+        client._agent,
+        "run_sync",
+        return_value=SimpleNamespace(output="A summary."),
+    )
+    content = [strategy_prompt("basic_prompt_for_transcript"), "A transcript."]
+
+    client.run(
+        content=content,
+        model_id="gemini-3.7-flash",
+        target_language="English",
+        thinking_level="high",
+        prompt_key="basic_prompt_for_transcript",
+    )
+
+    assert mock_run_sync.call_args.args[0] == content
+    assert mock_run_sync.call_args.kwargs["metadata"] == {"prompt_cache": "none"}
+
+
+@pytest.mark.parametrize(("status", "discarded"), [(404, True), (500, False)])
+def test_run_forgets_a_cached_context_gemini_no_longer_has(
+    mocker,
+    context_cache,
+    status,
+    discarded,
+):
+    """Test a 404 on a cached run drops the cache's record, then re-raises."""
+    client = LLMClient(mocker.MagicMock(), mocker.MagicMock(), context_cache)
+    mocker.patch.object(
+        client._agent,
+        "run_sync",
+        side_effect=ModelHTTPError(status, "gemini-3.7-flash"),
+    )
+
+    with pytest.raises(ModelHTTPError) as raised:
+        client.run(
+            content=[strategy_prompt("basic_prompt_for_transcript"), "A transcript."],
+            model_id="gemini-3.7-flash",
+            target_language="English",
+            thinking_level="high",
+            prompt_key="basic_prompt_for_transcript",
+        )
+
+    assert context_cache.discard.called is discarded
+    assert isinstance(raised.value, CachedContextGoneError) is discarded
+
+
+@pytest.mark.parametrize(
+    ("body", "discarded"),
+    [
+        (
+            {"error": {"message": "CachedContent not found (or permission denied)"}},
+            True,
+        ),
+        ({"error": {"message": "File files/mock123 is not found"}}, False),
+        (None, False),
+    ],
+)
+def test_run_blames_the_cached_context_only_when_the_error_names_it(
+    mocker,
+    context_cache,
+    body,
+    discarded,
+):
+    """Test a 404 on a cached run with a file drops the cache only if it is named.
+
+    The same status means a gone upload, which the summarizer handles; dropping
+    a healthy cache record for it would leave the cached content billed to TTL.
+    """
+    client = LLMClient(mocker.MagicMock(), mocker.MagicMock(), context_cache)
+    mocker.patch.object(
+        client._untraced_agent,
+        "run_sync",
+        side_effect=ModelHTTPError(404, "gemini-3.7-flash", body),
+    )
+    uploaded_file = client.build_uploaded_file(
+        model_id="gemini-3.7-flash",
+        file=SimpleNamespace(
+            name="files/mock123",
+            uri="https://generativelanguage.googleapis.com/v1beta/files/mock123",
+            mime_type="audio/ogg",
+        ),
+    )
+
+    with pytest.raises(ModelHTTPError) as raised:
+        client.run(
+            content=[strategy_prompt("basic_prompt_for_transcript"), uploaded_file],
+            model_id="gemini-3.7-flash",
+            target_language="English",
+            thinking_level="high",
+            prompt_key="basic_prompt_for_transcript",
+        )
+
+    assert context_cache.discard.called is discarded
+    assert isinstance(raised.value, CachedContextGoneError) is discarded
+
+
+def test_run_leaves_the_cache_alone_when_an_uncached_run_fails(mocker, context_cache):
+    """Test a 404 on a run that sent its prompt is no sign of a gone cache."""
+    client = LLMClient(mocker.MagicMock(), mocker.MagicMock(), context_cache)
+    mocker.patch.object(
+        client._agent,
+        "run_sync",
+        side_effect=ModelHTTPError(404, "gemini-3.7-flash"),
+    )
+
+    with pytest.raises(ModelHTTPError):
+        client.run(
+            content="Summarize this.",
+            model_id="gemini-3.7-flash",
+            target_language="English",
+            thinking_level="high",
+            prompt_key="basic_prompt_for_transcript",
+        )
+
+    context_cache.discard.assert_not_called()
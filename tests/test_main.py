@@ -1,9 +1,30 @@
+import logging
+import threading
+import time
 from types import SimpleNamespace
 
 import pytest
-
+from sqlalchemy.exc import OperationalError
+from telebot.apihelper import ApiTelegramException
+
+import cancellation
+from config import (
+    JOB_DEADLINE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    QUICK_MEDIA_MAX_BYTES,
+    QUICK_MEDIA_MAX_SECONDS,
+    SHUTDOWN_DRAIN_SECONDS,
+)
+from exceptions import JobDeadlineExceededError
 from helpers import make_app
-from main import BotApp, build_app
+from main import BotApp, build_app, classify_job, queue_position_reply
+
+UPDATE = {
+    "message_id": 31,
+    "date": 0,
+    "chat": {"id": 42, "type": "private"},
+    "text": "https://example.com",
+}
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -15,9 +36,18 @@ def _make_fake_container(mocker):
     return SimpleNamespace(
         bot=mocker.MagicMock(),
         user_repo=mocker.MagicMock(),
+        jobs=mocker.MagicMock(),
+        limiter=mocker.MagicMock(),
+        cancellations=mocker.MagicMock(),
+        dedupe=mocker.MagicMock(),
+        lease=mocker.MagicMock(),
         quota_manager=mocker.MagicMock(),
         tracer=mocker.MagicMock(),
         handlers=mocker.MagicMock(),
+        stats_log=mocker.MagicMock(),
+        scheduler=mocker.MagicMock(),
+        stream=mocker.MagicMock(),
+        webhook=mocker.MagicMock(),
     )
 
 
@@ -30,29 +60,42 @@ def test_build_app_wires_container_and_registers_handlers(mocker):
     assert isinstance(app, BotApp)
     assert app._bot is container.bot
     assert app._user_repo is container.user_repo
+    assert app._jobs is container.jobs
+    assert app._limiter is container.limiter
+    assert app._cancellations is container.cancellations
+    assert app._dedupe is container.dedupe
+    assert app._lease is container.lease
     assert app._quota_manager is container.quota_manager
     assert app._tracer is container.tracer
     assert app._handlers is container.handlers
-    # 8 registrations: start, info, myinfo, four /set_* commands, unified handler.
-    assert container.bot.message_handler.call_count == 8
+    assert app._stats_log is container.stats_log
+    assert app._scheduler is container.scheduler
+    # BOT_ROLE defaults to "all", which runs its jobs here instead of streaming them.
+    assert app._stream is None
+    assert app._webhook is container.webhook
+    # 10 registrations: start, info, myinfo, cancel, five /set_* commands, and the
+    # unified handler.
+    assert container.bot.message_handler.call_count == 10
 
 
 def test_register_registers_expected_handlers(mocker):
-    """register() registers all eight handlers with their exact kwargs."""
+    """register() registers all ten handlers with their exact kwargs."""
     app, fakes = make_app(mocker)
 
     app.register()
 
-    assert fakes.bot.message_handler.call_count == 8
+    assert fakes.bot.message_handler.call_count == 10
     calls = fakes.bot.message_handler.call_args_list
     assert calls[0].kwargs == {"commands": ["start"]}
     assert calls[1].kwargs == {"commands": ["info"]}
     assert calls[2].kwargs["commands"] == ["myinfo"]
-    assert calls[3].kwargs["commands"] == ["set_target_language"]
-    assert calls[4].kwargs["commands"] == ["set_summarizing_model"]
-    assert calls[5].kwargs["commands"] == ["set_prompt_strategy"]
-    assert calls[6].kwargs["commands"] == ["set_thinking_level"]
-    assert calls[7].kwargs["content_types"] == [
+    assert calls[3].kwargs["commands"] == ["cancel"]
+    assert calls[4].kwargs["commands"] == ["set_target_language"]
+    assert calls[5].kwargs["commands"] == ["set_summarizing_model"]
+    assert calls[6].kwargs["commands"] == ["set_prompt_strategy"]
+    assert calls[7].kwargs["commands"] == ["set_thinking_level"]
+    assert calls[8].kwargs["commands"] == ["set_summary_cache"]
+    assert calls[9].kwargs["content_types"] == [
         "text",
         "audio",
         "document",
@@ -60,32 +103,36 @@ def test_register_registers_expected_handlers(mocker):
         "voice",
         "video",
     ]
+    # The unified handler only queues; handle_message runs on a pool worker.
+    assert fakes.bot.message_handler.return_value.call_args_list[9].args == (
+        app.enqueue_message,
+    )
 
-    # The five auth-gated commands (myinfo and the four set_*) all wire the same
-    # func= predicate, backed by user_repo.check_auth.
-    for call in calls[2:7]:
-        assert call.kwargs["func"] == app._authorized
+    # The six auth-gated commands (myinfo, cancel and the four set_*) all wire
+    # the same func= predicate, backed by user_repo.check_auth.
+    for call in calls[2:8]:
+        assert call.kwargs["func"] == app.authorized
 
 
 def test_authorized_gates_on_a_known_approved_sender(mocker):
-    """_authorized passes only a present sender that check_auth approves."""
+    """`authorized` passes only a present sender that check_auth approves."""
     app, fakes = make_app(mocker)
     message = mocker.MagicMock()
 
     fakes.user_repo.check_auth.return_value = True
-    assert app._authorized(message) is True
+    assert app.authorized(message) is True
 
     fakes.user_repo.check_auth.return_value = False
-    assert app._authorized(message) is False
+    assert app.authorized(message) is False
 
     message.from_user = None
-    assert app._authorized(message) is False
+    assert app.authorized(message) is False
     # The None guard short-circuits, so the repo is not consulted a third time.
     assert fakes.user_repo.check_auth.call_count == 2
 
 
 def test_authorized_reads_an_unregistered_sender_as_unauthorized(mocker):
-    """_authorized answers False rather than raising for an unknown user.
+    """`authorized` answers False rather than raising for an unknown user.
 
     TeleBot evaluates func= filters unguarded, so a ValueError out of
     check_auth would abort handler matching for the whole update — the sender
@@ -96,33 +143,628 @@ def test_authorized_reads_an_unregistered_sender_as_unauthorized(mocker):
     message.from_user.id = 4242
     fakes.user_repo.check_auth.side_effect = ValueError("User not found")
 
-    assert app._authorized(message) is False
+    assert app.authorized(message) is False
     # Pins the sender's own id as the one looked up, which every other
     # attribute of a MagicMock message would otherwise satisfy.
     fakes.user_repo.check_auth.assert_called_once_with(4242)
 
 
-def test_run_starts_infinity_polling(mocker):
-    """run() polls Telegram with the fixed 20s timeout."""
+def test_enqueue_message_records_and_submits_the_job_keyed_by_chat(
+    mocker,
+    message_factory,
+):
+    """enqueue_message records the update, then queues run_job on its lane."""
+    app, fakes = make_app(mocker)
+    mock_run_job = mocker.patch.object(app, "run_job")
+    msg = message_factory(content_type="video", user_id=777)
+    msg.video.duration = 3600
+    fakes.jobs.add.return_value = 5
+    fakes.scheduler.submit.return_value = True
+
+    app.enqueue_message(msg)
+
+    fakes.jobs.add.assert_called_once_with(777, msg.json)
+    lane, key, job = fakes.scheduler.submit.call_args.args
+    assert lane == "long"
+    assert key == 777
+    mock_run_job.assert_not_called()
+    job()
+    mock_run_job.assert_called_once_with(5, msg)
+    fakes.bot.reply_to.assert_not_called()
+    fakes.jobs.finish.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("text", "lane"),
+    [
+        ("https://example.com/article", "quick"),
+        ("not a url at all", "quick"),
+        ("https://www.youtube.com/watch?v=dQw4w9WgXcQ please", "long"),
+        ("https://castro.fm/episode/123", "long"),
+        (None, "quick"),
+    ],
+)
+def test_classify_job_sends_only_media_links_to_the_long_lane(
+    message_factory,
+    text,
+    lane,
+):
+    """A web page needs one parse and one model call; a media link downloads."""
+    assert classify_job(message_factory(text=text)) == lane
+
+
+@pytest.mark.parametrize(
+    ("content_type", "attributes", "lane"),
+    [
+        ("voice", {}, "quick"),
+        ("voice", {"duration": QUICK_MEDIA_MAX_SECONDS + 1}, "long"),
+        ("audio", {"file_size": QUICK_MEDIA_MAX_BYTES + 1}, "long"),
+        ("video", {"file_size": None}, "long"),
+        ("video_note", {}, "quick"),
+        ("document", {}, "quick"),
+        ("document", {"file_size": QUICK_MEDIA_MAX_BYTES + 1}, "long"),
+        (
+            "document",
+            {"mime_type": "image/png", "file_size": QUICK_MEDIA_MAX_BYTES + 1},
+            "quick",
+        ),
+    ],
+)
+def test_classify_job_sends_short_small_media_to_the_quick_lane(
+    message_factory,
+    content_type,
+    attributes,
+    lane,
+):
+    """Media is quick only when its size is known and it is short and small.
+
+    A document of an unsupported type is answered without fetching it, so its
+    size does not matter.
+    """
+    msg = message_factory(content_type=content_type)
+    for name, value in attributes.items():
+        setattr(getattr(msg, content_type), name, value)
+
+    assert classify_job(msg) == lane
+
+
+def test_enqueue_message_drops_a_redelivered_message(mocker, message_factory):
+    """A message Telegram delivers again is neither recorded nor queued twice."""
+    app, fakes = make_app(mocker)
+    fakes.dedupe.first_message.return_value = False
+    msg = message_factory()
+
+    app.enqueue_message(msg)
+
+    fakes.dedupe.first_message.assert_called_once_with(msg.chat.id, msg.message_id)
+    fakes.jobs.add.assert_not_called()
+    fakes.scheduler.submit.assert_not_called()
+
+
+def test_enqueue_message_answers_when_the_pool_is_full(mocker, message_factory):
+    """A refused submission is answered instead of silently dropped."""
     app, fakes = make_app(mocker)
+    msg = message_factory()
+    fakes.scheduler.submit.return_value = False
+
+    app.enqueue_message(msg)
+
+    fakes.bot.reply_to.assert_called_once_with(
+        msg,
+        "The bot is busy. Please try again later.",
+    )
+    fakes.jobs.finish.assert_called_once_with(fakes.jobs.add.return_value, "failed")
+
+
+def test_enqueue_message_while_draining_leaves_the_job_queued(mocker, message_factory):
+    """A job that arrives, or is promoted, during shutdown waits for the restart."""
+    app, fakes = make_app(mocker)
+    mocker.patch("main.clean_up")
+    app.shutdown()
+
+    app.enqueue_message(message_factory())
+
+    fakes.scheduler.submit.assert_not_called()
+    fakes.jobs.finish.assert_not_called()
+    fakes.bot.reply_to.assert_not_called()
+
+
+def test_build_app_publishes_to_the_stream_in_the_ingest_role(mocker, monkeypatch):
+    """In the ingest role, build_app hands BotApp the container's job stream."""
+    monkeypatch.setattr("main.BOT_ROLE", "ingest")
+    container = _make_fake_container(mocker)
+
+    app = build_app(container)
+
+    assert app._stream is container.stream
+
+
+def test_enqueue_message_publishes_to_the_stream_in_the_ingest_role(
+    mocker,
+    message_factory,
+):
+    """An ingest BotApp records the job and streams it rather than running it."""
+    app, fakes = make_app(mocker)
+    app._stream = mocker.MagicMock()
+    msg = message_factory()
+    fakes.jobs.add.return_value = 5
+
+    app.enqueue_message(msg)
+
+    app._stream.publish.assert_called_once_with(5, msg.json)
+    fakes.scheduler.submit.assert_not_called()
+    fakes.bot.reply_to.assert_not_called()
+
+
+def test_run_in_the_ingest_role_takes_updates_without_running_jobs(mocker):
+    """An ingest BotApp starts no pools and resumes nothing; it only polls."""
+    app, fakes = make_app(mocker)
+    app._stream = mocker.MagicMock()
 
     app.run()
 
+    fakes.scheduler.start.assert_not_called()
+    fakes.jobs.unfinished.assert_not_called()
     fakes.bot.infinity_polling.assert_called_once_with(timeout=20)
 
 
+def test_run_job_handles_a_claimed_job_and_marks_it_done(mocker, message_factory):
+    """A claimed job is handled with its record, then finished."""
+    app, fakes = make_app(mocker)
+    mock_handle = mocker.patch.object(app, "handle_message")
+    msg = message_factory()
+    job = mocker.MagicMock(id=5, attempts=1)
+    fakes.jobs.claim.return_value = job
+
+    app.run_job(5, msg)
+
+    fakes.jobs.claim.assert_called_once_with(5)
+    mock_handle.assert_called_once_with(msg, job)
+    fakes.jobs.finish.assert_called_once_with(5)
+    fakes.limiter.release.assert_called_once_with(12345678, 5)
+
+
+def test_run_job_skips_a_job_it_cannot_claim(mocker, message_factory):
+    """A job already claimed elsewhere, or finished, is not run twice."""
+    app, fakes = make_app(mocker)
+    mock_handle = mocker.patch.object(app, "handle_message")
+    fakes.jobs.claim.return_value = None
+
+    app.run_job(5, message_factory())
+
+    mock_handle.assert_not_called()
+    fakes.jobs.finish.assert_not_called()
+
+
+def test_run_job_gives_up_after_max_attempts(mocker, message_factory):
+    """A job started JOB_MAX_ATTEMPTS times already is failed and answered."""
+    app, fakes = make_app(mocker)
+    mock_handle = mocker.patch.object(app, "handle_message")
+    msg = message_factory()
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=JOB_MAX_ATTEMPTS + 1)
+
+    app.run_job(5, msg)
+
+    mock_handle.assert_not_called()
+    fakes.jobs.finish.assert_called_once_with(5, "failed")
+    fakes.bot.reply_to.assert_called_once_with(
+        msg,
+        "This message could not be processed. Please send it again.",
+    )
+
+
+def test_run_job_leaves_an_interrupted_job_unfinished(mocker, message_factory):
+    """A job cut short by shutdown stays running, for the next start to resume."""
+    app, fakes = make_app(mocker)
+    mocker.patch.object(app, "handle_message", side_effect=KeyboardInterrupt)
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+
+    with pytest.raises(KeyboardInterrupt):
+        app.run_job(5, message_factory())
+
+    fakes.jobs.finish.assert_not_called()
+    fakes.limiter.release.assert_not_called()
+
+
+def test_enqueue_message_lines_up_a_job_past_the_user_limit(mocker, message_factory):
+    """A sender at the limit gets their place in line instead of a worker."""
+    app, fakes = make_app(mocker)
+    msg = message_factory(user_id=777)
+    fakes.jobs.add.return_value = 5
+    fakes.limiter.admit.return_value = 2
+    fakes.limiter.notices.return_value = {}
+    notice = fakes.bot.reply_to.return_value
+    notice.chat.id, notice.message_id = 777, 90
+
+    app.enqueue_message(msg)
+
+    fakes.limiter.admit.assert_called_once_with(777, 5)
+    fakes.scheduler.submit.assert_not_called()
+    fakes.bot.reply_to.assert_called_once_with(msg, queue_position_reply(2))
+    fakes.limiter.set_notice.assert_called_once_with(777, 5, 777, 90)
+    fakes.bot.delete_message.assert_not_called()
+
+
+def test_a_notice_for_a_job_promoted_meanwhile_is_deleted(mocker, message_factory):
+    """A job started while its place-in-line reply was sent loses the reply."""
+    app, fakes = make_app(mocker)
+    fakes.jobs.add.return_value = 5
+    fakes.limiter.admit.return_value = 1
+    fakes.limiter.notices.return_value = {}
+    fakes.limiter.set_notice.return_value = False
+    notice = fakes.bot.reply_to.return_value
+    notice.chat.id, notice.message_id = 777, 90
+
+    app.enqueue_message(message_factory(user_id=777))
+
+    fakes.bot.delete_message.assert_called_once_with(777, 90)
+
+
+def test_resumed_waiting_job_keeps_its_notice(mocker, message_factory):
+    """A job already in line after a restart is not announced a second time."""
+    app, fakes = make_app(mocker)
+    fakes.limiter.admit.return_value = 1
+    fakes.limiter.notices.return_value = {5: (777, 90)}
+
+    app._queue_job(5, message_factory(user_id=777))
+
+    fakes.bot.reply_to.assert_not_called()
+    fakes.scheduler.submit.assert_not_called()
+
+
+def test_a_job_without_a_sender_is_not_limited(mocker, message_factory):
+    """With no sender to count against, the job is dispatched as it is."""
+    app, fakes = make_app(mocker)
+    msg = message_factory()
+    msg.from_user = None
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+    mocker.patch.object(app, "handle_message")
+
+    app._queue_job(5, msg)
+    app.run_job(5, msg)
+
+    fakes.scheduler.submit.assert_called_once()
+    fakes.limiter.admit.assert_not_called()
+    fakes.limiter.release.assert_not_called()
+
+
+def test_run_job_starts_the_next_job_in_line_and_moves_the_line(
+    mocker,
+    message_factory,
+):
+    """A finished job's slot goes to the next one, whose notice is removed."""
+    app, fakes = make_app(mocker)
+    mocker.patch.object(app, "handle_message")
+    msg = message_factory(user_id=777)
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+    fakes.limiter.release.return_value = [6]
+    fakes.limiter.drop_notice.return_value = (777, 90)
+    fakes.jobs.get.return_value = mocker.MagicMock(update=UPDATE)
+    fakes.limiter.waiting.return_value = [7, 8]
+    fakes.limiter.notices.return_value = {7: (777, 91)}
+    fakes.scheduler.submit.return_value = True
+
+    app.run_job(5, msg)
+
+    fakes.limiter.release.assert_called_once_with(777, 5)
+    fakes.bot.delete_message.assert_called_once_with(777, 90)
+    fakes.jobs.get.assert_called_once_with(6)
+    lane, key, _ = fakes.scheduler.submit.call_args.args
+    assert (lane, key) == ("quick", 42)
+    fakes.bot.edit_message_text.assert_called_once_with(
+        queue_position_reply(1),
+        777,
+        91,
+    )
+
+
+def test_a_promoted_job_with_no_record_gives_its_slot_back(mocker, message_factory):
+    """A promoted job missing from Postgres releases the slot it was given."""
+    app, fakes = make_app(mocker)
+    msg = message_factory(user_id=777)
+    fakes.limiter.release.side_effect = [[6], []]
+    fakes.limiter.drop_notice.return_value = None
+    fakes.jobs.get.return_value = None
+    fakes.limiter.waiting.return_value = []
+    fakes.limiter.notices.return_value = {}
+
+    app._release(5, msg)
+
+    assert fakes.limiter.release.call_args_list == [
+        mocker.call(777, 5),
+        mocker.call(777, 6),
+    ]
+    fakes.scheduler.submit.assert_not_called()
+
+
+def test_a_promoted_job_with_no_message_is_failed_and_gives_its_slot_back(
+    mocker,
+    message_factory,
+):
+    """A promoted job whose update holds no message is failed, not dispatched."""
+    app, fakes = make_app(mocker)
+    msg = message_factory(user_id=777)
+    fakes.limiter.release.side_effect = [[6], []]
+    fakes.limiter.drop_notice.return_value = None
+    fakes.jobs.get.return_value = mocker.MagicMock(id=6, update=None)
+    fakes.limiter.waiting.return_value = []
+    fakes.limiter.notices.return_value = {}
+
+    app._release(5, msg)
+
+    fakes.jobs.finish.assert_called_once_with(6, "failed")
+    assert fakes.limiter.release.call_args_list == [
+        mocker.call(777, 5),
+        mocker.call(777, 6),
+    ]
+    fakes.scheduler.submit.assert_not_called()
+
+
+def test_a_notice_telegram_rejects_is_only_logged(mocker, message_factory):
+    """A deleted notice, or one already showing its place, does not fail the job."""
+    app, fakes = make_app(mocker)
+    fakes.limiter.release.side_effect = [[6], []]
+    fakes.limiter.drop_notice.return_value = (777, 90)
+    fakes.jobs.get.return_value = None
+    fakes.bot.delete_message.side_effect = ApiTelegramException(
+        "deleteMessage",
+        mocker.MagicMock(),
+        {"error_code": 400, "description": "Bad Request: message to delete not found"},
+    )
+    mock_warning = mocker.patch("main.logger.warning")
+
+    app._release(5, message_factory(user_id=777))
+
+    mock_warning.assert_called_once()
+
+
+def test_a_job_refused_by_a_full_lane_gives_its_slot_back(mocker, message_factory):
+    """A job failed for a full lane frees the sender's slot for their next one."""
+    app, fakes = make_app(mocker)
+    fakes.jobs.add.return_value = 5
+    fakes.scheduler.submit.return_value = False
+
+    app.enqueue_message(message_factory(user_id=777))
+
+    fakes.limiter.release.assert_called_once_with(777, 5)
+
+
+def test_handle_message_records_the_settings_on_a_new_job(mocker, message_factory):
+    """A job's first run snapshots the user's settings onto the job."""
+    app, fakes = make_app(mocker)
+    msg = message_factory()
+    user = mocker.MagicMock(approved=True)
+    fakes.user_repo.select_user.return_value = user
+    job = mocker.MagicMock(id=5, settings=None)
+
+    app.handle_message(msg, job)
+
+    fakes.handlers.job_settings.assert_called_once_with(user)
+    fakes.jobs.save_settings.assert_called_once_with(
+        5,
+        fakes.handlers.job_settings.return_value,
+    )
+    fakes.handlers.handle_url.assert_called_once_with(msg, user, "Hello")
+
+
+def test_handle_message_resumes_a_job_on_its_recorded_settings(
+    mocker,
+    message_factory,
+):
+    """A resumed job runs as the settings it recorded, without a user lookup."""
+    app, fakes = make_app(mocker)
+    msg = message_factory()
+    job = mocker.MagicMock(settings={"model": "m"})
+    user = fakes.handlers.user_from_job_settings.return_value
+
+    app.handle_message(msg, job)
+
+    fakes.handlers.user_from_job_settings.assert_called_once_with({"model": "m"})
+    fakes.user_repo.select_user.assert_not_called()
+    fakes.jobs.save_settings.assert_not_called()
+    fakes.handlers.handle_url.assert_called_once_with(msg, user, "Hello")
+
+
+def test_resume_jobs_queues_each_unfinished_job_as_a_reply(mocker):
+    """Unfinished jobs are rebuilt from their update and queued, oldest first."""
+    app, fakes = make_app(mocker)
+    mock_run_job = mocker.patch.object(app, "run_job")
+    update = {
+        "message_id": 31,
+        "date": 0,
+        "chat": {"id": 42, "type": "private"},
+        "text": "https://example.com",
+    }
+    fakes.jobs.unfinished.return_value = [mocker.MagicMock(id=7, update=update)]
+    fakes.scheduler.submit.return_value = True
+
+    app.resume_jobs()
+
+    lane, key, job = fakes.scheduler.submit.call_args.args
+    assert (lane, key) == ("quick", 42)
+    job()
+    job_id, message = mock_run_job.call_args.args
+    assert job_id == 7
+    assert message.message_id == 31
+    assert message.text == "https://example.com"
+
+
+def test_resume_jobs_fails_a_job_with_no_message(mocker, caplog):
+    """A job whose recorded update holds no message is failed, not queued."""
+    app, fakes = make_app(mocker)
+    fakes.jobs.unfinished.return_value = [mocker.MagicMock(id=7, update=None)]
+
+    with caplog.at_level(logging.WARNING, logger="main"):
+        app.resume_jobs()
+
+    fakes.jobs.finish.assert_called_once_with(7, "failed")
+    fakes.scheduler.submit.assert_not_called()
+    assert "Job 7 has no message to run" in caplog.text
+
+
+def test_run_starts_the_pool_then_infinity_polling(mocker):
+    """run() starts the workers before polling Telegram with the fixed 20s timeout.
+
+    It polls only once it holds the leader lease, and keeps renewing it; losing
+    it stops polling. Unfinished jobs are queued before any new update arrives.
+    Any webhook is removed first: Telegram refuses getUpdates while one is set,
+    and webhook mode leaves it registered on exit.
+    """
+    app, fakes = make_app(mocker)
+    order = mocker.MagicMock()
+    order.attach_mock(fakes.lease.wait, "wait_for_lease")
+    order.attach_mock(fakes.lease.keep, "keep_lease")
+    order.attach_mock(fakes.scheduler.start, "start")
+    order.attach_mock(mocker.patch.object(app, "start_heartbeat"), "heartbeat")
+    order.attach_mock(fakes.stats_log.start, "stats_log")
+    order.attach_mock(fakes.jobs.unfinished, "unfinished")
+    order.attach_mock(fakes.bot.remove_webhook, "remove_webhook")
+    order.attach_mock(fakes.bot.infinity_polling, "poll")
+    fakes.jobs.unfinished.return_value = []
+
+    app.run()
+
+    assert order.mock_calls == [
+        mocker.call.wait_for_lease(),
+        mocker.call.keep_lease(fakes.bot.stop_polling),
+        mocker.call.stats_log(app._stopped),
+        mocker.call.start(),
+        mocker.call.heartbeat(),
+        mocker.call.unfinished(),
+        mocker.call.remove_webhook(),
+        mocker.call.poll(timeout=20),
+    ]
+
+
+def test_run_serves_the_webhook_instead_of_polling(mocker):
+    """In webhook mode run() listens and serves updates, and never polls."""
+    app, fakes = make_app(mocker)
+    webhook = mocker.MagicMock()
+    app._webhook = webhook
+    mocker.patch.object(app, "start_heartbeat")
+    order = mocker.MagicMock()
+    order.attach_mock(fakes.scheduler.start, "start")
+    order.attach_mock(webhook.listen, "listen")
+    order.attach_mock(webhook.serve_forever, "serve")
+
+    app.run()
+
+    assert order.mock_calls == [
+        mocker.call.start(),
+        mocker.call.listen(),
+        mocker.call.serve(),
+    ]
+    fakes.bot.infinity_polling.assert_not_called()
+    fakes.bot.remove_webhook.assert_not_called()
+    fakes.lease.wait.assert_not_called()
+
+
+def test_heartbeat_keeps_running_jobs_alive_until_shutdown(mocker, caplog):
+    """The jobs this process runs are beaten for, a failed beat only logged."""
+    mocker.patch("main.JOB_HEARTBEAT_SECONDS", 0.01)
+    app, fakes = make_app(mocker)
+    beats = threading.Semaphore(0)
+
+    def heartbeat():
+        beats.release()
+        if fakes.jobs.heartbeat.call_count == 1:
+            msg = "connection reset"
+            raise OperationalError("UPDATE jobs", {}, Exception(msg))
+        return 1
+
+    fakes.jobs.heartbeat.side_effect = heartbeat
+
+    with caplog.at_level(logging.WARNING, logger="main"):
+        app.start_heartbeat()
+        assert beats.acquire(timeout=5)
+        assert beats.acquire(timeout=5)
+        app.shutdown()
+    beaten = fakes.jobs.heartbeat.call_count
+    time.sleep(0.05)
+
+    assert fakes.jobs.heartbeat.call_count <= beaten + 1
+    assert "Could not refresh job heartbeats" in caplog.text
+
+
+def test_losing_the_lease_stops_polling_but_keeps_the_heartbeat(mocker):
+    """A leader that lost its lease drains with its jobs still marked alive.
+
+    The new leader's resume_jobs then leaves them alone, however the lease was
+    lost, instead of running them a second time.
+    """
+    app, fakes = make_app(mocker)
+    mocker.patch.object(app, "start_heartbeat")
+    fakes.jobs.unfinished.return_value = []
+
+    app.run()
+    on_lost = fakes.lease.keep.call_args.args[0]
+    on_lost()
+
+    fakes.bot.stop_polling.assert_called_once_with()
+    assert not app._stopped.is_set()
+
+
 def test_shutdown_cleans_up_and_flushes_the_tracer(mocker):
-    """shutdown() sweeps temp files and flushes the tracer.
+    """shutdown() stops polling, hands the lease on, drains, sweeps and flushes.
+
+    The lease goes before the drain: the jobs still running here are kept from
+    the next leader by their heartbeats, so it need not wait for them.
 
     Whether tracing is configured at all is Tracer.shutdown's decision, covered
     by tests/test_services.py::test_tracer_shutdown_*.
     """
     app, fakes = make_app(mocker)
     mock_clean_up = mocker.patch("main.clean_up")
+    order = mocker.MagicMock()
+    order.attach_mock(fakes.bot.stop_polling, "stop_polling")
+    order.attach_mock(fakes.scheduler.shutdown, "pool_shutdown")
+    order.attach_mock(fakes.lease.release, "release_lease")
+    order.attach_mock(mock_clean_up, "clean_up")
+
+    app.shutdown()
+
+    assert order.mock_calls == [
+        mocker.call.stop_polling(),
+        mocker.call.release_lease(),
+        mocker.call.pool_shutdown(SHUTDOWN_DRAIN_SECONDS),
+        mocker.call.clean_up(all_downloads=True),
+    ]
+    fakes.tracer.shutdown.assert_called_once_with()
+
+
+def test_shutdown_closes_the_webhook_before_the_pool(mocker):
+    """No update may reach the pool once it has started draining."""
+    app, fakes = make_app(mocker)
+    app._webhook = mocker.MagicMock()
+    mocker.patch("main.clean_up")
+    order = mocker.MagicMock()
+    order.attach_mock(app._webhook.close, "close")
+    order.attach_mock(fakes.scheduler.shutdown, "pool_shutdown")
+
+    app.shutdown()
+
+    assert order.mock_calls == [
+        mocker.call.close(),
+        mocker.call.pool_shutdown(SHUTDOWN_DRAIN_SECONDS),
+    ]
+    fakes.bot.stop_polling.assert_not_called()
+    fakes.lease.release.assert_not_called()
+
+
+def test_shutdown_past_the_deadline_keeps_the_temp_files(mocker):
+    """Jobs still running at the deadline keep their files and resume on restart."""
+    app, fakes = make_app(mocker)
+    fakes.scheduler.shutdown.return_value = 2
+    mock_clean_up = mocker.patch("main.clean_up")
+    mock_warning = mocker.patch("main.logger.warning")
 
     app.shutdown()
 
-    mock_clean_up.assert_called_once_with(all_downloads=True)
+    mock_clean_up.assert_not_called()
+    mock_warning.assert_called_once_with(
+        "Shutdown left %d job(s) unfinished; they resume on restart",
+        2,
+    )
     fakes.tracer.shutdown.assert_called_once_with()
 
 
@@ -139,3 +781,112 @@ def test_shutdown_flushes_the_tracer_when_the_sweep_fails(mocker):
         app.shutdown()
 
     fakes.tracer.shutdown.assert_called_once_with()
+
+
+def test_cancel_drops_waiting_jobs_and_flags_running_ones(mocker, message_factory):
+    """/cancel takes waiting jobs out of line and flags the running ones."""
+    app, fakes = make_app(mocker)
+    msg = message_factory(user_id=777)
+    fakes.limiter.waiting.return_value = [7, 8]
+    fakes.limiter.running.return_value = [5, 8]
+    # Job 8 was promoted between reading the line and withdrawing it.
+    fakes.limiter.withdraw.side_effect = [True, False]
+    fakes.limiter.drop_notice.return_value = (777, 91)
+
+    app.handle_cancel(msg)
+
+    fakes.jobs.finish.assert_called_once_with(7, "cancelled")
+    fakes.bot.delete_message.assert_called_once_with(777, 91)
+    assert fakes.cancellations.cancel.call_args_list == [
+        mocker.call(8),
+        mocker.call(5),
+        mocker.call(8),
+    ]
+    fakes.bot.reply_to.assert_called_once_with(msg, "Cancelling 3 message(s).")
+
+
+def test_cancel_with_nothing_in_flight_says_so(mocker, message_factory):
+    """A sender with no jobs is told there is nothing to cancel."""
+    app, fakes = make_app(mocker)
+    msg = message_factory()
+    fakes.limiter.waiting.return_value = []
+    fakes.limiter.running.return_value = []
+
+    app.handle_cancel(msg)
+
+    fakes.cancellations.cancel.assert_not_called()
+    fakes.bot.reply_to.assert_called_once_with(msg, "Nothing to cancel.")
+
+
+def test_cancel_without_a_sender_is_answered(mocker, message_factory):
+    """/cancel from a message with no sender cannot tell whose jobs to stop."""
+    app, fakes = make_app(mocker)
+    msg = message_factory()
+    msg.from_user = None
+
+    app.handle_cancel(msg)
+
+    fakes.limiter.waiting.assert_not_called()
+    fakes.bot.reply_to.assert_called_once_with(msg, "User information is missing.")
+
+
+def test_run_job_skips_a_job_cancelled_before_it_started(mocker, message_factory):
+    """A job flagged while queued is finished as cancelled without running."""
+    app, fakes = make_app(mocker)
+    mock_handle = mocker.patch.object(app, "handle_message")
+    msg = message_factory(user_id=777)
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+    fakes.cancellations.token.return_value.cancelled.return_value = True
+
+    app.run_job(5, msg)
+
+    fakes.cancellations.token.assert_called_once_with(5)
+    mock_handle.assert_not_called()
+    fakes.jobs.finish.assert_called_once_with(5, "cancelled")
+    fakes.bot.reply_to.assert_called_once_with(msg, "Cancelled.")
+    fakes.limiter.release.assert_called_once_with(777, 5)
+
+
+def test_run_job_answers_one_timeout_past_the_deadline(mocker, message_factory):
+    """A job out of time is failed with a timeout reply and gives its slot back."""
+    app, fakes = make_app(mocker)
+    seen = []
+
+    def handle(_message, _job):
+        seen.append(cancellation.time_left())
+        raise JobDeadlineExceededError
+
+    mocker.patch.object(app, "handle_message", side_effect=handle)
+    msg = message_factory(user_id=777)
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+
+    app.run_job(5, msg)
+
+    assert 0 < seen[0] <= JOB_DEADLINE_SECONDS
+    assert cancellation.time_left() is None
+    fakes.jobs.finish.assert_called_once_with(5, "failed")
+    fakes.bot.reply_to.assert_called_once_with(
+        msg,
+        "This message took too long to process. Please try again later.",
+    )
+    fakes.limiter.release.assert_called_once_with(777, 5)
+
+
+def test_run_job_binds_the_token_and_stops_when_cancelled(mocker, message_factory):
+    """The pipeline sees the job's token; a cancel mid-way ends the job."""
+    app, fakes = make_app(mocker)
+    token = fakes.cancellations.token.return_value
+
+    def handle(_message, _job):
+        token.cancelled.return_value = True
+        cancellation.raise_if_stopped()
+
+    mocker.patch.object(app, "handle_message", side_effect=handle)
+    msg = message_factory()
+    fakes.jobs.claim.return_value = mocker.MagicMock(attempts=1)
+
+    app.run_job(5, msg)
+
+    fakes.jobs.finish.assert_called_once_with(5, "cancelled")
+    fakes.bot.reply_to.assert_called_once_with(msg, "Cancelled.")
+    cancellation.raise_if_stopped()
@@ -4,7 +4,7 @@ from limits.storage import MemoryStorage
 from limits.strategies import FixedWindowRateLimiter
 from limits.util import WindowStats
 
-from exceptions import LimitExceededError
+from exceptions import JobCancelledError, LimitExceededError
 from prompts import prompt_version
 from services import GeminiHelper, Messenger, QuotaManager, Tracer
 
@@ -85,6 +85,35 @@ def test_upload_and_wait_for_file_happy(mocker):
     mock_client.files.upload.assert_called_once()
 
 
+def test_upload_and_wait_for_file_deletes_the_upload_when_cancelled(mocker):
+    """A job cancelled while Gemini processes its file deletes the upload."""
+    mock_client = mocker.MagicMock()
+    mock_client.files.upload.return_value = mocker.MagicMock(state="PROCESSING")
+    mock_client.files.upload.return_value.name = "files/a"
+    mocker.patch("services.cancellation.sleep", side_effect=JobCancelledError)
+
+    with pytest.raises(JobCancelledError):
+        GeminiHelper(mock_client).upload_and_wait_for_file("path", "audio/ogg", 1)
+
+    mock_client.files.delete.assert_called_once_with(name="files/a")
+    mock_client.files.get.assert_not_called()
+
+
+def test_upload_and_wait_for_file_still_raises_the_cancel_if_delete_fails(mocker):
+    """A failed delete is logged; the job still ends as cancelled."""
+    mock_client = mocker.MagicMock()
+    mock_client.files.upload.return_value = mocker.MagicMock(state="PROCESSING")
+    mock_client.files.upload.return_value.name = "files/a"
+    mock_client.files.delete.side_effect = RuntimeError("network")
+    mocker.patch("services.cancellation.sleep", side_effect=JobCancelledError)
+    mock_warning = mocker.patch("services.logger.warning")
+
+    with pytest.raises(JobCancelledError):
+        GeminiHelper(mock_client).upload_and_wait_for_file("path", "audio/ogg", 1)
+
+    mock_warning.assert_called_once()
+
+
 def test_upload_and_wait_for_file_polling(mocker):
     """Test uploading file to Gemini with polling (PROCESSING -> ACTIVE)."""
     mock_client = mocker.MagicMock()
@@ -0,0 +1,197 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from telebot.types import Message
+
+from config import JOB_STREAM_BLOCK_MS, JOB_STREAM_CLAIM_IDLE_MS, JOB_STREAM_READ_COUNT
+from main import BotApp
+from stream_worker import StreamWorker, build_stream_worker
+from streams import StreamEntry
+
+UPDATE = {
+    "message_id": 31,
+    "date": 0,
+    "chat": {"id": 42, "type": "private"},
+    "text": "https://example.com",
+}
+
+
+def _make_worker(mocker):
+    """Return (worker, fakes) with every StreamWorker collaborator mocked."""
+    fakes = SimpleNamespace(
+        app=mocker.MagicMock(),
+        stream=mocker.MagicMock(),
+        scheduler=mocker.MagicMock(),
+        jobs=mocker.MagicMock(),
+    )
+    fakes.app.stored_message.side_effect = lambda _job_id, update: Message.de_json(
+        update,
+    )
+    fakes.stream.claim_stale.return_value = []
+    fakes.stream.read.return_value = []
+    worker = StreamWorker(
+        fakes.app,
+        fakes.stream,
+        fakes.scheduler,
+        fakes.jobs,
+        1000,
+    )
+    return worker, fakes
+
+
+def test_build_stream_worker_wires_a_job_only_bot_app(mocker):
+    """The worker's BotApp runs jobs only: no handlers or webhook.
+
+    It streams the jobs it starts for a sender whose slot it frees.
+    """
+    container = SimpleNamespace(
+        bot=mocker.MagicMock(),
+        user_repo=mocker.MagicMock(),
+        jobs=mocker.MagicMock(),
+        limiter=mocker.MagicMock(),
+        cancellations=mocker.MagicMock(),
+        dedupe=mocker.MagicMock(),
+        lease=mocker.MagicMock(),
+        quota_manager=mocker.MagicMock(),
+        tracer=mocker.MagicMock(),
+        handlers=mocker.MagicMock(),
+        stats_log=mocker.MagicMock(),
+        scheduler=mocker.MagicMock(),
+        stream=mocker.MagicMock(),
+    )
+
+    worker = build_stream_worker(container)
+
+    assert isinstance(worker._app, BotApp)
+    assert worker._app._jobs is container.jobs
+    assert worker._app._limiter is container.limiter
+    assert worker._app._cancellations is container.cancellations
+    assert worker._app._dedupe is container.dedupe
+    assert worker._app._lease is container.lease
+    assert worker._app._stream is container.stream
+    assert worker._app._stats_log is container.stats_log
+    assert worker._app._webhook is None
+    assert worker._stream is container.stream
+    assert worker._scheduler is container.scheduler
+    assert worker._claim_idle_ms == JOB_STREAM_CLAIM_IDLE_MS
+    container.bot.message_handler.assert_not_called()
+
+
+def test_poll_once_runs_a_new_entry_and_acks_after_it(mocker):
+    """A new entry is queued on its lane; it is acknowledged once run_job returns."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.read.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.scheduler.submit.return_value = True
+    order = mocker.MagicMock()
+    order.attach_mock(fakes.app.run_job, "run_job")
+    order.attach_mock(fakes.stream.ack, "ack")
+
+    worker.poll_once()
+
+    fakes.stream.read.assert_called_once_with(
+        JOB_STREAM_READ_COUNT,
+        JOB_STREAM_BLOCK_MS,
+    )
+    lane, key, job = fakes.scheduler.submit.call_args.args
+    assert (lane, key) == ("quick", 42)
+    fakes.stream.ack.assert_not_called()
+    job()
+    job_id, message = fakes.app.run_job.call_args.args
+    assert job_id == 7
+    assert message.message_id == 31
+    assert order.mock_calls[-1] == mocker.call.ack("1-0")
+    fakes.jobs.requeue.assert_not_called()
+
+
+def test_an_entry_with_no_message_is_acked_without_running(mocker):
+    """An entry whose job BotApp fails for want of a message is not dispatched."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.read.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.app.stored_message.side_effect = None
+    fakes.app.stored_message.return_value = None
+
+    worker.poll_once()
+
+    fakes.app.stored_message.assert_called_once_with(7, UPDATE)
+    fakes.scheduler.submit.assert_not_called()
+    fakes.stream.ack.assert_called_once_with("1-0")
+
+
+def test_failed_job_is_left_pending(mocker):
+    """A job that raises is not acknowledged, so another worker retries it."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.read.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.scheduler.submit.return_value = True
+    fakes.app.run_job.side_effect = RuntimeError("db down")
+    worker.poll_once()
+    job = fakes.scheduler.submit.call_args.args[2]
+
+    with pytest.raises(RuntimeError):
+        job()
+
+    fakes.stream.ack.assert_not_called()
+
+
+def test_poll_once_requeues_a_taken_over_entry_first(mocker):
+    """A dead worker's entry is taken over and its job put back to queued."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.claim_stale.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.scheduler.submit.return_value = True
+
+    worker.poll_once()
+
+    fakes.stream.claim_stale.assert_called_once_with(1000, JOB_STREAM_READ_COUNT)
+    fakes.jobs.requeue.assert_called_once_with(7)
+    fakes.scheduler.submit.assert_called_once()
+
+
+def test_dispatch_waits_while_the_lane_is_full(mocker):
+    """A full lane is retried rather than the entry dropped or left pending."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.read.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.scheduler.submit.side_effect = [False, True]
+    mock_wait = mocker.patch.object(worker._stopping, "wait", return_value=False)
+
+    worker.poll_once()
+
+    assert fakes.scheduler.submit.call_count == 2
+    mock_wait.assert_called_once_with(1)
+
+
+def test_dispatch_gives_up_on_a_full_lane_when_stopping(mocker):
+    """Shutdown stops the wait; the entry stays pending for another worker."""
+    worker, fakes = _make_worker(mocker)
+    fakes.stream.read.return_value = [StreamEntry("1-0", 7, UPDATE)]
+    fakes.scheduler.submit.return_value = False
+    worker._stopping.set()
+
+    worker.poll_once()
+
+    fakes.scheduler.submit.assert_called_once()
+    fakes.stream.ack.assert_not_called()
+
+
+def test_run_joins_the_group_starts_the_pools_and_polls_until_shutdown(mocker):
+    """run() polls until shutdown(), which then finishes through BotApp.shutdown."""
+    worker, fakes = _make_worker(mocker)
+    polled = threading.Event()
+
+    def read(*_args):
+        polled.set()
+        return []
+
+    fakes.stream.read.side_effect = read
+    thread = threading.Thread(target=worker.run)
+    thread.start()
+    assert polled.wait(timeout=5)
+
+    worker.shutdown()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    fakes.stream.ensure_group.assert_called_once_with()
+    fakes.scheduler.start.assert_called_once_with()
+    fakes.app.start_heartbeat.assert_called_once_with()
+    fakes.app.start_stats_log.assert_called_once_with()
+    fakes.app.shutdown.assert_called_once_with()
@@ -0,0 +1,95 @@
+import json
+import time
+
+import fakeredis
+import pytest
+from redis.exceptions import ResponseError
+
+from streams import JobStream, StreamEntry
+
+UPDATE = {"message_id": 1, "chat": {"id": 42, "type": "private"}, "text": "hi"}
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every consumer."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _stream(client, consumer="worker-a", maxlen=1000):
+    return JobStream(client, "jobs", "workers", consumer, maxlen)
+
+
+def test_published_job_is_read_by_one_consumer_of_the_group(client):
+    """Each entry goes to one consumer in the group, with the job id and update."""
+    first, second = _stream(client, "worker-a"), _stream(client, "worker-b")
+    first.ensure_group()
+    first.publish(7, UPDATE)
+
+    entries = first.read(10, 10)
+
+    assert [(entry.job_id, entry.update) for entry in entries] == [(7, UPDATE)]
+    assert second.read(10, 10) == []
+
+
+def test_ensure_group_is_idempotent(client):
+    """A worker joining an existing group does not fail on BUSYGROUP."""
+    stream = _stream(client)
+
+    stream.ensure_group()
+    stream.ensure_group()
+
+    assert client.xinfo_groups("jobs")[0]["name"] == "workers"
+
+
+def test_ensure_group_raises_other_errors(mocker):
+    """Errors other than an existing group are not swallowed."""
+    client = mocker.MagicMock()
+    client.xgroup_create.side_effect = ResponseError("WRONGTYPE")
+
+    with pytest.raises(ResponseError, match="WRONGTYPE"):
+        _stream(client).ensure_group()
+
+
+def test_unacknowledged_entry_is_taken_over_once_idle(client):
+    """A dead consumer's pending entry goes to another consumer after min_idle."""
+    dead, alive = _stream(client, "worker-a"), _stream(client, "worker-b")
+    dead.ensure_group()
+    dead.publish(7, UPDATE)
+    [entry] = dead.read(10, 10)
+
+    assert alive.claim_stale(60_000, 10) == []
+    time.sleep(0.02)
+    assert alive.claim_stale(10, 10) == [entry]
+
+
+def test_acknowledged_entry_is_never_taken_over(client):
+    """An acknowledged entry is off the pending list."""
+    stream = _stream(client)
+    stream.ensure_group()
+    stream.publish(7, UPDATE)
+    [entry] = stream.read(10, 10)
+
+    stream.ack(entry.entry_id)
+    time.sleep(0.02)
+
+    assert stream.claim_stale(10, 10) == []
+
+
+def test_publish_trims_the_stream_to_about_maxlen(mocker):
+    """Each publish trims the stream to about `maxlen`, so it does not grow forever."""
+    client = mocker.MagicMock()
+
+    _stream(client, maxlen=500).publish(7, UPDATE)
+
+    client.xadd.assert_called_once_with(
+        "jobs",
+        {"job_id": 7, "update": json.dumps(UPDATE)},
+        maxlen=500,
+        approximate=True,
+    )
+
+
+def test_stream_entry_is_a_plain_value():
+    """StreamEntry compares by value, so reads can be asserted directly."""
+    assert StreamEntry("1-0", 7, UPDATE) == StreamEntry("1-0", 7, UPDATE)
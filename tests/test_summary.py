@@ -7,9 +7,16 @@ from pydantic_ai.exceptions import ModelHTTPError
 from telebot.types import File
 from tenacity import RetryError
 
+import cancellation
 from config import DEFAULT_MODEL_ID_FOR_SUMMARY
 from domain import PrefixedText
-from exceptions import FetchTranscriptError, LimitExceededError
+from exceptions import (
+    CachedContextGoneError,
+    FetchTranscriptError,
+    JobCancelledError,
+    JobDeadlineExceededError,
+    LimitExceededError,
+)
 from prompts import PROMPTS
 from summary import Summarizer
 
@@ -27,7 +34,13 @@ def _make_summarizer(mocker):
         downloader=mocker.MagicMock(),
         audio_transcriber=mocker.MagicMock(),
         yt_transcriber=mocker.MagicMock(),
+        transcoder=mocker.MagicMock(),
+        uploads=mocker.MagicMock(),
     )
+    # No live upload to reuse, and none evicted by a new one.
+    fakes.uploads.get.return_value = None
+    fakes.uploads.put.side_effect = lambda _digest, uploaded: (uploaded, [])
+    mocker.patch("summary.file_sha256", return_value="digest")
     summarizer = Summarizer(
         fakes.quota_manager,
         fakes.gemini_helper,
@@ -35,6 +48,8 @@ def _make_summarizer(mocker):
         fakes.downloader,
         fakes.audio_transcriber,
         fakes.yt_transcriber,
+        fakes.transcoder,
+        fakes.uploads,
     )
     return summarizer, fakes
 
@@ -85,7 +100,8 @@ def test_summarize_with_file_upload_and_model_call(mocker):
         file="test_audio.ogg",
         mime_type="audio/ogg",
     )
-    fakes.gemini_helper.delete_file.assert_called_once_with("files/mock123")
+    fakes.uploads.put.assert_called_once_with("digest", mock_uploaded_file)
+    fakes.gemini_helper.delete_file.assert_not_called()
     fakes.llm_client.build_uploaded_file.assert_called_once_with(
         model_id="gemini-3.7-flash",
         file=mock_uploaded_file,
@@ -258,7 +274,7 @@ def test_summarize_with_document_polling(mocker):
     )
 
     assert result == "Document summary"
-    fakes.gemini_helper.delete_file.assert_called_once_with("files/doc123")
+    fakes.gemini_helper.delete_file.assert_not_called()
     _, uploaded = fakes.llm_client.run.call_args.kwargs["content"]
     assert uploaded == "uploaded-file-sentinel"
     fakes.llm_client.build_uploaded_file.assert_called_once_with(
@@ -415,7 +431,6 @@ def test_summarize_fallback_to_transcription(mocker):
         side_effect=RetryError(mocker.MagicMock()),
     )
     mocker.patch("summary.generate_temporary_name", return_value="temp.ogg")
-    mocker.patch("summary.compress_audio")
     fakes.audio_transcriber.transcribe.return_value = "Transcription text"
     mocker.patch.object(
         summarizer,
@@ -454,7 +469,7 @@ def test_summarize_routes_audio_around_a_model_that_cannot_read_it(mocker):
     fakes.quota_manager.check_quota.return_value = True
     mock_with_file = mocker.patch.object(summarizer, "summarize_with_file")
     mocker.patch("summary.generate_temporary_name", return_value="temp.ogg")
-    mock_compress = mocker.patch("summary.compress_audio")
+    mock_compress = fakes.transcoder.compress_audio
     fakes.audio_transcriber.transcribe.return_value = "Transcription text"
     mocker.patch.object(
         summarizer,
@@ -493,7 +508,6 @@ def test_summarize_with_document_routes_audio_document_to_transcription(mocker):
     fakes.quota_manager.check_quota.return_value = True
     fakes.downloader.download_tg.return_value = "voice.ogg"
     mocker.patch("summary.generate_temporary_name", return_value="temp.ogg")
-    mocker.patch("summary.compress_audio")
     fakes.audio_transcriber.transcribe.return_value = "Transcription text"
     mocker.patch.object(
         summarizer,
@@ -604,7 +618,7 @@ def test_summarize_fallback_cleans_up_temp_file_when_compress_fails(mocker):
         side_effect=RetryError(mocker.MagicMock()),
     )
     mocker.patch("summary.generate_temporary_name", return_value="temp.ogg")
-    mocker.patch("summary.compress_audio", side_effect=RuntimeError("ffmpeg failed"))
+    fakes.transcoder.compress_audio.side_effect = RuntimeError("ffmpeg failed")
     mock_clean_up = mocker.patch("summary.clean_up")
 
     with pytest.raises(RuntimeError):
@@ -736,8 +750,8 @@ def test_summarize_preflight_blocks_before_download(mocker):
     fakes.downloader.download_castro.assert_not_called()
 
 
-def test_summarize_with_file_deletes_gemini_file_when_quota_check_fails(mocker):
-    """Test summarize_with_file cleans up the uploaded Gemini file if consuming check fails."""
+def test_summarize_with_file_keeps_the_upload_when_quota_check_fails(mocker):
+    """Test a failed consuming check leaves the upload registered for the next try."""
     summarizer, fakes = _make_summarizer(mocker)
     mock_audio_file = SimpleNamespace(
         name="files/audio123",
@@ -770,7 +784,33 @@ def test_summarize_with_file_deletes_gemini_file_when_quota_check_fails(mocker):
         daily_limit=5,
         quantity=1,
     )
-    fakes.gemini_helper.delete_file.assert_called_with("files/audio123")
+    fakes.uploads.put.assert_called_with("digest", mock_audio_file)
+    fakes.gemini_helper.delete_file.assert_not_called()
+
+
+def test_summarize_with_file_stops_before_the_model_when_cancelled(mocker):
+    """A job cancelled during the upload keeps it for reuse and never calls the model."""
+    summarizer, fakes = _make_summarizer(mocker)
+    fakes.gemini_helper.upload_and_wait_for_file.return_value = SimpleNamespace(
+        name="files/audio123",
+    )
+    token = mocker.MagicMock(**{"cancelled.return_value": True})
+
+    with pytest.raises(JobCancelledError), cancellation.bind(token):
+        summarizer._summarize_uploaded_file(
+            file="test_audio.ogg",
+            mime_type="audio/ogg",
+            model="gemini-3.7-flash",
+            prompt_key="basic_prompt_for_transcript",
+            target_language="English",
+            user_id=1,
+            daily_limit=5,
+            thinking_level="minimal",
+        )
+
+    fakes.llm_client.run.assert_not_called()
+    fakes.quota_manager.check_quota.assert_not_called()
+    fakes.gemini_helper.delete_file.assert_not_called()
 
 
 def test_summarize_with_document_preflight_blocks_before_download(mocker):
@@ -799,7 +839,7 @@ def test_summarize_with_document_preflight_blocks_before_download(mocker):
 
 
 def test_summarize_with_file_logs_warning_on_delete_failure(mocker):
-    """Test summarize_with_file logs a warning when Gemini file deletion fails but still returns the result."""
+    """Test a failed delete of an evicted upload is logged and the result still returned."""
     summarizer, fakes = _make_summarizer(mocker)
     fakes.quota_manager.check_quota.return_value = True
     mock_audio_file = SimpleNamespace(
@@ -809,6 +849,10 @@ def test_summarize_with_file_logs_warning_on_delete_failure(mocker):
     )
     fakes.gemini_helper.upload_and_wait_for_file.return_value = mock_audio_file
     fakes.llm_client.run.return_value = "summary text"
+    fakes.uploads.put.side_effect = lambda _digest, uploaded: (
+        uploaded,
+        ["files/old"],
+    )
     fakes.gemini_helper.delete_file.side_effect = Exception("delete failed")
     mock_logger = mocker.patch("summary.logger")
 
@@ -823,7 +867,7 @@ def test_summarize_with_file_logs_warning_on_delete_failure(mocker):
     )
 
     assert result == "summary text"
-    fakes.gemini_helper.delete_file.assert_called_once_with("files/audio123")
+    fakes.gemini_helper.delete_file.assert_called_once_with("files/old")
     mock_logger.warning.assert_called_once()
 
 
@@ -846,6 +890,28 @@ def test_summarize_text_raises_on_empty_response(mocker):
         )
 
 
+def test_summarize_text_skips_a_backoff_past_the_deadline(mocker):
+    """With less time left than the 30 s backoff, the retry stops at once."""
+    summarizer, fakes = _make_summarizer(mocker)
+    mock_sleep = mocker.patch("tenacity.nap.time.sleep")
+    fakes.quota_manager.check_quota.return_value = True
+    fakes.llm_client.run.side_effect = AttributeError
+
+    with pytest.raises(JobDeadlineExceededError), cancellation.deadline(10):
+        summarizer.summarize_text(
+            text="Hello world",
+            model="gemini-3.7-flash",
+            prompt_key="basic_prompt_for_transcript",
+            target_language="English",
+            user_id=123,
+            daily_limit=10,
+            thinking_level="minimal",
+        )
+
+    assert fakes.llm_client.run.call_count == 1
+    mock_sleep.assert_not_called()
+
+
 def test_summarize_with_document_raises_when_upload_metadata_incomplete(mocker):
     """Test summarize_with_document raises RetryError and skips delete on bad metadata.
 
@@ -906,7 +972,7 @@ def test_summarize_with_document_raises_on_empty_response(mocker):
 
 
 def test_summarize_with_document_logs_warning_on_delete_failure(mocker):
-    """Test summarize_with_document logs a warning when Gemini file deletion fails but still returns the result."""
+    """Test a document whose upload evicts one that fails to delete still returns."""
     summarizer, fakes = _make_summarizer(mocker)
     fakes.quota_manager.check_quota.return_value = True
     fakes.downloader.download_tg.return_value = "temp_doc.pdf"
@@ -918,6 +984,10 @@ def test_summarize_with_document_logs_warning_on_delete_failure(mocker):
         mime_type="application/pdf",
     )
     fakes.llm_client.run.return_value = "document summary"
+    fakes.uploads.put.side_effect = lambda _digest, uploaded: (
+        uploaded,
+        ["files/old"],
+    )
     fakes.gemini_helper.delete_file.side_effect = Exception("delete failed")
     mock_logger = mocker.patch("summary.logger")
 
@@ -933,7 +1003,7 @@ def test_summarize_with_document_logs_warning_on_delete_failure(mocker):
     )
 
     assert result == "document summary"
-    fakes.gemini_helper.delete_file.assert_called_once_with("files/doc123")
+    fakes.gemini_helper.delete_file.assert_called_once_with("files/old")
     mock_logger.warning.assert_called_once()
 
 
@@ -962,3 +1032,100 @@ def test_summarize_with_telegram_file(mocker):
 
     assert result == "Telegram file summary"
     fakes.downloader.download_tg.assert_called_once_with(mock_tg_file, ext=".ogg")
+
+
+_SUMMARY_ARGS = {
+    "prompt_key": "basic_prompt_for_transcript",
+    "target_language": "English",
+    "user_id": 123,
+    "daily_limit": 10,
+    "thinking_level": "minimal",
+}
+
+
+def test_summarize_with_file_reuses_a_live_upload(mocker):
+    """Test a file whose bytes were uploaded before is not uploaded again."""
+    summarizer, fakes = _make_summarizer(mocker)
+    live = SimpleNamespace(name="files/live", uri="https://mock.uri")
+    fakes.uploads.get.return_value = live
+    fakes.llm_client.run.return_value = "summary"
+
+    result = summarizer._summarize_uploaded_file(
+        file="test_audio.ogg",
+        mime_type="audio/ogg",
+        model="gemini-3.7-flash",
+        **_SUMMARY_ARGS,
+    )
+
+    assert result == "summary"
+    fakes.uploads.get.assert_called_once_with("digest")
+    fakes.gemini_helper.upload_and_wait_for_file.assert_not_called()
+    fakes.uploads.put.assert_not_called()
+    fakes.llm_client.build_uploaded_file.assert_called_once_with(
+        model_id="gemini-3.7-flash",
+        file=live,
+    )
+
+
+def test_summarize_with_file_uses_the_upload_another_process_recorded_first(mocker):
+    """Test a lost race for the record runs on the winner's upload, deleting ours."""
+    summarizer, fakes = _make_summarizer(mocker)
+    theirs = SimpleNamespace(name="files/theirs")
+    fakes.uploads.put.side_effect = lambda _digest, uploaded: (
+        theirs,
+        [uploaded.name],
+    )
+    fakes.gemini_helper.upload_and_wait_for_file.return_value = SimpleNamespace(
+        name="files/ours",
+    )
+    fakes.llm_client.run.return_value = "summary"
+
+    summarizer._summarize_uploaded_file(
+        file="test_audio.ogg",
+        mime_type="audio/ogg",
+        model="gemini-3.7-flash",
+        **_SUMMARY_ARGS,
+    )
+
+    fakes.gemini_helper.delete_file.assert_called_once_with("files/ours")
+    fakes.llm_client.build_uploaded_file.assert_called_once_with(
+        model_id="gemini-3.7-flash",
+        file=theirs,
+    )
+
+
+@pytest.mark.parametrize(("status", "discarded"), [(404, True), (503, False)])
+def test_summarize_with_file_forgets_an_upload_gemini_no_longer_has(
+    mocker,
+    status,
+    discarded,
+):
+    """Test a 403/404 on the file reference drops the record; other errors keep it."""
+    summarizer, fakes = _make_summarizer(mocker)
+    fakes.llm_client.run.side_effect = ModelHTTPError(status, "gemini-3.7-flash")
+
+    with pytest.raises(ModelHTTPError):
+        summarizer._summarize_uploaded_file(
+            file="test_audio.ogg",
+            mime_type="audio/ogg",
+            model="gemini-3.7-flash",
+            **_SUMMARY_ARGS,
+        )
+
+    assert fakes.uploads.discard.called is discarded
+
+
+def test_summarize_with_file_keeps_an_upload_when_the_cached_context_is_gone(mocker):
+    """Test a 404 blamed on the cached context leaves the upload's record alone."""
+    summarizer, fakes = _make_summarizer(mocker)
+    fakes.llm_client.run.side_effect = CachedContextGoneError(404, "gemini-3.7-flash")
+
+    with pytest.raises(CachedContextGoneError):
+        summarizer._summarize_uploaded_file(
+            file="test_audio.ogg",
+            mime_type="audio/ogg",
+            model="gemini-3.7-flash",
+            **_SUMMARY_ARGS,
+        )
+
+    fakes.uploads.discard.assert_not_called()
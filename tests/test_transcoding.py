@@ -0,0 +1,101 @@
+import subprocess
+import threading
+
+import pytest
+
+from transcoding import EncodeStats, Transcoder
+
+FFMPEG_ARGS = [
+    "ffmpeg",
+    "-y",
+    "-threads",
+    "2",
+    "-i",
+    "in.mp4",
+    "-vn",
+    "-ac",
+    "1",
+    "-c:a",
+    "libopus",
+    "-b:a",
+    "16k",
+]
+
+
+def test_compress_audio_runs_ffmpeg_niced_with_a_timeout(mocker, tmp_path):
+    """compress_audio runs the Opus encode under nice, bounded by the timeout."""
+    output = tmp_path / "out.ogg"
+    output.write_bytes(b"x" * 42)
+    mock_run = mocker.patch("subprocess.run")
+
+    stats = Transcoder(2, 600, 10, 2).compress_audio("in.mp4", str(output))
+
+    mock_run.assert_called_once_with(
+        ["nice", "-n", "10", *FFMPEG_ARGS, str(output)],
+        check=True,
+        capture_output=False,
+        timeout=600,
+    )
+    assert isinstance(stats, EncodeStats)
+    assert stats.output_bytes == 42
+    assert stats.seconds >= 0
+    assert stats.waited >= 0
+
+
+def test_compress_audio_without_nice_runs_ffmpeg_directly(mocker, tmp_path):
+    """A nice level of 0 leaves ffmpeg at normal priority, with no wrapper."""
+    output = tmp_path / "out.ogg"
+    output.write_bytes(b"")
+    mock_run = mocker.patch("subprocess.run")
+
+    Transcoder(2, 600, 0, 2).compress_audio("in.mp4", str(output))
+
+    assert mock_run.call_args.args[0] == [*FFMPEG_ARGS, str(output)]
+
+
+def test_compress_audio_propagates_a_timeout(mocker):
+    """An encode past the timeout raises, and its slot is released."""
+    mocker.patch(
+        "subprocess.run",
+        side_effect=subprocess.TimeoutExpired("ffmpeg", 600),
+    )
+    transcoder = Transcoder(1, 600, 0, 2)
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        transcoder.compress_audio("in.mp4", "out.ogg")
+
+    assert transcoder._slots.acquire(blocking=False)
+
+
+def test_compress_audio_waits_for_a_free_slot(mocker, tmp_path):
+    """Past max_concurrent, an encode queues until a running one finishes."""
+    output = tmp_path / "out.ogg"
+    output.write_bytes(b"")
+    release = threading.Event()
+    started = []
+
+    def run(*_args, **_kwargs):
+        started.append(threading.current_thread().name)
+        release.wait(timeout=5)
+
+    mocker.patch("subprocess.run", side_effect=run)
+    transcoder = Transcoder(1, 600, 0, 2)
+    threads = [
+        threading.Thread(
+            target=transcoder.compress_audio,
+            args=("in.mp4", str(output)),
+            name=name,
+        )
+        for name in ("first", "second")
+    ]
+    threads[0].start()
+    while not started:
+        threading.Event().wait(0.01)
+    threads[1].start()
+    threads[1].join(timeout=0.1)
+
+    assert started == ["first"]
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert started == ["first", "second"]
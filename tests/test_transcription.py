@@ -1,8 +1,9 @@
 import textwrap
 
+import fakeredis
 import pytest
 from defusedxml.ElementTree import ParseError
-from replicate.exceptions import ModelError
+from replicate.exceptions import ModelError, ReplicateError
 from requests.exceptions import ChunkedEncodingError, ProxyError, SSLError
 from tenacity import RetryError
 from youtube_transcript_api._errors import (
@@ -13,9 +14,11 @@ from youtube_transcript_api._errors import (
 )
 from yt_dlp.utils import DownloadError
 
+from caching import PrefixedTextCache, TtlCache, ValkeyCache, VideoInfoCache
 from domain import PrefixedText
 from exceptions import (
     FetchTranscriptError,
+    JobCancelledError,
     TranscriptDownloadError,
 )
 from transcription import (
@@ -34,7 +37,7 @@ def _install_mock_ydl(mocker, tmp_path, info, vtt_name, vtt_text):
     production glob and the real clean_up both operate there.
 
     Returns:
-        The list each download() call appends its requested `subtitleslangs` to.
+        The list each process_ie_result() call appends its requested `subtitleslangs` to.
 
     """
     download_calls: list[list[str]] = []
@@ -53,13 +56,13 @@ def _install_mock_ydl(mocker, tmp_path, info, vtt_name, vtt_text):
         def extract_info(self, url: str, download: bool = True) -> dict:
             return info
 
-        def download(self, url_list: list[str]) -> int:
+        def process_ie_result(self, ie_result: dict, download: bool = True) -> dict:
             download_calls.append(self.opts.get("subtitleslangs", []))
             vtt_path.write_text(
                 f"WEBVTT\n\n00:00:01.000 --> 00:00:03.000\n{vtt_text}\n",
                 encoding="utf-8",
             )
-            return 0
+            return ie_result
 
     mocker.patch("transcription.generate_temporary_name", return_value="fake-uuid")
     mocker.patch("transcription.YoutubeDL", MockYDL)
@@ -67,6 +70,11 @@ def _install_mock_ydl(mocker, tmp_path, info, vtt_name, vtt_text):
     return download_calls, vtt_path
 
 
+def _ytdlp_backend(info=None):
+    """Return a YtDlpBackend with an info cache of its own unless one is given."""
+    return YtDlpBackend(info or VideoInfoCache(TtlCache(600, 16)))
+
+
 def _make_transcriber():
     """Return (transcriber, primary, fallback) wired to freshly constructed backends.
 
@@ -74,8 +82,12 @@ def _make_transcriber():
     so orchestration tests never touch the network or the module singletons.
     """
     primary = ApiBackend()
-    fallback = YtDlpBackend()
-    return YouTubeTranscriber(primary, fallback), primary, fallback
+    fallback = _ytdlp_backend()
+    cache = PrefixedTextCache(
+        ValkeyCache(fakeredis.FakeRedis(), "transcript", 60, 10**6, 10**6),
+        30,
+    )
+    return YouTubeTranscriber(primary, fallback, cache), primary, fallback
 
 
 def test_get_yt_transcript_uses_api_primary(mocker):
@@ -96,6 +108,18 @@ def test_get_yt_transcript_uses_api_primary(mocker):
     mock_ytdlp.assert_not_called()
 
 
+def test_get_transcript_does_not_fall_back_for_a_cancelled_job(mocker):
+    """A cancel in the primary backend ends the job instead of trying yt-dlp."""
+    transcriber, primary, fallback = _make_transcriber()
+    mocker.patch.object(primary, "fetch_via_api", side_effect=JobCancelledError)
+    mock_ytdlp = mocker.patch.object(fallback, "fetch_via_ytdlp")
+
+    with pytest.raises(JobCancelledError):
+        transcriber.get_transcript("https://youtu.be/dQw4w9WgXcQ")
+
+    mock_ytdlp.assert_not_called()
+
+
 @pytest.mark.parametrize(
     "url",
     [
@@ -212,6 +236,57 @@ def test_get_yt_transcript_both_empty_raises_error(mocker):
         transcriber.get_transcript(url)
 
 
+def test_get_transcript_answers_a_repeat_from_the_cache(mocker):
+    """A second request for the video, in any URL form, reaches no backend."""
+    transcriber, primary, fallback = _make_transcriber()
+    mock_api = mocker.patch.object(primary, "fetch_via_api", return_value="")
+    mocker.patch.object(fallback, "fetch_via_ytdlp", return_value="from yt-dlp")
+
+    first = transcriber.get_transcript("https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    second = transcriber.get_transcript("https://youtu.be/dQw4w9WgXcQ")
+
+    assert first == second == PrefixedText(text="from yt-dlp", prefix="📹")
+    mock_api.assert_called_once()
+
+
+def test_get_transcript_remembers_a_video_with_no_transcript(mocker):
+    """Once the API says there is none, a repeat fails without the backends."""
+    transcriber, primary, fallback = _make_transcriber()
+    mock_api = mocker.patch.object(
+        primary,
+        "fetch_via_api",
+        side_effect=TranscriptsDisabled("dQw4w9WgXcQ"),
+    )
+    mock_ytdlp = mocker.patch.object(
+        fallback,
+        "fetch_via_ytdlp",
+        side_effect=DownloadError("No subtitles available via yt-dlp"),
+    )
+    url = "https://youtu.be/dQw4w9WgXcQ"
+    with pytest.raises(FetchTranscriptError, match="Both transcript backends failed"):
+        transcriber.get_transcript(url)
+
+    with pytest.raises(FetchTranscriptError, match="no transcript"):
+        transcriber.get_transcript(url)
+
+    mock_api.assert_called_once()
+    mock_ytdlp.assert_called_once()
+
+
+def test_get_transcript_retries_after_a_transient_double_failure(mocker):
+    """Failures that do not say the transcript is absent are not remembered."""
+    transcriber, primary, fallback = _make_transcriber()
+    mock_api = mocker.patch.object(primary, "fetch_via_api", return_value="")
+    mocker.patch.object(fallback, "fetch_via_ytdlp", side_effect=RetryError(None))
+    url = "https://youtu.be/dQw4w9WgXcQ"
+
+    for _ in range(2):
+        with pytest.raises(FetchTranscriptError):
+            transcriber.get_transcript(url)
+
+    assert mock_api.call_count == 2
+
+
 def test_get_yt_transcript_unknown_url(mocker):
     """Test get_yt_transcript raises ValueError for unknown URL formats."""
     transcriber, primary, fallback = _make_transcriber()
@@ -227,7 +302,7 @@ def test_get_yt_transcript_unknown_url(mocker):
 
 def test_fetch_via_api_falls_back_to_other_languages(mocker):
     """Test fetch_via_api retries other languages on NoTranscriptFound."""
-    mocker.patch("transcription.time.sleep")  # don't actually wait 60s
+    mocker.patch("cancellation.time.sleep")  # don't actually wait 60s
     mock_ytt = mocker.patch("transcription.YouTubeTranscriptApi")
     mock_formatter = mocker.patch("transcription.TextFormatter")
 
@@ -379,15 +454,17 @@ def test_fetch_via_ytdlp_download_error_logged_and_retried(mocker, tmp_path):
         "subtitles": {"en": [{}]},
         "automatic_captions": {},
     }
-    ctx.download.side_effect = DownloadError("Sign in to confirm")
+    ctx.process_ie_result.side_effect = DownloadError("Sign in to confirm")
     mock_logger = mocker.patch("transcription.logger")
 
     with pytest.raises(RetryError):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
-    assert ctx.download.call_count == 2
+    assert ctx.process_ie_result.call_count == 2
+    # A failed download may be a stale format URL, so the retry probes afresh.
+    assert ctx.extract_info.call_count == 2
     mock_logger.warning.assert_any_call(
         "yt-dlp subtitle fetch failed: %s: %s",
         "DownloadError",
@@ -408,15 +485,15 @@ def test_fetch_via_ytdlp_unexpected_error_wrapped_and_retried(
         "subtitles": {"en": [{}]},
         "automatic_captions": {},
     }
-    ctx.download.side_effect = ConnectionError("network failure")
+    ctx.process_ie_result.side_effect = ConnectionError("network failure")
     mock_logger = mocker.patch("transcription.logger")
 
     with pytest.raises(RetryError):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
-    assert ctx.download.call_count == 2
+    assert ctx.process_ie_result.call_count == 2
     mock_logger.warning.assert_any_call(
         "yt-dlp subtitle fetch failed unexpectedly: %s: %s",
         "ConnectionError",
@@ -435,10 +512,10 @@ def test_fetch_via_ytdlp_unexpected_error_preserves_cause(mocker, tmp_path):
         "automatic_captions": {},
     }
     original_exc = ConnectionError("network failure")
-    ctx.download.side_effect = original_exc
+    ctx.process_ie_result.side_effect = original_exc
 
     with pytest.raises(RetryError) as exc_info:
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
@@ -460,7 +537,7 @@ def test_fetch_via_ytdlp_probe_download_error_logged_and_retried(
     mock_logger = mocker.patch("transcription.logger")
 
     with pytest.raises(RetryError):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
@@ -470,7 +547,7 @@ def test_fetch_via_ytdlp_probe_download_error_logged_and_retried(
         "DownloadError",
         mocker.ANY,
     )
-    ctx.download.assert_not_called()
+    ctx.process_ie_result.assert_not_called()
 
 
 def test_fetch_via_ytdlp_probe_unexpected_error_wrapped_and_retried(
@@ -487,7 +564,7 @@ def test_fetch_via_ytdlp_probe_unexpected_error_wrapped_and_retried(
     mock_logger = mocker.patch("transcription.logger")
 
     with pytest.raises(RetryError) as exc_info:
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
@@ -500,13 +577,13 @@ def test_fetch_via_ytdlp_probe_unexpected_error_wrapped_and_retried(
         "ValueError",
         mocker.ANY,
     )
-    ctx.download.assert_not_called()
+    ctx.process_ie_result.assert_not_called()
 
 
 def test_fetch_via_ytdlp_succeeds_on_second_attempt(mocker, tmp_path):
     """Test fetch_via_ytdlp returns transcript when first probe fails but second succeeds."""
     # Fixed name kept: the vtt fixture below is written under this name by
-    # MockYDL.download(), so the name must be known before the call for the
+    # MockYDL.process_ie_result(), so the name must be known before the call for the
     # production glob to find it — fetch_via_ytdlp never returns the temp name.
     mocker.patch("transcription.generate_temporary_name", return_value="fake-uuid")
     mocker.patch("transcription.Path.cwd", return_value=tmp_path)
@@ -533,13 +610,13 @@ def test_fetch_via_ytdlp_succeeds_on_second_attempt(mocker, tmp_path):
                 raise DownloadError("transient network blip")
             return {"subtitles": {"en": [{}]}, "automatic_captions": {}}
 
-        def download(self, url_list: list[str]) -> int:
+        def process_ie_result(self, ie_result: dict, download: bool = True) -> dict:
             vtt_path.write_text(vtt_content, encoding="utf-8")
-            return 0
+            return ie_result
 
     mocker.patch("transcription.YoutubeDL", MockYDL)
 
-    result = YtDlpBackend().fetch_via_ytdlp(
+    result = _ytdlp_backend().fetch_via_ytdlp(
         "https://www.youtube.com/watch?v=test",
     )
 
@@ -675,7 +752,7 @@ def test_fetch_via_ytdlp_selects_subtitle_track(
         expected_text,
     )
 
-    result = YtDlpBackend().fetch_via_ytdlp("https://www.youtube.com/watch?v=test")
+    result = _ytdlp_backend().fetch_via_ytdlp("https://www.youtube.com/watch?v=test")
 
     assert result == expected_text
     assert download_calls == [expected_langs]
@@ -684,6 +761,37 @@ def test_fetch_via_ytdlp_selects_subtitle_track(
     assert not vtt_path.exists()
 
 
+def test_fetch_via_ytdlp_reuses_a_video_probed_lately(mocker, tmp_path):
+    """A video whose info is cached is not extracted again, in any URL spelling."""
+    mocker.patch("transcription.generate_temporary_name", return_value="fake-uuid")
+    mocker.patch("transcription.Path.cwd", return_value=tmp_path)
+    info = VideoInfoCache(TtlCache(600, 16))
+    info.put(
+        "https://youtu.be/test",
+        {"subtitles": {"en": [{}]}},
+        "http://proxy-a:8080",
+    )
+    mocker.patch("transcription.get_proxy", return_value="http://proxy-b:8080")
+    mock_ydl_cls = mocker.patch("transcription.YoutubeDL")
+    ctx = mock_ydl_cls.return_value.__enter__.return_value
+    ctx.process_ie_result.side_effect = lambda *_, **__: (
+        tmp_path / "fake-uuid.en.vtt"
+    ).write_text("WEBVTT\n\n00:00:01.000 --> 00:00:03.000\nHello\n")
+
+    result = _ytdlp_backend(info).fetch_via_ytdlp(
+        "https://www.youtube.com/watch?v=test",
+    )
+
+    assert result == "Hello"
+    ctx.extract_info.assert_not_called()
+    ctx.process_ie_result.assert_called_once_with(
+        {"subtitles": {"en": [{}]}},
+        download=True,
+    )
+    # Its subtitle URLs are bound to the address that extracted them.
+    assert mock_ydl_cls.call_args.args[0]["proxy"] == "http://proxy-a:8080"
+
+
 def test_fetch_via_ytdlp_no_subtitles_skips_download(mocker, tmp_path):
     """Test fetch_via_ytdlp raises without calling download when no subtitles exist."""
     mocker.patch("transcription.Path.cwd", return_value=tmp_path)
@@ -692,11 +800,11 @@ def test_fetch_via_ytdlp_no_subtitles_skips_download(mocker, tmp_path):
     ctx.extract_info.return_value = {"subtitles": {}, "automatic_captions": {}}
 
     with pytest.raises(DownloadError, match="No subtitles available via yt-dlp"):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
-    ctx.download.assert_not_called()
+    ctx.process_ie_result.assert_not_called()
 
 
 def test_fetch_via_ytdlp_extract_info_none_raises(mocker, tmp_path):
@@ -707,11 +815,11 @@ def test_fetch_via_ytdlp_extract_info_none_raises(mocker, tmp_path):
     ctx.extract_info.return_value = None
 
     with pytest.raises(DownloadError, match="No subtitles available via yt-dlp"):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
-    ctx.download.assert_not_called()
+    ctx.process_ie_result.assert_not_called()
 
 
 def test_fetch_via_ytdlp_vtt_read_error_raises_download_error(
@@ -737,7 +845,7 @@ def test_fetch_via_ytdlp_vtt_read_error_raises_download_error(
     mocker.patch.object(YtDlpBackend, "_vtt_to_text", side_effect=OSError("disk full"))
 
     with pytest.raises(DownloadError, match="Failed to read downloaded VTT file"):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
@@ -755,14 +863,14 @@ def test_fetch_via_ytdlp_no_vtt_after_download_raises(mocker, tmp_path):
         "subtitles": {"en": [{}]},
         "automatic_captions": {},
     }
-    # download() succeeds but writes nothing to tmp_path
+    # process_ie_result() succeeds but writes nothing to tmp_path
 
     with pytest.raises(DownloadError, match="No subtitles available via yt-dlp"):
-        YtDlpBackend().fetch_via_ytdlp(
+        _ytdlp_backend().fetch_via_ytdlp(
             "https://www.youtube.com/watch?v=test",
         )
 
-    ctx.download.assert_called_once()
+    ctx.process_ie_result.assert_called_once()
 
 
 def test_fetch_via_ytdlp_pins_proxy_across_probe_and_download(
@@ -787,7 +895,7 @@ def test_fetch_via_ytdlp_pins_proxy_across_probe_and_download(
         "automatic_captions": {},
     }
 
-    YtDlpBackend().fetch_via_ytdlp("https://www.youtube.com/watch?v=test")
+    _ytdlp_backend().fetch_via_ytdlp("https://www.youtube.com/watch?v=test")
 
     assert mock_ydl_cls.call_count == 2
     probe_opts, download_opts = (call.args[0] for call in mock_ydl_cls.call_args_list)
@@ -809,7 +917,7 @@ def test_transcribe_happy_path(mocker):
     """Test transcribing an audio file successfully via Replicate."""
     mock_replicate = mocker.MagicMock()
     mocker.patch("transcription.Path.open", mocker.mock_open())
-    mocker.patch("transcription.time.sleep")  # Don't actually wait
+    mocker.patch("cancellation.time.sleep")  # Don't actually wait
 
     # Mock the prediction object and its lifecycle
     mock_prediction = mocker.MagicMock()
@@ -832,6 +940,21 @@ def test_transcribe_happy_path(mocker):
     mock_prediction.reload.assert_called_once()
 
 
+def test_transcribe_cancels_the_prediction_when_the_job_is_cancelled(mocker):
+    """A job cancelled mid-prediction cancels it on Replicate, so it stops billing."""
+    mock_replicate = mocker.MagicMock()
+    mocker.patch("transcription.Path.open", mocker.mock_open())
+    mocker.patch("transcription.cancellation.sleep", side_effect=JobCancelledError)
+    mock_prediction = mocker.MagicMock(status="processing")
+    mock_replicate.predictions.create.return_value = mock_prediction
+
+    with pytest.raises(JobCancelledError):
+        AudioTranscriber(mock_replicate).transcribe("test.ogg")
+
+    mock_prediction.cancel.assert_called_once_with()
+    mock_replicate.predictions.create.assert_called_once()
+
+
 def test_transcribe_failed_prediction(mocker):
     """Test transcribe raises ModelError when prediction fails."""
     mock_replicate = mocker.MagicMock()
@@ -882,6 +1005,105 @@ def test_transcribe_invalid_segments_raises_model_error(mocker):
         AudioTranscriber(mock_replicate).transcribe("test.ogg")
 
 
+def _succeeding_replicate(mocker, versions=("v1",)):
+    mock_replicate = mocker.MagicMock()
+    mocker.patch("transcription.Path.open", mocker.mock_open())
+    mock_replicate.models.get.return_value.versions.list.side_effect = [
+        [mocker.MagicMock(id=version)] for version in versions
+    ]
+    mock_replicate.predictions.create.return_value = mocker.MagicMock(
+        status="succeeded",
+        output={"segments": [{"text": "Hi"}]},
+    )
+    return mock_replicate
+
+
+def test_transcribe_reuses_the_version_until_the_refresh_interval(mocker):
+    """The version lookup runs once per interval, not once per transcription."""
+    clock = mocker.patch("transcription.time.monotonic", return_value=100.0)
+    mock_replicate = _succeeding_replicate(mocker, versions=("v1", "v2"))
+    transcriber = AudioTranscriber(mock_replicate, refresh_interval=60)
+
+    transcriber.transcribe("a.ogg")
+    transcriber.transcribe("b.ogg")
+    clock.return_value = 160.0
+    transcriber.transcribe("c.ogg")
+
+    mock_replicate.models.get.assert_called_with("victor-upmeet/whisperx")
+    assert mock_replicate.models.get.call_count == 2
+    used = [c.kwargs["version"] for c in mock_replicate.predictions.create.mock_calls]
+    assert used == ["v1", "v1", "v2"]
+
+
+def test_transcribe_with_a_pinned_version_never_looks_it_up(mocker):
+    """A pinned version goes straight into the prediction."""
+    mock_replicate = _succeeding_replicate(mocker)
+
+    AudioTranscriber(mock_replicate, pinned_version="pinned").transcribe("a.ogg")
+
+    mock_replicate.models.get.assert_not_called()
+    assert mock_replicate.predictions.create.call_args.kwargs["version"] == "pinned"
+
+
+@pytest.mark.parametrize(
+    ("status", "detail"),
+    [
+        (404, None),
+        (422, "Invalid version or not permitted"),
+        (422, "The specified version old does not exist"),
+    ],
+)
+def test_transcribe_refreshes_a_refused_version_once(mocker, status, detail):
+    """A version Replicate no longer has is looked up again and the call retried."""
+    mock_replicate = _succeeding_replicate(mocker, versions=("old", "new"))
+    prediction = mock_replicate.predictions.create.return_value
+    mock_replicate.predictions.create.side_effect = [
+        ReplicateError(status=status, detail=detail),
+        prediction,
+    ]
+    mock_sleep = mocker.patch("cancellation.time.sleep")
+
+    assert AudioTranscriber(mock_replicate).transcribe("a.ogg") == "Hi"
+
+    used = [c.kwargs["version"] for c in mock_replicate.predictions.create.mock_calls]
+    assert used == ["old", "new"]
+    mock_sleep.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ("pinned", "status", "detail"),
+    [
+        ("pinned", 404, None),
+        (None, 500, None),
+        (None, 422, "- input.audio_file: Does not match format 'uri'"),
+        (None, 422, None),
+    ],
+)
+def test_transcribe_leaves_other_refusals_to_the_retry_policy(
+    mocker,
+    pinned,
+    status,
+    detail,
+):
+    """A refused pinned version, bad input or any other error is retried as before.
+
+    Nothing is looked up again for them, nor the audio uploaded a second time
+    before the retry policy's own attempts.
+    """
+    mock_replicate = _succeeding_replicate(mocker)
+    mock_replicate.predictions.create.side_effect = ReplicateError(
+        status=status,
+        detail=detail,
+    )
+    mocker.patch("cancellation.time.sleep")
+
+    with pytest.raises(RetryError):
+        AudioTranscriber(mock_replicate, pinned_version=pinned).transcribe("a.ogg")
+
+    assert mock_replicate.models.get.call_count <= 1
+    assert mock_replicate.predictions.create.call_count == 3
+
+
 def test_extract_video_id_uppercase_host():
     """_extract_video_id handles uppercase and mixed-case hostnames."""
     assert (
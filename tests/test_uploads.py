@@ -0,0 +1,156 @@
+import time
+from datetime import UTC, datetime
+
+import fakeredis
+import pytest
+from google.genai import types
+
+from uploads import UploadRegistry
+
+
+@pytest.fixture
+def client():
+    """Provide an in-memory Redis-compatible server shared by every process."""
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def _registry(client, max_files=2, in_use=0):
+    return UploadRegistry(client, max_files, 3600, 48 * 3600, in_use)
+
+
+def _upload(name, hours_left=47.0):
+    expires = datetime.fromtimestamp(time.time() + hours_left * 3600, UTC)
+    return types.File(
+        name=f"files/{name}",
+        uri=f"https://generativelanguage.googleapis.com/v1beta/files/{name}",
+        mime_type="audio/ogg",
+        expiration_time=expires,
+        state=types.FileState.ACTIVE,
+    )
+
+
+def test_put_then_get_returns_the_upload_to_every_process(client):
+    """A recorded upload comes back, from any registry, as a ready file."""
+    uploaded = _upload("a")
+
+    assert _registry(client).put("sha-a", uploaded) == (uploaded, [])
+    found = _registry(client).get("sha-a")
+
+    assert (found.name, found.uri, found.mime_type) == (
+        uploaded.name,
+        uploaded.uri,
+        uploaded.mime_type,
+    )
+    assert found.state == types.FileState.ACTIVE
+    assert found.expiration_time.timestamp() == pytest.approx(
+        uploaded.expiration_time.timestamp(),
+    )
+    assert _registry(client).get("sha-b") is None
+
+
+def test_an_upload_close_to_expiry_is_dropped_not_reused(client):
+    """With under min_lifetime left, the record goes and the file is uploaded anew."""
+    registry = _registry(client)
+    registry.put("sha-a", _upload("a", hours_left=0.5))
+
+    assert registry.get("sha-a") is None
+    assert client.hlen("gemini-uploads:files") == 0
+    assert client.zcard("gemini-uploads:lru") == 0
+
+
+def test_an_upload_without_an_expiry_gets_the_default_lifetime(client):
+    """A file reporting no expiry is taken to live for Gemini's documented 48 hours."""
+    registry = _registry(client)
+    uploaded = _upload("a").model_copy(update={"expiration_time": None})
+
+    registry.put("sha-a", uploaded)
+
+    left = registry.get("sha-a").expiration_time.timestamp() - time.time()
+    assert left == pytest.approx(48 * 3600, abs=5)
+
+
+def test_put_evicts_the_least_recently_used_and_returns_their_names(client):
+    """Past max_files, the upload unused longest is forgotten for deletion."""
+    registry = _registry(client)
+    registry.put("sha-a", _upload("a"))
+    registry.put("sha-b", _upload("b"))
+    client.zadd("gemini-uploads:lru", {"sha-a": 1, "sha-b": 2})
+    registry.get("sha-a")
+
+    assert registry.put("sha-c", _upload("c"))[1] == ["files/b"]
+    assert registry.get("sha-b") is None
+    assert registry.get("sha-a") is not None
+
+
+def test_put_loses_to_an_upload_of_the_same_bytes_recorded_first(client):
+    """The second process uses the first one's upload and deletes its own."""
+    first = _registry(client)
+    first.put("sha-a", _upload("a"))
+
+    used, stale = _registry(client).put("sha-a", _upload("a2"))
+
+    assert used.name == "files/a"
+    assert stale == ["files/a2"]
+    assert first.get("sha-a").name == "files/a"
+
+
+def test_put_replaces_a_record_too_close_to_expiry_to_reuse(client):
+    """A recorded upload under min_lifetime does not block a fresh one."""
+    registry = _registry(client)
+    registry.put("sha-a", _upload("a", hours_left=0.5))
+    fresh = _upload("a2")
+
+    assert registry.put("sha-a", fresh) == (fresh, [])
+    assert registry.get("sha-a").name == "files/a2"
+
+
+def test_eviction_spares_an_upload_used_within_the_call_window(client):
+    """An upload a model call may still be reading stays past max_files."""
+    registry = _registry(client, max_files=1, in_use=600)
+    registry.put("sha-a", _upload("a"))
+    client.zadd("gemini-uploads:lru", {"sha-a": time.time() - 60})
+
+    assert registry.put("sha-b", _upload("b"))[1] == []
+    assert client.zcard("gemini-uploads:lru") == 2
+
+    client.zadd("gemini-uploads:lru", {"sha-a": time.time() - 601})
+
+    assert registry._evict() == ["files/a"]
+
+
+def test_eviction_spares_an_upload_used_again_meanwhile(mocker, client):
+    """A digest used after being listed for eviction is kept, nothing deleted."""
+    registry = _registry(client, max_files=1)
+    registry.put("sha-a", _upload("a"))
+    client.zadd("gemini-uploads:lru", {"sha-a": 1, "sha-b": 2})
+    client.hset("gemini-uploads:files", "sha-b", "{}")
+    real_zrangebyscore = client.zrangebyscore
+
+    def list_then_use(*args, **kwargs):
+        listed = real_zrangebyscore(*args, **kwargs)
+        client.zadd("gemini-uploads:lru", {"sha-a": time.time()})
+        return listed
+
+    mocker.patch.object(client, "zrangebyscore", side_effect=list_then_use)
+
+    assert registry._evict() == []
+    assert client.hexists("gemini-uploads:files", "sha-a")
+
+
+def test_eviction_of_a_record_already_gone_deletes_nothing(client):
+    """An lru entry whose record another process removed yields no name."""
+    registry = _registry(client, max_files=0)
+    client.zadd("gemini-uploads:lru", {"sha-a": 1})
+
+    assert registry._evict() == []
+    assert client.zcard("gemini-uploads:lru") == 0
+
+
+def test_discard_forgets_an_upload(client):
+    """A discarded upload is no longer offered for reuse."""
+    registry = _registry(client)
+    registry.put("sha-a", _upload("a"))
+
+    registry.discard("sha-a")
+
+    assert registry.get("sha-a") is None
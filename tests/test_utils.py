@@ -1,7 +1,17 @@
+import hashlib
 from pathlib import Path
 
+import fakeredis
+
 from config import PROTECTED_FILES
-from utils import classify_url, clean_up, compress_audio, generate_temporary_name
+from utils import (
+    canonical_source,
+    classify_url,
+    clean_up,
+    file_sha256,
+    generate_temporary_name,
+    run_transaction,
+)
 
 
 def test_classify_url_uppercase_youtube_host():
@@ -53,6 +63,14 @@ def test_classify_url_http_youtube_is_web():
     assert classify_url("http://youtube.com/watch?v=dQw4w9WgXcQ") == "web"
 
 
+def test_file_sha256_hashes_the_files_bytes(tmp_path):
+    """Test file_sha256 matches hashlib over the same bytes."""
+    path = tmp_path / "audio.ogg"
+    path.write_bytes(b"OggS" * 5000)
+
+    assert file_sha256(str(path)) == hashlib.sha256(b"OggS" * 5000).hexdigest()
+
+
 def test_generate_temporary_name_no_ext():
     """Test generating a temporary name without an extension."""
     name = generate_temporary_name()
@@ -70,37 +88,6 @@ def test_generate_temporary_name_with_ext():
     assert len(name) == 40  # 36 chars UUID + 4 chars extension
 
 
-def test_compress_audio_calls_ffmpeg(mocker):
-    """Test that compress_audio calls subprocess.run with correct arguments."""
-    mock_run = mocker.patch("subprocess.run")
-
-    input_file = "test_input.mp3"
-    output_file = "test_output.ogg"
-
-    compress_audio(input_file, output_file)
-
-    expected_args = [
-        "ffmpeg",
-        "-y",
-        "-i",
-        input_file,
-        "-vn",
-        "-ac",
-        "1",
-        "-c:a",
-        "libopus",
-        "-b:a",
-        "16k",
-        output_file,
-    ]
-
-    mock_run.assert_called_once_with(
-        expected_args,
-        check=True,
-        capture_output=False,
-    )
-
-
 def test_clean_up_single_file_unprotected(mocker):
     """Test that clean_up removes a single unprotected file."""
     mock_path = mocker.MagicMock(spec=Path)
@@ -175,3 +162,39 @@ def test_clean_up_all_downloads(mocker):
 
     # Only file1 should have been unlinked
     mock_unlink.assert_called_once_with(file1)
+
+
+def test_canonical_source_names_a_youtube_video_by_its_id():
+    """Every spelling of one video's URL shares one source."""
+    assert canonical_source("https://youtu.be/dQw4w9WgXcQ") == "youtube:dQw4w9WgXcQ"
+    assert (
+        canonical_source("https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42")
+        == "youtube:dQw4w9WgXcQ"
+    )
+
+
+def test_canonical_source_drops_what_does_not_change_the_page():
+    """Scheme, fragment, www. and host case do not split a URL's source."""
+    assert (
+        canonical_source("http://WWW.Example.com/a?b=1#top")
+        == canonical_source("https://example.com/a?b=1")
+        == "url:example.com/a?b=1"
+    )
+    assert (
+        canonical_source("https://castro.fm/episode/123") == "url:castro.fm/episode/123"
+    )
+
+
+def test_run_transaction_returns_the_callbacks_value():
+    """The transaction's commands run, and the result is the callback's own."""
+    client = fakeredis.FakeRedis(decode_responses=True)
+    client.set("counter", 41)
+
+    def bump(pipe):
+        current = int(pipe.get("counter"))
+        pipe.multi()
+        pipe.set("counter", current + 1)
+        return current + 1
+
+    assert run_transaction(client, bump, "counter") == 42
+    assert client.get("counter") == "42"
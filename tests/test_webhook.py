@@ -0,0 +1,156 @@
+import http.client
+import json
+import threading
+
+import fakeredis
+import pytest
+import telebot
+
+from dedupe import UpdateDeduplicator
+from webhook import SECRET_HEADER, WebhookServer
+
+URL = "https://bot.example.com/hook"
+SECRET = "secret"
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+
+def _update(update_id=1, text="https://example.com"):
+    """Return the JSON body Telegram would POST for one private text message."""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1234567890,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+
+def _dedupe():
+    """Return a deduplicator on its own in-memory server."""
+    return UpdateDeduplicator(fakeredis.FakeRedis(decode_responses=True), 60)
+
+
+def _post(port, body, secret=SECRET):
+    """POST `body` to the local server as Telegram would; return the HTTP status."""
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        connection.request(
+            "POST",
+            "/hook",
+            body=data,
+            headers={SECRET_HEADER: secret} if secret is not None else {},
+        )
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+@pytest.fixture
+def serve():
+    """Start a WebhookServer for `bot` on a free local port; yield its port."""
+    servers = []
+
+    def _serve(bot):
+        server = WebhookServer(bot, _dedupe(), URL, SECRET, "127.0.0.1", 0)
+        port = server.listen()
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        servers.append((server, thread))
+        return port
+
+    yield _serve
+    for server, thread in servers:
+        server.close()
+        thread.join(timeout=5)
+
+
+def test_webhook_server_requires_a_secret_token(mocker):
+    """An empty secret would accept forged updates, so it is refused outright."""
+    with pytest.raises(ValueError, match="secret token"):
+        WebhookServer(mocker.MagicMock(), _dedupe(), URL, "", "127.0.0.1", 0)
+
+
+def test_listen_registers_the_webhook_with_its_secret(mocker):
+    """listen() binds the port and points Telegram at the URL with the secret."""
+    bot = mocker.MagicMock()
+    server = WebhookServer(bot, _dedupe(), URL, SECRET, "127.0.0.1", 0)
+
+    port = server.listen()
+    server.close()
+
+    assert port > 0
+    bot.set_webhook.assert_called_once_with(
+        url=URL,
+        secret_token=SECRET,
+    )
+
+
+def test_post_dispatches_the_update_to_the_registered_handlers(mocker, serve):
+    """A POSTed update reaches the same message handlers polling feeds."""
+    bot = telebot.TeleBot("12345:mock_token", threaded=False)
+    mocker.patch.object(bot, "set_webhook")
+    received = []
+    bot.message_handler(content_types=["text"])(received.append)
+    port = serve(bot)
+
+    status = _post(port, _update(text="https://example.com/article"))
+
+    assert status == 200
+    assert [message.text for message in received] == ["https://example.com/article"]
+    assert received[0].chat.id == 42
+
+
+def test_post_of_a_redelivered_update_is_acknowledged_once(mocker, serve):
+    """Telegram's repeat of an update gets a 200 but reaches no handler again."""
+    bot = mocker.MagicMock()
+    port = serve(bot)
+
+    assert _post(port, _update(update_id=7)) == 200
+    assert _post(port, _update(update_id=7)) == 200
+    assert _post(port, _update(update_id=8)) == 200
+
+    assert bot.process_new_updates.call_count == 2
+
+
+@pytest.mark.parametrize("secret", ["wrong", "", None])
+def test_post_with_a_bad_secret_is_forbidden(mocker, serve, secret):
+    """A request without Telegram's secret header is refused and not dispatched."""
+    bot = mocker.MagicMock()
+    port = serve(bot)
+
+    assert _post(port, _update(), secret=secret) == 403
+    bot.process_new_updates.assert_not_called()
+
+
+@pytest.mark.parametrize("body", [b"not json", b"{}", b"null", b"[1, 2]"])
+def test_post_with_a_malformed_update_is_rejected(mocker, serve, body):
+    """A body that is not an update is answered 400 and not dispatched."""
+    bot = mocker.MagicMock()
+    port = serve(bot)
+
+    assert _post(port, body) == 400
+    bot.process_new_updates.assert_not_called()
+
+
+def test_close_stops_serving_and_releases_the_port(mocker):
+    """close() returns once serve_forever has stopped, from any state."""
+    server = WebhookServer(mocker.MagicMock(), _dedupe(), URL, SECRET, "127.0.0.1", 0)
+    port = server.listen()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    # Any answer at all means serve_forever is running.
+    assert _post(port, b"{}") == 400
+
+    server.close()
+    thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    # Closing a server that never served must not wait for serve_forever.
+    WebhookServer(mocker.MagicMock(), _dedupe(), URL, SECRET, "127.0.0.1", 0).close()
@@ -0,0 +1,158 @@
+import threading
+
+from workers import Scheduler, WorkerPool
+
+
+def _started(workers=2, queue_size=10):
+    pool = WorkerPool(workers, queue_size)
+    pool.start()
+    return pool
+
+
+def test_submit_runs_one_keys_jobs_in_order():
+    """Jobs for the same key run one at a time, in submission order."""
+    pool = _started(workers=4, queue_size=20)
+    seen = []
+
+    for index in range(20):
+        assert pool.submit("chat", lambda index=index: seen.append(index)) is True
+    pool.shutdown()
+
+    assert seen == list(range(20))
+
+
+def test_submit_runs_different_keys_in_parallel():
+    """A blocked job for one key does not hold up another key's job."""
+    pool = _started(workers=2)
+    release = threading.Event()
+    other_ran = threading.Event()
+
+    pool.submit("slow", release.wait)
+    pool.submit("fast", other_ran.set)
+
+    assert other_ran.wait(timeout=5)
+    release.set()
+    pool.shutdown()
+
+
+def test_submit_queues_behind_a_running_job_for_the_same_key():
+    """A job submitted while its key's head job runs waits for it to finish."""
+    pool = _started(workers=2)
+    release = threading.Event()
+    seen = []
+
+    pool.submit("chat", lambda: (release.wait(), seen.append("first")))
+    pool.submit("chat", lambda: seen.append("second"))
+    release.set()
+    pool.shutdown()
+
+    assert seen == ["first", "second"]
+
+
+def test_submit_refuses_when_the_queue_is_full():
+    """queue_size counts running jobs too; the next submission is refused."""
+    pool = _started(workers=1, queue_size=2)
+    release = threading.Event()
+
+    assert pool.submit("a", release.wait) is True
+    assert pool.submit("b", release.wait) is True
+    assert pool.submit("c", release.wait) is False
+
+    release.set()
+    pool.shutdown()
+
+
+def test_failed_job_is_logged_and_the_key_keeps_going(caplog):
+    """An exception in one job is logged and does not stall the key's next job."""
+    pool = _started(workers=1)
+    seen = []
+
+    def boom():
+        raise RuntimeError("boom")
+
+    pool.submit("chat", boom)
+    pool.submit("chat", lambda: seen.append("after"))
+    pool.shutdown()
+
+    assert seen == ["after"]
+    assert "Job for chat failed" in caplog.text
+
+
+def test_shutdown_refuses_new_jobs():
+    """After shutdown the pool takes nothing more."""
+    pool = _started()
+    pool.shutdown()
+
+    assert pool.submit("chat", lambda: None) is False
+
+
+def test_shutdown_reports_a_drain_complete():
+    """A pool that finishes its jobs in time reports none left."""
+    pool = _started()
+    pool.submit("chat", lambda: None)
+
+    assert pool.shutdown(timeout=5) == 0
+
+
+def test_shutdown_past_the_timeout_drops_jobs_not_yet_started():
+    """At the deadline a running job is left alone and the queued ones never start."""
+    pool = _started(workers=1)
+    release = threading.Event()
+    started = threading.Event()
+    seen = []
+
+    pool.submit("chat", lambda: (started.set(), release.wait(timeout=5)))
+    pool.submit("chat", lambda: seen.append("queued"))
+    pool.submit("other", lambda: seen.append("other"))
+    assert started.wait(timeout=5)
+
+    assert pool.shutdown(timeout=0.05) == 3
+    release.set()
+    with pool._idle:
+        assert pool._idle.wait_for(lambda: not pool._pending, timeout=5)
+    assert seen == []
+
+
+def test_scheduler_shutdown_shares_one_deadline_across_lanes(mocker):
+    """Each lane gets what is left of the timeout, not the whole of it again."""
+    lanes = {"quick": mocker.MagicMock(), "long": mocker.MagicMock()}
+    lanes["quick"].shutdown.return_value = 1
+    lanes["long"].shutdown.return_value = 2
+    clock = mocker.patch("workers.time.monotonic", side_effect=[100.0, 104.0, 112.0])
+
+    assert Scheduler(lanes).shutdown(timeout=10) == 3
+
+    lanes["quick"].shutdown.assert_called_once_with(6.0)
+    lanes["long"].shutdown.assert_called_once_with(0.0)
+    assert clock.call_count == 3
+
+
+def test_scheduler_runs_a_lane_while_another_is_saturated():
+    """A quick job is not held up by a long lane whose only worker is busy."""
+    scheduler = Scheduler({"quick": WorkerPool(1, 10), "long": WorkerPool(1, 10)})
+    scheduler.start()
+    release = threading.Event()
+    quick_ran = threading.Event()
+
+    assert scheduler.submit("long", "chat", release.wait) is True
+    assert scheduler.submit("long", "other", release.wait) is True
+    assert scheduler.submit("quick", "chat", quick_ran.set) is True
+
+    assert quick_ran.wait(timeout=5)
+    release.set()
+    scheduler.shutdown()
+
+
+def test_scheduler_lanes_refuse_independently():
+    """A full lane refuses its own jobs only."""
+    scheduler = Scheduler({"quick": WorkerPool(1, 1), "long": WorkerPool(1, 1)})
+    scheduler.start()
+    release = threading.Event()
+
+    assert scheduler.submit("long", "a", release.wait) is True
+    assert scheduler.submit("long", "b", release.wait) is False
+    assert scheduler.submit("quick", "a", release.wait) is True
+
+    release.set()
+    scheduler.shutdown()
+    assert scheduler.submit("quick", "a", release.wait) is False